@@ -5,9 +5,12 @@ from django.utils import timezone
 from django.urls import path
 from django.shortcuts import redirect, render
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Count
 from datetime import timedelta
-from .models import User, Building, Favorite, SavedRoute, SafetyAlert, SafetyConcern, BuildingView, PageView, AlertInteraction
+from .alert_snapshot import active_alert_snapshot
+from .route_alerts import saved_route_checker
+from .models import User, Building, Favorite, SavedRoute, SafetyAlert, SafetyConcern, BuildingView, PageView, AlertInteraction, GeocodeCache, OccupancyHourStats, WaitzFeedState, SchedulerLease, ScheduledJobStatus
 
 
 @admin.register(User)
@@ -56,8 +59,8 @@ class FavoriteAdmin(admin.ModelAdmin):
 @admin.register(SavedRoute)
 class SavedRouteAdmin(admin.ModelAdmin):
     """Admin configuration for SavedRoute model."""
-    list_display = ["user", "name", "origin_name", "destination_name", "distance_text", "duration_text", "created_at", "last_used"]
-    list_filter = ["created_at", "last_used"]
+    list_display = ["user", "name", "origin_name", "destination_name", "distance_text", "duration_text", "has_alert", "created_at", "last_used"]
+    list_filter = ["has_alert", "created_at", "last_used"]
     search_fields = ["user__email", "name", "origin_name", "destination_name", "destination_building__name"]
     ordering = ["-last_used", "-created_at"]
     autocomplete_fields = ["user", "destination_building"]
@@ -79,8 +82,8 @@ class SafetyAlertAdmin(admin.ModelAdmin):
             "fields": ("title", "description", "alert_type", "severity")
         }),
         ("Location", {
-            "fields": ("location_type", "latitude", "longitude", "radius", "polygon_coordinates"),
-            "description": "For circle type, provide radius in meters. For polygon type, provide JSON array of coordinates."
+            "fields": ("location_type", "address", "latitude", "longitude", "radius", "polygon_coordinates"),
+            "description": "Leave latitude and longitude empty to geocode them from the address on save. For circle type, provide radius in meters. For polygon type, provide JSON array of coordinates."
         }),
         ("Status & Dates", {
             "fields": ("is_active", "start_date", "end_date", "status_display")
@@ -113,27 +116,47 @@ class SafetyAlertAdmin(admin.ModelAdmin):
         return format_html('<span style="color: gray;">Unknown</span>')
     status_display.short_description = "Status"
     
+    def save_model(self, request, obj, form, change):
+        # Geocode here rather than in the background so the editor sees at
+        # once whether the address could be located
+        obj.geocode_if_needed()
+        super().save_model(request, obj, form, change)
+        if obj.latitude is None or obj.longitude is None:
+            messages.warning(
+                request,
+                f"Could not geocode '{obj.address}'. Enter latitude and longitude so the alert appears on the map."
+            )
+
     actions = ["activate_alerts", "deactivate_alerts", "mark_as_expired"]
     
     def activate_alerts(self, request, queryset):
         """Activate selected alerts."""
-        updated = queryset.update(is_active=True)
+        updated = queryset.update(is_active=True, updated_at=timezone.now())
+        self.recheck_saved_routes(queryset)
         self.message_user(request, f"{updated} alert(s) activated successfully.")
     activate_alerts.short_description = "Activate selected alerts"
     
     def deactivate_alerts(self, request, queryset):
         """Deactivate selected alerts."""
-        updated = queryset.update(is_active=False)
+        updated = queryset.update(is_active=False, updated_at=timezone.now())
+        self.recheck_saved_routes(queryset)
         self.message_user(request, f"{updated} alert(s) deactivated successfully.")
     deactivate_alerts.short_description = "Deactivate selected alerts"
     
     def mark_as_expired(self, request, queryset):
         """Mark selected alerts as expired by setting end_date to now."""
         now = timezone.now()
-        updated = queryset.update(end_date=now)
+        updated = queryset.update(end_date=now, updated_at=now)
+        self.recheck_saved_routes(queryset)
         self.message_user(request, f"{updated} alert(s) marked as expired.")
     mark_as_expired.short_description = "Mark as expired"
 
+    def recheck_saved_routes(self, queryset):
+        """queryset.update() sends no signals, so refresh the snapshot and routes here."""
+        transaction.on_commit(active_alert_snapshot.invalidate)
+        for alert_id in queryset.values_list('id', flat=True):
+            transaction.on_commit(lambda alert_id=alert_id: saved_route_checker.enqueue(alert_id))
+
 
 @admin.register(SafetyConcern)
 class SafetyConcernAdmin(admin.ModelAdmin):
@@ -327,9 +350,9 @@ class SafetyConcernAdmin(admin.ModelAdmin):
         try:
             concern = SafetyConcern.objects.get(pk=concern_id)
             
-            # Check if coordinates are available
-            if not concern.latitude or not concern.longitude:
-                messages.error(request, "Cannot approve: Missing GPS coordinates.")
+            # Check if coordinates are available (geocode the address if not)
+            if not concern.geocode_if_needed():
+                messages.error(request, "Cannot approve: Missing GPS coordinates and the address could not be geocoded.")
                 return redirect('admin:accounts_safetyconcern_change', concern_id)
             
             # Map concern category to alert type
@@ -387,8 +410,8 @@ class SafetyConcernAdmin(admin.ModelAdmin):
         error_count = 0
         
         for concern in queryset:
-            # Check if coordinates are available
-            if not concern.latitude or not concern.longitude:
+            # Check if coordinates are available (geocode the address if not)
+            if not concern.geocode_if_needed():
                 error_count += 1
                 continue
             
@@ -618,6 +641,67 @@ class SafetyConcernAdmin(admin.ModelAdmin):
         return redirect(reverse('admin:accounts_safetyconcern_changelist'))
 
 
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    """Admin configuration for GeocodeCache model."""
+    list_display = ["address", "latitude", "longitude", "provider", "hit_count", "last_used"]
+    list_filter = ["provider"]
+    search_fields = ["address", "normalized_address"]
+    readonly_fields = ["normalized_address", "provider", "hit_count", "last_used", "created_at", "updated_at"]
+
+
+@admin.register(OccupancyHourStats)
+class OccupancyHourStatsAdmin(admin.ModelAdmin):
+    """Admin configuration for OccupancyHourStats (filled by rollup_occupancy)."""
+    list_display = ['building', 'hour_of_week', 'sample_count', 'mean_percent', 'p90_percent', 'updated_at']
+    list_filter = ['hour_of_week']
+    search_fields = ['building__name', 'building__code']
+    readonly_fields = ['building', 'hour_of_week', 'sample_count', 'mean_percent', 'p90_percent', 'histogram', 'updated_at']
+
+    def has_add_permission(self, request):
+        """Stats come from the rollup only."""
+        return False
+
+
+@admin.register(WaitzFeedState)
+class WaitzFeedStateAdmin(admin.ModelAdmin):
+    """Admin configuration for WaitzFeedState (kept by fetch_waitz_occupancy)."""
+    list_display = ['url', 'runs', 'not_modified_runs', 'unchanged_runs', 'entries_skipped', 'entries_seen', 'checked_at', 'changed_at', 'poll_interval', 'poll_reason', 'next_poll_at']
+    readonly_fields = [
+        'url', 'etag', 'last_modified', 'fingerprint', 'names_fingerprint', 'buildings_version', 'entries',
+        'runs', 'not_modified_runs', 'unchanged_runs', 'entries_seen', 'entries_skipped', 'last_run_summary',
+        'checked_at', 'changed_at', 'change_rate', 'poll_interval', 'poll_reason', 'next_poll_at',
+    ]
+
+    def has_add_permission(self, request):
+        """State comes from the fetch command only; delete it to force a full ingest."""
+        return False
+
+
+@admin.register(SchedulerLease)
+class SchedulerLeaseAdmin(admin.ModelAdmin):
+    """Admin configuration for SchedulerLease (the scheduler leader lock)."""
+    list_display = ['name', 'holder', 'acquired_at', 'renewed_at', 'expires_at']
+    readonly_fields = ['name', 'holder', 'acquired_at', 'renewed_at', 'expires_at']
+
+    def has_add_permission(self, request):
+        """Leases are taken by scheduler processes; delete one to force a new election."""
+        return False
+
+
+@admin.register(ScheduledJobStatus)
+class ScheduledJobStatusAdmin(admin.ModelAdmin):
+    """Admin configuration for ScheduledJobStatus (recorded by the scheduler)."""
+    list_display = ['job_id', 'runs', 'failures', 'last_success_at', 'last_duration_ms', 'max_duration_ms', 'last_holder']
+    readonly_fields = [
+        'job_id', 'runs', 'failures', 'last_started_at', 'last_finished_at', 'last_success_at',
+        'last_duration_ms', 'max_duration_ms', 'total_duration_ms', 'last_error', 'last_holder',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(BuildingView)
 class BuildingViewAdmin(admin.ModelAdmin):
     """Admin configuration for BuildingView analytics model."""
@@ -923,3 +1007,8 @@ admin_site.register(SafetyConcern, SafetyConcernAdmin)
 admin_site.register(BuildingView, BuildingViewAdmin)
 admin_site.register(PageView, PageViewAdmin)
 admin_site.register(AlertInteraction, AlertInteractionAdmin)
+admin_site.register(GeocodeCache, GeocodeCacheAdmin)
+admin_site.register(OccupancyHourStats, OccupancyHourStatsAdmin)
+admin_site.register(WaitzFeedState, WaitzFeedStateAdmin)
+admin_site.register(SchedulerLease, SchedulerLeaseAdmin)
+admin_site.register(ScheduledJobStatus, ScheduledJobStatusAdmin)
@@ -0,0 +1,374 @@
+"""
+Point-in-hazard lookup over the active safety alerts.
+
+Answers "which active alerts contain this coordinate?" for /api/alerts/at/
+and "which active alerts does this route cross?" for /api/routes/check/
+without touching the database. The alert areas from the active alert
+snapshot (see alert_snapshot.py) are bulk-loaded into a Sort-Tile-Recursive
+(STR) packed bounding-volume hierarchy stored as flat NumPy arrays, one per
+tree level. A query walks the levels top-down testing all candidate boxes
+of a level at once, then runs exact, vectorized point-in-circle and
+point-in-polygon tests on the surviving alerts.
+
+The tree is immutable. It is rebuilt whenever the snapshot object changes,
+so it follows alert saves, expiry and changes made by other processes.
+"""
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .alert_snapshot import active_alert_snapshot
+from .geo import alert_bounds, haversine_m, segment_circle_entry, segments_intersect, to_local_xy
+
+logger = logging.getLogger(__name__)
+
+# Children per tree node
+NODE_CAPACITY = 16
+
+# Most severe first in lookup results
+SEVERITY_RANK = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+def str_pack(boxes, capacity=NODE_CAPACITY):
+    """
+    Sort-Tile-Recursive ordering of boxes (N x 4: min_lat, max_lat,
+    min_lng, max_lng). Returns the permutation that groups boxes into
+    spatially compact runs of `capacity`.
+    """
+    count = len(boxes)
+    if count <= capacity:
+        return np.arange(count)
+
+    leaves = math.ceil(count / capacity)
+    slices = math.ceil(math.sqrt(leaves))
+    per_slice = slices * capacity
+
+    center_lat = (boxes[:, 0] + boxes[:, 1]) / 2.0
+    center_lng = (boxes[:, 2] + boxes[:, 3]) / 2.0
+    by_lng = np.argsort(center_lng, kind='stable')
+    order = []
+    for start in range(0, count, per_slice):
+        tile = by_lng[start:start + per_slice]
+        order.append(tile[np.argsort(center_lat[tile], kind='stable')])
+    return np.concatenate(order)
+
+
+def parent_boxes(boxes, capacity=NODE_CAPACITY):
+    """Bounding box of each consecutive run of `capacity` boxes."""
+    starts = np.arange(0, len(boxes), capacity)
+    return np.column_stack([
+        np.minimum.reduceat(boxes[:, 0], starts),
+        np.maximum.reduceat(boxes[:, 1], starts),
+        np.minimum.reduceat(boxes[:, 2], starts),
+        np.maximum.reduceat(boxes[:, 3], starts),
+    ])
+
+
+def boxes_containing(boxes, lat, lng):
+    """Boolean mask of the boxes that contain the point."""
+    return (
+        (boxes[:, 0] <= lat) & (boxes[:, 1] >= lat)
+        & (boxes[:, 2] <= lng) & (boxes[:, 3] >= lng)
+    )
+
+
+class AlertGeometryIndex:
+    """
+    Immutable STR tree over the areas of one alert snapshot.
+
+    levels[0] holds the alert boxes in packed order; levels[k + 1] holds
+    the bounding box of every NODE_CAPACITY consecutive boxes of levels[k].
+    Node i of a level therefore owns children i*capacity .. (i+1)*capacity-1
+    of the level below, so no pointers are needed.
+    """
+
+    def __init__(self, snapshot, point_radius_m=25.0, capacity=NODE_CAPACITY):
+        self.snapshot = snapshot
+        self.capacity = capacity
+        entries = []
+        boxes = []
+        for entry in snapshot.entries:
+            geometry = self._geometry(entry.data, point_radius_m)
+            if geometry is not None:
+                entries.append((entry, geometry))
+                boxes.append(geometry[-1])
+
+        if not entries:
+            self.entries = []
+            self.levels = []
+            return
+
+        boxes = np.asarray(boxes, dtype=np.float64)
+        order = str_pack(boxes, capacity)
+        self.entries = [entries[i][0] for i in order]
+        geometries = [entries[i][1] for i in order]
+        boxes = boxes[order]
+
+        self.levels = [boxes]
+        while len(self.levels[-1]) > capacity:
+            self.levels.append(parent_boxes(self.levels[-1], capacity))
+
+        self._build_shapes(geometries)
+
+    def _geometry(self, data, point_radius_m):
+        """('circle', lat, lng, radius, box) or ('polygon', vertices, box)."""
+        location_type = data.get('location_type')
+        lat = data.get('latitude')
+        lng = data.get('longitude')
+        if location_type == 'polygon' and data.get('polygon_coordinates'):
+            vertices = np.asarray(data['polygon_coordinates'], dtype=np.float64)
+            if vertices.ndim == 2 and len(vertices) >= 3:
+                box = alert_bounds('polygon', lat, lng, polygon=vertices.tolist())
+                return ('polygon', vertices[:, :2], box)
+        if lat is None or lng is None:
+            return None
+        radius = data.get('radius') if location_type == 'circle' else None
+        # Point alerts are treated as a small circle around the point
+        radius = float(radius) if radius else point_radius_m
+        return ('circle', lat, lng, radius, alert_bounds('circle', lat, lng, radius=radius))
+
+    def _build_shapes(self, geometries):
+        """Flatten circles and polygon edges into arrays for vectorized tests."""
+        count = len(geometries)
+        self.is_circle = np.zeros(count, dtype=bool)
+        self.circle_lat = np.zeros(count)
+        self.circle_lng = np.zeros(count)
+        self.circle_radius = np.zeros(count)
+
+        edge_starts = np.zeros(count, dtype=np.int64)
+        edge_counts = np.zeros(count, dtype=np.int64)
+        edges = []
+        offset = 0
+        for i, geometry in enumerate(geometries):
+            if geometry[0] == 'circle':
+                self.is_circle[i] = True
+                self.circle_lat[i] = geometry[1]
+                self.circle_lng[i] = geometry[2]
+                self.circle_radius[i] = geometry[3]
+            else:
+                vertices = geometry[1]
+                edges.append(np.column_stack([vertices, np.roll(vertices, -1, axis=0)]))
+                edge_starts[i] = offset
+                edge_counts[i] = len(vertices)
+                offset += len(vertices)
+
+        self.edge_starts = edge_starts
+        self.edge_counts = edge_counts
+        # Columns: lat1, lng1, lat2, lng2
+        self.edges = np.concatenate(edges) if edges else np.zeros((0, 4))
+
+    def candidates(self, lat, lng):
+        """Indices of alerts whose bounding box contains the point."""
+        if not self.levels:
+            return np.zeros(0, dtype=np.int64)
+
+        top = self.levels[-1]
+        nodes = np.flatnonzero(boxes_containing(top, lat, lng))
+        for level in reversed(self.levels[:-1]):
+            if not len(nodes):
+                break
+            children = (nodes[:, None] * self.capacity + np.arange(self.capacity)).ravel()
+            children = children[children < len(level)]
+            nodes = children[boxes_containing(level[children], lat, lng)]
+        return nodes
+
+    def containing(self, lat, lng):
+        """Snapshot entries whose area contains the point, most severe first."""
+        candidates = self.candidates(lat, lng)
+        if not len(candidates):
+            return []
+
+        hits = []
+        circles = candidates[self.is_circle[candidates]]
+        if len(circles):
+            distance = haversine_m(lat, lng, self.circle_lat[circles], self.circle_lng[circles])
+            hits.extend(circles[distance <= self.circle_radius[circles]].tolist())
+
+        polygons = candidates[~self.is_circle[candidates]]
+        if len(polygons):
+            hits.extend(polygons[self._inside_polygons(polygons, lat, lng)].tolist())
+
+        matches = [self.entries[i] for i in hits]
+        matches.sort(key=lambda entry: (SEVERITY_RANK.get(entry.severity, len(SEVERITY_RANK)), entry.id))
+        return matches
+
+    def _polygon_edges(self, polygons):
+        """Edge ids of several polygons, and the position of each edge's polygon."""
+        counts = self.edge_counts[polygons]
+        owners = np.repeat(np.arange(len(polygons)), counts)
+        edge_ids = np.repeat(self.edge_starts[polygons] - np.cumsum(counts) + counts, counts)
+        return edge_ids + np.arange(counts.sum()), owners
+
+    def _inside_polygons(self, polygons, lat, lng):
+        """Even-odd ray casting of the point against several polygons at once."""
+        edge_ids, owners = self._polygon_edges(polygons)
+        lat1, lng1, lat2, lng2 = self.edges[edge_ids].T
+
+        # Cast a ray towards +lng and count the edges it crosses
+        straddles = (lat1 > lat) != (lat2 > lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_lng = lng1 + (lat - lat1) * (lng2 - lng1) / (lat2 - lat1)
+        crosses = straddles & (lng < crossing_lng)
+        return (np.bincount(owners, weights=crosses, minlength=len(polygons)) % 2) == 1
+
+    def route_hits(self, lats, lngs):
+        """
+        Alerts a polyline passes through, as (snapshot entry, meters along
+        the route where it first enters the zone), ordered by distance.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        if not len(lats) or not self.levels:
+            return []
+        if len(lats) == 1:
+            lats = np.repeat(lats, 2)
+            lngs = np.repeat(lngs, 2)
+
+        segments, alert_ids, t = self.segment_hits(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+        if not len(segments):
+            return []
+        segment_length = haversine_m(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+        segment_start = np.concatenate([[0.0], np.cumsum(segment_length)[:-1]])
+        distance = segment_start[segments] + t * segment_length[segments]
+        first = np.full(len(self.entries), np.inf)
+        np.minimum.at(first, alert_ids, distance)
+        found = np.flatnonzero(np.isfinite(first))
+        found = found[np.argsort(first[found], kind='stable')]
+        return [(self.entries[i], float(first[i])) for i in found]
+
+    def segment_hits(self, lats1, lngs1, lats2, lngs2):
+        """
+        Every (segment, alert) pair where a segment enters an alert area.
+        Returns arrays (segment indexes, entry indexes, t) with t (0..1)
+        the position along the segment where it first enters.
+
+        All segments are tested against all alerts in one batch: segment
+        and alert bounding boxes are compared first, then exact
+        segment-circle and segment-polygon tests run on the surviving pairs
+        in a local planar frame.
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+        lats1 = np.asarray(lats1, dtype=np.float64)
+        lngs1 = np.asarray(lngs1, dtype=np.float64)
+        lats2 = np.asarray(lats2, dtype=np.float64)
+        lngs2 = np.asarray(lngs2, dtype=np.float64)
+        if not len(lats1) or not self.levels:
+            return empty
+
+        segment_boxes = np.column_stack([
+            np.minimum(lats1, lats2), np.maximum(lats1, lats2),
+            np.minimum(lngs1, lngs2), np.maximum(lngs1, lngs2),
+        ])
+
+        # Alerts overlapping all the segments together, then (segment, alert) pairs
+        outer = np.array([
+            segment_boxes[:, 0].min(), segment_boxes[:, 1].max(),
+            segment_boxes[:, 2].min(), segment_boxes[:, 3].max(),
+        ])
+        boxes = self.levels[0]
+        alerts = np.flatnonzero(
+            (boxes[:, 0] <= outer[1]) & (boxes[:, 1] >= outer[0])
+            & (boxes[:, 2] <= outer[3]) & (boxes[:, 3] >= outer[2])
+        )
+        if not len(alerts):
+            return empty
+        seg = segment_boxes[:, None, :]
+        box = boxes[alerts][None, :, :]
+        overlap = (
+            (seg[..., 0] <= box[..., 1]) & (seg[..., 1] >= box[..., 0])
+            & (seg[..., 2] <= box[..., 3]) & (seg[..., 3] >= box[..., 2])
+        )
+        segments, positions = np.nonzero(overlap)
+        if not len(segments):
+            return empty
+        alert_ids = alerts[positions]
+
+        lat0, lng0 = float(outer[:2].mean()), float(outer[2:].mean())
+        ax, ay = to_local_xy(lats1[segments], lngs1[segments], lat0, lng0)
+        bx, by = to_local_xy(lats2[segments], lngs2[segments], lat0, lng0)
+
+        t = np.full(len(segments), np.inf)
+        circles = np.flatnonzero(self.is_circle[alert_ids])
+        if len(circles):
+            ids = alert_ids[circles]
+            cx, cy = to_local_xy(self.circle_lat[ids], self.circle_lng[ids], lat0, lng0)
+            t[circles] = segment_circle_entry(
+                ax[circles], ay[circles], bx[circles], by[circles], cx, cy, self.circle_radius[ids]
+            )
+        polygons = np.flatnonzero(~self.is_circle[alert_ids])
+        if len(polygons):
+            t[polygons] = self._polygon_entry(
+                alert_ids[polygons], ax[polygons], ay[polygons], bx[polygons], by[polygons], lat0, lng0
+            )
+
+        hit = np.isfinite(t)
+        return segments[hit], alert_ids[hit], t[hit]
+
+    def _polygon_entry(self, polygons, ax, ay, bx, by, lat0, lng0):
+        """
+        Position t along each segment AB where it first enters the paired
+        polygon: 0 if A is inside, else the nearest edge crossing, else inf.
+        """
+        edge_ids, owners = self._polygon_edges(polygons)
+        lat1, lng1, lat2, lng2 = self.edges[edge_ids].T
+        x1, y1 = to_local_xy(lat1, lng1, lat0, lng0)
+        x2, y2 = to_local_xy(lat2, lng2, lat0, lng0)
+        pax, pay = ax[owners], ay[owners]
+
+        # Is A inside? (even-odd ray cast towards +x)
+        straddles = (y1 > pay) != (y2 > pay)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_x = x1 + (pay - y1) * (x2 - x1) / (y2 - y1)
+        starts = np.cumsum(self.edge_counts[polygons]) - self.edge_counts[polygons]
+        inside = (np.add.reduceat((straddles & (pax < crossing_x)).astype(np.int64), starts) % 2) == 1
+
+        _, t = segments_intersect(pax, pay, bx[owners], by[owners], x1, y1, x2, y2)
+        entry = np.minimum.reduceat(t, starts)
+        return np.where(inside, 0.0, entry)
+
+
+class ActiveAlertIndex:
+    """
+    Process-wide holder of the AlertGeometryIndex for the current snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+
+    def get(self):
+        """Return an index matching the current alert snapshot."""
+        snapshot = active_alert_snapshot.get()
+        index = self._index
+        if index is not None and index.snapshot is snapshot:
+            return index
+
+        with self._lock:
+            if self._index is None or self._index.snapshot is not snapshot:
+                start = time.perf_counter()
+                point_radius = getattr(settings, 'ALERT_POINT_RADIUS_M', 25.0)
+                self._index = AlertGeometryIndex(snapshot, point_radius_m=point_radius)
+                logger.info(
+                    f"Alert geometry index built: {len(self._index.entries)} zones in "
+                    f"{(time.perf_counter() - start) * 1000:.1f} ms"
+                )
+            return self._index
+
+    def alerts_at(self, lat, lng):
+        """Active alert snapshot entries whose area contains (lat, lng)."""
+        return self.get().containing(lat, lng)
+
+    def alerts_on_route(self, points):
+        """(entry, entry distance in meters) for each active alert a route crosses."""
+        if not points:
+            return []
+        lats, lngs = zip(*points)
+        return self.get().route_hits(lats, lngs)
+
+
+# Shared per-process index used by the views
+active_alert_index = ActiveAlertIndex()
@@ -0,0 +1,245 @@
+"""
+Pre-serialized snapshot of the currently active safety alerts.
+
+Every open map polls /api/alerts/. Instead of loading, date-filtering,
+polygon-parsing and serializing every active alert on each poll, the
+snapshot keeps each active alert as a ready-made JSON fragment. A poll only
+filters fragments by type and severity, narrows them to the ids the bbox
+index returns for the viewport, and joins them.
+
+The snapshot is rebuilt when:
+- a SafetyAlert is saved or deleted in this process (signals.py),
+- the next start_date/end_date boundary passes, or
+- another process changed alerts (checked with a cheap aggregate query at
+  most every ALERT_SNAPSHOT_CHECK_INTERVAL seconds).
+
+Every alert in the snapshot has coordinates (see geocoding.py), so the map
+never geocodes addresses itself.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_alert(alert):
+    """Public JSON representation of an alert, as returned by /api/alerts/."""
+    alert_data = {
+        'id': alert.id,
+        'title': alert.title,
+        'description': alert.description,
+        'alert_type': alert.alert_type,
+        'severity': alert.severity,
+        'location_type': alert.location_type,
+        'is_active': alert.is_active,
+        'created_at': alert.created_at.isoformat(),
+        'updated_at': alert.updated_at.isoformat(),
+        'icon_url': alert.get_icon_url(),
+        'color': alert.get_color(),
+    }
+
+    # Add address if available
+    if alert.address:
+        alert_data['address'] = alert.address
+
+    # Add coordinates if available (for backwards compatibility)
+    if alert.latitude is not None and alert.longitude is not None:
+        alert_data['latitude'] = float(alert.latitude)
+        alert_data['longitude'] = float(alert.longitude)
+
+    # Add location-specific data
+    if alert.location_type == 'circle' and alert.radius:
+        alert_data['radius'] = float(alert.radius)
+
+    if alert.location_type == 'polygon':
+        polygon_coords = alert.get_polygon_coordinates()
+        if polygon_coords:
+            alert_data['polygon_coordinates'] = polygon_coords
+
+    # Add date information
+    if alert.start_date:
+        alert_data['start_date'] = alert.start_date.isoformat()
+    if alert.end_date:
+        alert_data['end_date'] = alert.end_date.isoformat()
+
+    return alert_data
+
+
+class SnapshotEntry:
+    """One active alert: the fields used for filtering plus its JSON fragment."""
+    __slots__ = ('id', 'alert_type', 'severity', 'latitude', 'longitude', 'bbox', 'data', 'json')
+
+    def __init__(self, alert):
+        self.id = alert.id
+        self.alert_type = alert.alert_type
+        self.severity = alert.severity
+        self.latitude = float(alert.latitude) if alert.latitude is not None else None
+        self.longitude = float(alert.longitude) if alert.longitude is not None else None
+        if alert.bbox_min_lat is None:
+            alert.update_bounds()
+        # (min_lat, max_lat, min_lng, max_lng) of the alert area, or None
+        self.bbox = (
+            (float(alert.bbox_min_lat), float(alert.bbox_max_lat),
+             float(alert.bbox_min_lng), float(alert.bbox_max_lng))
+            if alert.bbox_min_lat is not None else None
+        )
+        self.data = serialize_alert(alert)
+        self.json = json.dumps(self.data)
+
+
+class Snapshot:
+    """Immutable set of active alerts built at one point in time."""
+
+    def __init__(self, entries, expires_at, fingerprint):
+        self.entries = entries
+        self.expires_at = expires_at  # next start/end boundary, or None
+        self.fingerprint = fingerprint
+        self.body = render_body(entries)  # full unfiltered response
+        self.built_at = timezone.now()
+
+
+def render_body(entries):
+    """Assemble the /api/alerts/ JSON body from pre-serialized fragments."""
+    return (
+        '{"success": true, "count": %d, "alerts": [%s]}'
+        % (len(entries), ', '.join(entry.json for entry in entries))
+    ).encode()
+
+
+class ActiveAlertSnapshot:
+    """
+    Process-wide holder of the current alert Snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._listeners = []
+        # Unlocated alert ids already handed to the geocoder
+        self._geocode_queued = set()
+
+    def add_listener(self, callback):
+        """Call callback() whenever the snapshot is invalidated."""
+        self._listeners.append(callback)
+
+    def invalidate(self):
+        """Force a rebuild on the next request."""
+        self._snapshot = None
+        for callback in self._listeners:
+            callback()
+
+    def get(self):
+        """Return an up-to-date Snapshot, rebuilding it if needed."""
+        snapshot = self._snapshot
+        if snapshot is not None and not self._is_stale(snapshot):
+            return snapshot
+
+        new_unlocated = []
+        with self._lock:
+            # Another thread may have rebuilt it while we waited
+            if self._snapshot is snapshot or self._snapshot is None:
+                unlocated = []
+                self._snapshot = self._build(unlocated)
+                new_unlocated = [alert_id for alert_id in unlocated if alert_id not in self._geocode_queued]
+                self._geocode_queued = set(unlocated)
+            snapshot = self._snapshot
+
+        # Alerts without coordinates (rows saved before server-side
+        # geocoding, or still waiting on the background geocoder) are left
+        # off the map until located; saving their coordinates rebuilds the
+        # snapshot. Each is queued once, not on every rebuild.
+        if new_unlocated:
+            from .geocoding import background_geocoder
+            for alert_id in new_unlocated:
+                transaction.on_commit(lambda alert_id=alert_id: background_geocoder.enqueue('SafetyAlert', alert_id))
+        return snapshot
+
+    def filtered_body(self, alert_type=None, severity=None, bounds=None):
+        """
+        Response body for /api/alerts/ with optional filters.
+        bounds is a (north, south, east, west) tuple; alerts whose area
+        (circle, polygon or point) overlaps it are included.
+        """
+        snapshot = self.get()
+        if not alert_type and not severity and not bounds:
+            return snapshot.body
+
+        entries = snapshot.entries
+        if alert_type:
+            entries = [e for e in entries if e.alert_type == alert_type]
+        if severity:
+            entries = [e for e in entries if e.severity == severity]
+        if bounds:
+            from .models import SafetyAlert
+
+            # The bbox columns are indexed; the snapshot still decides which
+            # alerts are active and supplies their JSON
+            inside = set(SafetyAlert.objects.in_bounds(*bounds).values_list('id', flat=True))
+            entries = [e for e in entries if e.id in inside]
+        return render_body(entries)
+
+    def _is_stale(self, snapshot):
+        if snapshot.expires_at is not None and timezone.now() >= snapshot.expires_at:
+            return True
+
+        # Other processes' saves don't reach our signal handlers; compare a
+        # cheap fingerprint of the table every few seconds.
+        interval = getattr(settings, 'ALERT_SNAPSHOT_CHECK_INTERVAL', 5.0)
+        now = time.monotonic()
+        if now - self._checked_at < interval:
+            return False
+        self._checked_at = now
+        return self._fingerprint() != snapshot.fingerprint
+
+    def _fingerprint(self):
+        from .models import SafetyAlert
+
+        stats = SafetyAlert.objects.aggregate(count=Count('id'), last_update=Max('updated_at'))
+        return (stats['count'], stats['last_update'])
+
+    def _build(self, unlocated):
+        from .models import SafetyAlert
+
+        start = time.perf_counter()
+        fingerprint = self._fingerprint()
+        self._checked_at = time.monotonic()
+        now = timezone.now()
+
+        entries = []
+        expires_at = None
+        for alert in SafetyAlert.objects.filter(is_active=True):
+            if alert.is_currently_active():
+                if alert.latitude is not None and alert.longitude is not None:
+                    entries.append(SnapshotEntry(alert))
+                elif alert.address:
+                    unlocated.append(alert.id)
+                boundary = alert.end_date
+            else:
+                # Scheduled alerts become active at start_date
+                boundary = alert.start_date if alert.start_date and alert.start_date > now else None
+
+            if boundary is not None and boundary <= now:
+                # end_date is exactly now; it is expired a moment later
+                boundary = now + timedelta(seconds=1)
+            if boundary is not None and (expires_at is None or boundary < expires_at):
+                expires_at = boundary
+
+        snapshot = Snapshot(entries, expires_at, fingerprint)
+        logger.info(
+            f"Alert snapshot rebuilt: {len(entries)} active alerts in "
+            f"{(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return snapshot
+
+
+# Shared per-process snapshot used by the views
+active_alert_snapshot = ActiveAlertSnapshot()
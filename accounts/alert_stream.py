@@ -0,0 +1,189 @@
+"""
+Live safety alert updates over Server-Sent Events.
+
+A single broadcaster per process watches the active alert snapshot (see
+alert_snapshot.py) and turns each change into alert_created, alert_updated
+and alert_expired events. Every connected client gets the same event from
+an in-memory queue, so a change costs one snapshot rebuild no matter how
+many maps are open.
+
+Streaming needs an ASGI server (saferoute/asgi.py), e.g.
+``uvicorn saferoute.asgi:application``.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import uuid
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .alert_snapshot import active_alert_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event_id, event, data):
+    """Encode one SSE message."""
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+
+class Subscriber:
+    """One connected client."""
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class AlertBroadcaster:
+    """
+    Fans alert changes out to all connected SSE clients of this process.
+
+    Event ids are "<boot id>-<sequence>". A reconnecting client that sends a
+    Last-Event-ID still in the recent history gets only the events it
+    missed; anyone else starts with a full snapshot event.
+    """
+
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._sequence = itertools.count(1)
+        self._subscribers = set()
+        self._history = deque(maxlen=getattr(settings, 'ALERT_STREAM_HISTORY', 500))
+        self._last_entries = None  # alert id -> JSON fragment last broadcast
+        self._last_snapshot = None
+        self._loop = None
+        self._wake = None
+        self._watcher = None
+        active_alert_snapshot.add_listener(self._notify)
+
+    @property
+    def connection_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Register a client; returns None if the connection cap is reached."""
+        max_connections = getattr(settings, 'ALERT_STREAM_MAX_CONNECTIONS', 1000)
+        if len(self._subscribers) >= max_connections:
+            return None
+
+        subscriber = Subscriber(getattr(settings, 'ALERT_STREAM_QUEUE_SIZE', 100))
+        self._subscribers.add(subscriber)
+        self._ensure_watcher()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    async def stream(self, subscriber, last_event_id=None):
+        """Async iterator of SSE messages for one client."""
+        heartbeat = getattr(settings, 'ALERT_STREAM_HEARTBEAT', 15)
+        try:
+            yield f'retry: {getattr(settings, "ALERT_STREAM_RETRY_MS", 5000)}\n\n'
+
+            backlog = self._replay_after(last_event_id)
+            if backlog is None:
+                snapshot = await sync_to_async(active_alert_snapshot.get)()
+                self._publish_changes(snapshot)
+                yield self._snapshot_event(snapshot)
+            else:
+                for message in backlog:
+                    yield message
+
+            while not subscriber.overflowed:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _snapshot_event(self, snapshot):
+        """Full list of active alerts, tagged with the latest event id."""
+        data = '{"alerts": [%s]}' % ', '.join(entry.json for entry in snapshot.entries)
+        last_id = self._history[-1][0] if self._history else f'{self.boot_id}-0'
+        return format_event(last_id, 'snapshot', data)
+
+    def _replay_after(self, last_event_id):
+        """Messages after last_event_id, or None if it cannot be resumed."""
+        if not last_event_id or not self._history:
+            return None
+        ids = [event_id for event_id, _ in self._history]
+        if last_event_id == f'{self.boot_id}-0' and ids[0] == f'{self.boot_id}-1':
+            return [message for _, message in self._history]
+        if last_event_id not in ids:
+            return None
+        position = ids.index(last_event_id)
+        return [message for _, message in list(self._history)[position + 1:]]
+
+    def _notify(self):
+        """Snapshot invalidated (possibly from a sync thread): wake the watcher."""
+        if self._loop is not None and self._wake is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+
+    def _ensure_watcher(self):
+        loop = asyncio.get_running_loop()
+        if self._watcher is not None and not self._watcher.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._watcher = loop.create_task(self._watch())
+
+    async def _watch(self):
+        """Poll the (cheap, cached) snapshot while anyone is connected."""
+        interval = getattr(settings, 'ALERT_STREAM_POLL_INTERVAL', 2.0)
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                snapshot = await sync_to_async(active_alert_snapshot.get)()
+                self._publish_changes(snapshot)
+            except Exception as e:
+                logger.error(f"Alert stream update failed: {str(e)}")
+        self._watcher = None
+
+    def _publish_changes(self, snapshot):
+        """Broadcast the difference between the last snapshot and this one."""
+        if snapshot is self._last_snapshot:
+            return
+        entries = {entry.id: entry.json for entry in snapshot.entries}
+        previous = self._last_entries
+        self._last_snapshot = snapshot
+        self._last_entries = entries
+        if previous is None:
+            return
+
+        for alert_id, data in entries.items():
+            if alert_id not in previous:
+                self._broadcast('alert_created', data)
+            elif previous[alert_id] != data:
+                self._broadcast('alert_updated', data)
+        for alert_id in previous:
+            if alert_id not in entries:
+                self._broadcast('alert_expired', json.dumps({'id': alert_id}))
+
+    def _broadcast(self, event, data):
+        event_id = f'{self.boot_id}-{next(self._sequence)}'
+        message = format_event(event_id, event, data)
+        self._history.append((event_id, message))
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client: end its stream; it reconnects with Last-Event-ID
+                subscriber.overflowed = True
+
+
+# Shared per-process broadcaster used by the stream view
+alert_broadcaster = AlertBroadcaster()
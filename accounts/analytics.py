@@ -0,0 +1,188 @@
+"""
+Buffered analytics event sink.
+
+Request handlers record BuildingView, AlertInteraction and PageView events
+into a bounded in-process queue instead of running one INSERT each. A
+background thread drains the queue and writes the events with bulk_create
+once a batch fills up or the flush interval passes. Events that arrive while
+the queue is full are dropped and counted, so tracking can never slow down
+or break a request.
+
+Each row's timestamp is taken when the event is recorded, not when it is
+written, so counts per minute stay right however far the writer lags.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsBuffer:
+    """
+    Bounded write-behind queue for analytics rows.
+    """
+
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=2.0):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+        self._stats = {
+            'recorded': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'flushes': 0,
+        }
+
+    def record(self, model, **fields):
+        """
+        Queue one row of `model` for writing, stamped with the current time
+        as its timestamp. Never raises and never blocks; returns False if the
+        event was dropped because the queue is full.
+        """
+        fields.setdefault('timestamp', timezone.now())
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((model, fields))
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return False
+        with self._lock:
+            self._stats['recorded'] += 1
+        return True
+
+    def flush(self):
+        """Write everything currently queued. Returns the number of rows written."""
+        written = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the worker thread and flush whatever is still queued."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        """Counters plus the current queue depth."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker process: the parent's thread did not survive
+                self._reset()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='analytics-writer',
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                # The worker owns its own DB connection; don't keep it open
+                # between flushes
+                close_old_connections()
+                try:
+                    self._write(batch)
+                finally:
+                    close_old_connections()
+
+    def _collect(self):
+        """Block until a full batch is queued or the flush interval passes."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """bulk_create the batch, one INSERT statement per model."""
+        by_model = {}
+        for model, fields in batch:
+            by_model.setdefault(model, []).append(model(**fields))
+
+        written = 0
+        for model, rows in by_model.items():
+            try:
+                model.objects.bulk_create(rows, batch_size=self.batch_size)
+                written += len(rows)
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows)} {model.__name__} analytics rows: {str(e)}")
+                with self._lock:
+                    self._stats['failed'] += len(rows)
+
+        with self._lock:
+            self._stats['written'] += written
+            self._stats['flushes'] += 1
+        return written
+
+
+analytics_buffer = AnalyticsBuffer(
+    max_size=getattr(settings, 'ANALYTICS_BUFFER_SIZE', 10000),
+    batch_size=getattr(settings, 'ANALYTICS_FLUSH_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'ANALYTICS_FLUSH_INTERVAL', 2.0),
+)
+
+# Write out buffered events when the process exits
+atexit.register(analytics_buffer.shutdown)
+
+
+def record_event(model, **fields):
+    """
+    Record an analytics row. Buffered unless ANALYTICS_BUFFERED is False,
+    in which case the row is written immediately (e.g. for tests).
+    """
+    if not getattr(settings, 'ANALYTICS_BUFFERED', True):
+        try:
+            model.objects.create(**fields)
+            return True
+        except Exception:
+            return False
+    return analytics_buffer.record(model, **fields)
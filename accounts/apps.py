@@ -12,9 +12,17 @@ class AccountsConfig(AppConfig):
         """
         Run when Django starts up
         """
+        # Connect signal handlers that keep in-memory indexes in sync
+        from . import signals  # noqa: F401
+
         # Only start scheduler in runserver, not in migrate, shell, etc.
+        # (production runs python manage.py run_scheduler as its own process).
+        # With the autoreloader, only in the child process that serves requests.
+        import os
         import sys
-        if 'runserver' in sys.argv:
+        from django.conf import settings
+        if ('runserver' in sys.argv and getattr(settings, 'SCHEDULER_IN_RUNSERVER', True)
+                and (os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv)):
             try:
                 # Import scheduler here to avoid AppRegistryNotReady error
                 from .scheduler import start_scheduler
@@ -0,0 +1,249 @@
+"""
+Next-hour occupancy forecasts.
+
+A building's forecast is its hour-of-week baseline for the coming hour
+(the mean from OccupancyHourStats) plus its current deviation from the
+baseline, damped by a per-building factor phi:
+
+    forecast = baseline[next hour] + phi * (reading now - baseline[this hour])
+
+phi is the least-squares fit of each deviation to the deviation one hour
+earlier, over the last OCCUPANCY_FORECAST_FIT_DAYS of samples. A building
+running busier than usual therefore stays busier for a while. Confidence
+is the share of the model's own one-hour-ahead forecasts over that window
+that landed within OCCUPANCY_FORECAST_TOLERANCE points. It is shrunk
+towards 0 for buildings with little history.
+
+All buildings are fitted together on (buildings x 10-minute slots)
+arrays; nothing loops over buildings in Python. The hourly rollup refits
+and saves the parameters to OCCUPANCY_FORECAST_PATH. Each Waitz ingest
+then turns its readings into forecasts stored on Building.
+"""
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .occupancy import campus_time, hour_of_week, next_hour_text
+
+logger = logging.getLogger(__name__)
+
+SLOT_MINUTES = 10
+SLOTS_PER_HOUR = 60 // SLOT_MINUTES
+HOURS_PER_WEEK = 7 * 24
+
+# Pseudo-forecasts added to the confidence denominator, so a building with
+# a handful of lucky forecasts doesn't get a confidence near 1
+CONFIDENCE_PRIOR = 20
+
+
+def fill_baseline(baseline):
+    """
+    Fill hours with no data (nan) with the building's mean over its other
+    hours, or 50 for buildings with no data at all.
+    """
+    known = ~np.isnan(baseline)
+    counts = known.sum(axis=1)
+    overall = np.where(known, baseline, 0).sum(axis=1) / np.maximum(counts, 1)
+    overall[counts == 0] = 50.0
+    return np.where(known, baseline, overall[:, None]).astype(np.float32)
+
+
+def seasonal_baseline(values, hours):
+    """
+    Mean per hour of the week of values (buildings x slots, nan where
+    missing), with hours giving each slot's hour of the week.
+    """
+    present = ~np.isnan(values)
+    onehot = np.zeros((len(hours), HOURS_PER_WEEK), dtype=np.float32)
+    onehot[np.arange(len(hours)), hours] = 1.0
+    sums = np.where(present, values, 0).astype(np.float32) @ onehot
+    counts = present.astype(np.float32) @ onehot
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return fill_baseline(sums / counts)
+
+
+def fit_phi(values, baseline, hours, lag=SLOTS_PER_HOUR):
+    """Per-building damping of deviations from the baseline over lag slots, in [0, 1]."""
+    deviation = values - baseline[:, hours]
+    before = deviation[:, :-lag]
+    after = deviation[:, lag:]
+    both = ~np.isnan(before) & ~np.isnan(after)
+    covariance = np.where(both, before * after, 0).sum(axis=1)
+    variance = np.where(both, before * before, 0).sum(axis=1)
+    phi = np.divide(covariance, variance, out=np.zeros_like(covariance), where=variance > 0)
+    return np.clip(phi, 0.0, 1.0).astype(np.float32)
+
+
+def forecast(baseline, phi, current, hour_now, hour_next):
+    """Forecast percent for each building from its current reading."""
+    return np.clip(baseline[:, hour_next] + phi * (current - baseline[:, hour_now]), 0.0, 100.0)
+
+
+def forecast_errors(values, baseline, phi, hours, lag=SLOTS_PER_HOUR):
+    """Absolute errors of every lag-ahead forecast over values (nan where unknown)."""
+    predicted = np.clip(
+        baseline[:, hours[lag:]] + phi[:, None] * (values[:, :-lag] - baseline[:, hours[:-lag]]), 0.0, 100.0,
+    )
+    return np.abs(predicted - values[:, lag:])
+
+
+def forecast_confidence(errors, tolerance):
+    """Share of forecasts within tolerance, shrunk by CONFIDENCE_PRIOR."""
+    valid = ~np.isnan(errors)
+    hits = (np.where(valid, errors, np.inf) <= tolerance).sum(axis=1)
+    return (hits / (valid.sum(axis=1) + CONFIDENCE_PRIOR)).astype(np.float32)
+
+
+def slot_hours(start, slots):
+    """Hour of the week (campus time) of each 10-minute slot from start."""
+    hours = [hour_of_week(start + timedelta(hours=i)) for i in range(-(-slots // SLOTS_PER_HOUR))]
+    return np.repeat(np.array(hours, dtype=np.int64), SLOTS_PER_HOUR)[:slots]
+
+
+def sample_matrix(building_ids, start, slots):
+    """
+    Samples from start on as a (buildings x slots) float32 array, nan
+    where a building has no sample in a slot. building_ids must be sorted.
+    """
+    from .models import OccupancySample
+
+    end = start + timedelta(minutes=SLOT_MINUTES * slots)
+    rows = OccupancySample.objects.filter(
+        recorded_at__gte=start, recorded_at__lt=end, building_id__in=building_ids.tolist(),
+    ).order_by().values_list('building_id', 'percent', 'recorded_at')
+    ids, percents, seconds = [], [], []
+    for building_id, percent, recorded_at in rows.iterator(chunk_size=10000):
+        ids.append(building_id)
+        percents.append(percent)
+        seconds.append((recorded_at - start).total_seconds())
+
+    values = np.full((len(building_ids), slots), np.nan, dtype=np.float32)
+    if ids:
+        row = np.searchsorted(building_ids, np.array(ids))
+        slot = np.minimum((np.array(seconds) // (SLOT_MINUTES * 60)).astype(np.int64), slots - 1)
+        values[row, slot] = np.array(percents, dtype=np.float32)
+    return values
+
+
+def stats_baseline(building_ids, min_samples):
+    """(buildings x 168) mean percent from OccupancyHourStats."""
+    from .models import OccupancyHourStats
+
+    rows = np.array(list(OccupancyHourStats.objects.filter(
+        building_id__in=building_ids.tolist(), sample_count__gte=min_samples,
+    ).order_by().values_list('building_id', 'hour_of_week', 'mean_percent')), dtype=np.float64).reshape(-1, 3)
+    baseline = np.full((len(building_ids), HOURS_PER_WEEK), np.nan)
+    if len(rows):
+        baseline[np.searchsorted(building_ids, rows[:, 0].astype(np.int64)), rows[:, 1].astype(np.int64)] = rows[:, 2]
+    return fill_baseline(baseline)
+
+
+def fit_model(now=None, path=None):
+    """
+    Fit every building with occupancy history and save the model to
+    OCCUPANCY_FORECAST_PATH. Returns the number of buildings fitted.
+    """
+    from .models import OccupancyHourStats
+
+    now = now or timezone.now()
+    path = Path(path or settings.OCCUPANCY_FORECAST_PATH)
+    min_samples = getattr(settings, 'OCCUPANCY_MIN_SAMPLES', 3)
+    days = getattr(settings, 'OCCUPANCY_FORECAST_FIT_DAYS', 7)
+
+    building_ids = np.array(sorted(set(
+        OccupancyHourStats.objects.values_list('building_id', flat=True).distinct()
+    )), dtype=np.int64)
+    if not len(building_ids):
+        return 0
+
+    baseline = stats_baseline(building_ids, min_samples)
+    start = now.replace(minute=0, second=0, microsecond=0) - timedelta(days=days)
+    slots = days * 24 * SLOTS_PER_HOUR
+    values = sample_matrix(building_ids, start, slots)
+    hours = slot_hours(start, slots)
+    phi = fit_phi(values, baseline, hours)
+    confidence = forecast_confidence(
+        forecast_errors(values, baseline, phi, hours), getattr(settings, 'OCCUPANCY_FORECAST_TOLERANCE', 10),
+    )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + '.tmp.npz')
+    np.savez(temporary, building_ids=building_ids, baseline=baseline, phi=phi, confidence=confidence)
+    os.replace(temporary, path)
+    return len(building_ids)
+
+
+def load_model(path=None):
+    """The saved model as a dict of arrays, or None if it hasn't been fitted."""
+    path = path or getattr(settings, 'OCCUPANCY_FORECAST_PATH', None)
+    if not path:
+        return None
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    except (OSError, ValueError, KeyError) as e:
+        logger.info(f"Occupancy forecast model unavailable ({path}): {str(e)}")
+        return None
+
+
+def update_forecasts(readings, now=None, model=None):
+    """
+    Turn readings given as (building id, percent) into next-hour forecasts
+    on Building, writing only rows whose forecast changed. forecast_for is
+    the start of the campus hour forecast, so a steady forecast is still rewritten
+    once an hour and never points at an hour that has passed. Returns the
+    number of buildings updated.
+    """
+    from .models import Building
+
+    model = model if model is not None else load_model()
+    if model is None:
+        return 0
+    now = now or timezone.now()
+    building_ids = model['building_ids']
+
+    readings = [(building_id, percent) for building_id, percent in readings if percent is not None]
+    if not readings or not len(building_ids):
+        return 0
+    ids = np.array([building_id for building_id, _ in readings], dtype=np.int64)
+    current = np.array([percent for _, percent in readings], dtype=np.float32)
+    rows = np.minimum(np.searchsorted(building_ids, ids), len(building_ids) - 1)
+    known = building_ids[rows] == ids
+    ids, current, rows = ids[known], current[known], rows[known]
+
+    target = now + timedelta(hours=1)
+    predicted = forecast(
+        model['baseline'][rows], model['phi'][rows], current, hour_of_week(now), hour_of_week(target),
+    )
+    confidence = model['confidence'][rows]
+
+    forecast_for = campus_time(target).replace(minute=0, second=0, microsecond=0)
+    new = {
+        building_id: (int(round(float(percent))), round(float(score), 2), forecast_for)
+        for building_id, percent, score in zip(ids.tolist(), predicted, confidence)
+    }
+    # Rows sharing a forecast share an UPDATE (see fetch_waitz_occupancy.write_occupancy)
+    groups = {}
+    for building_id, *stored in Building.objects.filter(id__in=list(new)).values_list(
+        'id', 'forecast_percent', 'forecast_confidence', 'forecast_for',
+    ):
+        if tuple(stored) != new[building_id]:
+            groups.setdefault(new[building_id], []).append(building_id)
+
+    updated = 0
+    with transaction.atomic():
+        for (percent, score, forecast_for), group in groups.items():
+            for i in range(0, len(group), 500):
+                updated += Building.objects.filter(id__in=group[i:i + 500]).update(
+                    forecast_percent=percent,
+                    forecast_confidence=score,
+                    forecast_for=forecast_for,
+                    next_hour_prediction=next_hour_text(percent),
+                )
+    return updated
@@ -0,0 +1,146 @@
+"""
+Geographic helpers shared by the spatial indexes and routing code.
+All distances are in meters and all coordinates in decimal degrees.
+"""
+import math
+
+import numpy as np
+
+# Mean Earth radius in meters
+EARTH_RADIUS_M = 6371008.8
+
+# Meters per degree of latitude on the same sphere haversine_m uses, so
+# planar tests and bounding boxes agree with great-circle distances
+METERS_PER_DEGREE_LAT = EARTH_RADIUS_M * math.pi / 180.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance in meters.
+    Accepts scalars or NumPy arrays (broadcast against each other).
+    """
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlng = np.radians(np.asarray(lng2) - np.asarray(lng1))
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def meters_per_degree_lng(lat):
+    """Meters per degree of longitude at the given latitude."""
+    return METERS_PER_DEGREE_LAT * np.cos(np.radians(lat))
+
+
+def alert_bounds(location_type, latitude, longitude, radius=None, polygon=None):
+    """
+    Bounding box (min_lat, max_lat, min_lng, max_lng) of an alert's area,
+    or None if it has no usable geometry. Circles are expanded by their
+    radius; polygons use their vertices (a list of [lat, lng] pairs).
+    """
+    if location_type == 'polygon' and polygon:
+        try:
+            lats = [float(point[0]) for point in polygon]
+            lngs = [float(point[1]) for point in polygon]
+        except (TypeError, ValueError, IndexError):
+            lats = lngs = []
+        if lats:
+            return min(lats), max(lats), min(lngs), max(lngs)
+
+    if latitude is None or longitude is None:
+        return None
+    lat = float(latitude)
+    lng = float(longitude)
+    if location_type == 'circle' and radius:
+        dlat = float(radius) / METERS_PER_DEGREE_LAT
+        dlng = float(radius) / max(float(meters_per_degree_lng(lat)), 1e-9)
+        return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+    return lat, lat, lng, lng
+
+
+def round_bounds(bounds, places=6):
+    """Round a bounding box outwards to `places` decimals (for DecimalFields)."""
+    scale = 10 ** places
+    min_lat, max_lat, min_lng, max_lng = bounds
+    return (
+        math.floor(min_lat * scale) / scale,
+        math.ceil(max_lat * scale) / scale,
+        math.floor(min_lng * scale) / scale,
+        math.ceil(max_lng * scale) / scale,
+    )
+
+
+def to_local_xy(lat, lng, lat0, lng0):
+    """
+    Project coordinates to a local east/north plane in meters around
+    (lat0, lng0). Accurate to well under a meter across a campus.
+    """
+    x = (np.asarray(lng, dtype=np.float64) - lng0) * meters_per_degree_lng(lat0)
+    y = (np.asarray(lat, dtype=np.float64) - lat0) * METERS_PER_DEGREE_LAT
+    return x, y
+
+
+def point_segment_distance(px, py, ax, ay, bx, by):
+    """
+    Distance from points P to segments AB in the plane, and the position t
+    (0..1) of the closest point along each segment. Arguments broadcast.
+    """
+    dx = bx - ax
+    dy = by - ay
+    length_sq = dx * dx + dy * dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = ((px - ax) * dx + (py - ay) * dy) / length_sq
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    return np.hypot(ax + t * dx - px, ay + t * dy - py), t
+
+
+def points_in_polygon(px, py, vx, vy):
+    """
+    Even-odd test of points (px, py) against one polygon with vertices
+    (vx, vy). Returns a boolean array shaped like px.
+    """
+    px = np.asarray(px, dtype=np.float64)[..., None]
+    py = np.asarray(py, dtype=np.float64)[..., None]
+    x1, y1 = vx, vy
+    x2, y2 = np.roll(vx, -1), np.roll(vy, -1)
+    straddles = (y1 > py) != (y2 > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+    crosses = straddles & (px < crossing_x)
+    return (np.count_nonzero(crosses, axis=-1) % 2) == 1
+
+
+def segments_intersect(ax, ay, bx, by, cx, cy, dx, dy):
+    """
+    Whether segments AB and CD intersect (touching counts), and the
+    position t (0..1) of the intersection along AB (inf where they don't).
+    Arguments broadcast, so (N, 1) against (1, M) tests all pairs.
+    """
+    rx, ry = bx - ax, by - ay
+    sx, sy = dx - cx, dy - cy
+    denominator = rx * sy - ry * sx
+    qx, qy = cx - ax, cy - ay
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (qx * sy - qy * sx) / denominator
+        u = (qx * ry - qy * rx) / denominator
+    hit = (denominator != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    return hit, np.where(hit, t, np.inf)
+
+
+def segment_circle_entry(ax, ay, bx, by, cx, cy, radius):
+    """
+    Position t (0..1) along segments AB where each first enters its circle
+    (center C, radius in meters); 0 if A is already inside, inf if the
+    segment misses. Arguments broadcast.
+    """
+    dx, dy = bx - ax, by - ay
+    fx, fy = ax - cx, ay - cy
+    a = dx * dx + dy * dy
+    b = 2.0 * (fx * dx + fy * dy)
+    c = fx * fx + fy * fy - radius * radius
+    discriminant = b * b - 4.0 * a * c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (-b - np.sqrt(discriminant)) / (2.0 * a)
+    starts_inside = c <= 0
+    hit = starts_inside | ((discriminant >= 0) & (a > 0) & (t >= 0) & (t <= 1))
+    return np.where(starts_inside, 0.0, np.where(hit, t, np.inf))
@@ -0,0 +1,307 @@
+"""
+Server-side geocoding with a shared persistent cache.
+
+Addresses are geocoded once, when an alert, safety concern or building is
+saved or imported, instead of in every browser on every map load. Model
+save() never calls the provider: alerts and concerns saved without
+coordinates are queued on background_geocoder once the save is committed,
+and the located coordinates are saved back to the row. Results
+(including "no result" answers) are stored in the GeocodeCache table keyed
+by the normalized address, so the same address is never sent to the
+provider twice. Cache hits are counted in memory and written to the table
+in grouped UPDATEs every GEOCODE_HIT_FLUSH_INTERVAL seconds, so a hit
+costs no write.
+
+The provider is pluggable through settings.GEOCODER_BACKEND, a dotted path
+to a class with a geocode(address) method returning (lat, lng) or None:
+
+- accounts.geocoding.GoogleGeocoder (default) calls the Google Geocoding API.
+- accounts.geocoding.OfflineGeocoder never touches the network; it resolves
+  known building addresses and otherwise returns a stable point on campus.
+  Use it for tests and offline development.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import requests
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .outbound import outbound
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_GEOCODE_URL = 'https://maps.googleapis.com/maps/api/geocode/json'
+
+# Georgia Tech campus, used to bias lookups and by the offline stub
+CAMPUS_CENTER = (33.7756, -84.3963)
+CAMPUS_SPAN_DEG = 0.01
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+
+class GeocodingError(Exception):
+    """The provider could not answer (network error, quota, bad key); not cached."""
+
+
+def normalize_address(address):
+    """Cache key for an address: lowercase, no punctuation, single spaces."""
+    text = _PUNCTUATION_RE.sub(' ', (address or '').lower())
+    return ' '.join(text.split())[:500]
+
+
+class GoogleGeocoder:
+    """Google Geocoding API backend."""
+
+    name = 'google'
+
+    def __init__(self, api_key=None, timeout=10):
+        self.api_key = api_key if api_key is not None else getattr(settings, 'GOOGLE_MAPS_API_KEY', '')
+        self.timeout = timeout
+
+    def geocode(self, address):
+        if not self.api_key:
+            raise GeocodingError('GOOGLE_MAPS_API_KEY is not configured')
+
+        # Ensure address includes Atlanta, GA for better results
+        if 'atlanta' not in address.lower():
+            address = f"{address}, Atlanta, GA"
+
+        try:
+            response = outbound.get(
+                GOOGLE_GEOCODE_URL,
+                params={'address': address, 'key': self.api_key},
+                timeout=self.timeout,
+            )
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise GeocodingError(f'Geocoding request failed: {str(e)}')
+
+        status = data.get('status')
+        if status == 'OK' and data.get('results'):
+            location = data['results'][0]['geometry']['location']
+            return location['lat'], location['lng']
+        if status == 'ZERO_RESULTS':
+            return None
+        raise GeocodingError(f'Geocoding failed ({status}): {data.get("error_message", "")}')
+
+
+class OfflineGeocoder:
+    """
+    Network-free stub. Addresses of known buildings resolve to the building's
+    coordinates; anything else maps to a deterministic point on campus.
+    """
+
+    name = 'offline'
+
+    def geocode(self, address):
+        from .models import Building
+
+        key = normalize_address(address)
+        if not key:
+            return None
+
+        for building_address, lat, lng in Building.objects.values_list('address', 'latitude', 'longitude'):
+            if normalize_address(building_address) == key:
+                return float(lat), float(lng)
+
+        digest = hashlib.sha1(key.encode()).digest()
+        lat_offset = (digest[0] / 255 - 0.5) * CAMPUS_SPAN_DEG
+        lng_offset = (digest[1] / 255 - 0.5) * CAMPUS_SPAN_DEG
+        return round(CAMPUS_CENTER[0] + lat_offset, 6), round(CAMPUS_CENTER[1] + lng_offset, 6)
+
+
+class CacheHitCounter:
+    """
+    Buffers GeocodeCache hit counts and last-used times per process. Hits
+    are written at most every GEOCODE_HIT_FLUSH_INTERVAL seconds (on the
+    next hit after it passes) and at exit, one UPDATE per distinct count.
+    The counts are informational; hits buffered in a process that dies are
+    lost.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pending = Counter()  # GeocodeCache pk -> hits not yet written
+        self._flushed_at = time.monotonic()
+        self._pid = os.getpid()
+
+    def record(self, pk):
+        """Count one hit on a cache row, flushing if the interval has passed."""
+        interval = getattr(settings, 'GEOCODE_HIT_FLUSH_INTERVAL', 60)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker process: the parent's hits are its own to write
+                self._reset()
+            self._pending[pk] += 1
+            if time.monotonic() - self._flushed_at < interval:
+                return
+        self.flush()
+
+    def flush(self):
+        """Write the buffered hits. Returns the number of UPDATE statements run."""
+        from .models import GeocodeCache
+
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+
+        by_count = {}
+        for pk, count in pending.items():
+            by_count.setdefault(count, []).append(pk)
+        now = timezone.now()
+        for count, pks in by_count.items():
+            GeocodeCache.objects.filter(pk__in=pks).update(hit_count=F('hit_count') + count, last_used=now)
+        return len(by_count)
+
+
+cache_hits = CacheHitCounter()
+
+
+def _flush_cache_hits():
+    try:
+        cache_hits.flush()
+    except Exception as e:
+        logger.warning(f"Could not write geocode cache hits: {str(e)}")
+
+
+# Write out buffered hits when the process exits
+atexit.register(_flush_cache_hits)
+
+
+_backends = {}
+
+
+def get_geocoder():
+    """Return the configured geocoder backend instance."""
+    path = getattr(settings, 'GEOCODER_BACKEND', 'accounts.geocoding.GoogleGeocoder')
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def geocode(address, refresh=False):
+    """
+    Return (lat, lng) floats for address, or None if it cannot be located.
+
+    Looks the normalized address up in GeocodeCache first and only calls the
+    backend on a miss (or when refresh=True). Never raises: provider errors
+    are logged and return None without being cached.
+    """
+    from .models import GeocodeCache
+
+    key = normalize_address(address)
+    if not key:
+        return None
+
+    if not refresh:
+        entry = GeocodeCache.objects.filter(normalized_address=key).first()
+        if entry is not None:
+            cache_hits.record(entry.pk)
+            return entry.coordinates()
+
+    geocoder = get_geocoder()
+    try:
+        result = geocoder.geocode(address)
+    except GeocodingError as e:
+        logger.warning(f"Geocoding '{address[:80]}' failed: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected geocoding error for '{address[:80]}': {str(e)}")
+        return None
+
+    latitude, longitude = result if result else (None, None)
+    GeocodeCache.objects.update_or_create(
+        normalized_address=key,
+        defaults={
+            'address': address,
+            'latitude': latitude,
+            'longitude': longitude,
+            'provider': getattr(geocoder, 'name', geocoder.__class__.__name__),
+            'last_used': timezone.now(),
+        },
+    )
+    return (round(float(latitude), 6), round(float(longitude), 6)) if result else None
+
+
+class BackgroundGeocoder:
+    """
+    Locates saved rows that have an address but no coordinates on a
+    background thread. Set GEOCODE_ASYNC = False to geocode inline instead
+    (e.g. for tests and management commands).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pending = set()  # (model name, pk)
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def enqueue(self, model_name, pk):
+        """Geocode an accounts model row. Call after the save has been committed."""
+        if not getattr(settings, 'GEOCODE_ASYNC', True):
+            self.locate(model_name, pk)
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker process: the parent's thread did not survive
+                self._reset()
+            self._pending.add((model_name, pk))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='background-geocoder', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def locate(self, model_name, pk):
+        """
+        Geocode the row if it still lacks coordinates and save them.
+        Returns True if the row has coordinates afterwards.
+        """
+        instance = apps.get_model('accounts', model_name).objects.filter(pk=pk).first()
+        if instance is None:
+            return False
+        if instance.latitude is not None and instance.longitude is not None:
+            return True
+        if not instance.geocode_if_needed():
+            logger.warning(f"{model_name} {pk} has no coordinates and could not be geocoded")
+            return False
+        instance.save(update_fields=['latitude', 'longitude'])
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                rows, self._pending = self._pending, set()
+            close_old_connections()
+            for model_name, pk in sorted(rows):
+                try:
+                    self.locate(model_name, pk)
+                except Exception as e:
+                    logger.error(f"Geocoding {model_name} {pk} failed: {str(e)}")
+            close_old_connections()
+
+
+# Shared per-process worker
+background_geocoder = BackgroundGeocoder()
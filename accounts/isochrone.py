@@ -0,0 +1,150 @@
+"""
+Walking isochrones: what can be reached from a point within N minutes.
+
+One bounded Dijkstra search from the snapped origin node covers the largest
+budget (ISOCHRONE_MAX_MINUTES). Its per-node distances are cached by origin
+node, so dragging a time slider only re-thresholds cached arrays: the
+reachable buildings are a vectorized comparison over the snapped building
+nodes, and the area polygon takes the farthest reachable node in each
+angular sector around the origin.
+
+Buildings are snapped to the graph once and re-snapped when a Building
+changes (see signals.py).
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .geo import to_local_xy
+
+
+class IsochroneIndex:
+    """
+    Snapped buildings plus an LRU cache of bounded searches per origin node.
+    """
+
+    def __init__(self, cache_size=256, sectors=64):
+        self.cache_size = cache_size
+        self.sectors = sectors
+        self._lock = threading.Lock()
+        self._graph = None
+        self._buildings = None  # (ids, nodes, snap_m) arrays for self._graph
+        self._cache = OrderedDict()  # origin node -> distances in meters
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_origins'] = len(self._cache)
+        return stats
+
+    def invalidate_buildings(self):
+        """Re-snap buildings on the next query."""
+        with self._lock:
+            self._buildings = None
+
+    def set_buildings(self, graph, buildings):
+        """Snap buildings given as (id, lat, lng) onto graph."""
+        rows = list(buildings)
+        ids = np.array([building_id for building_id, _, _ in rows], dtype=np.int64)
+        nodes = np.zeros(len(rows), dtype=np.int64)
+        snaps = np.zeros(len(rows))
+        for i, (_, lat, lng) in enumerate(rows):
+            nodes[i], snaps[i] = graph.nearest_node(float(lat), float(lng))
+        with self._lock:
+            self._use_graph(graph)
+            self._buildings = (ids, nodes, snaps)
+
+    def _use_graph(self, graph):
+        """Drop everything computed on a previous graph. Caller holds the lock."""
+        if graph is not self._graph:
+            self._graph = graph
+            self._buildings = None
+            self._cache.clear()
+
+    def _get_buildings(self, graph):
+        with self._lock:
+            self._use_graph(graph)
+            buildings = self._buildings
+        if buildings is None:
+            from .models import Building
+            self.set_buildings(graph, Building.objects.values_list('id', 'latitude', 'longitude'))
+            with self._lock:
+                buildings = self._buildings
+        return buildings
+
+    def distances(self, graph, node, max_distance):
+        """Cached bounded Dijkstra distances (m) from an origin node."""
+        with self._lock:
+            self._use_graph(graph)
+            distances = self._cache.get(node)
+            if distances is not None:
+                self._cache.move_to_end(node)
+                self._stats['hits'] += 1
+                return distances
+            self._stats['misses'] += 1
+
+        distances = graph.distances_from(node, limit=max_distance)
+        with self._lock:
+            if graph is self._graph:
+                self._cache[node] = distances
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return distances
+
+    def query(self, graph, lat, lng, minutes, speed, max_minutes, max_snap=math.inf):
+        """
+        Reachability from (lat, lng) within `minutes` of walking. Returns a
+        dict with the origin snap distance, reachable buildings as
+        (building id, seconds) sorted by time, and the area polygon. Nothing
+        is searched when the origin is more than max_snap meters off the graph.
+        """
+        origin, origin_snap = graph.nearest_node(lat, lng)
+        if origin_snap > max_snap:
+            return {'snap_m': origin_snap, 'buildings': [], 'polygon': []}
+        distances = self.distances(graph, origin, max_minutes * 60.0 * speed)
+        budget = minutes * 60.0 * speed - origin_snap
+
+        ids, nodes, snaps = self._get_buildings(graph)
+        building_distance = distances[nodes] + snaps
+        reachable = np.flatnonzero(building_distance <= budget)
+        reachable = reachable[np.argsort(building_distance[reachable], kind='stable')]
+        seconds = (building_distance[reachable] + origin_snap) / speed
+
+        return {
+            'snap_m': origin_snap,
+            'buildings': list(zip(ids[reachable].tolist(), seconds.tolist())),
+            'polygon': self.polygon(graph, origin, distances, budget),
+        }
+
+    def polygon(self, graph, origin, distances, budget):
+        """
+        Star-shaped outline of the reachable nodes: the farthest one in each
+        of `sectors` equal angles around the origin, as [[lat, lng], ...].
+        """
+        inside = np.flatnonzero(distances <= budget)
+        lat0 = float(graph.node_lat[origin])
+        lng0 = float(graph.node_lng[origin])
+        if len(inside) < 3:
+            return [[lat0, lng0]] if len(inside) else []
+
+        x, y = to_local_xy(graph.node_lat[inside], graph.node_lng[inside], lat0, lng0)
+        radius = x * x + y * y
+        sector = ((np.arctan2(y, x) + math.pi) / (2 * math.pi) * self.sectors).astype(np.int64) % self.sectors
+        # Farthest node per sector: sort by radius, keep the last of each sector
+        order = np.lexsort((radius, sector))
+        last = np.flatnonzero(np.append(sector[order][1:] != sector[order][:-1], True))
+        chosen = inside[order[last]]
+        return [
+            [round(float(graph.node_lat[node]), 6), round(float(graph.node_lng[node]), 6)]
+            for node in chosen.tolist()
+        ]
+
+
+isochrone_index = IsochroneIndex(
+    cache_size=getattr(settings, 'ISOCHRONE_CACHE_SIZE', 256),
+    sectors=getattr(settings, 'ISOCHRONE_SECTORS', 64),
+)
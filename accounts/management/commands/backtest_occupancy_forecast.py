@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from accounts.forecast import (
+    HOURS_PER_WEEK, SLOTS_PER_HOUR, fit_phi, forecast_confidence, forecast_errors, seasonal_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = 'Backtest the next-hour occupancy forecaster on synthetic history against simpler forecasts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--buildings',
+            type=int,
+            default=10000,
+            help='Synthetic buildings (default: 10000)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Days of 10-minute history per building (default: 365)',
+        )
+        parser.add_argument(
+            '--test-days',
+            type=int,
+            default=28,
+            help='Final days held out for evaluation (default: 28)',
+        )
+        parser.add_argument(
+            '--chunk',
+            type=int,
+            default=250,
+            help='Buildings generated and fitted at a time (default: 250)',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=10,
+            help='Points a forecast may be off and still count as right (default: 10)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        slots = options['days'] * 24 * SLOTS_PER_HOUR
+        split = slots - options['test_days'] * 24 * SLOTS_PER_HOUR
+        lag = SLOTS_PER_HOUR
+        week = 7 * 24 * SLOTS_PER_HOUR
+        # History starts on a Monday at midnight
+        hours = (np.arange(slots) // SLOTS_PER_HOUR) % HOURS_PER_WEEK
+
+        totals = {name: np.zeros(3) for name in ('model', 'baseline', 'persistence')}  # abs, squared, count
+        hits = 0
+        generate_s = fit_s = evaluate_s = 0.0
+        phis = []
+        confidences = []
+
+        for first in range(0, options['buildings'], options['chunk']):
+            count = min(options['chunk'], options['buildings'] - first)
+            start = time.perf_counter()
+            values = self.synthetic_history(rng, count, slots, hours)
+            generate_s += time.perf_counter() - start
+
+            start = time.perf_counter()
+            train = values[:, :split]
+            baseline = seasonal_baseline(train, hours[:split])
+            phi = fit_phi(train, baseline, hours[:split])
+            # Confidence as fit_model computes it, from the last training week
+            confidences.append(forecast_confidence(
+                forecast_errors(train[:, -week:], baseline, phi, hours[split - week:split]), options['tolerance'],
+            ))
+            fit_s += time.perf_counter() - start
+            phis.append(phi)
+
+            # One-hour-ahead forecasts for every slot of the held-out days
+            start = time.perf_counter()
+            test = values[:, split - lag:]
+            test_hours = hours[split - lag:]
+            actual = test[:, lag:]
+            errors = {
+                'model': forecast_errors(test, baseline, phi, test_hours),
+                'baseline': np.abs(baseline[:, test_hours[lag:]] - actual),
+                'persistence': np.abs(test[:, :-lag] - actual),
+            }
+            for name, error in errors.items():
+                valid = ~np.isnan(error)
+                totals[name] += (error[valid].sum(), (error[valid] ** 2).sum(), valid.sum())
+            valid = ~np.isnan(errors['model'])
+            hits += int((errors['model'][valid] <= options['tolerance']).sum())
+            evaluate_s += time.perf_counter() - start
+
+        phi = np.concatenate(phis)
+        confidence = np.concatenate(confidences)
+        forecasts = int(totals['model'][2])
+        self.stdout.write(
+            f'{options["buildings"]} buildings x {options["days"]} days of 10-minute samples, '
+            f'{forecasts} one-hour-ahead forecasts over the last {options["test_days"]} days'
+        )
+        for name, label in (('model', 'Forecaster'), ('baseline', 'Hour-of-week mean'), ('persistence', 'Last reading')):
+            absolute, squared, n = totals[name]
+            self.stdout.write(f'  {label:<18} MAE {absolute / n:5.2f}   RMSE {np.sqrt(squared / n):5.2f}')
+        self.stdout.write(
+            f'Within {options["tolerance"]:g} points: {hits / forecasts:.1%} of forecasts; '
+            f'mean confidence from the last training week {confidence.mean():.2f}'
+        )
+        self.stdout.write(f'Fitted phi: median {np.median(phi):.2f}, 10th-90th percentile '
+                          f'{np.percentile(phi, 10):.2f}-{np.percentile(phi, 90):.2f}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Fit {fit_s:.2f} s, evaluate {evaluate_s:.2f} s '
+            f'({fit_s / options["buildings"] * 1e6:.0f} µs per building fit); data generation {generate_s:.2f} s'
+        ))
+
+    def synthetic_history(self, rng, count, slots, hours):
+        """
+        Weekly profile per building plus persistent deviations (AR(1) per
+        slot) and reading noise, nan while the building is closed.
+        """
+        hour_of_day = np.arange(HOURS_PER_WEEK) % 24
+        weekend = np.arange(HOURS_PER_WEEK) >= 5 * 24
+        peak = rng.uniform(11, 16, (count, 1))
+        width = rng.uniform(2, 5, (count, 1))
+        height = rng.uniform(30, 80, (count, 1)) * np.where(weekend, rng.uniform(0.3, 0.9, (count, 1)), 1.0)
+        profile = 5 + height * np.exp(-((hour_of_day - peak) / width) ** 2)
+        opens = rng.integers(6, 9, (count, 1))
+        closes = rng.integers(21, 25, (count, 1))
+        open_hours = (hour_of_day >= opens) & (hour_of_day < closes)
+
+        # Deviations that persist for about an hour or more
+        rho = rng.uniform(0.9, 0.99, (count, 1)).astype(np.float32)
+        shocks = rng.normal(0, 1, (count, slots)).astype(np.float32) * rng.uniform(2, 6, (count, 1)).astype(np.float32)
+        # Run the recursion a block of slots at a time: within a block each
+        # deviation is a rho-weighted sum of the block's shocks plus the
+        # carried-over deviation
+        block = 64
+        powers = np.arange(block)
+        lags = powers[:, None] - powers[None, :]
+        kernel = np.where(lags >= 0, rho[:, :, None] ** np.maximum(lags, 0), 0).astype(np.float32)
+        carry_weights = rho ** (powers + 1)
+        deviation = np.empty_like(shocks)
+        carry = np.zeros(count, dtype=np.float32)
+        for first in range(0, slots, block):
+            size = min(block, slots - first)
+            part = np.einsum('njk,nk->nj', kernel[:, :size, :size], shocks[:, first:first + size])
+            deviation[:, first:first + size] = part + carry_weights[:, :size] * carry[:, None]
+            carry = deviation[:, first + size - 1]
+
+        values = profile[:, hours].astype(np.float32) + deviation + rng.normal(0, 3, (count, slots)).astype(np.float32)
+        values = np.clip(np.round(values), 0, 100)
+        values[~open_hours[:, hours]] = np.nan
+        return values
@@ -0,0 +1,147 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from accounts.models import Building
+from accounts.search_index import BuildingSearchIndex, tokenize, normalize
+
+
+class Command(BaseCommand):
+    help = 'Compare recall and latency of the ORM, indexed and fuzzy building search paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of generated queries per run (default: 200)',
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=0,
+            help='Add this many synthetic buildings for the run (rolled back afterwards)',
+        )
+        parser.add_argument(
+            '--typos',
+            type=int,
+            default=1,
+            help='Number of random edits applied to each query word (default: 1)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Result limit used for recall (default: 20)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for query generation',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            if options['synthetic']:
+                self.create_synthetic_buildings(options['synthetic'], rng)
+
+            buildings = list(Building.objects.all())
+            if not buildings:
+                self.stdout.write(self.style.ERROR('No buildings in the database. Import buildings first.'))
+                return
+
+            self.stdout.write(f'Building table: {len(buildings)} rows')
+
+            index = BuildingSearchIndex()
+            start = time.perf_counter()
+            index.load()
+            self.stdout.write(f'Index build: {(time.perf_counter() - start) * 1000:.1f} ms')
+
+            queries = self.generate_queries(buildings, options['queries'], options['typos'], rng)
+            limit = options['limit']
+
+            paths = [
+                ('orm icontains', lambda q: self.orm_search(q, limit)),
+                ('index', lambda q: index.search(q, limit=limit)),
+                ('index fuzzy', lambda q: index.fuzzy_search(q, limit=limit)),
+            ]
+
+            self.stdout.write(f'\n{len(queries)} queries with {options["typos"]} typo(s) per word, top {limit}:\n')
+            self.stdout.write(f'{"path":<16}{"recall":>8}{"mean ms":>10}{"p95 ms":>10}')
+            for label, search in paths:
+                hits = 0
+                timings = []
+                for query, target_id in queries:
+                    start = time.perf_counter()
+                    result_ids = search(query)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if target_id in result_ids:
+                        hits += 1
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+                self.stdout.write(
+                    f'{label:<16}{hits / len(queries):>8.1%}{statistics.mean(timings):>10.3f}{p95:>10.3f}'
+                )
+
+            # Never keep synthetic rows
+            transaction.set_rollback(True)
+
+    def orm_search(self, query, limit):
+        """The original building_search_api query."""
+        return list(
+            Building.objects.filter(
+                Q(name__icontains=query) |
+                Q(code__icontains=query) |
+                Q(address__icontains=query)
+            ).values_list('id', flat=True)[:limit]
+        )
+
+    def generate_queries(self, buildings, count, typos, rng):
+        """Build (query, expected building id) pairs from building names."""
+        queries = []
+        for _ in range(count):
+            building = rng.choice(buildings)
+            words = tokenize(normalize(building.name)) or [building.code.lower()]
+            query = ' '.join(self.misspell(word, typos, rng) for word in words)
+            queries.append((query, building.id))
+        return queries
+
+    def misspell(self, word, typos, rng):
+        """Apply random deletions, substitutions and transpositions to word."""
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        for _ in range(typos):
+            if len(word) < 4:
+                break
+            pos = rng.randrange(1, len(word) - 1)
+            edit = rng.choice(('delete', 'substitute', 'transpose'))
+            if edit == 'delete':
+                word = word[:pos] + word[pos + 1:]
+            elif edit == 'substitute':
+                word = word[:pos] + rng.choice(letters) + word[pos + 1:]
+            else:
+                word = word[:pos - 1] + word[pos] + word[pos - 1] + word[pos + 1:]
+        return word
+
+    def create_synthetic_buildings(self, count, rng):
+        """Insert plausible campus buildings to test scaling."""
+        first = ['North', 'South', 'East', 'West', 'Central', 'Memorial', 'Tech', 'Science', 'Engineering', 'Arts']
+        second = ['Research', 'Learning', 'Student', 'Innovation', 'Residence', 'Athletic', 'Dining', 'Medical']
+        third = ['Hall', 'Center', 'Complex', 'Pavilion', 'Laboratory', 'Annex', 'Library', 'Commons']
+        streets = ['Ferst Dr', 'Atlantic Dr', 'State St', 'Hemphill Ave', 'Spring St', '10th St', 'Cherry St']
+
+        Building.objects.bulk_create([
+            Building(
+                name=f'{rng.choice(first)} {rng.choice(second)} {rng.choice(third)} {i}',
+                code=f'SYN{i}',
+                address=f'{rng.randint(1, 999)} {rng.choice(streets)} NW, Atlanta, GA',
+                latitude=33.77 + rng.uniform(-0.02, 0.02),
+                longitude=-84.40 + rng.uniform(-0.02, 0.02),
+            )
+            for i in range(count)
+        ], batch_size=1000)
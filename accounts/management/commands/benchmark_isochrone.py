@@ -0,0 +1,102 @@
+import random
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from accounts.isochrone import IsochroneIndex
+from accounts.management.commands.benchmark_routing import Command as RoutingBenchmark
+from accounts.routing import WalkingGraph
+
+
+class Command(BaseCommand):
+    help = 'Measure /api/isochrone/ latency for new origins and for slider drags on a cached origin'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--graph',
+            type=str,
+            default=None,
+            help='GeoJSON or OSM file to load (default: generate a synthetic grid)',
+        )
+        parser.add_argument(
+            '--grid',
+            type=int,
+            default=150,
+            help='Synthetic grid size per side (default: 150, i.e. 22,500 nodes)',
+        )
+        parser.add_argument(
+            '--buildings',
+            type=int,
+            default=300,
+            help='Synthetic buildings (default: 300)',
+        )
+        parser.add_argument(
+            '--origins',
+            type=int,
+            default=20,
+            help='Distinct origins (default: 20)',
+        )
+        parser.add_argument(
+            '--drags',
+            type=int,
+            default=30,
+            help='Slider positions queried per origin (default: 30)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['graph']:
+            graph = WalkingGraph.load(options['graph'])
+        else:
+            graph = RoutingBenchmark().synthetic_graph(options['grid'], rng)
+        speed = 1.4
+        max_minutes = 30
+
+        index = IsochroneIndex()
+        nodes = [rng.randrange(graph.node_count) for _ in range(options['buildings'])]
+        index.set_buildings(graph, [
+            (i, graph.node_lat[node] + rng.uniform(-1e-4, 1e-4), graph.node_lng[node] + rng.uniform(-1e-4, 1e-4))
+            for i, node in enumerate(nodes)
+        ])
+        self.stdout.write(f'Graph: {graph.node_count} nodes, {options["buildings"]} buildings')
+
+        cold = []
+        warm = []
+        wrong = 0
+        for _ in range(options['origins']):
+            node = rng.randrange(graph.node_count)
+            lat, lng = float(graph.node_lat[node]), float(graph.node_lng[node])
+
+            start = time.perf_counter()
+            index.query(graph, lat, lng, rng.uniform(1, max_minutes), speed, max_minutes)
+            cold.append((time.perf_counter() - start) * 1000)
+
+            full = graph.distances_from(node)
+            for _ in range(options['drags']):
+                minutes = rng.uniform(1, max_minutes)
+                start = time.perf_counter()
+                result = index.query(graph, lat, lng, minutes, speed, max_minutes)
+                warm.append((time.perf_counter() - start) * 1000)
+
+                # Same answer as an unbounded search
+                ids, building_nodes, snaps = index._buildings
+                expected = set(ids[full[building_nodes] + snaps <= minutes * 60 * speed].tolist())
+                if expected != {building_id for building_id, _ in result['buildings']}:
+                    wrong += 1
+
+        self.stdout.write(f'New origin (search + answer): mean {statistics.mean(cold):.1f} ms, max {max(cold):.1f} ms')
+        warm.sort()
+        self.stdout.write(
+            f'Slider drag (cached origin): mean {statistics.mean(warm):.2f} ms, '
+            f'p95 {warm[int(len(warm) * 0.95) - 1]:.2f} ms'
+        )
+        self.stdout.write(f'Cache: {index.stats()}')
+        style = self.style.SUCCESS if not wrong else self.style.ERROR
+        self.stdout.write(style(f'Verified against unbounded Dijkstra: {wrong} of {len(warm)} answers differ'))
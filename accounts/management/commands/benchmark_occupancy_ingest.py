@@ -0,0 +1,73 @@
+import io
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from accounts.management.commands.fetch_waitz_occupancy import Command as FetchCommand
+from accounts.models import Building
+
+
+class Command(BaseCommand):
+    help = 'Time a Waitz occupancy ingest with grouped bulk writes against one save() per building'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--buildings',
+            type=int,
+            default=2000,
+            help='Synthetic buildings, each in the feed (default: 2000)',
+        )
+        parser.add_argument(
+            '--change',
+            type=float,
+            default=0.2,
+            help='Share of buildings whose occupancy changes between runs (default: 0.2)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        count = options['buildings']
+        fetch = FetchCommand(stdout=io.StringIO())
+
+        with transaction.atomic():
+            Building.objects.bulk_create([
+                Building(
+                    name=f'Benchmark Occupancy {i}', code=f'BENCH-OCC-{i}', address='',
+                    latitude=33.7756, longitude=-84.3963, waitz_id=f'bench-{i}',
+                )
+                for i in range(count)
+            ])
+            feed = [{'id': f'bench-{i}', 'name': f'Benchmark Occupancy {i}', 'busyness': rng.randrange(100)}
+                    for i in range(count)]
+
+            written, skipped, elapsed, _ = fetch.ingest_waitz_data(feed)
+            self.stdout.write(f'First ingest: {written} written, {skipped} skipped in {elapsed * 1000:.0f} ms')
+
+            for entry in rng.sample(feed, int(count * options['change'])):
+                entry['busyness'] = (entry['busyness'] + 1 + rng.randrange(98)) % 100
+            written, skipped, elapsed, _ = fetch.ingest_waitz_data(feed)
+            self.stdout.write(self.style.SUCCESS(
+                f'Next ingest ({options["change"]:.0%} changed): {written} written, {skipped} skipped '
+                f'in {elapsed * 1000:.0f} ms'
+            ))
+
+            # Previous behaviour: every matched building saved on its own
+            start = time.perf_counter()
+            buildings = {building.waitz_id: building for building in Building.objects.filter(code__startswith='BENCH-OCC-')}
+            for entry in feed:
+                building = buildings[entry['id']]
+                fetch.update_building_with_api_data(building, entry)
+                building.occupancy_last_updated = timezone.now()
+                building.save()
+            self.stdout.write(f'One save() per building: {count} written in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+            # Never keep synthetic rows
+            transaction.set_rollback(True)
@@ -0,0 +1,144 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.management.base import BaseCommand
+from accounts.outbound import OutboundClient, UpstreamUnavailable
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    /ok answers at once, /flaky answers 503 to every third request and
+    /slow takes server.delay seconds. Connections are kept alive.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status = 200
+        if self.path == '/flaky':
+            with self.server.lock:
+                self.server.flaky_count += 1
+                if self.server.flaky_count % 3 == 0:
+                    status = 503
+        elif self.path == '/slow':
+            time.sleep(self.server.delay)
+        body = b'{"data": []}'
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out and went away
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.flaky_count = 0
+    server.delay = 0.0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class Command(BaseCommand):
+    help = 'Compare the pooled outbound client with bare requests calls against local stub servers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=300,
+            help='Requests per comparison (default: 300)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=0.5,
+            help='Request timeout in seconds against the slow upstream (default: 0.5)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        timeout = options['timeout']
+        healthy, healthy_url = start_stub()
+        failing, failing_url = start_stub()
+        client = OutboundClient(retries=2, backoff_base=0.02, backoff_max=0.1,
+                                breaker_failures=5, breaker_cooldown=1.0, pool_size=4)
+        try:
+            self.stdout.write(f'Healthy upstream {healthy_url}, failing upstream {failing_url}')
+
+            # Keep-alive pooling
+            start = time.perf_counter()
+            for _ in range(count):
+                requests.get(f'{healthy_url}/ok', timeout=5)
+            bare_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for _ in range(count):
+                client.get(f'{healthy_url}/ok', timeout=5)
+            pooled_ms = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f'  {count} GETs: bare requests.get {bare_ms / count:.2f} ms each, '
+                f'pooled client {pooled_ms / count:.2f} ms each'
+            )
+
+            # Retries with jittered backoff
+            bare_ok = sum(requests.get(f'{healthy_url}/flaky', timeout=5).status_code == 200 for _ in range(count))
+            client_ok = sum(client.get(f'{healthy_url}/flaky', timeout=5).status_code == 200 for _ in range(count))
+            self.stdout.write(
+                f'  Upstream failing every third request: {bare_ok}/{count} succeed bare, '
+                f'{client_ok}/{count} with retries'
+            )
+
+            # A hung upstream: every bare call waits out the timeout
+            failing.delay = timeout * 4
+            calls = 20
+            start = time.perf_counter()
+            for _ in range(calls):
+                try:
+                    requests.get(f'{failing_url}/slow', timeout=timeout)
+                except requests.exceptions.RequestException:
+                    pass
+            bare_s = time.perf_counter() - start
+            fast = 0
+            start = time.perf_counter()
+            for _ in range(calls):
+                try:
+                    client.get(f'{failing_url}/slow', timeout=timeout)
+                except UpstreamUnavailable:
+                    fast += 1
+                except requests.exceptions.RequestException:
+                    pass
+            client_s = time.perf_counter() - start
+            healthy_ok = client.get(f'{healthy_url}/ok', timeout=5).status_code == 200
+            self.stdout.write(
+                f'  {calls} calls to a hung upstream: {bare_s:.2f} s bare, {client_s:.2f} s with the breaker '
+                f'({fast} failed fast); other host still served: {healthy_ok}'
+            )
+
+            # Recovery: after the cooldown one trial request closes the breaker
+            failing.delay = 0.0
+            time.sleep(client.breaker_cooldown)
+            recovered = client.get(f'{failing_url}/slow', timeout=timeout).status_code == 200
+            state = client.stats()[failing_url.split('//')[1]]['breaker']
+            self.stdout.write(f'  After the cooldown: trial request succeeded {recovered}, breaker {state}')
+
+            for host, stats in client.stats().items():
+                self.stdout.write(self.style.SUCCESS(
+                    f'{host}: {stats["requests"]} requests, {stats["failures"]} failures, {stats["retries"]} retries, '
+                    f'{stats["short_circuited"]} failed fast, mean {stats["mean_ms"]} ms, '
+                    f'p50 <={stats["p50_ms"]:g} ms, p99 <={stats["p99_ms"]:g} ms'
+                ))
+                self.stdout.write('  ' + ', '.join(f'{bucket}: {n}' for bucket, n in stats['histogram'].items() if n))
+        finally:
+            for server in (healthy, failing):
+                server.shutdown()
+                server.server_close()
@@ -0,0 +1,135 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.alert_snapshot import active_alert_snapshot
+from accounts.management.commands.benchmark_routing import Command as RoutingBenchmark
+from accounts.models import SafetyAlert
+from accounts.routing import CampusRouter, WalkingGraph
+
+
+class Command(BaseCommand):
+    help = 'Replay popular campus trips through the route cache and report hit rate, latency and staleness'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--graph',
+            type=str,
+            default=None,
+            help='GeoJSON or OSM file to load (default: generate a synthetic grid)',
+        )
+        parser.add_argument(
+            '--grid',
+            type=int,
+            default=150,
+            help='Synthetic grid size per side (default: 150, i.e. 22,500 nodes)',
+        )
+        parser.add_argument(
+            '--places',
+            type=int,
+            default=40,
+            help='Popular places trips start and end at (default: 40)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Route requests to replay (default: 2000)',
+        )
+        parser.add_argument(
+            '--alerts',
+            type=int,
+            default=30,
+            help='Synthetic circle alerts (rolled back afterwards)',
+        )
+        parser.add_argument(
+            '--alert-every',
+            type=int,
+            default=100,
+            help='Move one alert every N requests (default: 100)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        benchmark = RoutingBenchmark()
+        if options['graph']:
+            graph = WalkingGraph.load(options['graph'])
+        else:
+            graph = benchmark.synthetic_graph(options['grid'], rng)
+        router = CampusRouter()
+        router.set_graph(graph)
+
+        # Popular places with Zipf-like popularity; requests start within ~5 m of them
+        places = [rng.randrange(graph.node_count) for _ in range(options['places'])]
+        weights = [1.0 / (rank + 1) for rank in range(len(places))]
+        jitter = 5 / 111195.0
+
+        def endpoint():
+            node = rng.choices(places, weights)[0]
+            return (float(graph.node_lat[node]) + rng.uniform(-jitter, jitter),
+                    float(graph.node_lng[node]) + rng.uniform(-jitter, jitter))
+
+        hit_ms = []
+        miss_ms = []
+        stale = 0
+        moves = 0
+        with transaction.atomic():
+            benchmark.create_alerts(graph, options['alerts'], rng)
+            alerts = list(SafetyAlert.objects.filter(title__startswith='Benchmark alert '))
+            active_alert_snapshot.invalidate()
+
+            for i in range(options['requests']):
+                if options['alert_every'] and i and i % options['alert_every'] == 0:
+                    alert = rng.choice(alerts)
+                    node = rng.randrange(graph.node_count)
+                    alert.latitude = round(float(graph.node_lat[node]), 6)
+                    alert.longitude = round(float(graph.node_lng[node]), 6)
+                    alert.update_bounds()
+                    alert.save()
+                    active_alert_snapshot.invalidate()
+                    moves += 1
+
+                (from_lat, from_lng), (to_lat, to_lng) = endpoint(), endpoint()
+                hits = router.cache.stats()['hits']
+                start = time.perf_counter()
+                route = router.route(from_lat, from_lng, to_lat, to_lng)
+                elapsed = (time.perf_counter() - start) * 1000
+                if router.cache.stats()['hits'] > hits:
+                    hit_ms.append(elapsed)
+                    # A cached route must cost the same as a fresh search
+                    fresh, _ = router._search(
+                        graph, router.get_penalties(),
+                        graph.nearest_node(from_lat, from_lng)[0], graph.nearest_node(to_lat, to_lng)[0],
+                    )
+                    if route['found'] and abs(fresh['cost'] - route['cost']) > 1e-6 * max(1.0, fresh['cost']):
+                        stale += 1
+                else:
+                    miss_ms.append(elapsed)
+
+            # Never keep synthetic alerts
+            transaction.set_rollback(True)
+        active_alert_snapshot.invalidate()
+
+        stats = router.cache.stats()
+        self.stdout.write(
+            f'{options["requests"]} requests between {len(places)} places, '
+            f'{moves} alert moves, graph with {graph.node_count} nodes'
+        )
+        self.stdout.write(
+            f'Hit rate {stats["hit_rate"] * 100:.1f}% ({stats["hits"]} hits, {stats["misses"]} misses), '
+            f'{stats["invalidated"]} routes dropped by alert changes, {stats["size"]} cached'
+        )
+        if hit_ms:
+            self.stdout.write(f'Cache hit: mean {statistics.mean(hit_ms):.3f} ms')
+        if miss_ms:
+            self.stdout.write(f'Cache miss (A* search): mean {statistics.mean(miss_ms):.2f} ms')
+        style = self.style.SUCCESS if not stale else self.style.WARNING
+        self.stdout.write(style(f'Cached routes costlier than a fresh search: {stale} of {len(hit_ms)}'))
@@ -0,0 +1,163 @@
+import math
+import random
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts import polyline
+from accounts.alert_index import AlertGeometryIndex
+from accounts.alert_snapshot import Snapshot, SnapshotEntry
+from accounts.geo import haversine_m
+from accounts.models import SafetyAlert
+
+
+class Command(BaseCommand):
+    help = 'Measure /api/routes/check/ route-vs-alert intersection latency on synthetic routes and alerts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alerts',
+            type=int,
+            default=1000,
+            help='Number of synthetic circle and polygon alerts (default: 1000)',
+        )
+        parser.add_argument(
+            '--points',
+            type=int,
+            default=500,
+            help='Vertices per route (default: 500)',
+        )
+        parser.add_argument(
+            '--routes',
+            type=int,
+            default=50,
+            help='Number of routes to check (default: 50)',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare results with point sampling every meter along each route',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Unsaved alerts: nothing touches the database
+        start = time.perf_counter()
+        snapshot = Snapshot([SnapshotEntry(alert) for alert in self.synthetic_alerts(options['alerts'], rng)], None, None)
+        index = AlertGeometryIndex(snapshot)
+        self.stdout.write(
+            f'{len(index.entries)} alerts indexed in {(time.perf_counter() - start) * 1000:.0f} ms'
+        )
+
+        routes = [self.random_route(options['points'], rng) for _ in range(options['routes'])]
+        timings = []
+        hit_counts = []
+        for route in routes:
+            start = time.perf_counter()
+            # Include decoding, as the API does
+            points = polyline.decode(polyline.encode(route))
+            lats, lngs = zip(*points)
+            hits = index.route_hits(lats, lngs)
+            timings.append((time.perf_counter() - start) * 1000)
+            hit_counts.append(len(hits))
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f'{options["points"]}-point routes: mean {statistics.mean(timings):.2f} ms, '
+            f'p95 {p95:.2f} ms, {statistics.mean(hit_counts):.1f} alerts crossed on average'
+        )
+
+        if options['verify']:
+            mismatches = 0
+            for route in routes:
+                points = polyline.decode(polyline.encode(route))
+                lats, lngs = zip(*points)
+                got = {entry.id: distance for entry, distance in index.route_hits(lats, lngs)}
+                expected = self.sampled_hits(index, points)
+                extra = [alert_id for alert_id in got if alert_id not in expected]
+                if any(not self.grazes(index, points, alert_id, got[alert_id]) for alert_id in extra):
+                    mismatches += 1
+                elif any(abs(got.get(alert_id, math.inf) - distance) > 1.5 for alert_id, distance in expected.items()):
+                    mismatches += 1
+            style = self.style.SUCCESS if not mismatches else self.style.ERROR
+            self.stdout.write(style(f'Verified against 1 m sampling: {mismatches} of {len(routes)} routes differ'))
+
+    def synthetic_alerts(self, count, rng):
+        now = timezone.now()
+        alerts = []
+        for i in range(count):
+            lat = 33.7756 + rng.uniform(-0.02, 0.02)
+            lng = -84.3963 + rng.uniform(-0.02, 0.02)
+            alert = SafetyAlert(
+                id=i + 1, title=f'Alert {i}', description='', alert_type='hazard',
+                severity=rng.choice(['low', 'medium', 'high', 'critical']),
+                latitude=lat, longitude=lng, created_at=now, updated_at=now,
+            )
+            if rng.random() < 0.5:
+                alert.location_type = 'circle'
+                alert.radius = rng.uniform(15, 150)
+            else:
+                alert.location_type = 'polygon'
+                sides = rng.randint(3, 10)
+                size = rng.uniform(0.0002, 0.0015)
+                angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(sides))
+                alert.polygon_coordinates = str([
+                    [round(lat + size * math.sin(a), 6), round(lng + size * math.cos(a), 6)] for a in angles
+                ])
+            alert.update_bounds()
+            alerts.append(alert)
+        return alerts
+
+    def random_route(self, points, rng):
+        """A wandering walk of ~10-30 m steps across campus."""
+        lat = 33.7756 + rng.uniform(-0.015, 0.015)
+        lng = -84.3963 + rng.uniform(-0.015, 0.015)
+        heading = rng.uniform(0, 2 * math.pi)
+        route = [(lat, lng)]
+        for _ in range(points - 1):
+            heading += rng.uniform(-0.5, 0.5)
+            step = rng.uniform(10, 30) / 111320.0
+            lat += step * math.sin(heading)
+            lng += step * math.cos(heading) / math.cos(math.radians(lat))
+            route.append((lat, lng))
+        return route
+
+    def sampled_hits(self, index, points):
+        """First 1 m sample inside each alert (slow reference)."""
+        hits = {}
+        travelled = 0.0
+        for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+            length = float(haversine_m(lat1, lng1, lat2, lng2))
+            steps = max(1, int(length))
+            for t in np.linspace(0.0, 1.0, steps + 1):
+                for entry in index.containing(lat1 + t * (lat2 - lat1), lng1 + t * (lng2 - lng1)):
+                    hits.setdefault(entry.id, travelled + t * length)
+            travelled += length
+        return hits
+
+    def grazes(self, index, points, alert_id, distance):
+        """
+        A hit the 1 m sampling missed is still correct when the route only
+        clips the zone: look for a point inside it at 5 cm steps near the entry.
+        """
+        travelled = 0.0
+        for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+            length = float(haversine_m(lat1, lng1, lat2, lng2))
+            if travelled + length >= distance - 1e-6:
+                for t in np.linspace(0.0, 1.0, max(2, int(length * 20) + 1)):
+                    lat, lng = lat1 + t * (lat2 - lat1), lng1 + t * (lng2 - lng1)
+                    if any(entry.id == alert_id for entry in index.containing(lat, lng)):
+                        return True
+                return False
+            travelled += length
+        return False
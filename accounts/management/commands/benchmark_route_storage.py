@@ -0,0 +1,142 @@
+import json
+import math
+import random
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from accounts import polyline
+from accounts.models import SavedRoute, User
+from accounts.routing import campus_router
+from accounts.views import load_saved_route_api
+
+
+class Command(BaseCommand):
+    help = 'Compare saved route geometry encodings by size and load latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--points',
+            type=int,
+            default=300,
+            help='Vertices per route (default: 300, about a 4 km walk)',
+        )
+        parser.add_argument(
+            '--routes',
+            type=int,
+            default=200,
+            help='Number of routes (default: 200)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        routes = [self.random_route(options['points'], rng) for _ in range(options['routes'])]
+
+        # Size of each representation
+        sizes = {'JSON [[lat, lng], ...]': [], 'Encoded polyline': [], 'Delta int32 array': []}
+        encode_us = []
+        decode_us = []
+        max_error = 0.0
+        for route in routes:
+            sizes['JSON [[lat, lng], ...]'].append(len(json.dumps([[round(lat, 6), round(lng, 6)] for lat, lng in route])))
+            start = time.perf_counter()
+            encoded = polyline.encode(route)
+            encode_us.append((time.perf_counter() - start) * 1e6)
+            start = time.perf_counter()
+            decoded = polyline.decode(encoded)
+            decode_us.append((time.perf_counter() - start) * 1e6)
+            sizes['Encoded polyline'].append(len(encoded))
+            sizes['Delta int32 array'].append(np.diff(np.round(np.asarray(route) * 1e5).astype(np.int32), axis=0, prepend=0).nbytes)
+            max_error = max(max_error, max(
+                math.hypot(lat - dlat, (lng - dlng) * math.cos(math.radians(lat))) * 111195.0
+                for (lat, lng), (dlat, dlng) in zip(route, decoded)
+            ))
+
+        self.stdout.write(f'{options["routes"]} routes of {options["points"]} points:')
+        for name, values in sizes.items():
+            self.stdout.write(f'  {name:<24} {statistics.mean(values):>8.0f} bytes')
+        self.stdout.write(
+            f'  Encode {statistics.mean(encode_us):.0f} us, decode {statistics.mean(decode_us):.0f} us, '
+            f'max rounding error {max_error:.2f} m'
+        )
+
+        # Loading a saved route with and without stored geometry
+        with transaction.atomic():
+            user, _ = User.objects.get_or_create(
+                username='benchmark-routes',
+                defaults={'email': 'benchmark-routes@example.com'},
+            )
+            factory = RequestFactory()
+            saved = [self.save_route(user, route) for route in routes[:50]]
+
+            timings = []
+            for route in saved:
+                start = time.perf_counter()
+                request = factory.post(
+                    '/api/routes/load/', json.dumps({'route_id': route.id}), content_type='application/json',
+                )
+                request.user = user
+                response = load_saved_route_api(request)
+                points = polyline.decode(json.loads(response.content)['route']['polyline'])
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'\nload_saved_route_api with polyline: mean {statistics.mean(timings):.2f} ms '
+                f'({len(points)} points ready to draw)'
+            )
+
+            if campus_router.get_graph() is not None:
+                timings = []
+                for route in saved:
+                    start = time.perf_counter()
+                    campus_router.route(
+                        float(route.origin_lat), float(route.origin_lng),
+                        float(route.destination_lat), float(route.destination_lng),
+                    )
+                    timings.append((time.perf_counter() - start) * 1000)
+                self.stdout.write(f'Recomputing on the campus graph instead: mean {statistics.mean(timings):.2f} ms')
+            else:
+                self.stdout.write('No walking graph loaded; skipping the recompute comparison')
+            self.stdout.write('(The browser previously added a DirectionsService round trip on top of the load.)')
+
+            # Never keep synthetic rows
+            transaction.set_rollback(True)
+
+    def random_route(self, points, rng):
+        """A wandering walk of ~10-20 m steps across campus."""
+        lat = 33.7756 + rng.uniform(-0.01, 0.01)
+        lng = -84.3963 + rng.uniform(-0.01, 0.01)
+        heading = rng.uniform(0, 2 * math.pi)
+        route = [(lat, lng)]
+        for _ in range(points - 1):
+            heading += rng.uniform(-0.4, 0.4)
+            step = rng.uniform(10, 20) / 111195.0
+            lat += step * math.sin(heading)
+            lng += step * math.cos(heading) / math.cos(math.radians(lat))
+            route.append((lat, lng))
+        return route
+
+    def save_route(self, user, route):
+        (origin_lat, origin_lng), (destination_lat, destination_lng) = route[0], route[-1]
+        return SavedRoute.objects.create(
+            user=user,
+            name='Benchmark route',
+            origin_lat=round(origin_lat, 6),
+            origin_lng=round(origin_lng, 6),
+            destination_lat=round(destination_lat, 6),
+            destination_lng=round(destination_lng, 6),
+            destination_name='Somewhere',
+            distance_text='',
+            duration_text='',
+            distance_value=0,
+            duration_value=0,
+            route_polyline=polyline.encode(route),
+        )
@@ -0,0 +1,197 @@
+import heapq
+import math
+import random
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.alert_snapshot import ActiveAlertSnapshot
+from accounts.models import SafetyAlert
+from accounts.routing import EdgePenalties, WalkingGraph, DEFAULT_ALERT_PENALTIES
+
+
+class Command(BaseCommand):
+    help = 'Measure campus walking router latency (A* with alert penalties) on a real or synthetic graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--graph',
+            type=str,
+            default=None,
+            help='GeoJSON or OSM file to load (default: generate a synthetic grid)',
+        )
+        parser.add_argument(
+            '--grid',
+            type=int,
+            default=150,
+            help='Synthetic grid size per side (default: 150, i.e. 22,500 nodes)',
+        )
+        parser.add_argument(
+            '--alerts',
+            type=int,
+            default=50,
+            help='Synthetic circle alerts added for the run (rolled back afterwards)',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of random origin/destination pairs (default: 200)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Threads for the concurrent run (default: 4)',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Check every A* cost against a plain Dijkstra search',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        start = time.perf_counter()
+        if options['graph']:
+            graph = WalkingGraph.load(options['graph'])
+        else:
+            graph = self.synthetic_graph(options['grid'], rng)
+        self.stdout.write(
+            f'Graph: {graph.node_count} nodes, {graph.edge_count} directed edges '
+            f'({(time.perf_counter() - start) * 1000:.0f} ms to build)'
+        )
+
+        with transaction.atomic():
+            self.create_alerts(graph, options['alerts'], rng)
+            snapshot = ActiveAlertSnapshot().get()
+            start = time.perf_counter()
+            penalties = EdgePenalties(graph, snapshot, DEFAULT_ALERT_PENALTIES)
+            penalized = int((penalties.multipliers > 1.0).sum())
+            self.stdout.write(
+                f'Penalties: {len(snapshot.entries)} active alerts, {penalized} edges penalized '
+                f'({(time.perf_counter() - start) * 1000:.1f} ms)'
+            )
+            # Never keep synthetic alerts
+            transaction.set_rollback(True)
+
+        pairs = [
+            (rng.randrange(graph.node_count), rng.randrange(graph.node_count))
+            for _ in range(options['queries'])
+        ]
+
+        timings = []
+        results = []
+        for source, target in pairs:
+            start = time.perf_counter()
+            results.append(graph.shortest_path(source, target, penalties.costs)[1])
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f'\nSingle thread: mean {statistics.mean(timings):.2f} ms, '
+            f'p95 {p95:.2f} ms, max {timings[-1]:.2f} ms'
+        )
+
+        # Concurrent read-only use: every thread must get identical answers
+        mismatches = []
+
+        def worker(chunk):
+            for index in chunk:
+                source, target = pairs[index]
+                if graph.shortest_path(source, target, penalties.costs)[1] != results[index]:
+                    mismatches.append(index)
+
+        threads = [
+            threading.Thread(target=worker, args=(range(i, len(pairs), options['threads']),))
+            for i in range(options['threads'])
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{options["threads"]} threads: {len(pairs) / elapsed:.0f} routes/s, '
+            f'{len(mismatches)} mismatches'
+        )
+
+        if options['verify']:
+            wrong = 0
+            for (source, target), cost in zip(pairs, results):
+                expected = self.dijkstra(graph, source, target, penalties.costs)
+                if not math.isclose(cost, expected, rel_tol=1e-9) and not (math.isinf(cost) and math.isinf(expected)):
+                    wrong += 1
+            style = self.style.SUCCESS if not wrong else self.style.ERROR
+            self.stdout.write(style(f'Verified against Dijkstra: {wrong} of {len(pairs)} costs differ'))
+
+    def synthetic_graph(self, size, rng):
+        """Jittered grid of ~20 m blocks around campus with some links removed."""
+        spacing = 0.00018
+        origin_lat, origin_lng = 33.7756 - size * spacing / 2, -84.3963 - size * spacing / 2
+        node_lat = []
+        node_lng = []
+        for row in range(size):
+            for col in range(size):
+                node_lat.append(origin_lat + row * spacing + rng.uniform(-0.3, 0.3) * spacing)
+                node_lng.append(origin_lng + col * spacing + rng.uniform(-0.3, 0.3) * spacing)
+
+        edges = []
+        for row in range(size):
+            for col in range(size):
+                node = row * size + col
+                if col + 1 < size and rng.random() > 0.1:
+                    edges.append((node, node + 1))
+                if row + 1 < size and rng.random() > 0.1:
+                    edges.append((node, node + size))
+        return WalkingGraph(node_lat, node_lng, edges)
+
+    def create_alerts(self, graph, count, rng):
+        """Insert random circle alerts over the graph area."""
+        SafetyAlert.objects.bulk_create([
+            SafetyAlert(
+                title=f'Benchmark alert {i}',
+                description='Synthetic alert for benchmark_routing',
+                alert_type='hazard',
+                severity=rng.choice(['low', 'medium', 'high', 'critical']),
+                location_type='circle',
+                latitude=round(float(graph.node_lat[node]), 6),
+                longitude=round(float(graph.node_lng[node]), 6),
+                radius=rng.uniform(20, 120),
+            )
+            for i, node in enumerate(rng.randrange(graph.node_count) for _ in range(count))
+        ])
+        # bulk_create skips save(), so fill in the bounding boxes here
+        for alert in SafetyAlert.objects.filter(title__startswith='Benchmark alert '):
+            alert.update_bounds()
+            alert.save()
+
+    def dijkstra(self, graph, source, target, costs):
+        """Reference shortest path cost without a heuristic."""
+        indptr = graph.indptr.tolist()
+        indices = graph.indices.tolist()
+        best = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if node == target:
+                return cost
+            if cost > best.get(node, math.inf):
+                continue
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                new_cost = cost + costs[edge]
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    heapq.heappush(heap, (new_cost, neighbor))
+        return math.inf
@@ -0,0 +1,119 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.alert_index import active_alert_index
+from accounts.alert_snapshot import active_alert_snapshot
+from accounts.models import SafetyAlert, SavedRoute, User
+from accounts.route_alerts import SavedRouteAlertChecker
+
+
+class Command(BaseCommand):
+    help = 'Measure how long re-flagging saved routes takes when an alert is published'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--routes',
+            type=int,
+            default=200000,
+            help='Synthetic saved routes (rolled back afterwards, default: 200000)',
+        )
+        parser.add_argument(
+            '--alerts',
+            type=int,
+            default=20,
+            help='Alerts published one at a time (default: 20)',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare the flags with a full check of every route',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        checker = SavedRouteAlertChecker()
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            self.create_routes(options['routes'], rng)
+            self.stdout.write(
+                f'{options["routes"]} saved routes created in {time.perf_counter() - start:.1f} s'
+            )
+
+            timings = []
+            candidates = []
+            for i in range(options['alerts']):
+                alert = SafetyAlert.objects.create(
+                    title=f'Benchmark alert {i}',
+                    description='Synthetic alert for benchmark_saved_route_alerts',
+                    alert_type='hazard',
+                    severity=rng.choice(['low', 'medium', 'high', 'critical']),
+                    location_type='circle',
+                    latitude=round(33.7756 + rng.uniform(-0.01, 0.01), 6),
+                    longitude=round(-84.3963 + rng.uniform(-0.01, 0.01), 6),
+                    radius=rng.uniform(20, 150),
+                )
+                # on_commit never fires inside this transaction
+                active_alert_snapshot.invalidate()
+                start = time.perf_counter()
+                checked, _, _ = checker.check_alerts({alert.id: None})
+                timings.append((time.perf_counter() - start) * 1000)
+                candidates.append(checked)
+
+            timings.sort()
+            self.stdout.write(
+                f'Per alert: median {timings[len(timings) // 2]:.1f} ms, max {timings[-1]:.1f} ms, '
+                f'{sum(candidates) / len(candidates):.0f} candidate routes on average '
+                f'({SavedRoute.objects.filter(has_alert=True).count()} routes flagged)'
+            )
+
+            if options['verify']:
+                index = active_alert_index.get()
+                wrong = 0
+                for route in SavedRoute.objects.filter(name__startswith='Benchmark route ').iterator():
+                    expected = {entry.id for entry, _ in index.route_hits(*zip(*route.route_points()))}
+                    linked = set(route.crossing_alerts.values_list('id', flat=True))
+                    if linked != expected or route.has_alert != bool(expected):
+                        wrong += 1
+                style = self.style.SUCCESS if not wrong else self.style.ERROR
+                self.stdout.write(style(f'Verified against a full check: {wrong} routes differ'))
+
+            # Never keep synthetic rows
+            transaction.set_rollback(True)
+        active_alert_snapshot.invalidate()
+
+    def create_routes(self, count, rng):
+        """Short campus trips between random points."""
+        user, _ = User.objects.get_or_create(
+            username='benchmark-routes',
+            defaults={'email': 'benchmark-routes@example.com'},
+        )
+        routes = []
+        for i in range(count):
+            origin_lat = 33.7756 + rng.uniform(-0.015, 0.015)
+            origin_lng = -84.3963 + rng.uniform(-0.015, 0.015)
+            route = SavedRoute(
+                user=user,
+                name=f'Benchmark route {i}',
+                origin_lat=round(origin_lat, 6),
+                origin_lng=round(origin_lng, 6),
+                destination_lat=round(origin_lat + rng.uniform(-0.006, 0.006), 6),
+                destination_lng=round(origin_lng + rng.uniform(-0.006, 0.006), 6),
+                destination_name='Somewhere',
+                distance_text='',
+                duration_text='',
+                distance_value=0,
+                duration_value=0,
+            )
+            # bulk_create skips save(), so fill in the bounding box here
+            route.update_bounds()
+            routes.append(route)
+        SavedRoute.objects.bulk_create(routes, batch_size=5000)
@@ -0,0 +1,125 @@
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.management.commands.fetch_waitz_occupancy import Command as FetchCommand
+from accounts.models import Building, WaitzFeedState
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serves the server's current feed, with an ETag when validators are on."""
+
+    def do_GET(self):
+        body = self.server.body
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.server.validators and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.validators:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Run Waitz ingests against a local feed stub to time change detection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--buildings',
+            type=int,
+            default=2000,
+            help='Synthetic buildings, each in the feed (default: 2000)',
+        )
+        parser.add_argument(
+            '--change',
+            type=float,
+            default=0.1,
+            help='Share of entries changed in the partly changed feed (default: 0.1)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        count = options['buildings']
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+        server.validators = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}/live/gatech'
+        feed = [
+            {'id': f'bench-{i}', 'name': f'Benchmark Feed {i}', 'busyness': rng.randrange(100), 'hourSummary': '7am - 11pm'}
+            for i in range(count)
+        ]
+
+        def serve(validators):
+            server.body = json.dumps({'data': feed}).encode()
+            server.validators = validators
+
+        def run(label, force=False):
+            start = time.perf_counter()
+            FetchCommand(stdout=io.StringIO()).fetch_all_buildings_from_waitz(feed_url=url, force=force)
+            elapsed = (time.perf_counter() - start) * 1000
+            state = WaitzFeedState.objects.get(url=url)
+            self.stdout.write(f'  {label:<36} {elapsed:7.0f} ms  {state.last_run_summary}')
+
+        try:
+            with transaction.atomic():
+                Building.objects.bulk_create([
+                    Building(
+                        name=f'Benchmark Feed {i}', code=f'BENCH-FEED-{i}', address='',
+                        latitude=33.7756, longitude=-84.3963, waitz_id=f'bench-{i}',
+                    )
+                    for i in range(count)
+                ])
+                self.stdout.write(f'{count} buildings, feed served from {url}')
+
+                serve(validators=True)
+                run('First run')
+                run('Same feed, ETag sent back (304)')
+
+                serve(validators=False)
+                run('Same feed, no validators')
+
+                for entry in rng.sample(feed, int(count * options['change'])):
+                    entry['busyness'] = (entry['busyness'] + 1 + rng.randrange(98)) % 100
+                serve(validators=False)
+                run(f'{options["change"]:.0%} of entries changed')
+
+                # Overnight: everything closes once, then nothing moves
+                for entry in feed:
+                    entry.update(busyness=0, hourSummary='Closed')
+                serve(validators=False)
+                run('Everything closed')
+                run('Still closed')
+
+                run('Still closed, --force', force=True)
+
+                state = WaitzFeedState.objects.get(url=url)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Skipped {state.entries_skipped} of {state.entries_seen} entries over {state.runs} runs '
+                    f'({state.not_modified_runs} not modified, {state.unchanged_runs} identical)'
+                ))
+
+                # Never keep synthetic rows
+                transaction.set_rollback(True)
+        finally:
+            server.shutdown()
+            server.server_close()
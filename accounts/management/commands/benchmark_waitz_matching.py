@@ -0,0 +1,110 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from accounts.models import Building
+from accounts.waitz import STOP_WORDS, WaitzMatcher
+
+WORDS = [
+    'clough', 'undergraduate', 'learning', 'price', 'gilbert', 'memorial', 'crosland', 'student', 'klaus',
+    'advanced', 'computing', 'howey', 'physics', 'skiles', 'college', 'engineering', 'molecular', 'science',
+    'technology', 'square', 'research', 'campus', 'recreation', 'north', 'west', 'east', 'village', 'marcus',
+    'nanotechnology', 'ford', 'environmental', 'biotechnology', 'bunger', 'henry', 'mason', 'boggs', 'love',
+    'manufacturing', 'instructional', 'van', 'leer', 'weber', 'space', 'management', 'scheller', 'global',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare Waitz building matching with the word index against the previous all-pairs scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--buildings',
+            type=int,
+            default=2000,
+            help='Synthetic buildings (default: 2000)',
+        )
+        parser.add_argument(
+            '--entries',
+            type=int,
+            default=2000,
+            help='Synthetic Waitz feed entries (default: 2000)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        common = sorted(STOP_WORDS - {'the', 'and', 'of'})
+        # Campus words plus rarer ones (donor names, departments)
+        syllables = ['ba', 'ker', 'lin', 'mor', 'ton', 'ash', 'ley', 'fer', 'gus', 'ri', 'son', 'wel']
+        vocabulary = WORDS + sorted({
+            ''.join(rng.choice(syllables) for _ in range(3)) for _ in range(options['entries'])
+        })
+        names = []
+        for _ in range(options['entries']):
+            words = rng.sample(WORDS, rng.randint(1, 2)) + rng.sample(vocabulary, 2) + [rng.choice(common)]
+            names.append(' '.join(word.title() for word in words) + f' {rng.randrange(10000)}')
+        entries = [{'id': 1000 + i, 'name': name} for i, name in enumerate(names)]
+
+        buildings = []
+        for i in range(options['buildings']):
+            roll = rng.random()
+            if roll < 0.4:
+                name = rng.choice(names)  # exact
+            elif roll < 0.7:
+                words = rng.choice(names).split()
+                name = ' '.join(words[:-1] + [rng.choice(vocabulary).title()])  # renamed a little
+            else:
+                name = ' '.join(word.title() for word in rng.sample(vocabulary, 3))
+            buildings.append(Building(name=name, code=f'B{i}'))
+
+        start = time.perf_counter()
+        expected = [self.scan(building, entries) for building in buildings]
+        scan_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        matcher = WaitzMatcher(entries)
+        found = [matcher.match(building) for building in buildings]
+        index_ms = (time.perf_counter() - start) * 1000
+
+        # Confirmed mappings: the next run looks ids up directly
+        for building, (entry, _) in zip(buildings, found):
+            if entry is not None:
+                building.waitz_id = str(entry['id'])
+        start = time.perf_counter()
+        matcher = WaitzMatcher(entries)
+        by_id = [matcher.match(building) for building in buildings]
+        id_ms = (time.perf_counter() - start) * 1000
+
+        matched = sum(entry is not None for entry, _ in found)
+        agree = sum((a is None) == (b is None) for a, (b, _) in zip(expected, found))
+        same = sum(a is b for a, (b, _) in zip(expected, found) if a is not None)
+        self.stdout.write(f'{len(buildings)} buildings x {len(entries)} feed entries, {matched} matched')
+        self.stdout.write(f'  All-pairs scan:       {scan_ms:8.1f} ms')
+        self.stdout.write(f'  Word index:           {index_ms:8.1f} ms (index build included)')
+        self.stdout.write(f'  Stored Waitz ids:     {id_ms:8.1f} ms ({sum(e is not None for e, _ in by_id)} matched)')
+        self.stdout.write(
+            f'Same matched/unmatched outcome for {agree} of {len(buildings)} buildings; '
+            f'same entry for {same} of {sum(a is not None for a in expected)} scan matches '
+            f'(the index prefers the entry with most words in common over feed order)'
+        )
+
+    def scan(self, building, entries):
+        """The previous matcher: exact name, then first partial match in feed order."""
+        for entry in entries:
+            if building.name.lower() == entry.get('name', '').lower():
+                return entry
+        for entry in entries:
+            waitz_name = entry.get('name', '')
+            db_name_parts = set(building.name.lower().split()) - STOP_WORDS
+            waitz_name_parts = set(waitz_name.lower().split()) - STOP_WORDS
+            if len(db_name_parts & waitz_name_parts) >= 2:
+                return entry
+            if waitz_name.lower() in building.name.lower() or building.name.lower() in waitz_name.lower():
+                return entry
+        return None
@@ -0,0 +1,95 @@
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import Building
+from accounts.routing import WalkingGraph, campus_router
+from accounts.walking_matrix import WalkingTimeMatrix, build_matrix, matrix_lock, update_matrix
+
+
+class Command(BaseCommand):
+    help = 'Compute building-to-building walking times over the campus walking graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every pair instead of only buildings that moved, were added or removed',
+        )
+        parser.add_argument(
+            '--graph',
+            type=str,
+            default=None,
+            help='Walking graph file (default: WALKING_GRAPH_PATH)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Matrix file (default: WALKING_MATRIX_PATH)',
+        )
+        parser.add_argument(
+            '--verify',
+            type=int,
+            default=0,
+            metavar='N',
+            help='Check N random pairs against an A* search',
+        )
+
+    def handle(self, *args, **options):
+        path = options['output'] or getattr(settings, 'WALKING_MATRIX_PATH', None)
+        if not path:
+            raise CommandError('Set WALKING_MATRIX_PATH or pass --output')
+
+        if options['graph']:
+            graph = WalkingGraph.load(options['graph'])
+        else:
+            graph = campus_router.get_graph()
+        if graph is None or not graph.node_count:
+            raise CommandError('No walking graph available (see WALKING_GRAPH_PATH)')
+
+        speed = getattr(settings, 'WALKING_SPEED_MPS', 1.4)
+        buildings = list(Building.objects.order_by('id').values_list('id', 'latitude', 'longitude'))
+        self.stdout.write(f'{len(buildings)} buildings, graph with {graph.node_count} nodes')
+
+        start = time.perf_counter()
+        with matrix_lock(path):
+            if options['full']:
+                build_matrix(graph, buildings, path, speed)
+                result = None
+            else:
+                result = update_matrix(graph, buildings, path, speed)
+        elapsed = time.perf_counter() - start
+
+        if result is None:
+            self.stdout.write(self.style.SUCCESS(
+                f'Built the full {len(buildings)} x {len(buildings)} matrix in {elapsed:.1f} s -> {path}'
+            ))
+        else:
+            moved, added, removed = result
+            self.stdout.write(self.style.SUCCESS(
+                f'Updated {path} in {elapsed:.2f} s: {moved} moved, {added} added, {removed} removed'
+            ))
+
+        if options['verify']:
+            self.verify(graph, path, speed, options['verify'])
+
+    def verify(self, graph, path, speed, count):
+        """Compare random matrix entries with fresh A* searches."""
+        matrix = WalkingTimeMatrix(path)
+        ids = matrix.meta['building_ids']
+        rng = random.Random(42)
+        wrong = 0
+        for _ in range(count):
+            a, b = rng.randrange(len(ids)), rng.randrange(len(ids))
+            if a == b:
+                continue
+            _, distance = graph.shortest_path(matrix.meta['nodes'][a], matrix.meta['nodes'][b])
+            expected = (matrix.meta['snap_m'][a] + distance + matrix.meta['snap_m'][b]) / speed
+            actual = float(matrix.times[a, b])
+            if not (np.isclose(actual, expected, rtol=1e-5) or (np.isinf(actual) and np.isinf(expected))):
+                wrong += 1
+        style = self.style.SUCCESS if not wrong else self.style.ERROR
+        self.stdout.write(style(f'Verified against A*: {wrong} of {count} pairs differ'))
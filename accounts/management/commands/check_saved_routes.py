@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.alert_snapshot import active_alert_snapshot
+from accounts.models import SafetyAlert, SavedRoute
+from accounts.route_alerts import saved_route_checker
+
+
+class Command(BaseCommand):
+    help = 'Re-check which saved routes cross an active safety alert'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-check the routes around every active alert (e.g. after migrating)',
+        )
+        parser.add_argument(
+            '--since',
+            type=int,
+            default=15,
+            help='Also re-check alerts whose start date passed in the last N minutes (default: 15)',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Alerts that expire or start on their own send no signal. Catch them
+        up here: every alert still linked to a route but no longer active,
+        plus alerts that became active recently.
+        """
+        # Don't wait for the snapshot's own change check
+        active_alert_snapshot.invalidate()
+        active_ids = {entry.id for entry in active_alert_snapshot.get().entries}
+        linked_ids = set(
+            SavedRoute.crossing_alerts.through.objects.values_list('safetyalert_id', flat=True).distinct()
+        )
+
+        if options['all']:
+            alert_ids = active_ids | linked_ids
+        else:
+            now = timezone.now()
+            started = set(
+                SafetyAlert.objects.filter(
+                    start_date__gt=now - timedelta(minutes=options['since']),
+                    start_date__lte=now,
+                ).values_list('id', flat=True)
+            )
+            alert_ids = (linked_ids - active_ids) | (started & active_ids)
+
+        if not alert_ids:
+            self.stdout.write('No alerts to re-check')
+            return
+
+        candidates, flagged, cleared = saved_route_checker.check_alerts(dict.fromkeys(alert_ids))
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {candidates} saved routes around {len(alert_ids)} alerts: '
+            f'{flagged} newly flagged, {cleared} cleared'
+        ))
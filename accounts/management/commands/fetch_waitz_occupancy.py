@@ -1,10 +1,26 @@
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
-from accounts.models import Building
+from accounts.forecast import update_forecasts
+from accounts.models import Building, WaitzFeedState
+from accounts.occupancy import occupancy_status, record_samples
+from accounts.outbound import outbound
+from accounts.polling import feed_readings, schedule_next_poll
+from accounts.waitz import WaitzMatcher, buildings_version, entry_fingerprint, entry_key, names_fingerprint
 import requests
 from bs4 import BeautifulSoup
+import hashlib
+import json
 import re
 import time
+from collections import defaultdict
+
+# Columns an ingest writes; nothing else on the row is touched
+OCCUPANCY_FIELDS = [
+    'current_occupancy_percent', 'occupancy_status', 'occupancy_last_updated',
+    'best_study_spot', 'operating_hours', 'waitz_id',
+]
 
 
 class Command(BaseCommand):
@@ -19,42 +35,92 @@ class Command(BaseCommand):
         parser.add_argument(
             '--waitz-id',
             type=str,
-            help='Waitz ID for the building (required if building-code not provided)',
+            help='Waitz ID to store for --building-code, overriding name matching',
         )
         parser.add_argument(
             '--all',
             action='store_true',
             help='Update all buildings with waitz_id set',
         )
+        parser.add_argument(
+            '--feed-url',
+            type=str,
+            help='Waitz feed to fetch instead of WAITZ_FEED_URL',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Ingest the whole feed even if it has not changed since the last run',
+        )
 
     def handle(self, *args, **options):
         if options['all']:
             # Fetch from main Waitz page for all buildings at once
-            self.fetch_all_buildings_from_waitz()
+            # (a failed run exits with an error, so the scheduler records it)
+            if not self.fetch_all_buildings_from_waitz(feed_url=options['feed_url'], force=options['force']):
+                raise CommandError('Waitz occupancy update failed')
         elif options['building_code']:
+            if options['waitz_id']:
+                # Confirm the mapping by hand; matching then uses the id
+                # (updated_at changes buildings_version, so full runs match again)
+                updated = Building.objects.filter(code=options['building_code']).update(
+                    waitz_id=options['waitz_id'], updated_at=timezone.now(),
+                )
+                if not updated:
+                    self.stdout.write(self.style.ERROR(f'No building with code {options["building_code"]}'))
+                    return
             # For single building, still fetch from main page
-            self.fetch_all_buildings_from_waitz(specific_code=options['building_code'])
+            self.fetch_all_buildings_from_waitz(specific_code=options['building_code'], feed_url=options['feed_url'])
         else:
             self.stdout.write(self.style.ERROR('Please provide --building-code or --all'))
 
-    def fetch_all_buildings_from_waitz(self, specific_code=None):
+    def fetch_all_buildings_from_waitz(self, specific_code=None, feed_url=None, force=False):
         """
         Fetch occupancy data for all buildings from the Waitz API.
         This is more efficient than individual requests per building.
+        Full runs skip what hasn't changed since the last run (see
+        ingest_feed_changes); force ingests everything anyway. Returns
+        whether the feed was fetched and ingested.
         """
         try:
-            url = 'https://waitz.io/live/gatech'
+            url = feed_url or getattr(settings, 'WAITZ_FEED_URL', 'https://waitz.io/live/gatech')
             self.stdout.write(f'Fetching data from Waitz API: {url}...')
             
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
             
-            response = requests.get(url, headers=headers, timeout=15)
+            # Runs for one building ingest whatever matches and leave the state alone
+            state = None
+            if not specific_code:
+                state = WaitzFeedState.objects.filter(url=url).first() or WaitzFeedState(url=url)
+                before = feed_readings(state)
+                if state.pk and not force:
+                    if state.etag:
+                        headers['If-None-Match'] = state.etag
+                    if state.last_modified:
+                        headers['If-Modified-Since'] = state.last_modified
+            
+            response = outbound.get(url, headers=headers, timeout=15)
+            
+            if response.status_code == 304 and state is not None and state.pk:
+                state.not_modified_runs += 1
+                self.finish_feed_run(state, self.replay_unchanged_feed(state) + ' (304 Not Modified)', before)
+                return True
             
             if response.status_code != 200:
                 self.stdout.write(self.style.ERROR(f'Failed to fetch Waitz API: HTTP {response.status_code}'))
-                return
+                return False
+            
+            fingerprint = hashlib.sha1(response.content).hexdigest()
+            if state is not None:
+                state.etag = response.headers.get('ETag', '')
+                state.last_modified = response.headers.get('Last-Modified', '')
+                if (not force and state.pk and state.fingerprint == fingerprint
+                        and state.buildings_version == buildings_version()):
+                    state.unchanged_runs += 1
+                    self.finish_feed_run(state, self.replay_unchanged_feed(state) + ' (identical response)', before)
+                    return True
             
             # Parse JSON response
             try:
@@ -62,92 +128,213 @@ class Command(BaseCommand):
                 waitz_buildings = data.get('data', [])
             except ValueError:
                 self.stdout.write(self.style.ERROR('Failed to parse JSON response from Waitz'))
-                return
+                return False
             
             if not waitz_buildings:
                 self.stdout.write(self.style.WARNING('No building data found in Waitz API response'))
-                return
+                return False
             
             self.stdout.write(f'Found {len(waitz_buildings)} buildings from Waitz API')
-            
-            # Match Waitz buildings to our database buildings
-            updated_count = 0
-            
-            # Get buildings to update
-            if specific_code:
-                buildings = Building.objects.filter(code=specific_code)
+            if state is None:
+                self.ingest_waitz_data(waitz_buildings, specific_code)
             else:
-                buildings = Building.objects.all()
-            
-            for building in buildings:
-                # Try to match by name (case-insensitive, fuzzy matching)
-                matched_data = self.match_building_api(building, waitz_buildings)
-                
-                if matched_data:
-                    self.update_building_with_api_data(building, matched_data)
-                    updated_count += 1
-            
-            self.stdout.write(self.style.SUCCESS(f'✓ Successfully updated {updated_count} buildings'))
+                if force:
+                    state.entries = '{}'
+                summary = self.ingest_feed_changes(state, waitz_buildings)
+                state.fingerprint = fingerprint
+                self.finish_feed_run(state, summary, before)
+            return True
             
         except requests.exceptions.RequestException as e:
             self.stdout.write(self.style.ERROR(f'✗ Error fetching Waitz API: {str(e)}'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'✗ Error processing Waitz data: {str(e)}'))
+        return False
     
-    def match_building_api(self, db_building, waitz_buildings):
+    def finish_feed_run(self, state, summary, before):
+        now = timezone.now()
+        schedule_next_poll(state, before, now)
+        state.runs += 1
+        state.checked_at = now
+        state.last_run_summary = summary[:255]
+        state.save()
+        self.stdout.write(
+            f'  {summary}. So far {state.entries_skipped} of {state.entries_seen} entries skipped over '
+            f'{state.runs} runs ({state.not_modified_runs} not modified, {state.unchanged_runs} identical)'
+        )
+        self.stdout.write(f'  Next poll in {state.poll_interval} s ({state.poll_reason})')
+    
+    def ingest_waitz_data(self, waitz_buildings, specific_code=None, building_ids=None, other_readings=()):
         """
-        Try to match a database building with Waitz API data.
-        Uses fuzzy name matching.
+        Match Waitz API entries to buildings and write the occupancy fields
+        that changed. building_ids limits the run to those buildings, and
+        other_readings are (building id, percent) readings of buildings left
+        out, which still go into the history and forecasts. Returns (rows
+        written, rows skipped, seconds, {building id: (entry, percent)}).
         """
-        # Try exact match first
-        for waitz_bldg in waitz_buildings:
-            waitz_name = waitz_bldg.get('name', '')
-            if db_building.name.lower() == waitz_name.lower():
-                return waitz_bldg
-        
-        # Try partial match
-        for waitz_bldg in waitz_buildings:
-            waitz_name = waitz_bldg.get('name', '')
-            
-            # Check if significant parts of the name match
-            db_name_parts = set(db_building.name.lower().split())
-            waitz_name_parts = set(waitz_name.lower().split())
-            
-            # Remove common words
-            common_words = {'building', 'hall', 'center', 'tower', 'library', 'commons', 'the', 'and', 'of'}
-            db_name_parts -= common_words
-            waitz_name_parts -= common_words
+        # Match Waitz buildings to our database buildings
+        start = time.perf_counter()
+        now = timezone.now()
+        matcher = WaitzMatcher(waitz_buildings)
+        matched_by = {'id': 0, 'name': 0, 'partial': 0}
+        changed = []
+        readings = []
+        matches = {}
+        skipped_count = 0
+        
+        # Get buildings to update (only the columns matching and the ingest use)
+        buildings = Building.objects.only('name', 'code', *OCCUPANCY_FIELDS)
+        if specific_code:
+            buildings = buildings.filter(code=specific_code)
+        if building_ids is not None:
+            buildings = buildings.filter(id__in=building_ids)
+        
+        for building in buildings:
+            # Stored waitz_id first, then exact and partial name matches
+            matched_data, how = matcher.match(building)
             
-            # If at least 2 significant words match, consider it a match
-            matching_words = db_name_parts & waitz_name_parts
-            if len(matching_words) >= 2:
-                self.stdout.write(f'  Matched: {db_building.name} → {waitz_name}')
-                return waitz_bldg
-            
-            # Check for abbreviations or partial matches
-            if waitz_name.lower() in db_building.name.lower() or db_building.name.lower() in waitz_name.lower():
-                self.stdout.write(f'  Matched: {db_building.name} → {waitz_name}')
-                return waitz_bldg
-        
-        return None
+            if matched_data:
+                matched_by[how] += 1
+                if how == 'partial':
+                    self.stdout.write(f'  Matched: {building.name} → {matched_data.get("name", "")}')
+                if self.update_building_with_api_data(building, matched_data, how):
+                    building.occupancy_last_updated = now
+                    changed.append(building)
+                else:
+                    skipped_count += 1
+                # The history gets a point every run, changed or not
+                readings.append((building.pk, building.current_occupancy_percent))
+                matches[building.pk] = (matched_data, building.current_occupancy_percent)
+        readings.extend(other_readings)
+        
+        with transaction.atomic():
+            statements = self.write_occupancy(changed)
+            sampled = record_samples(readings, now)
+        elapsed = time.perf_counter() - start
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Wrote {len(changed)} buildings in {statements} UPDATEs, skipped {skipped_count} unchanged, '
+            f'recorded {sampled} samples, {elapsed * 1000:.0f} ms ({matched_by["id"]} matched by Waitz ID, '
+            f'{matched_by["name"]} by name, {matched_by["partial"]} by partial name)'
+        ))
+        self.forecast_readings(readings, now)
+        return len(changed), skipped_count, elapsed, matches
+    
+    def forecast_readings(self, readings, now):
+        """Update next-hour forecasts from readings."""
+        # Forecasts are a bonus; the readings themselves are already stored
+        start = time.perf_counter()
+        try:
+            forecasted = update_forecasts(readings, now)
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'Could not update forecasts: {str(e)}'))
+        else:
+            self.stdout.write(
+                f'  Updated next-hour forecasts for {forecasted} buildings in '
+                f'{(time.perf_counter() - start) * 1000:.0f} ms'
+            )
+    
+    def ingest_feed_changes(self, state, waitz_buildings):
+        """
+        Ingest a fresh feed against the state of the last run. While entry
+        ids and names and the building table are unchanged, matches are
+        reused and only entries whose fingerprint changed are ingested;
+        otherwise the whole feed is. Updates state (unsaved).
+        """
+        previous = json.loads(state.entries) if state.pk else {}
+        fingerprints = {}
+        for entry in waitz_buildings:
+            # Matching uses the first entry for an id, so only that one counts
+            fingerprints.setdefault(entry_key(entry), (entry_fingerprint(entry), entry))
+        names = names_fingerprint(waitz_buildings)
+        version = buildings_version()
+        
+        if previous and (state.names_fingerprint, state.buildings_version) == (names, version):
+            changed_keys = {key for key, (fingerprint, _) in fingerprints.items() if previous[key][0] != fingerprint}
+            building_ids = []
+            other_readings = []
+            for key, (_, matched) in previous.items():
+                if key in changed_keys:
+                    building_ids.extend(building_id for building_id, _ in matched)
+                else:
+                    other_readings.extend(matched)
+            entries = [fingerprints[key][1] for key in changed_keys]
+            *_, matches = self.ingest_waitz_data(entries, building_ids=building_ids, other_readings=other_readings)
+            skipped = len(fingerprints) - len(changed_keys)
+            summary = (
+                f'Ingested {len(changed_keys)} changed of {len(fingerprints)} feed entries '
+                f'({len(building_ids)} buildings); skipped matching and writes for {skipped} unchanged entries '
+                f'({len(other_readings)} buildings)'
+            )
+        else:
+            changed_keys = set(fingerprints)
+            *_, matches = self.ingest_waitz_data(waitz_buildings)
+            skipped = 0
+            reason = 'entry names or buildings changed' if previous else 'no earlier matches to reuse'
+            summary = f'Ingested all {len(fingerprints)} feed entries ({reason})'
+        
+        by_key = {key: [fingerprint, []] for key, (fingerprint, _) in fingerprints.items()}
+        for key in fingerprints.keys() - changed_keys:
+            by_key[key][1] = previous[key][1]
+        for building_id, (entry, percent) in matches.items():
+            by_key[entry_key(entry)][1].append([building_id, percent])
+        state.entries = json.dumps(by_key, separators=(',', ':'))
+        state.names_fingerprint = names
+        state.buildings_version = version
+        state.entries_seen += len(fingerprints)
+        state.entries_skipped += skipped
+        if changed_keys:
+            state.changed_at = timezone.now()
+        return summary
+    
+    def replay_unchanged_feed(self, state):
+        """
+        The feed is as it was on the last run: record the last readings
+        again for the history and forecasts, with no parsing, matching or
+        building writes.
+        """
+        now = timezone.now()
+        entries = json.loads(state.entries)
+        readings = [tuple(reading) for _, matched in entries.values() for reading in matched]
+        sampled = record_samples(readings, now)
+        self.forecast_readings(readings, now)
+        state.entries_seen += len(entries)
+        state.entries_skipped += len(entries)
+        return f'Skipped all feed entries, recorded {sampled} samples from the last readings'
+    
+    def write_occupancy(self, buildings, batch_size=500):
+        """
+        Save the occupancy columns of buildings in one transaction. Rows
+        getting the same values share an UPDATE: occupancy takes few
+        distinct values, and a plain UPDATE ... WHERE id IN (...) is far
+        cheaper for the ORM to build than bulk_update's per-row CASE
+        expressions. Returns the number of UPDATE statements.
+        """
+        groups = defaultdict(list)
+        for building in buildings:
+            groups[tuple(getattr(building, field) for field in OCCUPANCY_FIELDS)].append(building.pk)
+        
+        statements = 0
+        with transaction.atomic():
+            for values, ids in groups.items():
+                for i in range(0, len(ids), batch_size):
+                    Building.objects.filter(pk__in=ids[i:i + batch_size]).update(**dict(zip(OCCUPANCY_FIELDS, values)))
+                    statements += 1
+        return statements
     
-    def update_building_with_api_data(self, building, waitz_data):
+    def update_building_with_api_data(self, building, waitz_data, how='id'):
         """
-        Update a building with occupancy data from Waitz API.
+        Apply occupancy data from the Waitz API to a building in memory.
+        Returns True if any occupancy field changed (the caller stamps
+        occupancy_last_updated and saves those in bulk), False if the row
+        can be skipped. how is how WaitzMatcher found the entry.
         """
         # Extract data from Waitz API response
         occupancy_percent = waitz_data.get('busyness') or waitz_data.get('percentage', 0) * 100
         occupancy_percent = int(occupancy_percent)
         
         # Determine status based on percentage
-        if occupancy_percent < 30:
-            status = 'not_busy'
-        elif occupancy_percent < 60:
-            status = 'moderate'
-        elif occupancy_percent < 80:
-            status = 'busy'
-        else:
-            status = 'very_busy'
+        status = occupancy_status(occupancy_percent)
         
         # Find best (least busy) study spot from sub-locations
         best_spot = self.find_best_study_spot(waitz_data.get('subLocs', []))
@@ -159,10 +346,11 @@ class Command(BaseCommand):
         elif operating_hours.lower() == 'closed':
             operating_hours = 'Closed'
         
+        before = [getattr(building, field) for field in OCCUPANCY_FIELDS]
+        
         # Update building
         building.current_occupancy_percent = occupancy_percent
         building.occupancy_status = status
-        building.occupancy_last_updated = timezone.now()
         
         # Update additional details if available
         if best_spot:
@@ -171,11 +359,13 @@ class Command(BaseCommand):
         if operating_hours:
             building.operating_hours = operating_hours
         
-        # Store Waitz ID for future reference
-        if not building.waitz_id and waitz_data.get('id'):
+        # Confirm exact name matches by storing the Waitz ID, so the next run
+        # matches by id; partial matches are only guesses and aren't stored
+        if how == 'name' and waitz_data.get('id'):
             building.waitz_id = str(waitz_data.get('id'))
         
-        building.save()
+        if [getattr(building, field) for field in OCCUPANCY_FIELDS] == before:
+            return False
         
         spot_info = f', Best: {best_spot[:30]}...' if best_spot else ''
         self.stdout.write(
@@ -183,6 +373,7 @@ class Command(BaseCommand):
                 f'✓ Updated {building.name}: {occupancy_percent}% ({status}) - {waitz_data.get("people", "?")} people{spot_info}'
             )
         )
+        return True
     
     def find_best_study_spot(self, sub_locs):
         """
@@ -359,7 +550,7 @@ class Command(BaseCommand):
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
             
-            response = requests.get(url, headers=headers, timeout=10)
+            response = outbound.get(url, headers=headers, timeout=10)
             
             if response.status_code == 200:
                 soup = BeautifulSoup(response.content, 'html.parser')
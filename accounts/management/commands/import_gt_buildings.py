@@ -1,9 +1,7 @@
 from django.core.management.base import BaseCommand
 from accounts.models import Building
+from accounts.geocoding import geocode
 import pandas as pd
-import requests
-import time
-from django.conf import settings
 
 
 class Command(BaseCommand):
@@ -19,7 +17,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--geocode',
             action='store_true',
-            help='Geocode addresses to get coordinates (requires Google Maps API key)'
+            help='Geocode addresses without coordinates (uses GEOCODER_BACKEND and the geocode cache)'
         )
 
     def handle(self, *args, **options):
@@ -45,17 +43,6 @@ class Command(BaseCommand):
             Building.objects.all().delete()
             self.stdout.write(self.style.WARNING('Cleared existing buildings'))
             
-            # Get Google Maps API key if geocoding
-            api_key = None
-            if geocode:
-                api_key = getattr(settings, 'GOOGLE_MAPS_API_KEY', None)
-                if not api_key:
-                    self.stdout.write(
-                        self.style.ERROR('Google Maps API key not found. Cannot geocode addresses.')
-                    )
-                    self.stdout.write('Set GOOGLE_MAPS_API_KEY in settings.py or use --no-geocode')
-                    return
-            
             created_count = 0
             skipped_count = 0
             
@@ -100,12 +87,11 @@ class Command(BaseCommand):
                             pass
                 
                 # If coordinates are missing, try geocoding if enabled
-                if (latitude is None or longitude is None) and geocode and api_key:
+                if (latitude is None or longitude is None) and geocode:
                     self.stdout.write(f'  Geocoding: {building_name}...')
-                    coordinates = self.geocode_address(full_address, api_key)
+                    coordinates = self.geocode_address(full_address)
                     if coordinates:
                         latitude, longitude = coordinates
-                        time.sleep(0.2)  # Rate limiting for API (200ms between requests)
                 
                 # Skip if we still don't have coordinates (coordinates are required)
                 if latitude is None or longitude is None:
@@ -182,55 +168,16 @@ class Command(BaseCommand):
             )
             raise
     
-    def geocode_address(self, address, api_key):
-        """Geocode an address using Google Maps Geocoding API"""
-        try:
-            url = 'https://maps.googleapis.com/maps/api/geocode/json'
-            
-            # Ensure address includes Atlanta, GA for better results
-            if 'Atlanta' not in address and 'ATLANTA' not in address:
-                address = f"{address}, Atlanta, GA"
-            
-            params = {
-                'address': address,
-                'key': api_key
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json()
-            
-            if data['status'] == 'OK' and data['results']:
-                location = data['results'][0]['geometry']['location']
-                lat = location['lat']
-                lng = location['lng']
-                self.stdout.write(
-                    self.style.SUCCESS(f'  ✓ Geocoded: {address[:50]}... → ({lat}, {lng})')
-                )
-                return lat, lng
-            elif data['status'] == 'ZERO_RESULTS':
-                self.stdout.write(
-                    self.style.WARNING(f'  ✗ No results for: {address[:50]}...')
-                )
-                return None
-            elif data['status'] == 'OVER_QUERY_LIMIT':
-                self.stdout.write(
-                    self.style.ERROR('  ✗ Geocoding API quota exceeded. Please wait or check your quota.')
-                )
-                return None
-            else:
-                self.stdout.write(
-                    self.style.WARNING(f'  ✗ Geocoding failed ({data["status"]}): {address[:50]}...')
-                )
-                return None
-                
-        except requests.exceptions.RequestException as e:
+    def geocode_address(self, address):
+        """Geocode an address through the shared geocode cache"""
+        coordinates = geocode(address)
+        if coordinates:
+            lat, lng = coordinates
             self.stdout.write(
-                self.style.WARNING(f'  ✗ Geocoding request error for {address[:50]}...: {str(e)}')
+                self.style.SUCCESS(f'  ✓ Geocoded: {address[:50]}... → ({lat}, {lng})')
             )
-            return None
-        except Exception as e:
+        else:
             self.stdout.write(
-                self.style.WARNING(f'  ✗ Geocoding error for {address[:50]}...: {str(e)}')
+                self.style.WARNING(f'  ✗ No results for: {address[:50]}...')
             )
-            return None
-
+        return coordinates
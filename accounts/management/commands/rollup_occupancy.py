@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from accounts.forecast import fit_model
+from accounts.occupancy import expire_samples, refresh_predictions, rollup_samples
+
+
+class Command(BaseCommand):
+    help = 'Roll occupancy samples up into hour-of-week stats, expire old samples, refresh peak hours and refit the next-hour forecaster'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-samples',
+            action='store_true',
+            help='Do not delete samples past OCCUPANCY_SAMPLE_RETENTION_DAYS',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        merged, aggregates = rollup_samples()
+        expired = 0 if options['keep_samples'] else expire_samples()
+        refreshed = refresh_predictions()
+        fitted = fit_model()
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {merged} samples into {aggregates} hour-of-week stats, expired {expired} samples, '
+            f'refreshed peak hours for {refreshed} buildings, fitted forecasts for {fitted} buildings '
+            f'in {(time.perf_counter() - start) * 1000:.0f} ms'
+        ))
@@ -0,0 +1,74 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.scheduler import JOBS, scheduler_status, start_scheduler, stop_scheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the scheduled jobs in this process; one leader across all scheduler processes runs them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--identity',
+            type=str,
+            help='Name this process holds the leader lease under (default: host:pid)',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Show the current leader and each job\'s last run, then exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.show_status()
+            return
+
+        started = start_scheduler(options['identity'])
+        if started is None:
+            raise CommandError('APScheduler is not installed (pip install apscheduler)')
+        scheduler, lease = started
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        role = 'leader' if lease.is_leader() else 'standby'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scheduler running as {lease.identity} ({role}) with jobs: {", ".join(JOBS)}. Ctrl+C to stop.'
+        ))
+        try:
+            while not stop.wait(1):
+                leader = lease.is_leader()
+                if leader != (role == 'leader'):
+                    role = 'leader' if leader else 'standby'
+                    self.stdout.write(f'Now {role}')
+        finally:
+            self.stdout.write('Stopping scheduler (waiting for running jobs)...')
+            stop_scheduler(scheduler, lease)
+
+    def show_status(self):
+        status = scheduler_status()
+        lease = status['lease']
+        if status['leader']:
+            self.stdout.write(f'Leader: {status["leader"]} (lease expires {lease.expires_at:%Y-%m-%d %H:%M:%S})')
+        else:
+            self.stdout.write(self.style.WARNING('Leader: none (no scheduler holds a current lease)'))
+        for entry in status['jobs']:
+            job = entry['status']
+            line = f'  {entry["id"]:<24} {entry["trigger"]} {entry["schedule"]:<12}'
+            if job is None:
+                self.stdout.write(f'{line} never run')
+                continue
+            last_success = f'{job.last_success_at:%Y-%m-%d %H:%M:%S}' if job.last_success_at else 'never'
+            self.stdout.write(
+                f'{line} last success {last_success}, last {self.format_ms(job.last_duration_ms)}, '
+                f'mean {self.format_ms(job.mean_duration_ms)}, max {self.format_ms(job.max_duration_ms)}, '
+                f'{job.runs} runs, {job.failures} failed'
+            )
+            if job.last_error:
+                self.stdout.write(self.style.ERROR(f'    last error: {job.last_error.splitlines()[0]}'))
+
+    def format_ms(self, value):
+        return f'{value:.0f} ms' if value is not None else '-'
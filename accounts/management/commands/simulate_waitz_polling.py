@@ -0,0 +1,256 @@
+import time
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts.models import OccupancySample
+from accounts.occupancy import campus_time, hour_of_week
+from accounts.polling import PollingPolicy, in_peak, peak_hours_from_means, peak_hours_of_week
+
+
+class Command(BaseCommand):
+    help = 'Replay recorded (or synthetic) Waitz readings through the adaptive polling policy and fixed intervals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Days of readings to replay (default: 7)',
+        )
+        parser.add_argument(
+            '--synthetic',
+            action='store_true',
+            help='Replay a synthetic minute-by-minute feed instead of the recorded occupancy samples',
+        )
+        parser.add_argument(
+            '--buildings',
+            type=int,
+            default=200,
+            help='Synthetic buildings (default: 200)',
+        )
+        parser.add_argument(
+            '--min-seconds',
+            type=int,
+            help='Shortest adaptive interval (default: WAITZ_POLL_MIN_SECONDS)',
+        )
+        parser.add_argument(
+            '--max-seconds',
+            type=int,
+            help='Longest adaptive interval (default: WAITZ_POLL_MAX_SECONDS)',
+        )
+        parser.add_argument(
+            '--drift-budget',
+            type=float,
+            help='Points readings may drift between adaptive polls (default: WAITZ_POLL_DRIFT_BUDGET)',
+        )
+        parser.add_argument(
+            '--fixed-seconds',
+            type=int,
+            help='Fixed interval to compare with (default: WAITZ_POLL_BASE_SECONDS)',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=5,
+            help='Points a shown reading may be off and still count as fresh (default: 5)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed',
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        if options['synthetic']:
+            start, times, values, peak_hours = self.synthetic_feed(
+                np.random.default_rng(options['seed']), options['buildings'], options['days'],
+            )
+            source = f'synthetic feed, {values.shape[0]} buildings, one reading a minute'
+        else:
+            start, times, values = self.recorded_feed(options['days'])
+            peak_hours = peak_hours_of_week()
+            source = f'recorded samples, {values.shape[0]} buildings, {len(times)} ingests'
+            self.stdout.write(
+                'Freshness is measured at the recorded ingests, so intervals no longer than the '
+                'recording interval show no error'
+            )
+        days = (times[-1] - times[0]) / 86400
+        self.stdout.write(
+            f'Replaying {days:.1f} days from {campus_time(start):%Y-%m-%d %H:%M} campus time ({source}); '
+            f'{len(peak_hours)} peak hours a week'
+        )
+
+        adaptive = PollingPolicy(
+            adaptive=True, min_seconds=options['min_seconds'], max_seconds=options['max_seconds'],
+            drift_budget=options['drift_budget'],
+        )
+        fixed = options['fixed_seconds'] or adaptive.base_seconds
+        policies = [
+            (f'Every {fixed // 60:g} min', PollingPolicy(adaptive=False, base_seconds=fixed)),
+            # As fresh at peak hours as the adaptive policy, all day
+            (f'Every {adaptive.peak_seconds // 60:g} min', PollingPolicy(adaptive=False, base_seconds=adaptive.peak_seconds)),
+            (f'Every {adaptive.min_seconds // 60:g} min', PollingPolicy(adaptive=False, base_seconds=adaptive.min_seconds)),
+            (f'Adaptive {adaptive.min_seconds}-{adaptive.max_seconds} s', adaptive),
+        ]
+
+        # Hour of the week of each reading, for the peak-hour and overnight columns
+        hours = np.array([hour_of_week(start + timedelta(seconds=float(t - times[0]))) for t in times])
+        in_peak_hours = np.isin(hours, list(peak_hours))
+        overnight = hours % 24 < 6
+
+        results = []
+        for label, policy in policies:
+            poll_times, poll_snapshots, reasons = self.replay(policy, start, times, values, peak_hours)
+            stats = self.freshness(times, values, poll_times, poll_snapshots, options['tolerance'], in_peak_hours)
+            stats['overnight'] = int(overnight[poll_snapshots].sum())
+            results.append((label, len(poll_times), stats, reasons))
+
+        self.stdout.write(
+            f'  {"Policy":<22} {"Requests":>8} {"Per day":>8} {"Overnight":>9} {"Mean err":>9} {"Peak err":>9} '
+            f'{"p95 err":>8} {"Stale":>7} {"Mean age":>9}'
+        )
+        for label, requests, stats, _ in results:
+            self.stdout.write(
+                f'  {label:<22} {requests:>8} {requests / days:>8.0f} {stats["overnight"]:>9} '
+                f'{stats["mean_error"]:>9.2f} {stats["peak_error"]:>9.2f} {stats["p95_error"]:>8.0f} '
+                f'{stats["stale"]:>7.1%} {stats["mean_age"] / 60:>7.1f} m'
+            )
+        self.stdout.write(
+            f'  (error in points against the feed at each reading, overall and in peak hours; '
+            f'overnight = midnight to 6am; stale = off by more than {options["tolerance"]:g} points)'
+        )
+
+        label, requests, stats, reasons = results[-1]
+        self.stdout.write('  Adaptive intervals by reason: ' + ', '.join(
+            f'{reason} {count}' for reason, count in reasons.most_common()
+        ))
+        for fixed_label, fixed_requests, fixed, _ in results[:2]:
+            self.stdout.write(
+                f'  vs {fixed_label.lower()}: {requests - fixed_requests:+d} requests ({requests / fixed_requests - 1:+.0%}), '
+                f'mean error {stats["mean_error"]:.2f} vs {fixed["mean_error"]:.2f} points, '
+                f'in peak hours {stats["peak_error"]:.2f} vs {fixed["peak_error"]:.2f}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Replayed in {time.perf_counter() - start_time:.1f} s'))
+
+    def replay(self, policy, start, times, values, peak_hours):
+        """
+        Poll the replayed feed as the scheduler would: each poll sees the
+        latest reading at that moment. Returns (poll times, snapshot index
+        of each poll, Counter of interval reasons).
+        """
+        poll_times = []
+        poll_snapshots = []
+        reasons = Counter()
+        now = times[0]
+        previous = None
+        rate = None
+        interval = None
+        while now <= times[-1]:
+            snapshot = int(np.searchsorted(times, now, side='right')) - 1
+            column = values[:, snapshot]
+            readings = {i: int(percent) for i, percent in enumerate(column) if not np.isnan(percent)}
+            if previous is not None:
+                rate = policy.change_rate(rate, previous, readings, now - poll_times[-1])
+            moment = start + timedelta(seconds=float(now - times[0]))
+            peak = policy.adaptive and in_peak(moment, peak_hours, policy.max_seconds)
+            interval, reason = policy.next_interval(interval, rate, any(readings.values()), peak, moment)
+            reasons[reason] += 1
+            poll_times.append(now)
+            poll_snapshots.append(snapshot)
+            previous = readings
+            now += interval
+        return np.array(poll_times), np.array(poll_snapshots), reasons
+
+    def freshness(self, times, values, poll_times, poll_snapshots, tolerance, in_peak_hours):
+        """
+        Errors of the readings shown between polls against every reading of
+        buildings that were open, and the mean age of what was shown.
+        """
+        last_poll = np.searchsorted(poll_times, times, side='right') - 1
+        shown = values[:, poll_snapshots[last_poll]]
+        open_readings = ~np.isnan(values) & ~np.isnan(shown) & ((values > 0) | (shown > 0))
+        errors = np.abs(shown - values)
+        peak_errors = errors[open_readings & in_peak_hours]
+        errors = errors[open_readings]
+        return {
+            'mean_error': errors.mean() if errors.size else 0.0,
+            'peak_error': peak_errors.mean() if peak_errors.size else 0.0,
+            'p95_error': np.percentile(errors, 95) if errors.size else 0.0,
+            'stale': (errors > tolerance).mean() if errors.size else 0.0,
+            'mean_age': (times - poll_times[last_poll]).mean(),
+        }
+
+    def recorded_feed(self, days):
+        """
+        (start, seconds since start of each ingest, readings) from the
+        occupancy samples of the last days. Buildings missing from an
+        ingest keep their last reading.
+        """
+        since = timezone.now() - timedelta(days=days)
+        rows = list(
+            OccupancySample.objects.filter(recorded_at__gte=since).order_by('recorded_at')
+            .values_list('building_id', 'percent', 'recorded_at')
+        )
+        if not rows:
+            raise CommandError(f'No occupancy samples in the last {days} days; use --synthetic to replay a synthetic feed')
+        moments = sorted({recorded_at for _, _, recorded_at in rows})
+        if (moments[-1] - moments[0]) < timedelta(hours=1):
+            raise CommandError('Less than an hour of occupancy samples to replay; use --synthetic to replay a synthetic feed')
+        columns = {moment: i for i, moment in enumerate(moments)}
+        buildings = {building_id: i for i, building_id in enumerate(sorted({row[0] for row in rows}))}
+        values = np.full((len(buildings), len(moments)), np.nan)
+        for building_id, percent, recorded_at in rows:
+            values[buildings[building_id], columns[recorded_at]] = percent
+
+        # Forward-fill gaps along each building's row
+        index = np.where(np.isnan(values), 0, np.arange(len(moments)))
+        np.maximum.accumulate(index, axis=1, out=index)
+        values = values[np.arange(len(buildings))[:, None], index]
+        times = np.array([(moment - moments[0]).total_seconds() for moment in moments])
+        return moments[0], times, values
+
+    def synthetic_feed(self, rng, count, days):
+        """
+        (start, times, readings, peak hours) of a minute-by-minute feed
+        starting on a Monday at midnight campus time. Each building has a
+        daily busy peak, persistent drift around it that's larger when it's
+        busier, and reads 0 while closed. An extra first week gives the hour-of-week history the
+        peak hours come from, as rollup_occupancy would.
+        """
+        week = 7 * 24 * 60
+        minutes = days * 24 * 60 + week
+        minute_of_day = np.arange(minutes) % (24 * 60) / 60
+        weekend = (np.arange(minutes) // (24 * 60)) % 7 >= 5
+        peak = rng.uniform(11, 16, (count, 1))
+        width = rng.uniform(2, 5, (count, 1))
+        height = rng.uniform(30, 80, (count, 1)) * np.where(weekend, rng.uniform(0.3, 0.9, (count, 1)), 1.0)
+        profile = 5 + height * np.exp(-((minute_of_day - peak) / width) ** 2)
+        opens = rng.integers(6, 9, (count, 1))
+        closes = rng.integers(21, 25, (count, 1))
+        open_minutes = (minute_of_day >= opens) & (minute_of_day < closes)
+
+        rho = rng.uniform(0.98, 0.995, count)
+        # Busier buildings swing more, as more people come and go
+        shocks = rng.normal(0, 1, (count, minutes)) * rng.uniform(0.3, 1.0, (count, 1)) * np.sqrt(profile / 25)
+        deviation = np.empty((count, minutes))
+        carry = np.zeros(count)
+        for minute in range(minutes):
+            carry = rho * carry + shocks[:, minute]
+            deviation[:, minute] = carry
+        values = np.clip(np.round(profile + deviation), 0, 100)
+        values[~open_minutes] = 0
+
+        # Monday midnight campus time, a whole extra week back
+        today = campus_time(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        monday = today - timedelta(days=today.weekday() + 7 * ((days + 6) // 7 + 1))
+        history = values[:, :week].reshape(count, 7 * 24, 60).mean(axis=(0, 2))
+        peak_hours = peak_hours_from_means(dict(enumerate(history)), getattr(settings, 'WAITZ_POLL_PEAK_FRACTION', 0.75))
+        start = monday + timedelta(days=7)
+        times = np.arange(minutes - week, dtype=float) * 60
+        return start, times, values[:, week:], peak_hours
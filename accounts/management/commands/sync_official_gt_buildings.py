@@ -1,27 +1,24 @@
 """
 Management command to sync official Georgia Tech buildings with accurate geocoded coordinates.
-Uses Google Geocoding API to ensure coordinates match building addresses precisely.
+Geocodes addresses through the shared geocode cache (GEOCODER_BACKEND).
 """
 
-import time
-import requests
 from django.core.management.base import BaseCommand
-from django.conf import settings
+from accounts.geocoding import geocode
 from accounts.models import Building
 
 
 class Command(BaseCommand):
     help = 'Sync official Georgia Tech buildings with accurate geocoded coordinates'
 
-    def handle(self, *args, **kwargs):
-        api_key = settings.GOOGLE_MAPS_API_KEY
-        
-        if not api_key:
-            self.stdout.write(
-                self.style.ERROR('❌ GOOGLE_MAPS_API_KEY not found in settings')
-            )
-            return
-        
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Ignore cached geocoding results and ask the geocoder again'
+        )
+
+    def handle(self, *args, **options):
         # Official Georgia Tech buildings from campus directory
         official_buildings = [
             {'name': '505 Tenth St', 'code': '155', 'address': '505 Tenth St. N.W., Atlanta, GA 30332'},
@@ -101,21 +98,11 @@ class Command(BaseCommand):
             self.stdout.write(f'Processing: {name} ({code})...')
             
             try:
-                # Geocode the address
-                url = 'https://maps.googleapis.com/maps/api/geocode/json'
-                params = {
-                    'address': address,
-                    'key': api_key
-                }
-                
-                response = requests.get(url, params=params, timeout=10)
-                data = response.json()
+                # Geocode the address (through the shared geocode cache)
+                coordinates = geocode(address, refresh=options['refresh'])
                 
-                if data['status'] == 'OK' and len(data['results']) > 0:
-                    result = data['results'][0]
-                    location = result['geometry']['location']
-                    lat = location['lat']
-                    lng = location['lng']
+                if coordinates:
+                    lat, lng = coordinates
                     
                     # Update or create building
                     building, created = Building.objects.update_or_create(
@@ -136,12 +123,9 @@ class Command(BaseCommand):
                         self.stdout.write(self.style.SUCCESS(f'  ✓ Updated: {name} at ({lat:.6f}, {lng:.6f})'))
                         updated_count += 1
                 else:
-                    self.stdout.write(self.style.ERROR(f'  ❌ Geocoding failed: {data.get("status")}'))
+                    self.stdout.write(self.style.ERROR('  ❌ Geocoding failed'))
                     failed_count += 1
                 
-                # Rate limiting
-                time.sleep(0.15)
-                
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'  ❌ Error: {str(e)}'))
                 failed_count += 1
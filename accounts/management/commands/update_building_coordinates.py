@@ -1,27 +1,23 @@
-import os
-import time
-import requests
 from django.core.management.base import BaseCommand
+from accounts.geocoding import geocode
 from accounts.models import Building
-from django.conf import settings
 
 
 class Command(BaseCommand):
-    help = 'Update all building coordinates using Google Geocoding API for accuracy'
+    help = 'Update all building coordinates by geocoding their addresses'
 
-    def handle(self, *args, **kwargs):
-        api_key = settings.GOOGLE_MAPS_API_KEY
-        
-        if not api_key:
-            self.stdout.write(
-                self.style.ERROR('❌ GOOGLE_MAPS_API_KEY not found in settings')
-            )
-            return
-        
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Ignore cached geocoding results and ask the geocoder again'
+        )
+
+    def handle(self, *args, **options):
         buildings = Building.objects.all().order_by('name')
         total = buildings.count()
         
-        self.stdout.write(f'\n🔍 Updating coordinates for {total} buildings using Google Geocoding API...\n')
+        self.stdout.write(f'\n🔍 Updating coordinates for {total} buildings via the geocode cache...\n')
         
         updated_count = 0
         failed_count = 0
@@ -33,24 +29,12 @@ class Command(BaseCommand):
             address = building.address
             
             try:
-                # Call Google Geocoding API
-                url = 'https://maps.googleapis.com/maps/api/geocode/json'
-                params = {
-                    'address': address,
-                    'key': api_key
-                }
-                
-                response = requests.get(url, params=params, timeout=10)
-                data = response.json()
+                coordinates = geocode(address, refresh=options['refresh'])
                 
-                if data['status'] == 'OK' and len(data['results']) > 0:
-                    result = data['results'][0]
-                    location = result['geometry']['location']
-                    
+                if coordinates:
                     old_lat = building.latitude
                     old_lng = building.longitude
-                    new_lat = location['lat']
-                    new_lng = location['lng']
+                    new_lat, new_lng = coordinates
                     
                     # Update building coordinates
                     building.latitude = new_lat
@@ -58,8 +42,8 @@ class Command(BaseCommand):
                     building.save()
                     
                     # Calculate difference for verification
-                    lat_diff = abs(new_lat - old_lat) if old_lat else 0
-                    lng_diff = abs(new_lng - old_lng) if old_lng else 0
+                    lat_diff = abs(new_lat - float(old_lat)) if old_lat else 0
+                    lng_diff = abs(new_lng - float(old_lng)) if old_lng else 0
                     
                     self.stdout.write(
                         self.style.SUCCESS(
@@ -78,19 +62,11 @@ class Command(BaseCommand):
                 else:
                     self.stdout.write(
                         self.style.ERROR(
-                            f'  ❌ Geocoding failed: {data.get("status", "Unknown error")}'
+                            '  ❌ Geocoding failed'
                         )
                     )
                     failed_count += 1
                 
-                # Rate limiting: Google allows 50 requests/second, be conservative
-                time.sleep(0.1)
-                
-            except requests.RequestException as e:
-                self.stdout.write(
-                    self.style.ERROR(f'  ❌ Network error: {str(e)}')
-                )
-                failed_count += 1
             except Exception as e:
                 self.stdout.write(
                     self.style.ERROR(f'  ❌ Error: {str(e)}')
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_building_best_study_spot_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_address', models.CharField(max_length=500, unique=True, verbose_name='Normalized Address')),
+                ('address', models.TextField(help_text='Address as first submitted', verbose_name='Address')),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Latitude')),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Longitude')),
+                ('provider', models.CharField(blank=True, max_length=50, verbose_name='Provider')),
+                ('hit_count', models.IntegerField(default=0, verbose_name='Cache Hits')),
+                ('last_used', models.DateTimeField(blank=True, null=True, verbose_name='Last Used')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Geocode Cache Entry',
+                'verbose_name_plural': 'Geocode Cache',
+                'ordering': ['normalized_address'],
+            },
+        ),
+    ]
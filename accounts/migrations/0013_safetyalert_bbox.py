@@ -0,0 +1,102 @@
+# Generated by Django 5.0.14 on 2026-10-17 01:50
+
+import json
+import math
+
+from django.db import migrations, models
+
+# Frozen copies of the accounts.geo helpers as of this migration, so later
+# changes to that module can't change what this backfill computes
+METERS_PER_DEGREE_LAT = 6371008.8 * math.pi / 180.0
+
+
+def alert_bounds(location_type, latitude, longitude, radius, polygon):
+    if location_type == 'polygon' and polygon:
+        try:
+            lats = [float(point[0]) for point in polygon]
+            lngs = [float(point[1]) for point in polygon]
+        except (TypeError, ValueError, IndexError):
+            lats = lngs = []
+        if lats:
+            return min(lats), max(lats), min(lngs), max(lngs)
+
+    if latitude is None or longitude is None:
+        return None
+    lat = float(latitude)
+    lng = float(longitude)
+    if location_type == 'circle' and radius:
+        dlat = float(radius) / METERS_PER_DEGREE_LAT
+        dlng = float(radius) / max(METERS_PER_DEGREE_LAT * math.cos(math.radians(lat)), 1e-9)
+        return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+    return lat, lat, lng, lng
+
+
+def round_bounds(bounds):
+    min_lat, max_lat, min_lng, max_lng = bounds
+    return (
+        math.floor(min_lat * 1e6) / 1e6,
+        math.ceil(max_lat * 1e6) / 1e6,
+        math.floor(min_lng * 1e6) / 1e6,
+        math.ceil(max_lng * 1e6) / 1e6,
+    )
+
+
+def fill_bounds(apps, schema_editor):
+    """Compute bounding boxes for existing alerts."""
+    SafetyAlert = apps.get_model('accounts', 'SafetyAlert')
+    for alert in SafetyAlert.objects.all():
+        polygon = None
+        if alert.location_type == 'polygon' and alert.polygon_coordinates:
+            try:
+                polygon = json.loads(alert.polygon_coordinates)
+            except json.JSONDecodeError:
+                polygon = None
+        bounds = alert_bounds(alert.location_type, alert.latitude, alert.longitude, alert.radius, polygon)
+        if bounds is None:
+            continue
+        min_lat, max_lat, min_lng, max_lng = round_bounds(bounds)
+        updates = {
+            'bbox_min_lat': min_lat,
+            'bbox_max_lat': max_lat,
+            'bbox_min_lng': min_lng,
+            'bbox_max_lng': max_lng,
+        }
+        if alert.location_type == 'polygon' and (alert.latitude is None or alert.longitude is None):
+            updates['latitude'] = round((min_lat + max_lat) / 2, 6)
+            updates['longitude'] = round((min_lng + max_lng) / 2, 6)
+        SafetyAlert.objects.filter(pk=alert.pk).update(**updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_geocodecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='safetyalert',
+            name='bbox_max_lat',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='safetyalert',
+            name='bbox_max_lng',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='safetyalert',
+            name='bbox_min_lat',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='safetyalert',
+            name='bbox_min_lng',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='safetyalert',
+            index=models.Index(fields=['bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng'], name='safetyalert_bbox_idx'),
+        ),
+        migrations.RunPython(fill_bounds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:01
+
+import math
+
+from django.db import migrations, models
+
+
+def fill_bounds(apps, schema_editor):
+    """Compute bounding boxes for existing saved routes."""
+    SavedRoute = apps.get_model('accounts', 'SavedRoute')
+    for route in SavedRoute.objects.all():
+        lats = (float(route.origin_lat), float(route.destination_lat))
+        lngs = (float(route.origin_lng), float(route.destination_lng))
+        # Rounded outwards to the columns' 6 decimals
+        SavedRoute.objects.filter(pk=route.pk).update(
+            bbox_min_lat=math.floor(min(lats) * 1e6) / 1e6,
+            bbox_max_lat=math.ceil(max(lats) * 1e6) / 1e6,
+            bbox_min_lng=math.floor(min(lngs) * 1e6) / 1e6,
+            bbox_max_lng=math.ceil(max(lngs) * 1e6) / 1e6,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_safetyalert_bbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedroute',
+            name='alerts_checked_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='savedroute',
+            name='bbox_max_lat',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='savedroute',
+            name='bbox_max_lng',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='savedroute',
+            name='bbox_min_lat',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='savedroute',
+            name='bbox_min_lng',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='savedroute',
+            name='crossing_alerts',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='affected_routes', to='accounts.safetyalert'),
+        ),
+        migrations.AddField(
+            model_name='savedroute',
+            name='has_alert',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Crosses Active Alert'),
+        ),
+        migrations.AddIndex(
+            model_name='savedroute',
+            index=models.Index(fields=['bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng'], name='savedroute_bbox_idx'),
+        ),
+        migrations.RunPython(fill_bounds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_savedroute_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedroute',
+            name='route_polyline',
+            field=models.TextField(blank=True, default='', help_text='Route geometry as an encoded polyline (precision 5)', verbose_name='Route Polyline'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_savedroute_route_polyline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyHourStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_of_week', models.PositiveSmallIntegerField(help_text='0 = Monday 0:00-1:00, campus time', verbose_name='Hour of Week')),
+                ('sample_count', models.PositiveIntegerField(default=0, verbose_name='Samples')),
+                ('mean_percent', models.FloatField(default=0.0, verbose_name='Mean Occupancy %')),
+                ('p90_percent', models.PositiveSmallIntegerField(default=0, verbose_name='90th Percentile Occupancy %')),
+                ('histogram', models.TextField(default='{}', help_text='JSON {percent: sample count}', verbose_name='Histogram')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_hours', to='accounts.building', verbose_name='Building')),
+            ],
+            options={
+                'verbose_name': 'Occupancy Hour Stats',
+                'verbose_name_plural': 'Occupancy Hour Stats',
+                'ordering': ['building', 'hour_of_week'],
+                'unique_together': {('building', 'hour_of_week')},
+            },
+        ),
+        migrations.CreateModel(
+            name='OccupancySample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('percent', models.PositiveSmallIntegerField(verbose_name='Occupancy %')),
+                ('recorded_at', models.DateTimeField(verbose_name='Recorded At')),
+                ('rolled_up', models.BooleanField(default=False, verbose_name='Rolled Up')),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_samples', to='accounts.building', verbose_name='Building')),
+            ],
+            options={
+                'verbose_name': 'Occupancy Sample',
+                'verbose_name_plural': 'Occupancy Samples',
+                'ordering': ['-recorded_at'],
+                'indexes': [models.Index(fields=['building', 'recorded_at'], name='accounts_oc_buildin_010c8d_idx'), models.Index(fields=['rolled_up', 'recorded_at'], name='accounts_oc_rolled__9c67bc_idx')],
+            },
+        ),
+    ]
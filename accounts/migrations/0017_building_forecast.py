@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_occupancy_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='building',
+            name='forecast_confidence',
+            field=models.FloatField(blank=True, help_text='Share (0-1) of recent forecasts that were within OCCUPANCY_FORECAST_TOLERANCE points', null=True, verbose_name='Forecast Confidence'),
+        ),
+        migrations.AddField(
+            model_name='building',
+            name='forecast_for',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Forecast For'),
+        ),
+        migrations.AddField(
+            model_name='building',
+            name='forecast_percent',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Forecast occupancy an hour after the last reading (see forecast.py)', null=True, verbose_name='Forecast Occupancy %'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_building_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitzFeedState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True, verbose_name='Feed URL')),
+                ('etag', models.CharField(blank=True, max_length=255, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=64, verbose_name='Last-Modified')),
+                ('fingerprint', models.CharField(blank=True, help_text='SHA-1 of the response body', max_length=40, verbose_name='Feed Fingerprint')),
+                ('names_fingerprint', models.CharField(blank=True, help_text='SHA-1 of the entry ids and names, which decide matching', max_length=40, verbose_name='Names Fingerprint')),
+                ('buildings_version', models.CharField(blank=True, help_text='Building table version the matches were made against', max_length=100, verbose_name='Buildings Version')),
+                ('entries', models.TextField(default='{}', help_text='JSON {entry key: [fingerprint, [[building id, percent], ...]]}', verbose_name='Entries')),
+                ('runs', models.PositiveIntegerField(default=0, verbose_name='Runs')),
+                ('not_modified_runs', models.PositiveIntegerField(default=0, help_text='Runs answered 304 Not Modified', verbose_name='Not Modified Runs')),
+                ('unchanged_runs', models.PositiveIntegerField(default=0, help_text='Runs whose response body was identical', verbose_name='Unchanged Runs')),
+                ('entries_seen', models.PositiveBigIntegerField(default=0, verbose_name='Entries Seen')),
+                ('entries_skipped', models.PositiveBigIntegerField(default=0, help_text="Entries not matched or written because they hadn't changed", verbose_name='Entries Skipped')),
+                ('last_run_summary', models.CharField(blank=True, max_length=255, verbose_name='Last Run')),
+                ('checked_at', models.DateTimeField(blank=True, null=True, verbose_name='Checked At')),
+                ('changed_at', models.DateTimeField(blank=True, null=True, verbose_name='Changed At')),
+            ],
+            options={
+                'verbose_name': 'Waitz Feed State',
+                'verbose_name_plural': 'Waitz Feed States',
+                'ordering': ['url'],
+            },
+        ),
+    ]
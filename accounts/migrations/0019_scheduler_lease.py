@@ -0,0 +1,51 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_waitz_feed_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJobStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=100, unique=True, verbose_name='Job')),
+                ('runs', models.PositiveIntegerField(default=0, verbose_name='Runs')),
+                ('failures', models.PositiveIntegerField(default=0, verbose_name='Failures')),
+                ('last_started_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Started')),
+                ('last_finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Finished')),
+                ('last_success_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Success')),
+                ('last_duration_ms', models.FloatField(blank=True, null=True, verbose_name='Last Duration (ms)')),
+                ('max_duration_ms', models.FloatField(default=0.0, verbose_name='Longest Duration (ms)')),
+                ('total_duration_ms', models.FloatField(default=0.0, verbose_name='Total Duration (ms)')),
+                ('last_error', models.TextField(blank=True, verbose_name='Last Error')),
+                ('last_holder', models.CharField(blank=True, max_length=255, verbose_name='Last Run By')),
+            ],
+            options={
+                'verbose_name': 'Scheduled Job Status',
+                'verbose_name_plural': 'Scheduled Job Statuses',
+                'ordering': ['job_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Name')),
+                ('holder', models.CharField(blank=True, help_text='host:pid of the scheduler holding the lease', max_length=255, verbose_name='Holder')),
+                ('acquired_at', models.DateTimeField(blank=True, null=True, verbose_name='Acquired At')),
+                ('renewed_at', models.DateTimeField(blank=True, null=True, verbose_name='Renewed At')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Expires At')),
+            ],
+            options={
+                'verbose_name': 'Scheduler Lease',
+                'verbose_name_plural': 'Scheduler Leases',
+                'ordering': ['name'],
+            },
+        ),
+    ]
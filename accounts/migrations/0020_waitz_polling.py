@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_scheduler_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waitzfeedstate',
+            name='change_rate',
+            field=models.FloatField(blank=True, help_text="Smoothed mean squared change of open buildings' readings, points² per minute", null=True, verbose_name='Change Rate'),
+        ),
+        migrations.AddField(
+            model_name='waitzfeedstate',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Next Poll At'),
+        ),
+        migrations.AddField(
+            model_name='waitzfeedstate',
+            name='poll_interval',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Poll Interval (s)'),
+        ),
+        migrations.AddField(
+            model_name='waitzfeedstate',
+            name='poll_reason',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Poll Interval Reason'),
+        ),
+    ]
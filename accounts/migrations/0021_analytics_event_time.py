@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_waitz_polling'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alertinteraction',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Interaction At'),
+        ),
+        migrations.AlterField(
+            model_name='buildingview',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Viewed At'),
+        ),
+        migrations.AlterField(
+            model_name='pageview',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Viewed At'),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 import json
 
@@ -60,6 +60,9 @@ class Building(models.Model):
     best_study_spot = models.CharField(max_length=255, blank=True, verbose_name="Best Study Spot", help_text="Recommended study area")
     operating_hours = models.CharField(max_length=255, blank=True, verbose_name="Operating Hours")
     occupancy_last_updated = models.DateTimeField(null=True, blank=True, verbose_name="Occupancy Last Updated")
+    forecast_percent = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Forecast Occupancy %", help_text="Forecast occupancy an hour after the last reading (see forecast.py)")
+    forecast_confidence = models.FloatField(null=True, blank=True, verbose_name="Forecast Confidence", help_text="Share (0-1) of recent forecasts that were within OCCUPANCY_FORECAST_TOLERANCE points")
+    forecast_for = models.DateTimeField(null=True, blank=True, verbose_name="Forecast For")
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -110,6 +113,138 @@ class Building(models.Model):
             return '#ef4444'  # Red - Very Busy
 
 
+class OccupancySample(models.Model):
+    """
+    One occupancy reading of a building, appended on every Waitz ingest.
+    Samples are rolled up into OccupancyHourStats and deleted after
+    OCCUPANCY_SAMPLE_RETENTION_DAYS (see occupancy.py).
+    """
+    building = models.ForeignKey(Building, on_delete=models.CASCADE, related_name='occupancy_samples', verbose_name="Building")
+    percent = models.PositiveSmallIntegerField(verbose_name="Occupancy %")
+    recorded_at = models.DateTimeField(verbose_name="Recorded At")
+    rolled_up = models.BooleanField(default=False, verbose_name="Rolled Up")
+
+    class Meta:
+        verbose_name = "Occupancy Sample"
+        verbose_name_plural = "Occupancy Samples"
+        ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['building', 'recorded_at']),
+            models.Index(fields=['rolled_up', 'recorded_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.building_id} at {self.recorded_at}: {self.percent}%"
+
+
+class OccupancyHourStats(models.Model):
+    """
+    Occupancy of a building in one hour of the week (campus time), over all
+    rolled-up samples. The histogram holds a count per percent value, so
+    statistics stay exact as samples are merged in and raw rows expire.
+    """
+    building = models.ForeignKey(Building, on_delete=models.CASCADE, related_name='occupancy_hours', verbose_name="Building")
+    hour_of_week = models.PositiveSmallIntegerField(verbose_name="Hour of Week", help_text="0 = Monday 0:00-1:00, campus time")
+    sample_count = models.PositiveIntegerField(default=0, verbose_name="Samples")
+    mean_percent = models.FloatField(default=0.0, verbose_name="Mean Occupancy %")
+    p90_percent = models.PositiveSmallIntegerField(default=0, verbose_name="90th Percentile Occupancy %")
+    histogram = models.TextField(default='{}', verbose_name="Histogram", help_text="JSON {percent: sample count}")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Occupancy Hour Stats"
+        verbose_name_plural = "Occupancy Hour Stats"
+        ordering = ['building', 'hour_of_week']
+        unique_together = ('building', 'hour_of_week')
+
+    def __str__(self):
+        return f"{self.building_id} hour {self.hour_of_week}: {self.mean_percent:.0f}% mean"
+
+
+class WaitzFeedState(models.Model):
+    """
+    What fetch_waitz_occupancy saw in a Waitz feed on its last run, so the
+    next run can skip the parts that didn't change, counters of the work
+    skipped so far, and when the feed should be polled next.
+    """
+    url = models.URLField(unique=True, verbose_name="Feed URL")
+    etag = models.CharField(max_length=255, blank=True, verbose_name="ETag")
+    last_modified = models.CharField(max_length=64, blank=True, verbose_name="Last-Modified")
+    fingerprint = models.CharField(max_length=40, blank=True, verbose_name="Feed Fingerprint", help_text="SHA-1 of the response body")
+    names_fingerprint = models.CharField(max_length=40, blank=True, verbose_name="Names Fingerprint", help_text="SHA-1 of the entry ids and names, which decide matching")
+    buildings_version = models.CharField(max_length=100, blank=True, verbose_name="Buildings Version", help_text="Building table version the matches were made against")
+    entries = models.TextField(default='{}', verbose_name="Entries", help_text="JSON {entry key: [fingerprint, [[building id, percent], ...]]}")
+    runs = models.PositiveIntegerField(default=0, verbose_name="Runs")
+    not_modified_runs = models.PositiveIntegerField(default=0, verbose_name="Not Modified Runs", help_text="Runs answered 304 Not Modified")
+    unchanged_runs = models.PositiveIntegerField(default=0, verbose_name="Unchanged Runs", help_text="Runs whose response body was identical")
+    entries_seen = models.PositiveBigIntegerField(default=0, verbose_name="Entries Seen")
+    entries_skipped = models.PositiveBigIntegerField(default=0, verbose_name="Entries Skipped", help_text="Entries not matched or written because they hadn't changed")
+    last_run_summary = models.CharField(max_length=255, blank=True, verbose_name="Last Run")
+    checked_at = models.DateTimeField(null=True, blank=True, verbose_name="Checked At")
+    changed_at = models.DateTimeField(null=True, blank=True, verbose_name="Changed At")
+    # Adaptive polling (see polling.py)
+    change_rate = models.FloatField(null=True, blank=True, verbose_name="Change Rate", help_text="Smoothed mean squared change of open buildings' readings, points² per minute")
+    poll_interval = models.PositiveIntegerField(null=True, blank=True, verbose_name="Poll Interval (s)")
+    poll_reason = models.CharField(max_length=50, blank=True, verbose_name="Poll Interval Reason")
+    next_poll_at = models.DateTimeField(null=True, blank=True, verbose_name="Next Poll At")
+
+    class Meta:
+        verbose_name = "Waitz Feed State"
+        verbose_name_plural = "Waitz Feed States"
+        ordering = ['url']
+
+    def __str__(self):
+        return self.url
+
+
+class SchedulerLease(models.Model):
+    """
+    Leader lock for scheduled jobs. Only the holder of an unexpired lease
+    runs jobs; it renews the lease on a heartbeat, and a standby takes over
+    once the lease expires (see scheduler.py).
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name="Name")
+    holder = models.CharField(max_length=255, blank=True, verbose_name="Holder", help_text="host:pid of the scheduler holding the lease")
+    acquired_at = models.DateTimeField(null=True, blank=True, verbose_name="Acquired At")
+    renewed_at = models.DateTimeField(null=True, blank=True, verbose_name="Renewed At")
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Expires At")
+
+    class Meta:
+        verbose_name = "Scheduler Lease"
+        verbose_name_plural = "Scheduler Leases"
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name}: {self.holder or 'free'}"
+
+
+class ScheduledJobStatus(models.Model):
+    """Outcome and timing of the runs of one scheduled job, across all scheduler processes."""
+    job_id = models.CharField(max_length=100, unique=True, verbose_name="Job")
+    runs = models.PositiveIntegerField(default=0, verbose_name="Runs")
+    failures = models.PositiveIntegerField(default=0, verbose_name="Failures")
+    last_started_at = models.DateTimeField(null=True, blank=True, verbose_name="Last Started")
+    last_finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Last Finished")
+    last_success_at = models.DateTimeField(null=True, blank=True, verbose_name="Last Success")
+    last_duration_ms = models.FloatField(null=True, blank=True, verbose_name="Last Duration (ms)")
+    max_duration_ms = models.FloatField(default=0.0, verbose_name="Longest Duration (ms)")
+    total_duration_ms = models.FloatField(default=0.0, verbose_name="Total Duration (ms)")
+    last_error = models.TextField(blank=True, verbose_name="Last Error")
+    last_holder = models.CharField(max_length=255, blank=True, verbose_name="Last Run By")
+
+    class Meta:
+        verbose_name = "Scheduled Job Status"
+        verbose_name_plural = "Scheduled Job Statuses"
+        ordering = ['job_id']
+
+    def __str__(self):
+        return self.job_id
+
+    @property
+    def mean_duration_ms(self):
+        return self.total_duration_ms / self.runs if self.runs else None
+
+
 class Favorite(models.Model):
     """
     Model representing a user's favorite building.
@@ -134,6 +269,49 @@ class Favorite(models.Model):
         return self.custom_name if self.custom_name else self.building.name
 
 
+class BoundingBoxQuerySet(models.QuerySet):
+    """For models with bbox_min_lat/bbox_max_lat/bbox_min_lng/bbox_max_lng columns."""
+
+    def in_bounds(self, north, south, east, west):
+        """Rows whose bounding box overlaps the rectangle (uses the bbox index)."""
+        return self.filter(
+            bbox_min_lat__lte=north,
+            bbox_max_lat__gte=south,
+            bbox_min_lng__lte=east,
+            bbox_max_lng__gte=west,
+        )
+
+
+class GeocodedLocation:
+    """
+    For models whose latitude/longitude are filled in from an address
+    column, named by geocode_address_field.
+    """
+    geocode_address_field = 'address'
+
+    def geocode_if_needed(self):
+        """Fill in missing coordinates from the address. Returns True if located."""
+        if self.latitude is not None and self.longitude is not None:
+            return True
+        address = getattr(self, self.geocode_address_field)
+        if not address:
+            return False
+
+        from .geocoding import geocode
+        coordinates = geocode(address)
+        if coordinates is None:
+            return False
+        self.latitude, self.longitude = coordinates
+        return True
+
+    def enqueue_geocoding(self):
+        """Queue the row on the background geocoder once the save is committed, if it needs it."""
+        if getattr(self, self.geocode_address_field) and (self.latitude is None or self.longitude is None):
+            from .geocoding import background_geocoder
+            model_name, pk = self.__class__.__name__, self.pk
+            transaction.on_commit(lambda: background_geocoder.enqueue(model_name, pk))
+
+
 class SavedRoute(models.Model):
     """
     Model representing a user's saved route.
@@ -164,15 +342,45 @@ class SavedRoute(models.Model):
     duration_text = models.CharField(max_length=50, verbose_name="Duration")
     distance_value = models.IntegerField(verbose_name="Distance in meters")
     duration_value = models.IntegerField(verbose_name="Duration in seconds")
+    route_polyline = models.TextField(
+        blank=True,
+        default='',
+        verbose_name="Route Polyline",
+        help_text="Route geometry as an encoded polyline (precision 5)"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_used = models.DateTimeField(null=True, blank=True, verbose_name="Last Used")
 
+    # Bounding box of the route, maintained on save (see update_bounds)
+    bbox_min_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    bbox_max_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    bbox_min_lng = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    bbox_max_lng = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+
+    # Active alerts the route passes through, kept up to date by route_alerts.py
+    crossing_alerts = models.ManyToManyField(
+        'SafetyAlert',
+        blank=True,
+        related_name='affected_routes',
+        editable=False,
+    )
+    has_alert = models.BooleanField(default=False, editable=False, verbose_name="Crosses Active Alert")
+    alerts_checked_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = BoundingBoxQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Saved Route"
         verbose_name_plural = "Saved Routes"
         ordering = ['-last_used', '-created_at']
+        indexes = [
+            models.Index(
+                fields=['bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng'],
+                name='savedroute_bbox_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.name}"
@@ -183,8 +391,57 @@ class SavedRoute(models.Model):
             return f"{self.destination_building.name} ({self.destination_building.code})"
         return self.destination_name
 
+    def route_points(self):
+        """
+        (lat, lng) vertices of the route: the stored polyline, or just
+        origin and destination for routes saved without geometry.
+        """
+        if self.route_polyline:
+            from . import polyline
+            try:
+                points = polyline.decode(self.route_polyline)
+            except ValueError:
+                points = []
+            if points:
+                return points
+        return [
+            (float(self.origin_lat), float(self.origin_lng)),
+            (float(self.destination_lat), float(self.destination_lng)),
+        ]
+
+    def get_bounds(self):
+        """Bounding box as {north, south, east, west}, or None if not computed yet."""
+        if self.bbox_min_lat is None:
+            return None
+        return {
+            'north': float(self.bbox_max_lat),
+            'south': float(self.bbox_min_lat),
+            'east': float(self.bbox_max_lng),
+            'west': float(self.bbox_min_lng),
+        }
 
-class SafetyAlert(models.Model):
+    def update_bounds(self):
+        """Recompute the bounding box columns from the route points."""
+        from .geo import round_bounds
+
+        points = self.route_points()
+        lats = [lat for lat, lng in points]
+        lngs = [lng for lat, lng in points]
+        min_lat, max_lat, min_lng, max_lng = round_bounds((min(lats), max(lats), min(lngs), max(lngs)))
+        self.bbox_min_lat, self.bbox_max_lat = min_lat, max_lat
+        self.bbox_min_lng, self.bbox_max_lng = min_lng, max_lng
+
+    def save(self, *args, **kwargs):
+        self.update_bounds()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                'bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng',
+            }
+        super().save(*args, **kwargs)
+
+
+class SafetyAlert(GeocodedLocation, models.Model):
     """
     Model representing a safety alert (construction, emergency, etc.)
     that can be displayed on the map as icons or colored zones.
@@ -279,6 +536,14 @@ class SafetyAlert(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Bounding box of the alert area, maintained on save (see update_bounds)
+    bbox_min_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    bbox_max_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    bbox_min_lng = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    bbox_max_lng = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    
+    objects = BoundingBoxQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Safety Alert"
         verbose_name_plural = "Safety Alerts"
@@ -287,6 +552,10 @@ class SafetyAlert(models.Model):
             models.Index(fields=['is_active', 'severity']),
             models.Index(fields=['alert_type', 'is_active']),
             models.Index(fields=['created_at']),
+            models.Index(
+                fields=['bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng'],
+                name='safetyalert_bbox_idx',
+            ),
         ]
     
     def __str__(self):
@@ -404,12 +673,48 @@ class SafetyAlert(models.Model):
                 'address': 'Either address or coordinates must be provided.'
             })
 
-
-class SafetyConcern(models.Model):
+    def update_bounds(self):
+        """
+        Recompute the bounding box columns from the radius or polygon.
+        Polygons without a center get the center of their bounding box.
+        """
+        from .geo import alert_bounds, round_bounds
+
+        bounds = alert_bounds(
+            self.location_type, self.latitude, self.longitude,
+            radius=self.radius, polygon=self.get_polygon_coordinates(),
+        )
+        if bounds is None:
+            self.bbox_min_lat = self.bbox_max_lat = self.bbox_min_lng = self.bbox_max_lng = None
+            return
+
+        min_lat, max_lat, min_lng, max_lng = round_bounds(bounds)
+        self.bbox_min_lat, self.bbox_max_lat = min_lat, max_lat
+        self.bbox_min_lng, self.bbox_max_lng = min_lng, max_lng
+        if self.location_type == 'polygon' and (self.latitude is None or self.longitude is None):
+            self.latitude = round((min_lat + max_lat) / 2, 6)
+            self.longitude = round((min_lng + max_lng) / 2, 6)
+
+    def save(self, *args, **kwargs):
+        self.update_bounds()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                'latitude', 'longitude', 'bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng',
+            }
+        super().save(*args, **kwargs)
+        # Geocode after commit, off the request, so the map never has to
+        # geocode in the browser
+        self.enqueue_geocoding()
+
+
+class SafetyConcern(GeocodedLocation, models.Model):
     """
     Model representing a user-submitted safety concern.
     Users can report issues like broken lights, unsafe paths, etc.
     """
+    geocode_address_field = 'location_address'
+
     CATEGORY_CHOICES = [
         ('construction', 'Construction/Roadwork'),
         ('emergency', 'Emergency Situation'),
@@ -517,6 +822,11 @@ class SafetyConcern(models.Model):
     def __str__(self):
         return f"{self.get_category_display()} - {self.location_address[:50]}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Concerns submitted without GPS still get coordinates for approval
+        self.enqueue_geocoding()
+
     def get_status_badge_color(self):
         """Return Bootstrap badge color class based on status."""
         color_map = {
@@ -529,6 +839,38 @@ class SafetyConcern(models.Model):
         return color_map.get(self.status, 'secondary')
 
 
+class GeocodeCache(models.Model):
+    """
+    Persistent geocoding results keyed by normalized address.
+    Shared by alerts, safety concerns, the admin and building imports so
+    each address is sent to the geocoding provider only once.
+    A row without coordinates records that the provider found no result.
+    """
+    normalized_address = models.CharField(max_length=500, unique=True, verbose_name="Normalized Address")
+    address = models.TextField(verbose_name="Address", help_text="Address as first submitted")
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, verbose_name="Latitude")
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, verbose_name="Longitude")
+    provider = models.CharField(max_length=50, blank=True, verbose_name="Provider")
+    hit_count = models.IntegerField(default=0, verbose_name="Cache Hits")
+    last_used = models.DateTimeField(null=True, blank=True, verbose_name="Last Used")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Geocode Cache Entry"
+        verbose_name_plural = "Geocode Cache"
+        ordering = ['normalized_address']
+
+    def __str__(self):
+        return self.address[:80]
+
+    def coordinates(self):
+        """Return (lat, lng) floats, or None for a cached miss."""
+        if self.latitude is None or self.longitude is None:
+            return None
+        return float(self.latitude), float(self.longitude)
+
+
 class BuildingView(models.Model):
     """
     Model for tracking building views and searches.
@@ -564,7 +906,7 @@ class BuildingView(models.Model):
         verbose_name="Session ID",
         help_text="Anonymous session tracking"
     )
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Viewed At")
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Viewed At")
 
     class Meta:
         verbose_name = "Building View"
@@ -610,7 +952,7 @@ class PageView(models.Model):
         blank=True,
         verbose_name="Session ID"
     )
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Viewed At")
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Viewed At")
 
     class Meta:
         verbose_name = "Page View"
@@ -661,7 +1003,7 @@ class AlertInteraction(models.Model):
         blank=True,
         verbose_name="Session ID"
     )
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Interaction At")
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Interaction At")
 
     class Meta:
         verbose_name = "Alert Interaction"
@@ -0,0 +1,198 @@
+"""
+Occupancy history.
+
+Every Waitz ingest appends one OccupancySample per matched building. The
+hourly rollup (rollup_occupancy) merges samples from completed hours into
+OccupancyHourStats, one row per building and hour of the week in campus
+time (OCCUPANCY_TIME_ZONE). Each row keeps a histogram of percent values,
+so the mean and 90th percentile stay exact as new samples are merged in,
+and raw samples can be deleted after OCCUPANCY_SAMPLE_RETENTION_DAYS
+without losing the aggregates.
+
+Building.peak_hours is then computed from the aggregates with no
+scraping, and the aggregates are the baseline of the next-hour forecasts
+(forecast.py).
+"""
+import json
+from collections import defaultdict
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+STATUS_LABELS = {
+    'not_busy': 'Not busy',
+    'moderate': 'Moderate',
+    'busy': 'Busy',
+    'very_busy': 'Very busy',
+}
+
+
+def occupancy_status(percent):
+    """Status key for an occupancy percentage."""
+    if percent < 30:
+        return 'not_busy'
+    elif percent < 60:
+        return 'moderate'
+    elif percent < 80:
+        return 'busy'
+    return 'very_busy'
+
+
+def campus_time(moment):
+    return timezone.localtime(moment, ZoneInfo(getattr(settings, 'OCCUPANCY_TIME_ZONE', 'America/New_York')))
+
+
+def hour_of_week(moment):
+    """0 for Monday 0:00-1:00 campus time, up to 167."""
+    local = campus_time(moment)
+    return local.weekday() * 24 + local.hour
+
+
+def hour_label(hour):
+    """'3pm' for 15."""
+    return f'{hour % 12 or 12}{"am" if hour < 12 else "pm"}'
+
+
+def histogram_stats(histogram):
+    """(count, mean, 90th percentile) of a {percent: count} histogram."""
+    count = sum(histogram.values())
+    if not count:
+        return 0, 0.0, 0
+    mean = sum(percent * n for percent, n in histogram.items()) / count
+    # Nearest-rank percentile
+    rank = -(-count * 9 // 10)
+    seen = 0
+    for percent in sorted(histogram):
+        seen += histogram[percent]
+        if seen >= rank:
+            return count, mean, percent
+    return count, mean, max(histogram)
+
+
+def record_samples(readings, recorded_at):
+    """Append samples given as (building id, percent). Returns how many."""
+    from .models import OccupancySample
+
+    samples = [
+        OccupancySample(building_id=building_id, percent=min(max(int(percent), 0), 100), recorded_at=recorded_at)
+        for building_id, percent in readings
+        if percent is not None
+    ]
+    OccupancySample.objects.bulk_create(samples, batch_size=1000)
+    return len(samples)
+
+
+def rollup_samples(now=None):
+    """
+    Merge samples from completed hours that weren't rolled up yet into the
+    hour-of-week aggregates. Returns (samples merged, aggregates written).
+    """
+    from .models import OccupancyHourStats, OccupancySample
+
+    now = now or timezone.now()
+    cutoff = now.replace(minute=0, second=0, microsecond=0)
+    pending = OccupancySample.objects.filter(rolled_up=False, recorded_at__lt=cutoff)
+    last_id = pending.aggregate(last_id=Max('id'))['last_id']
+    if last_id is None:
+        return 0, 0
+    pending = pending.filter(id__lte=last_id)
+
+    added = defaultdict(lambda: defaultdict(int))  # (building, hour of week) -> {percent: count}
+    merged = 0
+    rows = pending.order_by().values_list('building_id', 'percent', 'recorded_at')
+    for building_id, percent, recorded_at in rows.iterator(chunk_size=5000):
+        added[(building_id, hour_of_week(recorded_at))][percent] += 1
+        merged += 1
+
+    with transaction.atomic():
+        existing = {
+            (stats.building_id, stats.hour_of_week): stats
+            for stats in OccupancyHourStats.objects.filter(building_id__in={key[0] for key in added})
+        }
+        created = []
+        updated = []
+        for key, counts in added.items():
+            stats = existing.get(key)
+            if stats is None:
+                stats = OccupancyHourStats(building_id=key[0], hour_of_week=key[1])
+                histogram = {}
+                created.append(stats)
+            else:
+                histogram = {int(percent): n for percent, n in json.loads(stats.histogram).items()}
+                updated.append(stats)
+            for percent, n in counts.items():
+                histogram[percent] = histogram.get(percent, 0) + n
+            stats.sample_count, stats.mean_percent, stats.p90_percent = histogram_stats(histogram)
+            stats.histogram = json.dumps(histogram, separators=(',', ':'), sort_keys=True)
+            stats.updated_at = now
+
+        OccupancyHourStats.objects.bulk_create(created, batch_size=500)
+        OccupancyHourStats.objects.bulk_update(
+            updated, ['sample_count', 'mean_percent', 'p90_percent', 'histogram', 'updated_at'], batch_size=500,
+        )
+        pending.update(rolled_up=True)
+    return merged, len(created) + len(updated)
+
+
+def expire_samples(now=None):
+    """Delete samples older than OCCUPANCY_SAMPLE_RETENTION_DAYS that were rolled up."""
+    from .models import OccupancySample
+
+    now = now or timezone.now()
+    days = getattr(settings, 'OCCUPANCY_SAMPLE_RETENTION_DAYS', 28)
+    deleted, _ = OccupancySample.objects.filter(
+        rolled_up=True, recorded_at__lt=now - timedelta(days=days),
+    ).delete()
+    return deleted
+
+
+def peak_hours_text(day_stats, count=3):
+    """
+    The busiest hours of one day as "3pm, 4pm, and 5pm" (in time order),
+    from {hour of day: mean percent}.
+    """
+    peaks = sorted(sorted(day_stats, key=lambda hour: -day_stats[hour])[:count])
+    labels = [hour_label(hour) for hour in peaks]
+    if len(labels) < 3:
+        return ' and '.join(labels)
+    return ', '.join(labels[:-1]) + ', and ' + labels[-1]
+
+
+def next_hour_text(mean_percent):
+    return f'{STATUS_LABELS[occupancy_status(mean_percent)]}, about {round(mean_percent)}%'
+
+
+def refresh_predictions(now=None):
+    """
+    Recompute peak_hours (today, campus time) for every building with
+    history. Hours with fewer than OCCUPANCY_MIN_SAMPLES samples are
+    ignored. Only changed rows are written. Returns the number of
+    buildings updated. next_hour_prediction comes from the forecaster
+    (see forecast.py) on every ingest.
+    """
+    from .models import Building, OccupancyHourStats
+
+    now = now or timezone.now()
+    min_samples = getattr(settings, 'OCCUPANCY_MIN_SAMPLES', 3)
+    today = campus_time(now).weekday()
+
+    peaks = defaultdict(dict)
+    for building_id, hour, mean in OccupancyHourStats.objects.filter(
+        sample_count__gte=min_samples, hour_of_week__gte=today * 24, hour_of_week__lt=(today + 1) * 24,
+    ).order_by().values_list('building_id', 'hour_of_week', 'mean_percent').iterator(chunk_size=5000):
+        peaks[building_id][hour % 24] = mean
+
+    updated = 0
+    with transaction.atomic():
+        for building_id, peak_hours in Building.objects.filter(
+            id__in=peaks.keys(),
+        ).values_list('id', 'peak_hours'):
+            text = peak_hours_text(peaks[building_id])
+            if peak_hours != text:
+                Building.objects.filter(id=building_id).update(peak_hours=text)
+                updated += 1
+    return updated
@@ -0,0 +1,269 @@
+"""
+Shared HTTP client for outbound integrations: the Waitz feed and Google
+geocoding.
+
+- One requests.Session per process. Connections to each host are kept alive
+  and pooled (OUTBOUND_POOL_SIZE per host), so repeated calls skip the TCP
+  and TLS handshakes.
+- Connection errors, timeouts, 429s and 5xx answers are retried up to
+  OUTBOUND_RETRIES times for idempotent methods (GET, HEAD, OPTIONS; others
+  only when the caller passes retries=). The wait before retry n is drawn
+  uniformly from 0 to min(OUTBOUND_BACKOFF_MAX, OUTBOUND_BACKOFF_BASE * 2**n)
+  seconds ("full jitter"), so callers that failed together don't retry
+  together. A Retry-After header (seconds or an HTTP date) is honoured up
+  to OUTBOUND_BACKOFF_MAX.
+- Each host has a circuit breaker. After OUTBOUND_BREAKER_FAILURES failures
+  in a row (connection errors, timeouts, 5xx) it opens. Calls to that host
+  then raise UpstreamUnavailable at once instead of each waiting out the
+  timeout. After OUTBOUND_BREAKER_COOLDOWN seconds a single trial request
+  is let through: success closes the breaker, failure opens it again.
+- Each host has a latency histogram of every attempt, in LATENCY_BUCKETS_MS.
+  stats() reports them with request, failure, retry and short-circuit
+  counts (shown on the analytics dashboard).
+
+UpstreamUnavailable is a requests ConnectionError, so callers that already
+handle requests.exceptions.RequestException need no changes.
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last one catches the rest
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """The host's circuit breaker is open; the request was not sent."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one host: 'closed' (calls go through),
+    'open' (calls fail fast until the cooldown ends) or 'half_open' (one
+    trial call is in flight).
+    """
+
+    def __init__(self, name, failure_threshold=5, cooldown=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self, now):
+        """Whether a call may be sent now (takes the trial slot when half-open)."""
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and now - self.opened_at >= self.cooldown:
+            self.state = 'half_open'
+            return True
+        return False
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures in a row")
+            self.state = 'open'
+            self.opened_at = now
+
+
+class LatencyHistogram:
+    """Counts of latencies per LATENCY_BUCKETS_MS bucket."""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+
+    def percentile(self, fraction):
+        """Upper bound (ms) of the bucket holding the given percentile, or None."""
+        if not self.total:
+            return None
+        rank = fraction * self.total
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+
+class HostStats:
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.short_circuited = 0
+
+
+class OutboundClient:
+    """
+    Pooled session with retries, per-host circuit breakers and latency
+    histograms. Thread-safe; use the module-level outbound instance.
+    """
+
+    def __init__(self, retries=None, backoff_base=None, backoff_max=None,
+                 breaker_failures=None, breaker_cooldown=None, pool_size=None):
+        self.retries = retries if retries is not None else getattr(settings, 'OUTBOUND_RETRIES', 2)
+        self.backoff_base = backoff_base if backoff_base is not None else getattr(settings, 'OUTBOUND_BACKOFF_BASE', 0.25)
+        self.backoff_max = backoff_max if backoff_max is not None else getattr(settings, 'OUTBOUND_BACKOFF_MAX', 4.0)
+        self.breaker_failures = breaker_failures if breaker_failures is not None else getattr(settings, 'OUTBOUND_BREAKER_FAILURES', 5)
+        self.breaker_cooldown = breaker_cooldown if breaker_cooldown is not None else getattr(settings, 'OUTBOUND_BREAKER_COOLDOWN', 30.0)
+        pool_size = pool_size if pool_size is not None else getattr(settings, 'OUTBOUND_POOL_SIZE', 10)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, host):
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = HostStats(CircuitBreaker(host, self.breaker_failures, self.breaker_cooldown))
+        return stats
+
+    def backoff(self, attempt, response=None):
+        """Seconds to wait before retry number attempt (0-based)."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '').strip()
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+            if retry_after:
+                try:
+                    moment = parsedate_to_datetime(retry_after)
+                except (TypeError, ValueError):
+                    moment = None
+                if moment is not None:
+                    if moment.tzinfo is None:
+                        moment = moment.replace(tzinfo=timezone.utc)
+                    wait = (moment - datetime.now(timezone.utc)).total_seconds()
+                    return min(max(wait, 0.0), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def request(self, method, url, retries=None, **kwargs):
+        """
+        Send a request like requests.request. Returns the last response
+        (which may be an error status once retries run out) or raises a
+        RequestException, UpstreamUnavailable if the breaker is open.
+        """
+        method = method.upper()
+        host = urlsplit(url).netloc
+        if retries is None:
+            retries = self.retries if method in IDEMPOTENT_METHODS else 0
+
+        attempt = 0
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                stats = self._host(host)
+                if not stats.breaker.allow(now):
+                    stats.short_circuited += 1
+                    raise UpstreamUnavailable(f'{host} is unavailable (circuit open after repeated failures)')
+                stats.requests += 1
+
+            response = None
+            error = None
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                error = e
+            except BaseException:
+                # Not retried (e.g. UnicodeError or LocationParseError from a
+                # bad URL), but still a failure: a half-open breaker must not
+                # keep waiting for its trial call
+                with self._lock:
+                    stats.latency.record((time.perf_counter() - start) * 1000)
+                    stats.failures += 1
+                    stats.breaker.record_failure(time.monotonic())
+                raise
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            failed = error is not None or response.status_code >= 500
+            with self._lock:
+                stats.latency.record(elapsed_ms)
+                if failed:
+                    stats.failures += 1
+                    stats.breaker.record_failure(time.monotonic())
+                else:
+                    stats.breaker.record_success()
+                retry = (
+                    attempt < retries
+                    and (error is not None or response.status_code in RETRY_STATUSES)
+                    and stats.breaker.state != 'open'
+                )
+                if retry:
+                    stats.retries += 1
+
+            if not retry:
+                if error is not None:
+                    raise error
+                return response
+            time.sleep(self.backoff(attempt, response))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """Per-host counters, breaker state and latency percentiles."""
+        with self._lock:
+            return {
+                host: {
+                    'requests': stats.requests,
+                    'failures': stats.failures,
+                    'retries': stats.retries,
+                    'short_circuited': stats.short_circuited,
+                    'breaker': stats.breaker.state,
+                    'mean_ms': round(stats.latency.sum_ms / stats.latency.total, 1) if stats.latency.total else None,
+                    'p50_ms': stats.latency.percentile(0.5),
+                    'p90_ms': stats.latency.percentile(0.9),
+                    'p99_ms': stats.latency.percentile(0.99),
+                    'histogram': dict(zip(
+                        [f'<={bound:g}ms' if bound != float('inf') else f'>{LATENCY_BUCKETS_MS[-2]:g}ms'
+                         for bound in LATENCY_BUCKETS_MS],
+                        stats.latency.counts,
+                    )),
+                }
+                for host, stats in sorted(self._hosts.items())
+            }
+
+    def reset(self):
+        """Forget all breakers and statistics."""
+        with self._lock:
+            self._hosts.clear()
+
+
+outbound = OutboundClient()
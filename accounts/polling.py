@@ -0,0 +1,179 @@
+"""
+Adaptive Waitz polling.
+
+The scheduler checks fetch_waitz_occupancy every WAITZ_POLL_MIN_SECONDS,
+but the feed is only fetched once WaitzFeedState.next_poll_at has passed.
+After each fetch, PollingPolicy picks the wait before the next one:
+
+- Change rate: the mean squared change of open buildings' readings per
+  minute since the last fetch, smoothed over fetches (WAITZ_POLL_SMOOTHING).
+  Occupancy wanders like a random walk, whose squared drift grows in
+  proportion to time, so this rate doesn't depend on how long the last
+  wait was. The wait is how long readings take at that rate to drift
+  WAITZ_POLL_DRIFT_BUDGET points (root mean square), so changing data is
+  polled faster and static data slower.
+- Backing off is gradual: the wait grows by at most WAITZ_POLL_BACKOFF
+  times per fetch, while speeding up takes effect at once.
+- Peak hours: hours of the week whose campus mean occupancy (from
+  OccupancyHourStats) is at least WAITZ_POLL_PEAK_FRACTION of the busiest
+  hour's. Within one, or when one starts within WAITZ_POLL_MAX_SECONDS,
+  the wait is at most WAITZ_POLL_PEAK_SECONDS.
+- Closed: when no building reports any occupancy (closed buildings read
+  0%), the wait is WAITZ_POLL_MAX_SECONDS.
+- Buildings open and close on the hour, so no wait runs past 30 seconds
+  after the next hour starts.
+
+Waits stay within WAITZ_POLL_MIN_SECONDS and WAITZ_POLL_MAX_SECONDS. With
+WAITZ_POLL_ADAPTIVE off every wait is WAITZ_POLL_BASE_SECONDS. A failed
+fetch leaves next_poll_at alone, so it is retried on the next check.
+
+simulate_waitz_polling replays recorded readings through the policy to
+compare requests and freshness with fixed intervals.
+"""
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg
+from django.utils import timezone
+
+from .occupancy import hour_of_week
+
+
+class PollingPolicy:
+    """Picks the wait before the next poll from the signals above."""
+
+    def __init__(self, adaptive=None, base_seconds=None, min_seconds=None, max_seconds=None,
+                 peak_seconds=None, drift_budget=None, backoff=None, smoothing=None):
+        self.adaptive = adaptive if adaptive is not None else getattr(settings, 'WAITZ_POLL_ADAPTIVE', True)
+        self.base_seconds = base_seconds if base_seconds is not None else getattr(settings, 'WAITZ_POLL_BASE_SECONDS', 600)
+        self.min_seconds = min_seconds if min_seconds is not None else getattr(settings, 'WAITZ_POLL_MIN_SECONDS', 120)
+        self.max_seconds = max_seconds if max_seconds is not None else getattr(settings, 'WAITZ_POLL_MAX_SECONDS', 1800)
+        self.peak_seconds = peak_seconds if peak_seconds is not None else getattr(settings, 'WAITZ_POLL_PEAK_SECONDS', 300)
+        self.drift_budget = drift_budget if drift_budget is not None else getattr(settings, 'WAITZ_POLL_DRIFT_BUDGET', 2.5)
+        self.backoff = backoff if backoff is not None else getattr(settings, 'WAITZ_POLL_BACKOFF', 1.5)
+        self.smoothing = smoothing if smoothing is not None else getattr(settings, 'WAITZ_POLL_SMOOTHING', 0.5)
+
+    def change_rate(self, previous_rate, before, after, elapsed_seconds):
+        """
+        Smoothed mean squared change per minute between two readings
+        {building id: percent}, over buildings open in either. Readings
+        less than a minute apart (back-to-back manual runs) count as a
+        minute apart.
+        """
+        changes = [
+            (after[building_id] - before[building_id]) ** 2
+            for building_id in before.keys() & after.keys()
+            if before[building_id] or after[building_id]
+        ]
+        if not changes:
+            return previous_rate
+        rate = sum(changes) / len(changes) / max(elapsed_seconds / 60, 1)
+        if previous_rate is None:
+            return rate
+        return previous_rate + self.smoothing * (rate - previous_rate)
+
+    def next_interval(self, previous_interval, rate, any_open, peak, now):
+        """(seconds until the next poll, reason)."""
+        if not self.adaptive:
+            return self.base_seconds, 'fixed'
+        if not any_open:
+            interval, reason = self.max_seconds, 'closed'
+        else:
+            if rate is None:
+                interval, reason = self.base_seconds, 'no history'
+            elif rate > 0:
+                interval, reason = self.drift_budget ** 2 / rate * 60, 'changing'
+            else:
+                interval, reason = self.max_seconds, 'static'
+            limit = (previous_interval or self.base_seconds) * self.backoff
+            if interval > limit:
+                interval, reason = limit, 'backing off'
+            if peak and interval > self.peak_seconds:
+                interval, reason = self.peak_seconds, 'peak hours'
+        # Buildings open and close on the hour, so check just after it
+        interval = min(interval, 3600 - (now.minute * 60 + now.second) + 30)
+        return int(min(max(interval, self.min_seconds), self.max_seconds)), reason
+
+
+def peak_hours_of_week(fraction=None):
+    """Hours of the week whose campus mean occupancy is within fraction of the busiest."""
+    from .models import OccupancyHourStats
+
+    fraction = fraction if fraction is not None else getattr(settings, 'WAITZ_POLL_PEAK_FRACTION', 0.75)
+    means = dict(
+        OccupancyHourStats.objects.filter(
+            sample_count__gte=getattr(settings, 'OCCUPANCY_MIN_SAMPLES', 3),
+        ).order_by().values('hour_of_week').annotate(mean=Avg('mean_percent')).values_list('hour_of_week', 'mean')
+    )
+    return peak_hours_from_means(means, fraction)
+
+
+def peak_hours_from_means(means, fraction):
+    """Peak hours from {hour of week: campus mean percent}."""
+    busiest = max(means.values(), default=0)
+    if not busiest:
+        return set()
+    return {hour for hour, mean in means.items() if mean >= fraction * busiest}
+
+
+def in_peak(now, peak_hours, lookahead_seconds):
+    """Whether now, or lookahead_seconds from now, falls in a peak hour."""
+    return (
+        hour_of_week(now) in peak_hours
+        or hour_of_week(now + timedelta(seconds=lookahead_seconds)) in peak_hours
+    )
+
+
+def feed_readings(state):
+    """{building id: percent} of the buildings matched on the feed state's last run."""
+    return {
+        building_id: percent
+        for _, matched in json.loads(state.entries).values()
+        for building_id, percent in matched
+        if percent is not None
+    }
+
+
+def feed_checked(url=None):
+    """
+    (when the feed was last fetched, ids of the buildings it had), or
+    (None, empty set) before the first fetch. Ingests only write buildings
+    whose reading changed, so this is how fresh the others' readings are.
+    """
+    from .models import WaitzFeedState
+
+    url = url or getattr(settings, 'WAITZ_FEED_URL', 'https://waitz.io/live/gatech')
+    state = WaitzFeedState.objects.filter(url=url).only('checked_at', 'entries').first()
+    if state is None or state.checked_at is None:
+        return None, frozenset()
+    return state.checked_at, frozenset(feed_readings(state))
+
+
+def schedule_next_poll(state, before, now, policy=None):
+    """
+    Set state's change rate, poll interval and next poll time (unsaved)
+    after a fetch. before holds the readings before it (feed_readings),
+    and state's checked_at must still be the previous fetch's.
+    """
+    policy = policy or PollingPolicy()
+    after = feed_readings(state)
+    if state.checked_at is not None:
+        state.change_rate = policy.change_rate(
+            state.change_rate, before, after, (now - state.checked_at).total_seconds(),
+        )
+    peak = policy.adaptive and in_peak(now, peak_hours_of_week(), policy.max_seconds)
+    state.poll_interval, state.poll_reason = policy.next_interval(
+        state.poll_interval, state.change_rate, any(after.values()), peak, now,
+    )
+    state.next_poll_at = now + timedelta(seconds=state.poll_interval)
+
+
+def poll_due(url=None, now=None):
+    """Whether the feed should be fetched now. Checks may run a few seconds early."""
+    from .models import WaitzFeedState
+
+    url = url or getattr(settings, 'WAITZ_FEED_URL', 'https://waitz.io/live/gatech')
+    now = now or timezone.now()
+    next_poll_at = WaitzFeedState.objects.filter(url=url).values_list('next_poll_at', flat=True).first()
+    return next_poll_at is None or next_poll_at <= now + timedelta(seconds=5)
@@ -0,0 +1,58 @@
+"""
+Encoded polyline format (as used by the Google Maps APIs).
+
+Each coordinate is stored as the delta from the previous one, scaled by
+10^precision, zig-zag encoded and split into 5-bit chunks offset by 63.
+Precision 5 (~1 m) is what Google returns for routes.
+"""
+
+
+def encode(points, precision=5):
+    """Encode a sequence of (lat, lng) pairs."""
+    factor = 10 ** precision
+    chunks = []
+    previous_lat = previous_lng = 0
+    for lat, lng in points:
+        lat = int(round(lat * factor))
+        lng = int(round(lng * factor))
+        for delta in (lat - previous_lat, lng - previous_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous_lat, previous_lng = lat, lng
+    return ''.join(chunks)
+
+
+def decode(encoded, precision=5):
+    """
+    Decode an encoded polyline into a list of (lat, lng) pairs.
+    Raises ValueError on malformed input.
+    """
+    factor = float(10 ** precision)
+    points = []
+    index = 0
+    length = len(encoded)
+    lat = lng = 0
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            result = 0
+            shift = 0
+            while True:
+                if index >= length:
+                    raise ValueError('Truncated polyline')
+                byte = ord(encoded[index]) - 63
+                index += 1
+                if byte < 0 or byte > 0x3f:
+                    raise ValueError('Invalid polyline character')
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
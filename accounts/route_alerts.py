@@ -0,0 +1,244 @@
+"""
+Flag saved routes that pass through an active safety alert.
+
+When an alert is created, updated or deleted, only the saved routes near
+it are re-checked. Candidates are the routes whose bounding box overlaps
+the alert's (served by the bbox index on SavedRoute) plus the routes
+already linked to it, so an alert that moved or expired releases its old
+routes as well. Each batch of candidates is tested against just the
+changed alerts with one AlertGeometryIndex.segment_hits call, the
+crossing_alerts links are diffed and has_alert is written for the whole
+batch with a single UPDATE.
+
+Checks run on a background thread once the alert change is committed, so
+publishing an alert never waits on them. Changes that arrive while a check
+is running are coalesced into the next one. Set SAVED_ROUTE_CHECK_ASYNC =
+False to run checks inline instead (e.g. for tests and management
+commands).
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from .alert_index import AlertGeometryIndex, active_alert_index
+from .alert_snapshot import Snapshot, active_alert_snapshot
+from .geo import METERS_PER_DEGREE_LAT, meters_per_degree_lng
+from .models import SafetyAlert, SavedRoute
+
+logger = logging.getLogger(__name__)
+
+
+class SavedRouteAlertChecker:
+    """
+    Keeps SavedRoute.has_alert and SavedRoute.crossing_alerts in sync with
+    the active alerts.
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pending = {}  # alert id -> fallback bounds (deleted alerts) or None
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+        self._stats = {
+            'runs': 0,
+            'alerts': 0,
+            'candidates': 0,
+            'flagged': 0,
+            'cleared': 0,
+            'failed': 0,
+            'last_run_ms': None,
+        }
+
+    def enqueue(self, alert_id, bounds=None):
+        """
+        Re-check the routes around an alert. `bounds` (min_lat, max_lat,
+        min_lng, max_lng) is only needed when the alert row is gone.
+        Call after the change has been committed.
+        """
+        if not getattr(settings, 'SAVED_ROUTE_CHECK_ASYNC', True):
+            self.check_alerts({alert_id: bounds})
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker process: the parent's thread did not survive
+                self._reset()
+            self._pending[alert_id] = bounds or self._pending.get(alert_id)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='saved-route-alert-checker',
+                    daemon=True,
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def stats(self):
+        """Counters from the checks run by this process."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                alerts, self._pending = self._pending, {}
+            if not alerts:
+                continue
+            # The worker owns its own DB connection; don't keep it open
+            # between checks
+            close_old_connections()
+            try:
+                self.check_alerts(alerts)
+            except Exception as e:
+                logger.error(f"Saved route check for alerts {sorted(alerts)} failed: {str(e)}")
+                with self._lock:
+                    self._stats['failed'] += 1
+            finally:
+                close_old_connections()
+
+    def check_alerts(self, alerts):
+        """
+        Re-check the saved routes around the given alerts ({alert id:
+        fallback bounds or None}). Returns (candidates, flagged, cleared).
+        """
+        start = time.perf_counter()
+        alert_ids = set(alerts)
+        snapshot = active_alert_snapshot.get()
+        point_radius = getattr(settings, 'ALERT_POINT_RADIUS_M', 25.0)
+        index = AlertGeometryIndex(
+            Snapshot([entry for entry in snapshot.entries if entry.id in alert_ids], None, None),
+            point_radius_m=point_radius,
+        )
+
+        route_ids = self._candidates(alerts, index, point_radius)
+        flagged = cleared = 0
+        ordered = sorted(route_ids)
+        for i in range(0, len(ordered), self.batch_size):
+            batch_flagged, batch_cleared = self._check_batch(ordered[i:i + self.batch_size], index, alert_ids)
+            flagged += batch_flagged
+            cleared += batch_cleared
+
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['alerts'] += len(alert_ids)
+            self._stats['candidates'] += len(route_ids)
+            self._stats['flagged'] += flagged
+            self._stats['cleared'] += cleared
+            self._stats['last_run_ms'] = round(elapsed, 1)
+        logger.info(
+            f"Saved routes checked for {len(alert_ids)} alert(s): {len(route_ids)} candidates, "
+            f"{flagged} flagged, {cleared} cleared in {elapsed:.1f} ms"
+        )
+        return len(route_ids), flagged, cleared
+
+    def check_routes(self, routes):
+        """Check routes (e.g. one just saved) against all active alerts."""
+        routes = list(routes)
+        if not routes:
+            return 0, 0
+        index = active_alert_index.get()
+        return self._check_batch([route.id for route in routes], index, {entry.id for entry in index.entries})
+
+    def _candidates(self, alerts, index, point_radius):
+        """Ids of saved routes that may cross or have crossed the alerts."""
+        boxes = {entry.id: tuple(box) for entry, box in zip(index.entries, index.levels[0])} if index.levels else {}
+        missing = [alert_id for alert_id in alerts if alert_id not in boxes and alerts[alert_id] is None]
+        stored = {
+            alert_id: (min_lat, max_lat, min_lng, max_lng)
+            for alert_id, min_lat, max_lat, min_lng, max_lng in SafetyAlert.objects.filter(
+                id__in=missing, bbox_min_lat__isnull=False,
+            ).values_list('id', 'bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng')
+        } if missing else {}
+
+        route_ids = set(
+            SavedRoute.crossing_alerts.through.objects.filter(
+                safetyalert_id__in=list(alerts),
+            ).values_list('savedroute_id', flat=True)
+        )
+        for alert_id, fallback in alerts.items():
+            if alert_id in boxes:
+                min_lat, max_lat, min_lng, max_lng = boxes[alert_id]
+            else:
+                bounds = fallback or stored.get(alert_id)
+                if bounds is None:
+                    continue
+                # Inactive alert: widen its stored box as point alerts are
+                # matched within point_radius
+                min_lat, max_lat, min_lng, max_lng = (float(value) for value in bounds)
+                dlat = point_radius / METERS_PER_DEGREE_LAT
+                dlng = point_radius / float(meters_per_degree_lng(max(abs(min_lat), abs(max_lat))))
+                min_lat, max_lat, min_lng, max_lng = min_lat - dlat, max_lat + dlat, min_lng - dlng, max_lng + dlng
+            route_ids.update(
+                SavedRoute.objects.in_bounds(max_lat, min_lat, max_lng, min_lng).values_list('id', flat=True)
+            )
+        return route_ids
+
+    def _check_batch(self, route_ids, index, alert_ids):
+        """
+        Test one batch of routes against the alerts in `index` and update
+        their links to `alert_ids` and their flags. Returns (flagged, cleared).
+        """
+        routes = list(SavedRoute.objects.filter(id__in=route_ids).only(
+            'id', 'has_alert', 'origin_lat', 'origin_lng', 'destination_lat', 'destination_lng', 'route_polyline',
+        ))
+        found = set()
+        points = [route.route_points() for route in routes]
+        counts = np.array([len(route_points) - 1 for route_points in points])
+        if index.levels and counts.sum() > 0:
+            owners = np.repeat(np.arange(len(routes)), counts)
+            starts = np.array([point for route_points in points for point in route_points[:-1]])
+            ends = np.array([point for route_points in points for point in route_points[1:]])
+            segments, entries, _ = index.segment_hits(starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1])
+            found = {
+                (routes[owner].id, index.entries[entry].id)
+                for owner, entry in zip(owners[segments].tolist(), entries.tolist())
+            }
+
+        Link = SavedRoute.crossing_alerts.through
+        route_ids = [route.id for route in routes]
+        existing = {
+            (route_id, alert_id): link_id
+            for link_id, route_id, alert_id in Link.objects.filter(
+                savedroute_id__in=route_ids, safetyalert_id__in=list(alert_ids),
+            ).values_list('id', 'savedroute_id', 'safetyalert_id')
+        }
+
+        with transaction.atomic():
+            stale = [link_id for pair, link_id in existing.items() if pair not in found]
+            if stale:
+                Link.objects.filter(id__in=stale).delete()
+            Link.objects.bulk_create([
+                Link(savedroute_id=route_id, safetyalert_id=alert_id)
+                for route_id, alert_id in found if (route_id, alert_id) not in existing
+            ])
+            linked = set(
+                Link.objects.filter(savedroute_id__in=route_ids).values_list('savedroute_id', flat=True)
+            )
+            has_alert = Case(When(id__in=linked, then=Value(True)), default=Value(False)) if linked else False
+            SavedRoute.objects.filter(id__in=route_ids).update(has_alert=has_alert, alerts_checked_at=timezone.now())
+
+        flagged = sum(1 for route in routes if route.id in linked and not route.has_alert)
+        cleared = sum(1 for route in routes if route.id not in linked and route.has_alert)
+        return flagged, cleared
+
+
+saved_route_checker = SavedRouteAlertChecker(
+    batch_size=getattr(settings, 'SAVED_ROUTE_CHECK_BATCH_SIZE', 500),
+)
@@ -0,0 +1,131 @@
+"""
+Cache of computed walking routes.
+
+Popular trips (a dorm to the CULC, Tech Square to Klaus) are requested by
+many users. Routes are keyed by the graph nodes that the origin and
+destination snap to, so all requests that start and end near the same
+nodes share one A* search. Beyond ROUTE_CACHE_SIZE entries the least
+recently used one is evicted, and every entry expires ROUTE_CACHE_TTL
+seconds after it was computed.
+
+When the active alert snapshot changes, the router (see routing.py) works
+out which alerts were added, removed or edited and passes their bounding
+boxes to invalidate_bounds(). A route is only dropped when some path
+through one of those boxes could cost less than the cached route: every
+edge costs at least its length, so a path via the box is at least as long
+as the straight lines from the origin to the box and from the box to the
+destination. If that bound already exceeds the route's cost, neither a new
+alert there nor a lifted one can change the answer, and the route stays
+cached.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from .geo import METERS_PER_DEGREE_LAT
+
+# Keeps the straight-line bound below the haversine edge lengths (as for A*)
+BOUND_SCALE = 0.999
+
+
+def distance_to_box(lat, lng, box):
+    """Planar distance in meters from a point to (min_lat, max_lat, min_lng, max_lng)."""
+    dlat = max(box[0] - lat, 0.0, lat - box[1]) * METERS_PER_DEGREE_LAT
+    dlng = max(box[2] - lng, 0.0, lng - box[3]) * METERS_PER_DEGREE_LAT * math.cos(math.radians(lat))
+    return math.hypot(dlat, dlng) * BOUND_SCALE
+
+
+def may_affect(reach, box):
+    """
+    Whether an alert change inside box could change a route, given its
+    reach (origin lat, lng, destination lat, lng, cost).
+    """
+    lat_a, lng_a, lat_b, lng_b, cost = reach
+    return distance_to_box(lat_a, lng_a, box) + distance_to_box(lat_b, lng_b, box) <= cost
+
+
+class RouteCache:
+    """
+    LRU + TTL cache of route results keyed by (source node, target node).
+    """
+
+    def __init__(self, max_size=1000, ttl=900.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (result, reach, expires_at)
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0, 'evicted': 0}
+
+    @property
+    def generation(self):
+        """Changes on every invalidation; pass it back to put()."""
+        return self._generation
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def get(self, key):
+        """The cached result for key, or None."""
+        if not self.max_size:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                del self._entries[key]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, result, reach, generation):
+        """
+        Store a result. reach is (origin lat, lng, destination lat, lng,
+        cost) of the route, or None if alerts can't affect it. Results
+        computed before the last invalidation (generation differs) are not
+        stored.
+        """
+        if not self.max_size:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (result, reach, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def invalidate_bounds(self, boxes):
+        """
+        Drop every route that an alert change inside one of boxes, given as
+        (min_lat, max_lat, min_lng, max_lng), may affect.
+        """
+        boxes = [box for box in boxes if box is not None]
+        with self._lock:
+            self._generation += 1
+            if not boxes:
+                return 0
+            stale = [
+                key for key, (_, reach, _) in self._entries.items()
+                if reach is not None and any(may_affect(reach, box) for box in boxes)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidated'] += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
@@ -0,0 +1,513 @@
+"""
+Campus walking router.
+
+Loads a pedestrian network from a local file (settings.WALKING_GRAPH_PATH,
+a GeoJSON FeatureCollection of LineStrings or an OSM XML extract) into a
+compact CSR (compressed sparse row) adjacency:
+
+    indptr[n] .. indptr[n + 1]  -> slice of edges leaving node n
+    indices[e]                  -> node the edge leads to
+    lengths[e]                  -> edge length in meters
+
+Routes are found with A* using the straight-line distance to the target
+as heuristic. Edges that cross an active SafetyAlert zone cost more (see
+ROUTE_ALERT_PENALTIES), so routes go around hazards when a reasonable
+detour exists and only walk through them otherwise.
+
+The graph and the per-snapshot edge costs are immutable once built, so any
+number of request threads can search concurrently without locking. Results
+are cached per pair of snapped nodes (see route_cache.py).
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+from django.conf import settings
+
+from . import polyline
+from .alert_snapshot import active_alert_snapshot
+from .geo import (
+    METERS_PER_DEGREE_LAT, alert_bounds, haversine_m, point_segment_distance,
+    points_in_polygon, segments_intersect, to_local_xy,
+)
+from .route_cache import RouteCache
+
+logger = logging.getLogger(__name__)
+
+# OSM highway values that are walkable
+WALKABLE_HIGHWAYS = {
+    'footway', 'path', 'pedestrian', 'steps', 'living_street', 'residential',
+    'service', 'corridor', 'crossing', 'track', 'unclassified', 'tertiary',
+    'secondary', 'primary', 'cycleway',
+}
+
+# Edge cost multiplier for crossing an alert zone, by severity
+DEFAULT_ALERT_PENALTIES = {'low': 2.0, 'medium': 5.0, 'high': 20.0, 'critical': 100.0}
+
+# Nodes closer than this are merged when loading GeoJSON (~1 cm)
+COORDINATE_PRECISION = 7
+
+# Keeps the planar A* heuristic below the haversine edge lengths
+HEURISTIC_SCALE = 0.999
+
+
+class WalkingGraph:
+    """
+    Immutable pedestrian graph in CSR form. Every edge is stored in both
+    directions.
+    """
+
+    def __init__(self, node_lat, node_lng, edges):
+        """
+        node_lat/node_lng: coordinates per node.
+        edges: iterable of (from node, to node) pairs, undirected.
+        """
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.node_lng = np.asarray(node_lng, dtype=np.float64)
+
+        pairs = np.asarray(list(edges), dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        both = np.concatenate([pairs, pairs[:, ::-1]])
+        both = np.unique(both, axis=0)  # drop duplicate edges, sort by source
+
+        sources = both[:, 0]
+        self.indices = both[:, 1].astype(np.int32)
+        self.indptr = np.zeros(len(self.node_lat) + 1, dtype=np.int64)
+        np.add.at(self.indptr, sources + 1, 1)
+        self.indptr = np.cumsum(self.indptr)
+        self.edge_sources = sources.astype(np.int32)
+        self.lengths = haversine_m(
+            self.node_lat[sources], self.node_lng[sources],
+            self.node_lat[self.indices], self.node_lng[self.indices],
+        ).astype(np.float64)
+
+        # Plain-list mirrors: the A* loop indexes these one element at a
+        # time, which is several times faster on lists than on arrays.
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        self._lat = self.node_lat.tolist()
+        self._lng = self.node_lng.tolist()
+        self._lengths = self.lengths.tolist()
+
+    @property
+    def node_count(self):
+        return len(self.node_lat)
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Build from polylines given as lists of (lat, lng) vertices."""
+        node_ids = {}
+        node_lat = []
+        node_lng = []
+        edges = []
+        for line in lines:
+            previous = None
+            for lat, lng in line:
+                key = (round(lat, COORDINATE_PRECISION), round(lng, COORDINATE_PRECISION))
+                node = node_ids.get(key)
+                if node is None:
+                    node = node_ids[key] = len(node_lat)
+                    node_lat.append(lat)
+                    node_lng.append(lng)
+                if previous is not None:
+                    edges.append((previous, node))
+                previous = node
+        return cls(node_lat, node_lng, edges)
+
+    @classmethod
+    def from_geojson(cls, path):
+        """Load LineString/MultiLineString features ([lng, lat] order)."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        lines = []
+        for feature in data.get('features', []):
+            properties = feature.get('properties') or {}
+            if properties.get('foot') == 'no' or properties.get('access') == 'private':
+                continue
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'LineString':
+                parts = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiLineString':
+                parts = geometry['coordinates']
+            else:
+                continue
+            for part in parts:
+                lines.append([(point[1], point[0]) for point in part])
+        return cls.from_lines(lines)
+
+    @classmethod
+    def from_osm(cls, path):
+        """Load walkable ways from an OSM XML extract."""
+        nodes = {}
+        ways = []
+        for _, element in ElementTree.iterparse(path, events=('end',)):
+            if element.tag == 'node':
+                nodes[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+                element.clear()
+            elif element.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in element.findall('tag')}
+                if tags.get('highway') in WALKABLE_HIGHWAYS and tags.get('foot') != 'no':
+                    ways.append([nd.get('ref') for nd in element.findall('nd')])
+                element.clear()
+
+        lines = [[nodes[ref] for ref in way if ref in nodes] for way in ways]
+        return cls.from_lines(lines)
+
+    @classmethod
+    def load(cls, path):
+        path = str(path)
+        if path.endswith('.osm') or path.endswith('.xml'):
+            return cls.from_osm(path)
+        return cls.from_geojson(path)
+
+    def nearest_node(self, lat, lng):
+        """Closest node to a coordinate and its distance in meters."""
+        x, y = to_local_xy(self.node_lat, self.node_lng, lat, lng)
+        node = int(np.argmin(x * x + y * y))
+        return node, float(haversine_m(lat, lng, self.node_lat[node], self.node_lng[node]))
+
+    def shortest_path(self, source, target, costs=None):
+        """
+        A* from source to target. costs is a per-edge list of traversal
+        costs (defaults to lengths); it must never be below the edge length
+        for the straight-line heuristic to stay admissible.
+        Returns (node list, total cost) or (None, inf) if unreachable.
+        """
+        if costs is None:
+            costs = self._lengths
+        indptr = self._indptr
+        indices = self._indices
+        lat = self._lat
+        lng = self._lng
+
+        # Heuristic: planar distance to the target in meters. Shrunk very
+        # slightly so it never exceeds the haversine edge lengths.
+        target_lat = lat[target]
+        target_lng = lng[target]
+        scale_y = METERS_PER_DEGREE_LAT * HEURISTIC_SCALE
+        scale_x = scale_y * math.cos(math.radians(target_lat))
+        sqrt = math.sqrt
+
+        best = [math.inf] * len(lat)
+        came_from = {source: -1}
+        closed = bytearray(len(lat))
+        best[source] = 0.0
+        heap = [(0.0, 0.0, source)]
+        pop = heapq.heappop
+        push = heapq.heappush
+        while heap:
+            _, cost, node = pop(heap)
+            if node == target:
+                path = [node]
+                while came_from[path[-1]] != -1:
+                    path.append(came_from[path[-1]])
+                path.reverse()
+                return path, cost
+            if closed[node]:
+                continue
+            closed[node] = 1
+
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                if closed[neighbor]:
+                    continue
+                new_cost = cost + costs[edge]
+                if new_cost < best[neighbor]:
+                    best[neighbor] = new_cost
+                    came_from[neighbor] = node
+                    dx = (lng[neighbor] - target_lng) * scale_x
+                    dy = (lat[neighbor] - target_lat) * scale_y
+                    push(heap, (new_cost + sqrt(dx * dx + dy * dy), new_cost, neighbor))
+        return None, math.inf
+
+    def distances_from(self, source, costs=None, limit=math.inf):
+        """
+        Dijkstra from source to every node. Returns an array of path costs
+        (meters with the default costs); inf for nodes that are unreachable
+        or further than `limit`.
+        """
+        if costs is None:
+            costs = self._lengths
+        indptr = self._indptr
+        indices = self._indices
+
+        best = [math.inf] * self.node_count
+        closed = bytearray(self.node_count)
+        best[source] = 0.0
+        heap = [(0.0, source)]
+        pop = heapq.heappop
+        push = heapq.heappush
+        while heap:
+            cost, node = pop(heap)
+            if closed[node]:
+                continue
+            closed[node] = 1
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                new_cost = cost + costs[edge]
+                if new_cost < best[neighbor] and new_cost <= limit:
+                    best[neighbor] = new_cost
+                    push(heap, (new_cost, neighbor))
+        return np.array(best)
+
+    def coordinates(self, path):
+        """[[lat, lng], ...] of a node path."""
+        return [[self._lat[node], self._lng[node]] for node in path]
+
+    def path_edges(self, path):
+        """Edge ids along a node path."""
+        edges = []
+        for a, b in zip(path, path[1:]):
+            start, end = self._indptr[a], self._indptr[a + 1]
+            edges.append(start + self._indices[start:end].index(b))
+        return edges
+
+
+class EdgePenalties:
+    """
+    Per-edge cost multipliers for one alert snapshot.
+
+    multipliers[e] is the largest penalty of any alert zone edge e crosses
+    (1.0 if none) and alert_ids[e] the id of that alert (-1 if none).
+    """
+
+    def __init__(self, graph, snapshot, penalties, point_radius_m=25.0):
+        self.snapshot = snapshot
+        self.multipliers = np.ones(graph.edge_count)
+        self.alert_ids = np.full(graph.edge_count, -1, dtype=np.int64)
+
+        if graph.edge_count:
+            a = graph.edge_sources
+            b = graph.indices
+            lat_a, lng_a = graph.node_lat[a], graph.node_lng[a]
+            lat_b, lng_b = graph.node_lat[b], graph.node_lng[b]
+            edge_min_lat = np.minimum(lat_a, lat_b)
+            edge_max_lat = np.maximum(lat_a, lat_b)
+            edge_min_lng = np.minimum(lng_a, lng_b)
+            edge_max_lng = np.maximum(lng_a, lng_b)
+
+            for entry in snapshot.entries:
+                penalty = penalties.get(entry.severity, 1.0)
+                if penalty <= 1.0 or entry.bbox is None:
+                    continue
+                min_lat, max_lat, min_lng, max_lng = self._zone_bounds(entry, point_radius_m)
+                candidates = np.flatnonzero(
+                    (edge_min_lat <= max_lat) & (edge_max_lat >= min_lat)
+                    & (edge_min_lng <= max_lng) & (edge_max_lng >= min_lng)
+                )
+                if not len(candidates):
+                    continue
+                hit = candidates[self._crosses(entry, point_radius_m, lat_a[candidates], lng_a[candidates],
+                                               lat_b[candidates], lng_b[candidates])]
+                worse = hit[self.multipliers[hit] < penalty]
+                self.multipliers[worse] = penalty
+                self.alert_ids[worse] = entry.id
+
+        self.costs = (graph.lengths * self.multipliers).tolist()
+
+    @staticmethod
+    def _zone_bounds(entry, point_radius_m):
+        """Alert bbox; point alerts are widened to a small circle."""
+        data = entry.data
+        if data.get('location_type') in ('circle', 'polygon'):
+            return entry.bbox
+        return alert_bounds('circle', data['latitude'], data['longitude'], radius=point_radius_m)
+
+    @staticmethod
+    def _crosses(entry, point_radius_m, lat_a, lng_a, lat_b, lng_b):
+        """Which segments A-B touch the alert's circle or polygon."""
+        data = entry.data
+        lat0 = (entry.bbox[0] + entry.bbox[1]) / 2.0
+        lng0 = (entry.bbox[2] + entry.bbox[3]) / 2.0
+        ax, ay = to_local_xy(lat_a, lng_a, lat0, lng0)
+        bx, by = to_local_xy(lat_b, lng_b, lat0, lng0)
+
+        polygon = data.get('polygon_coordinates') if data.get('location_type') == 'polygon' else None
+        if polygon:
+            vertices = np.asarray(polygon, dtype=np.float64)
+            vx, vy = to_local_xy(vertices[:, 0], vertices[:, 1], lat0, lng0)
+            inside = points_in_polygon(ax, ay, vx, vy) | points_in_polygon(bx, by, vx, vy)
+            crossing, _ = segments_intersect(
+                ax[:, None], ay[:, None], bx[:, None], by[:, None],
+                vx[None, :], vy[None, :], np.roll(vx, -1)[None, :], np.roll(vy, -1)[None, :],
+            )
+            return inside | crossing.any(axis=1)
+
+        if data.get('location_type') == 'circle' and data.get('radius'):
+            radius = float(data['radius'])
+        else:
+            radius = point_radius_m
+        cx, cy = to_local_xy(data['latitude'], data['longitude'], lat0, lng0)
+        distance, _ = point_segment_distance(cx, cy, ax, ay, bx, by)
+        return distance <= radius
+
+
+class CampusRouter:
+    """
+    Process-wide router: the walking graph (loaded lazily from
+    WALKING_GRAPH_PATH), edge penalties for the current alert snapshot and
+    the route cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._graph = None
+        self._failure = None  # (path, file mtime, retry at) after a failed load
+        self._penalties = None
+        self.cache = RouteCache(
+            max_size=getattr(settings, 'ROUTE_CACHE_SIZE', 1000),
+            ttl=getattr(settings, 'ROUTE_CACHE_TTL', 900),
+        )
+
+    def get_graph(self):
+        """The loaded WalkingGraph, or None if no graph file is available."""
+        if self._graph is not None or not self._should_load():
+            return self._graph
+        with self._lock:
+            if self._graph is None and self._should_load():
+                path = getattr(settings, 'WALKING_GRAPH_PATH', None)
+                try:
+                    start = time.perf_counter()
+                    self._graph = WalkingGraph.load(path)
+                    logger.info(
+                        f"Walking graph loaded from {path}: {self._graph.node_count} nodes, "
+                        f"{self._graph.edge_count} directed edges in "
+                        f"{(time.perf_counter() - start) * 1000:.0f} ms"
+                    )
+                except (OSError, TypeError, ValueError, ElementTree.ParseError) as e:
+                    logger.warning(f"Walking graph unavailable ({path}): {str(e)}")
+                    retry_at = time.monotonic() + getattr(settings, 'WALKING_GRAPH_RETRY_SECONDS', 300)
+                    self._failure = (path, self._file_mtime(path), retry_at)
+        return self._graph
+
+    def _should_load(self):
+        """
+        Whether to try loading the graph: always before the first attempt,
+        and after a failed one once the file (or WALKING_GRAPH_PATH) changed
+        or WALKING_GRAPH_RETRY_SECONDS passed.
+        """
+        if self._failure is None:
+            return True
+        path, mtime, retry_at = self._failure
+        return (
+            time.monotonic() >= retry_at
+            or getattr(settings, 'WALKING_GRAPH_PATH', None) != path
+            or self._file_mtime(path) != mtime
+        )
+
+    @staticmethod
+    def _file_mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except (OSError, TypeError, ValueError):
+            return None
+
+    def set_graph(self, graph):
+        """
+        Replace the graph (e.g. after rebuilding the file). None reloads it
+        from WALKING_GRAPH_PATH on next use.
+        """
+        with self._lock:
+            self._graph = graph
+            self._failure = None
+            self._penalties = None
+            self.cache.clear()
+
+    def get_penalties(self):
+        """EdgePenalties for the current alert snapshot."""
+        graph = self.get_graph()
+        snapshot = active_alert_snapshot.get()
+        penalties = self._penalties
+        if penalties is not None and penalties.snapshot is snapshot:
+            return penalties
+        with self._lock:
+            if self._penalties is None or self._penalties.snapshot is not snapshot:
+                previous = self._penalties
+                point_radius_m = getattr(settings, 'ALERT_POINT_RADIUS_M', 25.0)
+                self._penalties = EdgePenalties(
+                    graph, snapshot,
+                    getattr(settings, 'ROUTE_ALERT_PENALTIES', DEFAULT_ALERT_PENALTIES),
+                    point_radius_m=point_radius_m,
+                )
+                if previous is not None:
+                    self.cache.invalidate_bounds(self.changed_zones(previous.snapshot, snapshot, point_radius_m))
+            return self._penalties
+
+    @staticmethod
+    def changed_zones(old, new, point_radius_m):
+        """Areas of the alerts added, removed or edited between two snapshots."""
+        before = {entry.id: entry for entry in old.entries}
+        after = {entry.id: entry for entry in new.entries}
+        zones = []
+        for alert_id in before.keys() | after.keys():
+            old_entry, new_entry = before.get(alert_id), after.get(alert_id)
+            if old_entry is not None and new_entry is not None and old_entry.json == new_entry.json:
+                continue
+            for entry in (old_entry, new_entry):
+                if entry is not None and entry.bbox is not None:
+                    zones.append(EdgePenalties._zone_bounds(entry, point_radius_m))
+        return zones
+
+    def route(self, from_lat, from_lng, to_lat, to_lng):
+        """
+        Walking route between two coordinates, or None if no graph is
+        loaded. The result dict has 'found' False when the snapped nodes
+        are not connected. Searches are shared through the route cache.
+        """
+        graph = self.get_graph()
+        if graph is None or not graph.node_count:
+            return None
+
+        source, source_snap = graph.nearest_node(from_lat, from_lng)
+        target, target_snap = graph.nearest_node(to_lat, to_lng)
+        # Read before the penalties so a concurrent invalidation drops our result
+        generation = self.cache.generation
+        penalties = self.get_penalties()
+        result = self.cache.get((source, target))
+        if result is None:
+            result, reach = self._search(graph, penalties, source, target)
+            self.cache.put((source, target), result, reach, generation)
+        return dict(result, snap_m=(source_snap, target_snap))
+
+    def _search(self, graph, penalties, source, target):
+        """
+        A* between two nodes. Returns (result, reach) where reach is what
+        the route cache needs to tell which alert changes may affect it.
+        """
+        path, cost = graph.shortest_path(source, target, penalties.costs)
+        if path is None:
+            # Penalties never disconnect nodes, so alerts can't change this
+            return {'found': False}, None
+
+        edges = graph.path_edges(path)
+        alert_ids = sorted({int(alert_id) for alert_id in penalties.alert_ids[edges] if alert_id >= 0})
+        distance = float(graph.lengths[edges].sum()) if edges else 0.0
+        coordinates = graph.coordinates(path)
+        reach = (
+            float(graph.node_lat[source]), float(graph.node_lng[source]),
+            float(graph.node_lat[target]), float(graph.node_lng[target]), cost,
+        )
+        return {
+            'found': True,
+            'path': coordinates,
+            'polyline': polyline.encode(coordinates),
+            'distance_m': distance,
+            'cost': cost,
+            'alert_ids': alert_ids,
+        }, reach
+
+
+# Shared per-process router used by the views
+campus_router = CampusRouter()
+
@@ -1,5 +1,25 @@
 """
-Background scheduler for updating occupancy data from Waitz.io
+Background scheduler for updating occupancy data from Waitz.io and the
+other periodic jobs.
+
+Jobs are registered in JOBS with the @job decorator and run by an
+APScheduler BackgroundScheduler, either in a dedicated process
+(python manage.py run_scheduler, for production) or inside runserver
+during development.
+
+Any number of scheduler processes may run, on any host. They share a
+leader lock: a SchedulerLease row that one process holds while it renews
+it every SCHEDULER_HEARTBEAT_SECONDS. The lease lasts
+SCHEDULER_LEASE_SECONDS. Jobs only run in the holder; the others check
+on each heartbeat and take over once the lease has expired, for example
+when the leader was killed. The expiry is compared with each host's
+clock, so hosts' clocks must agree to well within the lease.
+
+fetch_waitz_occupancy is checked every WAITZ_POLL_MIN_SECONDS and fetches
+the feed only when the adaptive polling policy (polling.py) says it's due.
+
+Each run is recorded in ScheduledJobStatus (duration, last success, last
+error), which the analytics dashboard and run_scheduler --status show.
 """
 try:
     from apscheduler.schedulers.background import BackgroundScheduler
@@ -8,60 +28,263 @@ except ImportError:
     APSCHEDULER_AVAILABLE = False
     BackgroundScheduler = None
 
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.management import call_command
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
 import logging
 
+from .polling import poll_due
+
 logger = logging.getLogger(__name__)
 
+LEASE_NAME = 'scheduler'
+
+# Job id -> {'func', 'trigger', 'trigger_args'}, in registration order
+JOBS = {}
 
+
+def job(trigger, **trigger_args):
+    """
+    Register a function as a scheduled job with an APScheduler trigger.
+    A job returns False when it had nothing to do; that run isn't recorded.
+    """
+    def register(func):
+        JOBS[func.__name__] = {'func': func, 'trigger': trigger, 'trigger_args': trigger_args}
+        return func
+    return register
+
+
+# Checked every WAITZ_POLL_MIN_SECONDS; the adaptive policy decides when a fetch is due
+@job('interval', seconds=getattr(settings, 'WAITZ_POLL_MIN_SECONDS', 120))
 def fetch_waitz_occupancy():
     """
-    Scheduled task to fetch occupancy data from Waitz.io
-    Runs every 10 minutes
+    Scheduled task to fetch occupancy data from Waitz.io, when the polling
+    policy says it's due (see polling.py)
+    """
+    if not poll_due():
+        return False
+    # Call the management command to fetch occupancy data
+    # This will update all buildings that have waitz_id set
+    call_command('fetch_waitz_occupancy', '--all')
+
+
+@job('interval', minutes=10)
+def check_saved_routes():
+    """
+    Scheduled task to catch saved routes up with alerts that started or
+    expired on their own (alert edits are handled as they happen)
+    """
+    call_command('check_saved_routes')
+
+
+# Just after each hour, once that hour's samples are complete
+@job('cron', minute=2)
+def rollup_occupancy():
+    """
+    Scheduled task to merge the last hour's occupancy samples into the
+    hour-of-week stats, refresh peak hours and refit the forecaster
+    """
+    call_command('rollup_occupancy')
+
+
+def default_identity():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class LeaderLease:
+    """
+    One process's view of the SchedulerLease row. acquire() renews the
+    lease if this process holds it, or takes it if it is free or expired,
+    with a single conditional UPDATE so two processes can't both win.
     """
+
+    def __init__(self, identity=None, name=LEASE_NAME, ttl=None):
+        self.identity = identity or default_identity()
+        self.name = name
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SCHEDULER_LEASE_SECONDS', 60)
+        self._valid_until = 0.0  # time.monotonic() deadline of the lease we hold
+
+    def acquire(self):
+        """Take or renew the lease. Returns whether this process is the leader."""
+        from .models import SchedulerLease
+
+        started = time.monotonic()
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+        leases = SchedulerLease.objects.filter(name=self.name)
+        held = leases.filter(holder=self.identity, expires_at__gt=now).update(
+            renewed_at=now, expires_at=expires_at,
+        )
+        if not held:
+            held = leases.filter(Q(expires_at__isnull=True) | Q(expires_at__lte=now) | Q(holder=self.identity)).update(
+                holder=self.identity, acquired_at=now, renewed_at=now, expires_at=expires_at,
+            )
+            if held:
+                logger.info(f"Scheduler lease '{self.name}' acquired by {self.identity}")
+        if not held and not leases.exists():
+            try:
+                with transaction.atomic():
+                    SchedulerLease.objects.create(
+                        name=self.name, holder=self.identity, acquired_at=now, renewed_at=now, expires_at=expires_at,
+                    )
+                held = 1
+                logger.info(f"Scheduler lease '{self.name}' acquired by {self.identity}")
+            except IntegrityError:
+                held = 0  # another process created it first
+        self._valid_until = started + self.ttl if held else 0.0
+        return bool(held)
+
+    def is_leader(self):
+        """Whether the lease last acquired by this process is still current."""
+        return time.monotonic() < self._valid_until
+
+    def release(self):
+        """Give the lease up so a standby can take over at once."""
+        from .models import SchedulerLease
+
+        if self._valid_until:
+            SchedulerLease.objects.filter(name=self.name, holder=self.identity).update(expires_at=timezone.now())
+            self._valid_until = 0.0
+
+
+def run_job(job_id, func, lease):
+    """Run a job if this process is the leader, recording its outcome."""
+    from .models import ScheduledJobStatus
+
+    if not lease.is_leader():
+        return
+    close_old_connections()
+    started_at = timezone.now()
+    start = time.perf_counter()
+    error = ''
+    try:
+        logger.debug(f"[{started_at}] Starting scheduled job {job_id}...")
+        if func() is False:
+            close_old_connections()
+            return
+    except Exception as e:
+        error = f'{str(e)}\n{traceback.format_exc()}'
+        logger.error(f"[{timezone.now()}] Error in scheduled job {job_id}: {str(e)}")
+    duration_ms = (time.perf_counter() - start) * 1000
+    finished_at = timezone.now()
+
+    try:
+        values = {
+            'runs': F('runs') + 1,
+            'last_started_at': started_at,
+            'last_finished_at': finished_at,
+            'last_duration_ms': duration_ms,
+            'total_duration_ms': F('total_duration_ms') + duration_ms,
+            'last_error': error,
+            'last_holder': lease.identity,
+        }
+        if error:
+            values['failures'] = F('failures') + 1
+        else:
+            values['last_success_at'] = finished_at
+        values['max_duration_ms'] = Greatest(F('max_duration_ms'), Value(duration_ms))
+        # Create the row and count the run together, so no reader sees a
+        # row without a run
+        with transaction.atomic():
+            ScheduledJobStatus.objects.get_or_create(job_id=job_id)
+            ScheduledJobStatus.objects.filter(job_id=job_id).update(**values)
+    except Exception as e:
+        logger.error(f"Could not record the run of {job_id}: {str(e)}")
+    finally:
+        close_old_connections()
+    logger.info(f"[{finished_at}] Scheduled job {job_id} {'failed' if error else 'completed'} in {duration_ms:.0f} ms")
+
+
+def heartbeat(lease):
+    """Renew the lease, or try to take it over."""
+    was_leader = lease.is_leader()
+    close_old_connections()
     try:
-        logger.info(f"[{timezone.now()}] Starting scheduled Waitz occupancy update...")
-        
-        # Call the management command to fetch occupancy data
-        # This will update all buildings that have waitz_id set
-        call_command('fetch_waitz_occupancy', '--all')
-        
-        logger.info(f"[{timezone.now()}] Scheduled Waitz occupancy update completed")
+        leader = lease.acquire()
     except Exception as e:
-        logger.error(f"[{timezone.now()}] Error in scheduled Waitz update: {str(e)}")
+        logger.error(f"Scheduler lease heartbeat failed: {str(e)}")
+        leader = lease.is_leader()
+    finally:
+        close_old_connections()
+    if was_leader and not leader:
+        logger.warning(f"Scheduler lease lost by {lease.identity}; jobs paused")
 
 
-def start_scheduler():
+def start_scheduler(identity=None):
     """
-    Start the background scheduler
+    Start the background scheduler with every registered job. Returns
+    (scheduler, lease), or None if APScheduler isn't installed.
     """
     if not APSCHEDULER_AVAILABLE:
         logger.warning("APScheduler not available. Install it with: pip install apscheduler")
         return None
-    
+
+    lease = LeaderLease(identity)
+    heartbeat(lease)
+
     scheduler = BackgroundScheduler()
-    
-    # Schedule the job to run every 10 minutes
+    for job_id, entry in JOBS.items():
+        scheduler.add_job(
+            run_job,
+            entry['trigger'],
+            args=[job_id, entry['func'], lease],
+            id=job_id,
+            replace_existing=True,
+            max_instances=1,  # Prevent overlapping runs
+            coalesce=True,
+            **entry['trigger_args'],
+        )
     scheduler.add_job(
-        fetch_waitz_occupancy,
+        heartbeat,
         'interval',
-        minutes=10,
-        id='fetch_waitz_occupancy',
+        seconds=getattr(settings, 'SCHEDULER_HEARTBEAT_SECONDS', 15),
+        args=[lease],
+        id='scheduler_heartbeat',
         replace_existing=True,
-        max_instances=1  # Prevent overlapping runs
+        max_instances=1,
     )
-    
-    # Run immediately on startup (optional)
-    # scheduler.add_job(
-    #     fetch_waitz_occupancy,
-    #     'date',
-    #     run_date=timezone.now(),
-    #     id='fetch_waitz_occupancy_startup'
-    # )
-    
+
     scheduler.start()
-    logger.info("Waitz occupancy scheduler started - will update every 10 minutes")
-    
-    return scheduler
+    role = 'leader' if lease.is_leader() else 'standby'
+    logger.info(f"Scheduler started as {role} ({lease.identity}) with jobs: {', '.join(JOBS)}")
+
+    return scheduler, lease
+
+
+def stop_scheduler(scheduler, lease):
+    """Stop the scheduler, letting running jobs finish, and release the lease."""
+    scheduler.shutdown(wait=True)
+    try:
+        lease.release()
+    except Exception as e:
+        logger.error(f"Could not release the scheduler lease: {str(e)}")
+
+
+def scheduler_status():
+    """The lease and every registered job's status, for the dashboard and --status."""
+    from .models import ScheduledJobStatus, SchedulerLease
 
+    lease = SchedulerLease.objects.filter(name=LEASE_NAME).first()
+    statuses = {status.job_id: status for status in ScheduledJobStatus.objects.filter(job_id__in=list(JOBS))}
+    return {
+        'leader': lease.holder if lease and lease.expires_at and lease.expires_at > timezone.now() else None,
+        'lease': lease,
+        'jobs': [
+            {
+                'id': job_id,
+                'schedule': ', '.join(f'{key}={value}' for key, value in entry['trigger_args'].items()),
+                'trigger': entry['trigger'],
+                'status': statuses.get(job_id),
+            }
+            for job_id, entry in JOBS.items()
+        ],
+    }
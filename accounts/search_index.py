@@ -0,0 +1,364 @@
+"""
+In-memory search index for campus buildings.
+
+Keeps an n-gram index over Building name, code and address so the map's
+search box can be answered without running an OR of three icontains
+filters (a full table scan) on every keystroke.
+
+Fuzzy mode (?fuzzy=1) tolerates misspellings: query words are matched
+against the indexed vocabulary through a word trigram index, scored with a
+bounded edit distance, and weighted by field (code > name > address).
+
+The index is process-local. It is loaded from the database on the first
+search, kept in sync by the Building post_save/post_delete signals once the
+change is committed (see signals.py), and reloaded when another process
+changed buildings (checked at most every BUILDING_INDEX_CHECK_INTERVAL
+seconds, see table_version.py).
+"""
+import heapq
+import logging
+import re
+import threading
+
+from .table_version import TableVersion
+
+logger = logging.getLogger(__name__)
+
+# Fields indexed for each building
+SEARCH_FIELDS = ('name', 'code', 'address')
+
+# Longest gram stored in the index. Queries longer than this are answered by
+# intersecting their grams and verifying the substring on the candidates.
+MAX_GRAM = 3
+
+# Result tiers (lower sorts first)
+TIER_EXACT_CODE = 0
+TIER_NAME_PREFIX = 1
+TIER_SUBSTRING = 2
+
+# Fuzzy ranking weight of a word match in each field
+FIELD_WEIGHTS = {'code': 3.0, 'name': 2.0, 'address': 1.0}
+
+# Score multiplier when a query word only matches the start of a word
+PREFIX_MATCH_PENALTY = 0.85
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase and collapse whitespace for indexing and querying."""
+    return ' '.join((text or '').lower().split())
+
+
+def iter_grams(text, max_gram=MAX_GRAM):
+    """Yield every distinct substring of text with length 1..max_gram."""
+    seen = set()
+    for size in range(1, max_gram + 1):
+        for start in range(len(text) - size + 1):
+            gram = text[start:start + size]
+            if gram not in seen:
+                seen.add(gram)
+                yield gram
+
+
+def query_grams(query, max_gram=MAX_GRAM):
+    """Return the grams whose postings must all contain a match for query."""
+    if len(query) <= max_gram:
+        return [query]
+    return list({query[i:i + max_gram] for i in range(len(query) - max_gram + 1)})
+
+
+def tokenize(text):
+    """Split normalized text into alphanumeric words."""
+    return WORD_RE.findall(text)
+
+
+def word_grams(word):
+    """Return the padded trigrams of a word (^ and $ mark its boundaries)."""
+    padded = f'^{word}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(word):
+    """Number of edits tolerated for a query word of this length."""
+    if len(word) <= 3:
+        return 0 if len(word) < 3 else 1
+    if len(word) <= 6:
+        return 1
+    return 2
+
+
+def bounded_edit_distance(query, word, max_dist, prefix=False):
+    """
+    Optimal string alignment distance between query and word, or None if it
+    exceeds max_dist. With prefix=True the query is compared against the best
+    matching prefix of word, so partially typed words still match.
+    """
+    if not prefix and abs(len(query) - len(word)) > max_dist:
+        return None
+
+    previous_previous = None
+    previous = list(range(len(word) + 1))
+    for i in range(1, len(query) + 1):
+        current = [i] + [0] * len(word)
+        for j in range(1, len(word) + 1):
+            cost = 0 if query[i - 1] == word[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1,         # deletion
+                current[j - 1] + 1,      # insertion
+                previous[j - 1] + cost,  # substitution
+            )
+            if (i > 1 and j > 1 and query[i - 1] == word[j - 2]
+                    and query[i - 2] == word[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)  # transposition
+        if min(current) > max_dist:
+            return None
+        previous_previous, previous = previous, current
+
+    distance = min(previous) if prefix else previous[-1]
+    return distance if distance <= max_dist else None
+
+
+class BuildingSearchIndex:
+    """
+    Process-local n-gram index over Building name, code and address.
+
+    Results are ranked deterministically: exact code matches first, then
+    name prefixes, then any other substring match. Ties are broken by name
+    and id so the order is stable across requests and processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = TableVersion('Building', 'BUILDING_INDEX_CHECK_INTERVAL')
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}  # building id -> {field: normalized text}
+        self._postings = {field: {} for field in SEARCH_FIELDS}  # field -> gram -> set(ids)
+        self._words = {field: {} for field in SEARCH_FIELDS}  # field -> word -> set(ids)
+        self._word_refs = {}  # word -> number of (field, building) references
+        self._word_grams = {}  # padded trigram -> set(words)
+
+    @property
+    def is_loaded(self):
+        return self._loaded
+
+    def load(self):
+        """(Re)build the whole index from the database."""
+        from .models import Building
+
+        fingerprint = self._version.fingerprint()
+        rows = list(Building.objects.values_list('id', *SEARCH_FIELDS))
+        with self._lock:
+            self._reset()
+            for building_id, *values in rows:
+                self._add(building_id, dict(zip(SEARCH_FIELDS, values)))
+            self._loaded = True
+            self._version.mark_loaded(fingerprint)
+        logger.info(f"Building search index loaded ({len(self._docs)} buildings)")
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on the next search."""
+        with self._lock:
+            self._loaded = False
+            self._reset()
+
+    def update_building(self, building):
+        """Insert or refresh a single building after it was saved."""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(building.pk)
+            self._add(building.pk, {field: getattr(building, field) for field in SEARCH_FIELDS})
+
+    def remove_building(self, building_id):
+        """Remove a single building after it was deleted."""
+        with self._lock:
+            if self._loaded:
+                self._remove(building_id)
+
+    def search(self, query, limit=20):
+        """
+        Return up to `limit` ranked building ids matching query.
+        Returns None if the index could not be loaded, so callers can fall
+        back to the ORM query.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        with self._lock:
+            if not self._ensure_loaded():
+                return None
+
+            matches = set()
+            grams = query_grams(query)
+            for field in SEARCH_FIELDS:
+                candidates = self._candidates(field, grams)
+                if len(query) > MAX_GRAM:
+                    candidates = {pk for pk in candidates if query in self._docs[pk][field]}
+                matches |= candidates
+
+            return heapq.nsmallest(limit, matches, key=lambda pk: self._rank_key(pk, query))
+
+    def fuzzy_search(self, query, limit=20):
+        """
+        Return up to `limit` building ids ranked by typo-tolerant relevance.
+
+        Every query word must match some word of the building (exactly, as a
+        prefix, or within a bounded edit distance). Each word contributes its
+        best match weighted by field, and buildings are ordered by total score.
+        Returns None if the index could not be loaded.
+        """
+        tokens = tokenize(normalize(query))
+        if not tokens:
+            return []
+
+        with self._lock:
+            if not self._ensure_loaded():
+                return None
+
+            totals = None
+            for token in tokens:
+                token_scores = self._score_token(token)
+                if totals is None:
+                    totals = token_scores
+                else:
+                    totals = {pk: totals[pk] + score for pk, score in token_scores.items() if pk in totals}
+                if not totals:
+                    return []
+
+            return heapq.nsmallest(
+                limit, totals,
+                key=lambda pk: (-totals[pk], self._docs[pk]['name'], self._docs[pk]['code'], pk),
+            )
+
+    def _score_token(self, token):
+        """Best weighted similarity of token against each building's words."""
+        max_dist = max_typos(token)
+
+        # Candidate words must share enough padded trigrams with the token:
+        # each edit destroys at most 3 of them, and a prefix match loses the
+        # trailing '$' gram.
+        grams = word_grams(token)
+        shared = {}
+        for gram in grams:
+            for word in self._word_grams.get(gram, ()):
+                shared[word] = shared.get(word, 0) + 1
+        min_shared = max(1, len(grams) - 3 * max_dist - 1)
+
+        scores = {}
+        for word, count in shared.items():
+            if count < min_shared:
+                continue
+            if word == token:
+                similarity = 1.0
+            else:
+                distance = bounded_edit_distance(token, word, max_dist)
+                if distance is not None:
+                    similarity = 1.0 - distance / (len(token) + 1)
+                else:
+                    distance = bounded_edit_distance(token, word, max_dist, prefix=True)
+                    if distance is None:
+                        continue
+                    similarity = PREFIX_MATCH_PENALTY * (1.0 - distance / (len(token) + 1))
+
+            for field in SEARCH_FIELDS:
+                ids = self._words[field].get(word)
+                if not ids:
+                    continue
+                score = FIELD_WEIGHTS[field] * similarity
+                for building_id in ids:
+                    if score > scores.get(building_id, 0.0):
+                        scores[building_id] = score
+        return scores
+
+    def _ensure_loaded(self):
+        try:
+            if self._loaded and not self._version.is_stale():
+                return True
+            self.load()
+        except Exception as e:
+            # A failed reload keeps serving the index that is already loaded
+            logger.warning(f"Building search index unavailable: {str(e)}")
+            return self._loaded
+        return True
+
+    def _candidates(self, field, grams):
+        """Intersect posting lists for grams, smallest first."""
+        postings = self._postings[field]
+        lists = []
+        for gram in grams:
+            ids = postings.get(gram)
+            if not ids:
+                return set()
+            lists.append(ids)
+        lists.sort(key=len)
+        result = set(lists[0])
+        for ids in lists[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def _rank_key(self, building_id, query):
+        doc = self._docs[building_id]
+        if doc['code'] == query:
+            tier = TIER_EXACT_CODE
+        elif doc['name'].startswith(query):
+            tier = TIER_NAME_PREFIX
+        else:
+            tier = TIER_SUBSTRING
+        return (tier, doc['name'], doc['code'], building_id)
+
+    def _add(self, building_id, values):
+        doc = {field: normalize(values.get(field)) for field in SEARCH_FIELDS}
+        self._docs[building_id] = doc
+        for field in SEARCH_FIELDS:
+            postings = self._postings[field]
+            for gram in iter_grams(doc[field]):
+                postings.setdefault(gram, set()).add(building_id)
+
+            words = self._words[field]
+            for word in set(tokenize(doc[field])):
+                words.setdefault(word, set()).add(building_id)
+                self._word_refs[word] = self._word_refs.get(word, 0) + 1
+                if self._word_refs[word] == 1:
+                    for gram in word_grams(word):
+                        self._word_grams.setdefault(gram, set()).add(word)
+
+    def _remove(self, building_id):
+        doc = self._docs.pop(building_id, None)
+        if doc is None:
+            return
+        for field in SEARCH_FIELDS:
+            postings = self._postings[field]
+            for gram in iter_grams(doc[field]):
+                ids = postings.get(gram)
+                if ids is not None:
+                    ids.discard(building_id)
+                    if not ids:
+                        del postings[gram]
+
+            words = self._words[field]
+            for word in set(tokenize(doc[field])):
+                ids = words.get(word)
+                if ids is not None:
+                    ids.discard(building_id)
+                    if not ids:
+                        del words[word]
+                self._word_refs[word] -= 1
+                if not self._word_refs[word]:
+                    del self._word_refs[word]
+                    for gram in word_grams(word):
+                        grams = self._word_grams.get(gram)
+                        if grams is not None:
+                            grams.discard(word)
+                            if not grams:
+                                del self._word_grams[gram]
+
+
+# Shared per-process index used by the views
+building_index = BuildingSearchIndex()
@@ -0,0 +1,54 @@
+"""
+Signal handlers that keep in-memory caches in sync with the database.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .alert_snapshot import active_alert_snapshot
+from .isochrone import isochrone_index
+from .models import Building, SafetyAlert
+from .route_alerts import saved_route_checker
+from .search_index import building_index
+from .spatial_index import building_spatial_index
+from .walking_matrix import walking_matrix
+
+
+@receiver(post_save, sender=Building)
+def building_saved(sender, instance, **kwargs):
+    """
+    Refresh the building in the search, spatial and isochrone indexes, and
+    its walking times if it moved.
+    """
+    transaction.on_commit(lambda: building_index.update_building(instance))
+    transaction.on_commit(lambda: building_spatial_index.update_building(instance))
+    transaction.on_commit(isochrone_index.invalidate_buildings)
+
+    building_id, lat, lng = instance.pk, instance.latitude, instance.longitude
+    transaction.on_commit(lambda: walking_matrix.building_moved(building_id, lat, lng))
+
+
+@receiver(post_delete, sender=Building)
+def building_deleted(sender, instance, **kwargs):
+    """Drop the building from the search, spatial and isochrone indexes."""
+    building_id = instance.pk
+    transaction.on_commit(lambda: building_index.remove_building(building_id))
+    transaction.on_commit(lambda: building_spatial_index.remove_building(building_id))
+    transaction.on_commit(isochrone_index.invalidate_buildings)
+
+
+@receiver(post_save, sender=SafetyAlert)
+@receiver(post_delete, sender=SafetyAlert)
+def safety_alert_changed(sender, instance, **kwargs):
+    """
+    Rebuild the active alert snapshot once the change is committed, then
+    re-check the saved routes around the alert.
+    """
+    transaction.on_commit(active_alert_snapshot.invalidate)
+
+    # A deleted row can't be looked up later, so pass its last known box
+    bounds = None
+    if kwargs.get('signal') is post_delete and instance.bbox_min_lat is not None:
+        bounds = (instance.bbox_min_lat, instance.bbox_max_lat, instance.bbox_min_lng, instance.bbox_max_lng)
+    alert_id = instance.pk
+    transaction.on_commit(lambda: saved_route_checker.enqueue(alert_id, bounds))
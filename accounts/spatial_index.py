@@ -0,0 +1,206 @@
+"""
+In-memory spatial index for nearest-building queries.
+
+Buildings are bucketed into a uniform latitude/longitude grid. A k-nearest
+query walks rings of cells outward from the query point and computes
+haversine distances for the gathered candidates in one NumPy call, stopping
+as soon as no unvisited cell can hold a closer building.
+
+Like the search index, it is process-local, loaded on first use, kept in
+sync per building by the Building signals once the change is committed (see
+signals.py) and reloaded when another process changed buildings (see
+table_version.py).
+"""
+import logging
+import math
+import threading
+
+import numpy as np
+
+from .geo import haversine_m, meters_per_degree_lng
+from .table_version import TableVersion
+
+logger = logging.getLogger(__name__)
+
+# Grid cell size in degrees (about 220 m of latitude)
+CELL_SIZE_DEG = 0.002
+
+
+class BuildingSpatialIndex:
+    """
+    Uniform grid index over Building latitude/longitude.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE_DEG):
+        self.cell_size = cell_size
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = TableVersion('Building', 'BUILDING_INDEX_CHECK_INTERVAL')
+        self._cells = {}      # (row, col) -> {building id: (lat, lng)}
+        self._locations = {}  # building id -> (row, col)
+        self._bounds = None   # [min row, max row, min col, max col] of occupied cells
+
+    def load(self):
+        """(Re)build the grid from the database."""
+        from .models import Building
+
+        fingerprint = self._version.fingerprint()
+        rows = list(Building.objects.values_list('id', 'latitude', 'longitude'))
+        with self._lock:
+            self._cells = {}
+            self._locations = {}
+            self._bounds = None
+            for building_id, lat, lng in rows:
+                self._add(building_id, lat, lng)
+            self._loaded = True
+            self._version.mark_loaded(fingerprint)
+        logger.info(f"Building spatial index loaded ({len(self._locations)} buildings)")
+
+    def invalidate(self):
+        """Drop the grid; it is rebuilt on the next query."""
+        with self._lock:
+            self._loaded = False
+            self._cells = {}
+            self._locations = {}
+            self._bounds = None
+
+    def update_building(self, building):
+        """Move a single building to its current cell after it was saved."""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(building.pk)
+            self._add(building.pk, building.latitude, building.longitude)
+
+    def remove_building(self, building_id):
+        """Remove a single building after it was deleted."""
+        with self._lock:
+            if self._loaded:
+                self._remove(building_id)
+
+    def nearest(self, lat, lng, k=10, radius=None):
+        """
+        Return up to k (building id, distance in meters) pairs sorted by
+        distance, optionally limited to `radius` meters.
+        Returns None if the index could not be loaded.
+        """
+        with self._lock:
+            if not self._ensure_loaded():
+                return None
+            if not self._cells or k <= 0:
+                return []
+
+            center_row, center_col = self._cell_of(lat, lng)
+            min_row, max_row, min_col, max_col = self._bounds
+            max_ring = max(
+                abs(center_row - min_row), abs(center_row - max_row),
+                abs(center_col - min_col), abs(center_col - max_col),
+            )
+
+            # Narrowest cell extent in meters near the query point (cells get
+            # narrower in longitude away from the equator)
+            cell_m = self.cell_size * meters_per_degree_lng(min(abs(lat) + 1.0, 89.0))
+
+            ids = []
+            lats = []
+            lngs = []
+            ring = 0
+            while True:
+                if (2 * ring + 1) ** 2 > len(self._cells):
+                    # Walking rings now costs more than visiting every
+                    # occupied cell (sparse or far-away data): scan them all.
+                    ids, lats, lngs = self._all_points()
+                    break
+
+                for cell in self._ring_cells(center_row, center_col, ring):
+                    for building_id, (b_lat, b_lng) in self._cells.get(cell, {}).items():
+                        ids.append(building_id)
+                        lats.append(b_lat)
+                        lngs.append(b_lng)
+
+                # Everything within this distance of the query has been visited
+                covered_m = ring * cell_m
+                if ring >= max_ring or (radius is not None and covered_m >= radius):
+                    break
+                if len(ids) >= k:
+                    distances = haversine_m(lat, lng, np.array(lats), np.array(lngs))
+                    if np.partition(distances, k - 1)[k - 1] <= covered_m:
+                        break
+                ring += 1
+
+            if not ids:
+                return []
+
+            distances = haversine_m(lat, lng, np.array(lats), np.array(lngs))
+            order = np.argsort(distances, kind='stable')
+            if radius is not None:
+                order = order[distances[order] <= radius]
+            order = order[:k]
+            return [(ids[i], float(distances[i])) for i in order]
+
+    def _ensure_loaded(self):
+        try:
+            if self._loaded and not self._version.is_stale():
+                return True
+            self.load()
+        except Exception as e:
+            # A failed reload keeps serving the grid that is already loaded
+            logger.warning(f"Building spatial index unavailable: {str(e)}")
+            return self._loaded
+        return True
+
+    def _all_points(self):
+        ids = []
+        lats = []
+        lngs = []
+        for bucket in self._cells.values():
+            for building_id, (b_lat, b_lng) in bucket.items():
+                ids.append(building_id)
+                lats.append(b_lat)
+                lngs.append(b_lng)
+        return ids, lats, lngs
+
+    def _cell_of(self, lat, lng):
+        return (math.floor(float(lat) / self.cell_size), math.floor(float(lng) / self.cell_size))
+
+    def _ring_cells(self, row, col, ring):
+        """Cells at Chebyshev distance `ring` from (row, col)."""
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
+
+    def _add(self, building_id, lat, lng):
+        if lat is None or lng is None:
+            return
+        lat, lng = float(lat), float(lng)
+        cell = self._cell_of(lat, lng)
+        self._cells.setdefault(cell, {})[building_id] = (lat, lng)
+        self._locations[building_id] = cell
+        # Bounds only grow; removals leave them conservative
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            self._bounds = [
+                min(self._bounds[0], cell[0]), max(self._bounds[1], cell[0]),
+                min(self._bounds[2], cell[1]), max(self._bounds[3], cell[1]),
+            ]
+
+    def _remove(self, building_id):
+        cell = self._locations.pop(building_id, None)
+        if cell is None:
+            return
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(building_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+
+# Shared per-process index used by the views
+building_spatial_index = BuildingSpatialIndex()
@@ -0,0 +1,44 @@
+"""
+Cheap cross-process change check for process-local caches.
+
+Signal handlers only run in the process that saved a row, so caches built
+from a table also compare a fingerprint of it (row count and latest
+updated_at) at most every few seconds, as alert_snapshot.py does for
+alerts. That catches saves from other web workers and from management
+commands such as import_gt_buildings.
+"""
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, Max
+
+
+class TableVersion:
+    """Remembers a table's fingerprint at load time and tells when it moved."""
+
+    def __init__(self, model_name, interval_setting, default_interval=5.0):
+        self.model_name = model_name
+        self.interval_setting = interval_setting
+        self.default_interval = default_interval
+        self._loaded = None
+        self._checked_at = 0.0
+
+    def fingerprint(self):
+        """(row count, latest updated_at). Take it before reading the rows."""
+        model = apps.get_model('accounts', self.model_name)
+        stats = model.objects.aggregate(count=Count('id'), last_update=Max('updated_at'))
+        return (stats['count'], stats['last_update'])
+
+    def mark_loaded(self, fingerprint):
+        self._loaded = fingerprint
+        self._checked_at = time.monotonic()
+
+    def is_stale(self):
+        """Whether the table changed since mark_loaded, checked at most every interval seconds."""
+        interval = getattr(settings, self.interval_setting, self.default_interval)
+        now = time.monotonic()
+        if now - self._checked_at < interval:
+            return False
+        self._checked_at = now
+        return self.fingerprint() != self._loaded
@@ -1,3 +1,2255 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+from asgiref.sync import sync_to_async
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from django.utils import timezone
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import polyline
+from .views import parse_route_geometry
+from .alert_index import SEVERITY_RANK, AlertGeometryIndex, active_alert_index
+from .management.commands.fetch_waitz_occupancy import Command as FetchWaitzCommand
+from .analytics import AnalyticsBuffer, record_event
+from .alert_snapshot import active_alert_snapshot
+from .alert_stream import AlertBroadcaster
+from .forecast import (
+    CONFIDENCE_PRIOR, HOURS_PER_WEEK, SLOTS_PER_HOUR, fill_baseline, fit_model, fit_phi, forecast, forecast_confidence,
+    load_model, slot_hours, update_forecasts,
+)
+from .geo import haversine_m
+from .geocoding import CacheHitCounter, GeocodingError, geocode
+from .isochrone import IsochroneIndex
+from .models import (
+    Building, BuildingView, GeocodeCache, OccupancyHourStats, OccupancySample, PageView, SafetyAlert, SafetyConcern,
+    SavedRoute, ScheduledJobStatus, SchedulerLease, User, WaitzFeedState,
+)
+from .route_alerts import SavedRouteAlertChecker
+from .route_cache import RouteCache
+from .routing import CampusRouter, WalkingGraph
+from .scheduler import LEASE_NAME, LeaderLease, heartbeat, run_job
+from .search_index import BuildingSearchIndex, bounded_edit_distance
+from .spatial_index import BuildingSpatialIndex
+from .occupancy import (
+    expire_samples, histogram_stats, hour_of_week, peak_hours_text, record_samples, refresh_predictions,
+    rollup_samples,
+)
+from .polling import PollingPolicy, poll_due
+from .outbound import LATENCY_BUCKETS_MS, CircuitBreaker, OutboundClient, UpstreamUnavailable, outbound
+from .walking_matrix import (
+    WalkingMatrixStore, WalkingTimeMatrix, build_matrix, generation_path, load_times, metadata_path, update_matrix,
+)
+from .waitz import STOP_WORDS, WaitzMatcher, name_words
+
+
+class StubServer:
+    """
+    Local HTTP server for outbound tests. Each request is answered with the
+    next queued (status, headers, body); the last one is repeated.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []  # (method, path, headers)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self):
+                stub.requests.append((self.command, self.path, dict(self.headers)))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                status, headers, body = stub.responses.pop(0) if len(stub.responses) > 1 else stub.responses[0]
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body)
+                body = body.encode() if isinstance(body, str) else body
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            do_GET = do_POST = do_HEAD = respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}/'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def closed_port_url():
+    """URL of a local port nothing listens on (connections are refused)."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}/'
+
+
+# Corner of the test street grids, on campus
+GRID_ORIGIN = (33.770, -84.400)
+
+
+def grid_lines(size=3, step=0.001):
+    """Streets of a size x size grid of blocks `step` degrees apart, as (lat, lng) polylines."""
+    lat0, lng0 = GRID_ORIGIN
+    rows = [[(lat0 + i * step, lng0 + j * step) for j in range(size)] for i in range(size)]
+    columns = [[(lat0 + i * step, lng0 + j * step) for i in range(size)] for j in range(size)]
+    return rows + columns
+
+
+def grid_point(i, j, step=0.001):
+    return GRID_ORIGIN[0] + i * step, GRID_ORIGIN[1] + j * step
+
+
+def create_saved_route(user, points, **fields):
+    (origin_lat, origin_lng), (destination_lat, destination_lng) = points[0], points[-1]
+    return SavedRoute.objects.create(
+        user=user, name=fields.pop('name', 'Route'), origin_lat=origin_lat, origin_lng=origin_lng,
+        destination_lat=destination_lat, destination_lng=destination_lng, destination_name='Destination',
+        distance_text='', duration_text='', distance_value=0, duration_value=0,
+        route_polyline=polyline.encode(points), **fields,
+    )
+
+
+def create_alert(lat, lng, radius, severity='high', **fields):
+    fields = {
+        'title': 'Alert', 'description': '', 'alert_type': 'hazard', 'location_type': 'circle', 'is_active': True,
+        **fields,
+    }
+    return SafetyAlert.objects.create(latitude=lat, longitude=lng, radius=radius, severity=severity, **fields)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_failures_in_a_row(self):
+        breaker = CircuitBreaker('host', failure_threshold=3, cooldown=10)
+        breaker.record_failure(0)
+        breaker.record_failure(0)
+        breaker.record_success()
+        breaker.record_failure(0)
+        breaker.record_failure(0)
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record_failure(1)
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow(5))
+
+    def test_single_trial_after_cooldown(self):
+        breaker = CircuitBreaker('host', failure_threshold=1, cooldown=10)
+        breaker.record_failure(0)
+        self.assertFalse(breaker.allow(9.9))
+        self.assertTrue(breaker.allow(10))
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertFalse(breaker.allow(10))
+
+    def test_trial_success_closes_and_failure_reopens(self):
+        breaker = CircuitBreaker('host', failure_threshold=5, cooldown=10)
+        for _ in range(5):
+            breaker.record_failure(0)
+        breaker.allow(10)
+        breaker.record_failure(10)
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow(15))
+        self.assertTrue(breaker.allow(20))
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.failures, 0)
+
+
+class OutboundClientTests(SimpleTestCase):
+    def make_client(self, **kwargs):
+        options = {'retries': 2, 'backoff_base': 0, 'backoff_max': 0, 'breaker_failures': 3, 'breaker_cooldown': 30}
+        options.update(kwargs)
+        return OutboundClient(**options)
+
+    def host_stats(self, client, url):
+        return client.stats()[url.split('/')[2]]
+
+    def test_retries_5xx_and_429_for_get(self):
+        client = self.make_client()
+        with StubServer((503, {}, ''), (429, {}, ''), (200, {}, 'ok')) as stub:
+            response = client.get(stub.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(stub.requests), 3)
+        stats = self.host_stats(client, stub.url)
+        self.assertEqual((stats['requests'], stats['retries'], stats['failures']), (3, 2, 1))
+        self.assertEqual(stats['breaker'], 'closed')
+
+    def test_returns_last_error_response_when_retries_run_out(self):
+        client = self.make_client(breaker_failures=10)
+        with StubServer((502, {}, 'bad gateway')) as stub:
+            response = client.get(stub.url)
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_post_is_not_retried_unless_asked(self):
+        client = self.make_client()
+        with StubServer((503, {}, ''), (503, {}, ''), (200, {}, 'ok')) as stub:
+            self.assertEqual(client.post(stub.url, data='x').status_code, 503)
+            self.assertEqual(client.post(stub.url, data='x', retries=1).status_code, 200)
+        self.assertEqual([method for method, _, _ in stub.requests], ['POST', 'POST', 'POST'])
+
+    def test_client_errors_are_not_retried(self):
+        client = self.make_client()
+        with StubServer((404, {}, '')) as stub:
+            self.assertEqual(client.get(stub.url).status_code, 404)
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(self.host_stats(client, stub.url)['failures'], 0)
+
+    def test_connection_errors_are_retried_then_raised(self):
+        client = self.make_client(breaker_failures=10)
+        url = closed_port_url()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.get(url, timeout=2)
+        stats = self.host_stats(client, url)
+        self.assertEqual((stats['requests'], stats['retries'], stats['failures']), (3, 2, 3))
+
+    def test_breaker_opens_and_short_circuits(self):
+        client = self.make_client(retries=0)
+        with StubServer((500, {}, '')) as stub:
+            for _ in range(3):
+                client.get(stub.url)
+            with self.assertRaises(UpstreamUnavailable):
+                client.get(stub.url)
+        self.assertEqual(len(stub.requests), 3)
+        stats = self.host_stats(client, stub.url)
+        self.assertEqual((stats['breaker'], stats['short_circuited']), ('open', 1))
+
+    def test_retries_stop_once_the_breaker_opens(self):
+        client = self.make_client(retries=5, breaker_failures=2)
+        with StubServer((500, {}, '')) as stub:
+            client.get(stub.url)
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_trial_after_cooldown_closes_or_reopens(self):
+        client = self.make_client(retries=0, breaker_failures=1, breaker_cooldown=0.1)
+        with StubServer((500, {}, ''), (500, {}, ''), (200, {}, 'ok')) as stub:
+            client.get(stub.url)
+            time.sleep(0.15)
+            self.assertEqual(client.get(stub.url).status_code, 500)
+            self.assertEqual(self.host_stats(client, stub.url)['breaker'], 'open')
+            with self.assertRaises(UpstreamUnavailable):
+                client.get(stub.url)
+            time.sleep(0.15)
+            self.assertEqual(client.get(stub.url).status_code, 200)
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(self.host_stats(client, stub.url)['breaker'], 'closed')
+
+    def test_unexpected_errors_are_recorded_and_release_the_trial(self):
+        client = self.make_client(retries=2, breaker_failures=1, breaker_cooldown=0)
+        with StubServer((500, {}, '')) as stub:
+            client.get(stub.url)
+            with mock.patch.object(client.session, 'request', side_effect=UnicodeError('bad label')):
+                with self.assertRaises(UnicodeError):
+                    client.get(stub.url)
+            stats = self.host_stats(client, stub.url)
+            self.assertEqual(stats['breaker'], 'open')
+            self.assertEqual((stats['requests'], stats['failures'], stats['retries']), (2, 2, 0))
+            # Not stuck half-open: the next trial goes out
+            client.get(stub.url)
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_latency_histogram_counts_every_attempt(self):
+        client = self.make_client()
+        with StubServer((503, {}, ''), (200, {}, 'ok')) as stub:
+            for _ in range(3):
+                client.get(stub.url)
+        stats = self.host_stats(client, stub.url)
+        self.assertEqual(sum(stats['histogram'].values()), 4)
+        self.assertEqual(len(stats['histogram']), len(LATENCY_BUCKETS_MS))
+        self.assertIsNotNone(stats['mean_ms'])
+        self.assertIn(stats['p50_ms'], LATENCY_BUCKETS_MS)
+        self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+
+    def test_retry_after_seconds_and_dates(self):
+        client = self.make_client(backoff_base=1, backoff_max=5)
+        response = requests.Response()
+        response.headers['Retry-After'] = '2'
+        self.assertEqual(client.backoff(0, response), 2)
+        response.headers['Retry-After'] = '120'
+        self.assertEqual(client.backoff(0, response), 5)
+        response.headers['Retry-After'] = format_datetime(datetime.now(dt_timezone.utc) + timedelta(seconds=3), usegmt=True)
+        self.assertTrue(1 < client.backoff(0, response) <= 3)
+        response.headers['Retry-After'] = format_datetime(datetime.now(dt_timezone.utc) + timedelta(hours=1), usegmt=True)
+        self.assertEqual(client.backoff(0, response), 5)
+        response.headers['Retry-After'] = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        self.assertEqual(client.backoff(0, response), 0)
+        response.headers['Retry-After'] = 'soon'
+        self.assertTrue(0 <= client.backoff(0, response) <= 1)
+
+
+class WaitzFeedIngestTests(TestCase):
+    """fetch_waitz_occupancy --all against a local feed: what is skipped between runs."""
+
+    def setUp(self):
+        outbound.reset()
+        self.buildings = [
+            Building.objects.create(name=name, code=code, address=f'{code} St', latitude=33.77, longitude=-84.39)
+            for name, code in [
+                ('Price Gilbert Library', 'LIB'),
+                ('Clough Undergraduate Learning Commons', 'CULC'),
+                ('Student Center', 'STUC'),
+            ]
+        ]
+        self.feed = [
+            {'id': 11, 'name': 'Price Gilbert Library', 'busyness': 40, 'hourSummary': 'Open'},
+            {'id': 12, 'name': 'Clough Undergraduate Learning Commons', 'busyness': 65, 'hourSummary': 'Open'},
+            {'id': 13, 'name': 'Student Center', 'busyness': 20, 'hourSummary': 'Open'},
+        ]
+
+    def fetch(self, stub):
+        """Run the command; returns the WaitzMatcher instances it created."""
+        matchers = []
+
+        def matcher(entries):
+            matchers.append(entries)
+            return WaitzMatcher(entries)
+
+        with mock.patch('accounts.management.commands.fetch_waitz_occupancy.WaitzMatcher', side_effect=matcher):
+            call_command('fetch_waitz_occupancy', '--all', '--feed-url', stub.url, stdout=io.StringIO())
+        return matchers
+
+    def occupancy(self):
+        return {
+            building.code: (building.current_occupancy_percent, building.occupancy_last_updated)
+            for building in Building.objects.all()
+        }
+
+    def state(self, stub):
+        return WaitzFeedState.objects.get(url=stub.url)
+
+    def test_first_run_matches_and_stores_ids(self):
+        with StubServer((200, {}, {'data': self.feed})) as stub:
+            matchers = self.fetch(stub)
+        self.assertEqual(len(matchers), 1)
+        self.assertEqual(
+            dict(Building.objects.values_list('code', 'waitz_id')),
+            {'LIB': '11', 'CULC': '12', 'STUC': '13'},
+        )
+        self.assertEqual({code: percent for code, (percent, _) in self.occupancy().items()},
+                         {'LIB': 40, 'CULC': 65, 'STUC': 20})
+        self.assertEqual(OccupancySample.objects.count(), 3)
+        state = self.state(stub)
+        self.assertEqual((state.runs, state.entries_seen, state.entries_skipped), (1, 3, 0))
+
+    def test_not_modified_skips_matching_and_writes(self):
+        with StubServer((200, {'ETag': '"v1"'}, {'data': self.feed}), (304, {}, '')) as stub:
+            self.fetch(stub)
+            before = self.occupancy()
+            matchers = self.fetch(stub)
+        self.assertEqual(stub.requests[1][2].get('If-None-Match'), '"v1"')
+        self.assertEqual(matchers, [])
+        self.assertEqual(self.occupancy(), before)
+        self.assertEqual(OccupancySample.objects.count(), 6)
+        state = self.state(stub)
+        self.assertEqual((state.runs, state.not_modified_runs, state.unchanged_runs), (2, 1, 0))
+        self.assertEqual((state.entries_seen, state.entries_skipped), (6, 3))
+
+    def test_identical_body_skips_matching_and_writes(self):
+        with StubServer((200, {}, {'data': self.feed})) as stub:
+            self.fetch(stub)
+            before = self.occupancy()
+            matchers = self.fetch(stub)
+        self.assertEqual(matchers, [])
+        self.assertEqual(self.occupancy(), before)
+        self.assertEqual(OccupancySample.objects.count(), 6)
+        state = self.state(stub)
+        self.assertEqual((state.runs, state.not_modified_runs, state.unchanged_runs), (2, 0, 1))
+        self.assertEqual((state.entries_seen, state.entries_skipped), (6, 3))
+
+    def test_only_changed_entries_are_rewritten(self):
+        changed = [dict(entry) for entry in self.feed]
+        changed[1]['busyness'] = 90
+        with StubServer((200, {}, {'data': self.feed}), (200, {}, {'data': changed})) as stub:
+            self.fetch(stub)
+            before = self.occupancy()
+            matchers = self.fetch(stub)
+        self.assertEqual([[entry['id'] for entry in entries] for entries in matchers], [[12]])
+        after = self.occupancy()
+        self.assertEqual(after['CULC'][0], 90)
+        self.assertNotEqual(after['CULC'][1], before['CULC'][1])
+        self.assertEqual((after['LIB'], after['STUC']), (before['LIB'], before['STUC']))
+        # Unchanged buildings still get a sample from their last reading
+        self.assertEqual(
+            sorted(OccupancySample.objects.order_by('-id')[:3].values_list('percent', flat=True)), [20, 40, 90],
+        )
+        state = self.state(stub)
+        self.assertEqual((state.entries_seen, state.entries_skipped), (6, 2))
+
+    def test_renamed_entry_invalidates_matches(self):
+        renamed = [dict(entry) for entry in self.feed]
+        renamed[2]['name'] = 'John Lewis Student Center'
+        with StubServer((200, {}, {'data': self.feed}), (200, {}, {'data': renamed})) as stub:
+            self.fetch(stub)
+            matchers = self.fetch(stub)
+        self.assertEqual([len(entries) for entries in matchers], [3])
+        state = self.state(stub)
+        self.assertIn('entry names or buildings changed', state.last_run_summary)
+        self.assertEqual(state.entries_skipped, 0)
+
+    def test_building_change_invalidates_matches(self):
+        with StubServer((200, {}, {'data': self.feed})) as stub:
+            self.fetch(stub)
+            Building.objects.create(name='Klaus Advanced Computing Building', code='KACB', address='266 Ferst Dr',
+                                    latitude=33.777, longitude=-84.396)
+            matchers = self.fetch(stub)
+        self.assertEqual([len(entries) for entries in matchers], [3])
+        state = self.state(stub)
+        self.assertEqual((state.unchanged_runs, state.entries_skipped), (0, 0))
+        self.assertIn('entry names or buildings changed', state.last_run_summary)
+
+    def test_partial_matches_are_not_stored(self):
+        Building.objects.filter(code='STUC').update(name='Student Center Complex')
+        feed = [dict(entry) for entry in self.feed]
+        feed[2]['name'] = 'Student Center'
+        with StubServer((200, {}, {'data': feed})) as stub:
+            self.fetch(stub)
+        building = Building.objects.get(code='STUC')
+        self.assertEqual(building.current_occupancy_percent, 20)
+        self.assertIsNone(building.waitz_id)
+
+    def test_renumbered_entry_is_matched_by_name_again(self):
+        renumbered = [dict(entry) for entry in self.feed]
+        renumbered[0]['id'] = 21
+        renumbered[0]['busyness'] = 75
+        with StubServer((200, {}, {'data': self.feed}), (200, {}, {'data': renumbered})) as stub:
+            self.fetch(stub)
+            self.fetch(stub)
+        building = Building.objects.get(code='LIB')
+        self.assertEqual((building.waitz_id, building.current_occupancy_percent), ('21', 75))
+
+
+    def building_updates(self, queries):
+        return [query['sql'] for query in queries
+                if query['sql'].startswith('UPDATE "accounts_building"') and 'current_occupancy_percent' in query['sql']]
+
+    def test_unchanged_rows_are_not_written(self):
+        changed = [dict(entry) for entry in self.feed]
+        changed[0]['busyness'] = 90
+        changed[2]['busyness'] = 90
+        with StubServer((200, {}, {'data': self.feed}), (200, {}, {'data': changed})) as stub:
+            self.fetch(stub)
+            before = self.occupancy()
+            with CaptureQueriesContext(connection) as queries:
+                self.fetch(stub)
+        # One UPDATE per changed row (their Waitz ids differ), none for CULC
+        self.assertEqual(len(self.building_updates(queries)), 2)
+        after = self.occupancy()
+        self.assertEqual(after['CULC'], before['CULC'])
+        self.assertEqual((after['LIB'][0], after['STUC'][0]), (90, 90))
+
+    def test_rows_with_the_same_values_share_an_update(self):
+        command = FetchWaitzCommand(stdout=io.StringIO())
+        buildings = list(Building.objects.all())
+        for building, percent in zip(buildings, (30, 30, 70)):
+            building.current_occupancy_percent = percent
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(command.write_occupancy(buildings), 2)
+        self.assertEqual(len(self.building_updates(queries)), 2)
+        self.assertEqual(command.write_occupancy(buildings, batch_size=1), 3)
+        self.assertEqual(command.write_occupancy([]), 0)
+
+    def test_ingest_is_one_transaction(self):
+        with StubServer((200, {}, {'data': self.feed})) as stub:
+            with mock.patch('accounts.management.commands.fetch_waitz_occupancy.record_samples',
+                            side_effect=RuntimeError('disk full')), self.assertRaises(CommandError):
+                self.fetch(stub)
+        # The occupancy writes went back with the failed sample insert
+        self.assertEqual(set(Building.objects.values_list('current_occupancy_percent', flat=True)), {None})
+
+    def test_last_checked_moves_while_last_updated_stays(self):
+        with StubServer((200, {}, {'data': self.feed})) as stub, override_settings(WAITZ_FEED_URL=stub.url):
+            self.fetch(stub)
+            ids = ','.join(str(building.pk) for building in self.buildings)
+            first = self.client.get(reverse('building_batch_api'), {'ids': ids, 'fields': 'occupancy'}).json()
+            self.fetch(stub)
+            second = self.client.get(reverse('building_batch_api'), {'ids': ids, 'fields': 'occupancy'}).json()
+        state = self.state(stub)
+        for before, after in zip(first['buildings'], second['buildings']):
+            self.assertEqual(before['occupancy']['last_updated'], after['occupancy']['last_updated'])
+            self.assertEqual(after['occupancy']['last_checked'], state.checked_at.isoformat())
+            self.assertLess(before['occupancy']['last_checked'], after['occupancy']['last_checked'])
+
+
+class PollingPolicyTests(SimpleTestCase):
+    # Ten past the hour, so the top-of-hour cap (50.5 minutes) doesn't bind
+    now = datetime(2026, 10, 14, 18, 10, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.policy = PollingPolicy(
+            adaptive=True, base_seconds=600, min_seconds=120, max_seconds=1800, peak_seconds=300,
+            drift_budget=2.5, backoff=1.5, smoothing=0.5,
+        )
+
+    def interval(self, previous, rate, any_open=True, peak=False, now=None):
+        return self.policy.next_interval(previous, rate, any_open, peak, now or self.now)
+
+    def test_change_rate_per_minute_over_open_buildings(self):
+        before = {1: 10, 2: 0, 3: 0}
+        after = {1: 14, 2: 0, 3: 6, 4: 50}
+        # (16 + 36) / 2 buildings over 2 minutes; building 2 is closed, 4 is new
+        self.assertEqual(self.policy.change_rate(None, before, after, 120), 13)
+        self.assertEqual(self.policy.change_rate(5, before, after, 120), 9)
+        # Back-to-back runs count as a minute apart
+        self.assertEqual(self.policy.change_rate(None, before, after, 5), 26)
+        self.assertEqual(self.policy.change_rate(5, {2: 0}, {2: 0}, 120), 5)
+
+    def test_interval_is_the_time_to_drift_the_budget(self):
+        self.assertEqual(self.interval(600, 1.0), (375, 'changing'))
+        self.assertEqual(self.interval(600, None), (600, 'no history'))
+
+    def test_speeds_up_at_once_and_backs_off_gradually(self):
+        self.assertEqual(self.interval(1800, 1.0), (375, 'changing'))
+        self.assertEqual(self.interval(375, 0.01), (562, 'backing off'))
+        self.assertEqual(self.interval(600, 0), (900, 'backing off'))
+        self.assertEqual(self.interval(1200, 0), (1800, 'static'))
+
+    def test_clamped_to_min_and_max(self):
+        self.assertEqual(self.interval(600, 100.0), (120, 'changing'))
+        self.assertEqual(self.interval(1800, 0.001), (1800, 'backing off'))
+
+    def test_closed_waits_the_longest(self):
+        self.assertEqual(self.interval(120, 50.0, any_open=False), (1800, 'closed'))
+
+    def test_peak_hours_cap(self):
+        self.assertEqual(self.interval(1800, 0.01, peak=True), (300, 'peak hours'))
+        self.assertEqual(self.interval(600, 1.0, peak=True), (300, 'peak hours'))
+        self.assertEqual(self.interval(600, 10.0, peak=True), (120, 'changing'))
+
+    def test_checks_just_after_the_hour(self):
+        five_to = self.now.replace(minute=55)
+        self.assertEqual(self.interval(1800, 0, any_open=False, now=five_to), (330, 'closed'))
+        self.assertEqual(self.interval(600, 1.0, now=self.now.replace(minute=59, second=50)), (120, 'changing'))
+
+    def test_fixed_interval_when_not_adaptive(self):
+        policy = PollingPolicy(adaptive=False, base_seconds=600)
+        self.assertEqual(policy.next_interval(120, 100.0, False, True, self.now), (600, 'fixed'))
+
+
+class PollDueTests(TestCase):
+    def test_due_once_next_poll_passes(self):
+        url = 'https://waitz.example/feed'
+        now = timezone.now()
+        self.assertTrue(poll_due(url, now))
+        state = WaitzFeedState.objects.create(url=url, next_poll_at=now + timedelta(minutes=2))
+        self.assertFalse(poll_due(url, now))
+        # Checks may run a few seconds early
+        self.assertTrue(poll_due(url, now + timedelta(seconds=116)))
+        state.next_poll_at = None
+        state.save()
+        self.assertTrue(poll_due(url, now))
+
+class OccupancyHistoryTests(TestCase):
+    # Wednesday 2:20pm campus time (EDT)
+    now = datetime(2026, 10, 14, 18, 20, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.library = Building.objects.create(name='Library', code='LIB', address='', latitude=33.77, longitude=-84.39)
+        self.culc = Building.objects.create(name='CULC', code='CULC', address='', latitude=33.77, longitude=-84.39)
+
+    def record(self, hours_ago, readings, minute=0):
+        recorded_at = self.now.replace(minute=minute) - timedelta(hours=hours_ago)
+        return record_samples(readings, recorded_at)
+
+    def stats(self, building, moment):
+        return OccupancyHourStats.objects.get(building=building, hour_of_week=hour_of_week(moment))
+
+    def test_histogram_stats(self):
+        self.assertEqual(histogram_stats({}), (0, 0.0, 0))
+        self.assertEqual(histogram_stats({percent: 1 for percent in range(1, 11)}), (10, 5.5, 9))
+        self.assertEqual(histogram_stats({10: 9, 90: 1}), (10, 18.0, 10))
+        self.assertEqual(histogram_stats({10: 8, 90: 2}), (10, 26.0, 90))
+
+    def test_hour_of_week_is_campus_time(self):
+        # Monday 0:30 and Sunday 23:30 in New York, in and out of daylight saving time
+        self.assertEqual(hour_of_week(datetime(2026, 10, 19, 4, 30, tzinfo=dt_timezone.utc)), 0)
+        self.assertEqual(hour_of_week(datetime(2026, 10, 19, 3, 30, tzinfo=dt_timezone.utc)), 167)
+        self.assertEqual(hour_of_week(datetime(2026, 12, 14, 5, 30, tzinfo=dt_timezone.utc)), 0)
+        self.assertEqual(hour_of_week(self.now), 2 * 24 + 14)
+
+    def test_rollup_merges_completed_hours_once(self):
+        self.assertEqual(self.record(1, [(self.library.pk, 40), (self.culc.pk, 70), (self.culc.pk, None)]), 2)
+        self.record(1, [(self.library.pk, 60), (self.culc.pk, 150)], minute=30)
+        # The current hour isn't over yet
+        self.record(0, [(self.library.pk, 90)], minute=10)
+
+        self.assertEqual(rollup_samples(self.now), (4, 2))
+        library = self.stats(self.library, self.now - timedelta(hours=1))
+        self.assertEqual((library.sample_count, library.mean_percent, library.p90_percent), (2, 50.0, 60))
+        self.assertEqual(json.loads(library.histogram), {'40': 1, '60': 1})
+        # Readings are clamped to 0-100
+        self.assertEqual(self.stats(self.culc, self.now - timedelta(hours=1)).p90_percent, 100)
+        self.assertEqual(rollup_samples(self.now), (0, 0))
+        self.assertEqual(OccupancySample.objects.filter(rolled_up=False).count(), 1)
+
+    def test_incremental_rollups_match_one_rollup(self):
+        rng = random.Random(5)
+        weeks = [[(self.library.pk, rng.randint(0, 100)) for _ in range(5)] for _ in range(4)]
+        for week, readings in enumerate(weeks):
+            self.record(24 * 7 * week + 1, readings)
+            rollup_samples(self.now)
+        percents = [percent for readings in weeks for _, percent in readings]
+        stats = self.stats(self.library, self.now - timedelta(hours=1))
+        self.assertEqual(stats.sample_count, 20)
+        self.assertAlmostEqual(stats.mean_percent, sum(percents) / 20)
+        self.assertEqual(stats.p90_percent, sorted(percents)[17])
+        self.assertEqual(OccupancyHourStats.objects.count(), 1)
+
+    @override_settings(OCCUPANCY_SAMPLE_RETENTION_DAYS=7)
+    def test_expired_samples_leave_the_aggregates(self):
+        self.record(24 * 8, [(self.library.pk, 30)])
+        self.record(24 * 9, [(self.library.pk, 50)])
+        self.record(1, [(self.library.pk, 70)])
+        # Nothing is deleted before it is rolled up
+        self.assertEqual(expire_samples(self.now), 0)
+        rollup_samples(self.now)
+        self.assertEqual(expire_samples(self.now), 2)
+        self.assertEqual(OccupancySample.objects.count(), 1)
+        self.assertEqual(self.stats(self.library, self.now - timedelta(days=8)).sample_count, 1)
+
+    @override_settings(OCCUPANCY_MIN_SAMPLES=2)
+    def test_peak_hours_come_from_todays_stats(self):
+        self.assertEqual(peak_hours_text({9: 20, 14: 80, 15: 90, 16: 70, 20: 10}), '2pm, 3pm, and 4pm')
+        self.assertEqual(peak_hours_text({0: 5, 12: 60}), '12am and 12pm')
+
+        for day in range(1, 3):
+            for hour, percent in ((10, 30), (13, 80), (8, 50), (11, 60)):
+                moment = self.now.replace(hour=hour + 4) - timedelta(days=7 * day)
+                record_samples([(self.library.pk, percent)], moment)
+        # Busy, but only one sample and on another day
+        record_samples([(self.library.pk, 100)], self.now.replace(hour=19) - timedelta(days=7))
+        record_samples([(self.library.pk, 100)], self.now - timedelta(days=1))
+        rollup_samples(self.now)
+
+        self.assertEqual(refresh_predictions(self.now), 1)
+        self.library.refresh_from_db()
+        self.assertEqual(self.library.peak_hours, '8am, 11am, and 1pm')
+        # Only changed rows are written
+        self.assertEqual(refresh_predictions(self.now), 0)
+
+    def test_rollup_command(self):
+        self.record(24 * 60, [(self.library.pk, 30)])
+        rollup_samples(self.now)
+        self.record(1, [(self.library.pk, 50)])
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(OCCUPANCY_FORECAST_PATH=os.path.join(directory, 'forecast.npz')):
+                out = io.StringIO()
+                call_command('rollup_occupancy', '--keep-samples', stdout=out)
+                self.assertIn('Merged 1 samples into 1 hour-of-week stats, expired 0 samples', out.getvalue())
+                self.assertEqual(OccupancySample.objects.count(), 2)
+                call_command('rollup_occupancy', stdout=out)
+        self.assertEqual(OccupancySample.objects.count(), 1)
+
+
+class ForecastTests(TestCase):
+    # Wednesday 2:20pm campus time (EDT)
+    now = datetime(2026, 10, 14, 18, 20, tzinfo=dt_timezone.utc)
+
+    def test_baseline_fills_hours_without_data(self):
+        baseline = np.full((3, HOURS_PER_WEEK), np.nan)
+        baseline[0, :] = 10
+        baseline[1, :2] = (20, 40)
+        filled = fill_baseline(baseline)
+        self.assertEqual(filled.dtype, np.float32)
+        self.assertTrue((filled[0] == 10).all())
+        self.assertEqual(filled[1, :3].tolist(), [20, 40, 30])
+        self.assertTrue((filled[2] == 50).all())
+
+    def test_phi_recovers_persistent_deviations(self):
+        rng = np.random.default_rng(1)
+        slots = 14 * 24 * SLOTS_PER_HOUR
+        hours = slot_hours(self.now, slots)
+        baseline = np.full((2, HOURS_PER_WEEK), 40.0, dtype=np.float32)
+        deviation = np.zeros((2, slots))
+        for slot in range(SLOTS_PER_HOUR, slots):
+            # Deviations that decay to 0.8 an hour later, and ones that don't last
+            deviation[0, slot] = 0.8 * deviation[0, slot - SLOTS_PER_HOUR] + rng.normal(0, 5)
+            deviation[1, slot] = rng.normal(0, 5)
+        values = (baseline[:, hours] + deviation).astype(np.float32)
+        values[:, ::7] = np.nan
+        phi = fit_phi(values, baseline, hours)
+        self.assertAlmostEqual(float(phi[0]), 0.8, delta=0.05)
+        self.assertLess(float(phi[1]), 0.1)
+        # Anti-correlated deviations are clipped to 0, and no data gives 0
+        flipping = baseline[:1, hours] + np.where(np.arange(slots) // SLOTS_PER_HOUR % 2, 10, -10)
+        self.assertEqual(fit_phi(flipping.astype(np.float32), baseline[:1], hours).tolist(), [0.0])
+        self.assertEqual(fit_phi(np.full((1, slots), np.nan, dtype=np.float32), baseline[:1], hours).tolist(), [0.0])
+
+    def test_forecast_adds_damped_deviation_to_next_hour(self):
+        baseline = np.zeros((3, HOURS_PER_WEEK), dtype=np.float32)
+        baseline[:, 14], baseline[:, 15] = 40, 60
+        phi = np.array([0.5, 1.0, 1.0], dtype=np.float32)
+        current = np.array([50, 80, 0], dtype=np.float32)
+        self.assertEqual(forecast(baseline, phi, current, 14, 15).tolist(), [65, 100, 20])
+
+    def test_confidence_is_shrunk_for_short_histories(self):
+        errors = np.array([[1, 2, 30, np.nan] + [1] * 16, [1, 2] + [np.nan] * 18])
+        confidence = forecast_confidence(errors, 10)
+        self.assertAlmostEqual(float(confidence[0]), 18 / (19 + CONFIDENCE_PRIOR), places=6)
+        self.assertAlmostEqual(float(confidence[1]), 2 / (2 + CONFIDENCE_PRIOR), places=6)
+
+    def test_model_round_trip_and_updates(self):
+        building = Building.objects.create(name='Library', code='LIB', address='', latitude=33.77, longitude=-84.39)
+        other = Building.objects.create(name='CULC', code='CULC', address='', latitude=33.77, longitude=-84.39)
+        for days in range(1, 8):
+            for minute in range(0, 60, 10):
+                moment = self.now.replace(minute=minute) - timedelta(days=days)
+                record_samples([(building.pk, 30), (other.pk, 0)], moment)
+                record_samples([(building.pk, 70), (other.pk, 0)], moment + timedelta(hours=1))
+        rollup_samples(self.now)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'forecast.npz')
+            self.assertIsNone(load_model(path))
+            self.assertEqual(fit_model(self.now, path=path), 2)
+            model = load_model(path)
+        self.assertEqual(model['building_ids'].tolist(), sorted([building.pk, other.pk]))
+        self.assertEqual(model['baseline'].shape, (2, HOURS_PER_WEEK))
+        row = model['building_ids'].tolist().index(building.pk)
+        self.assertAlmostEqual(float(model['baseline'][row, hour_of_week(self.now)]), 30)
+        self.assertAlmostEqual(float(model['baseline'][row, hour_of_week(self.now) + 1]), 70)
+
+        readings = [(building.pk, 30), (other.pk, 0), (other.pk + 100, 50), (building.pk, None)]
+        self.assertEqual(update_forecasts(readings, self.now, model), 2)
+        building.refresh_from_db()
+        self.assertEqual(building.forecast_percent, 70)
+        self.assertEqual(building.next_hour_prediction, 'Busy, about 70%')
+        self.assertEqual(building.forecast_for, datetime(2026, 10, 14, 19, 0, tzinfo=dt_timezone.utc))
+        # Unchanged forecasts aren't rewritten within the hour
+        self.assertEqual(update_forecasts(readings, self.now + timedelta(minutes=20), model), 0)
+
+        # A steady forecast still moves on to the next hour
+        later = self.now + timedelta(hours=3)
+        update_forecasts([(other.pk, 0)], later, model)
+        other.refresh_from_db()
+        self.assertEqual(other.forecast_percent, 0)
+        self.assertEqual(other.forecast_for, datetime(2026, 10, 14, 22, 0, tzinfo=dt_timezone.utc))
+
+class WaitzMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = WaitzMatcher([
+            {'id': 1, 'name': 'Price Gilbert Library'},
+            {'id': 2, 'name': 'Klaus Computing Bldg'},
+            {'id': 3, 'name': 'Student Center Commons'},
+            {'id': 4, 'name': 'Smart Hall'},
+            {'id': 5, 'name': 'CULC'},
+            {'id': 6, 'name': 'Klaus Advanced Computing Annex'},
+            {'name': 'Crosland Tower'},
+        ])
+
+    def match(self, name, waitz_id=None):
+        entry, how = self.matcher.match(Building(name=name, waitz_id=waitz_id))
+        return (entry.get('id', entry['name']) if entry else None), how
+
+    def test_waitz_id_is_matched_by_id_only(self):
+        self.assertEqual(self.match('Renamed Library', waitz_id='1'), (1, 'id'))
+        self.assertEqual(self.match('Price Gilbert Library', waitz_id='5'), (5, 'id'))
+
+    def test_retired_waitz_id_falls_back_to_the_name(self):
+        self.assertEqual(self.match('Price Gilbert Library', waitz_id='99'), (1, 'name'))
+        self.assertEqual(self.match('Klaus Computing', waitz_id='99'), (2, 'partial'))
+        self.assertEqual(self.match('Renamed Library', waitz_id='99'), (None, None))
+
+    def test_exact_names_ignore_case(self):
+        self.assertEqual(self.match('culc'), (5, 'name'))
+        self.assertEqual(self.match('CROSLAND TOWER'), ('Crosland Tower', 'name'))
+
+    def test_containment_includes_common_words(self):
+        self.assertEqual(self.match('Library'), (1, 'partial'))
+        self.assertEqual(self.match('Student Center'), (3, 'partial'))
+        self.assertEqual(self.match('Gilbert Library'), (1, 'partial'))
+
+    def test_containment_is_on_whole_words(self):
+        self.assertEqual(self.match('Art'), (None, None))
+        self.assertEqual(self.match('Hall'), (4, 'partial'))
+        # One significant word in common and neither name inside the other
+        self.assertEqual(self.match('Price Hall'), (None, None))
+
+    def test_most_significant_words_in_common_wins(self):
+        self.assertEqual(self.match('Klaus Advanced Computing Building'), (6, 'partial'))
+        self.assertEqual(self.match('Klaus Computing'), (2, 'partial'))
+
+    def test_matches_a_full_scan(self):
+        def scan(name):
+            words = name_words(name.lower())
+            for entry in self.matcher.entries:
+                other = entry['name'].lower()
+                if other == name.lower():
+                    return entry
+            best = None
+            for entry in self.matcher.entries:
+                other = entry['name'].lower()
+                common = words & name_words(other)
+                significant = len(common - STOP_WORDS)
+                contained = (words <= name_words(other) or name_words(other) <= words) and (
+                    other in name.lower() or name.lower() in other)
+                if significant >= 2 or (common and contained):
+                    if best is None or significant > best[0]:
+                        best = (significant, entry)
+            return best[1] if best else None
+
+        rng = random.Random(3)
+        vocabulary = ['klaus', 'computing', 'advanced', 'library', 'hall', 'student', 'center', 'price',
+                      'gilbert', 'annex', 'smart', 'culc', 'tower', 'crosland', 'commons', 'bldg']
+        for _ in range(500):
+            name = ' '.join(rng.sample(vocabulary, rng.randint(1, 4)))
+            with self.subTest(name=name):
+                self.assertIs(self.matcher.match(Building(name=name))[0], scan(name))
+
+class BuildingSearchTests(TestCase):
+    def setUp(self):
+        for name, code, address in [
+            ('Klaus Advanced Computing Building', 'KACB', '266 Ferst Dr NW'),
+            ('Clough Undergraduate Learning Commons', 'CULC', '266 4th St NW'),
+            ('Student Center', 'STUC', '350 Ferst Dr NW'),
+            ('Price Gilbert Library', 'LIB', '704 Cherry St NW'),
+            ('College of Computing', 'COC', '801 Atlantic Dr NW'),
+        ]:
+            Building.objects.create(name=name, code=code, address=address, latitude=33.77, longitude=-84.39)
+        self.index = BuildingSearchIndex()
+
+    def names(self, ids):
+        found = Building.objects.in_bulk(ids)
+        return [found[pk].name for pk in ids]
+
+    def test_ranks_exact_code_then_name_prefix_then_substring(self):
+        self.assertEqual(self.names(self.index.search('coc')), ['College of Computing'])
+        self.assertEqual(
+            self.names(self.index.search('klaus')),
+            ['Klaus Advanced Computing Building'],
+        )
+        # Same tier: by name
+        self.assertEqual(
+            self.names(self.index.search('comput')),
+            ['College of Computing', 'Klaus Advanced Computing Building'],
+        )
+        self.assertEqual(
+            self.names(self.index.search('co')),
+            ['College of Computing', 'Clough Undergraduate Learning Commons', 'Klaus Advanced Computing Building'],
+        )
+        self.assertEqual(self.index.search('ferst dr'), self.index.search('FERST   DR'))
+        self.assertEqual(self.index.search('nowhere'), [])
+
+    def test_fuzzy_search_tolerates_typos_and_partial_words(self):
+        self.assertEqual(self.names(self.index.fuzzy_search('kluas')[:1]), ['Klaus Advanced Computing Building'])
+        self.assertEqual(self.names(self.index.fuzzy_search('studnet centr')), ['Student Center'])
+        self.assertEqual(self.names(self.index.fuzzy_search('libr')), ['Price Gilbert Library'])
+        self.assertEqual(self.index.fuzzy_search('zzzz'), [])
+
+    def test_fuzzy_search_weights_code_over_name_over_address(self):
+        self.assertEqual(self.names(self.index.fuzzy_search('culc')), ['Clough Undergraduate Learning Commons'])
+        # "ferst" is only in addresses; both buildings on it match
+        self.assertEqual(len(self.index.fuzzy_search('frest')), 2)
+
+    def test_bounded_edit_distance(self):
+        self.assertEqual(bounded_edit_distance('klaus', 'kluas', 2), 1)
+        self.assertEqual(bounded_edit_distance('center', 'centre', 2), 1)
+        self.assertIsNone(bounded_edit_distance('library', 'commons', 2))
+        self.assertEqual(bounded_edit_distance('comp', 'computing', 1, prefix=True), 0)
+
+    def test_signal_updates_apply_on_commit(self):
+        self.index.search('klaus')
+        with mock.patch('accounts.signals.building_index', self.index):
+            with self.captureOnCommitCallbacks(execute=True):
+                building = Building.objects.create(
+                    name='Bobby Dodd Stadium', code='BDS', address='155 North Ave NW', latitude=33.77, longitude=-84.39,
+                )
+                self.assertEqual(self.index.search('dodd'), [])
+            self.assertEqual(self.index.search('dodd'), [building.pk])
+            with self.captureOnCommitCallbacks(execute=True):
+                building.delete()
+        self.assertEqual(self.index.search('dodd'), [])
+
+    @override_settings(BUILDING_INDEX_CHECK_INTERVAL=0)
+    def test_reloads_when_another_process_changes_buildings(self):
+        self.assertEqual(self.names(self.index.search('klaus')), ['Klaus Advanced Computing Building'])
+        # A queryset update sends no signals, as if another process saved it
+        Building.objects.filter(code='KACB').update(name='Klaus Hall', updated_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self.names(self.index.search('klaus')), ['Klaus Hall'])
+
+    @override_settings(ANALYTICS_BUFFERED=False)
+    def test_search_api(self):
+        response = self.client.get('/api/buildings/search/', {'q': 'studnt', 'fuzzy': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([building['code'] for building in response.json()['buildings']], ['STUC'])
+        response = self.client.get('/api/buildings/search/', {'q': 'studnt'})
+        self.assertEqual(response.json()['buildings'], [])
+
+    def test_batch_api_keeps_requested_order_and_lists_missing_ids(self):
+        klaus, library = Building.objects.get(code='KACB'), Building.objects.get(code='LIB')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('building_batch_api'), {'ids': f'{library.pk},999,{klaus.pk},{library.pk}'}).json()
+        # One building query; the other is the feed check for occupancy
+        self.assertEqual(sum('"accounts_building"' in query['sql'] for query in queries), 1)
+        self.assertEqual([building['code'] for building in data['buildings']], ['LIB', 'KACB'])
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['missing'], [999])
+        self.assertEqual(data['buildings'][0]['latitude'], 33.77)
+
+    def test_batch_api_only_returns_and_reads_requested_fields(self):
+        klaus = Building.objects.get(code='KACB')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('building_batch_api'), {'ids': klaus.pk, 'fields': 'name, code'}).json()
+        self.assertEqual(data['buildings'], [{'id': klaus.pk, 'name': klaus.name, 'code': 'KACB'}])
+        self.assertNotIn('address', queries[0]['sql'])
+
+        response = self.client.get(reverse('building_batch_api'), {'ids': klaus.pk, 'fields': 'name,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_batch_api_caps_ids_per_request(self):
+        ids = ','.join(str(pk) for pk in range(1, 501))
+        data = self.client.get(reverse('building_batch_api'), {'ids': ids, 'fields': 'id'}).json()
+        self.assertEqual(data['count'] + len(data['missing']), 500)
+        response = self.client.get(reverse('building_batch_api'), {'ids': ids + ',501'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('building_batch_api')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('building_batch_api'), {'ids': '1,two'}).status_code, 400)
+
+
+class BuildingSpatialIndexTests(TestCase):
+    def setUp(self):
+        rng = random.Random(17)
+        Building.objects.bulk_create([
+            Building(
+                name=f'Building {i}', code=f'B{i}', address='',
+                latitude=round(GRID_ORIGIN[0] + rng.uniform(0, 0.02), 6),
+                longitude=round(GRID_ORIGIN[1] + rng.uniform(0, 0.02), 6),
+            )
+            for i in range(300)
+        ])
+        # Stored (rounded) coordinates, as the index sees them
+        self.buildings = [(pk, float(lat), float(lng)) for pk, lat, lng in
+                          Building.objects.values_list('id', 'latitude', 'longitude')]
+        self.index = BuildingSpatialIndex()
+
+    def brute_force(self, lat, lng, k, radius=None):
+        distances = sorted(
+            (float(haversine_m(lat, lng, b_lat, b_lng)), pk) for pk, b_lat, b_lng in self.buildings
+        )
+        if radius is not None:
+            distances = [(distance, pk) for distance, pk in distances if distance <= radius]
+        return [(pk, distance) for distance, pk in distances[:k]]
+
+    def assertSameNearest(self, result, expected):
+        self.assertEqual([pk for pk, _ in result], [pk for pk, _ in expected])
+        for (_, distance), (_, expected_distance) in zip(result, expected):
+            self.assertAlmostEqual(distance, expected_distance, places=6)
+
+    def test_matches_brute_force_scan(self):
+        rng = random.Random(19)
+        for _ in range(100):
+            # Inside the buildings' area and up to a few kilometers outside it
+            lat = GRID_ORIGIN[0] + rng.uniform(-0.03, 0.05)
+            lng = GRID_ORIGIN[1] + rng.uniform(-0.03, 0.05)
+            k = rng.choice([1, 5, 10, 50, 400])
+            radius = rng.choice([None, 100, 500, 2000])
+            with self.subTest(lat=lat, lng=lng, k=k, radius=radius):
+                self.assertSameNearest(self.index.nearest(lat, lng, k=k, radius=radius), self.brute_force(lat, lng, k, radius))
+
+    def test_radius_edges(self):
+        lat, lng = grid_point(10, 10)
+        expected = self.brute_force(lat, lng, 20)
+        fifth = expected[4][1]
+        # The radius is inclusive
+        self.assertSameNearest(self.index.nearest(lat, lng, k=20, radius=fifth), expected[:5])
+        self.assertSameNearest(self.index.nearest(lat, lng, k=20, radius=fifth - 0.01), expected[:4])
+        self.assertSameNearest(self.index.nearest(lat, lng, k=3, radius=fifth), expected[:3])
+        self.assertEqual(self.index.nearest(lat + 1, lng, k=5, radius=1000), [])
+        self.assertEqual(self.index.nearest(lat, lng, k=0), [])
+
+    def test_follows_building_changes(self):
+        lat, lng = grid_point(30, 30)
+        with mock.patch('accounts.signals.building_spatial_index', self.index):
+            self.index.nearest(lat, lng)
+            with self.captureOnCommitCallbacks(execute=True):
+                building = Building.objects.create(name='New', code='N', address='', latitude=lat, longitude=lng)
+            self.assertEqual(self.index.nearest(lat, lng, k=1), [(building.pk, 0.0)])
+            with self.captureOnCommitCallbacks(execute=True):
+                building.delete()
+        self.assertNotEqual(self.index.nearest(lat, lng, k=1)[0][0], building.pk)
+
+    def test_nearby_api(self):
+        lat, lng = grid_point(10, 10)
+        with mock.patch('accounts.views.building_spatial_index', self.index):
+            data = self.client.get(reverse('nearby_buildings_api'), {'lat': lat, 'lng': lng, 'k': 3}).json()
+            expected = self.brute_force(lat, lng, 3)
+            self.assertEqual([building['id'] for building in data['buildings']], [pk for pk, _ in expected])
+            self.assertEqual([building['distance_m'] for building in data['buildings']],
+                             [round(distance, 1) for _, distance in expected])
+
+            # k is capped at 50
+            data = self.client.get(reverse('nearby_buildings_api'), {'lat': lat, 'lng': lng, 'k': 500}).json()
+            self.assertEqual(data['count'], 50)
+            data = self.client.get(reverse('nearby_buildings_api'), {'lat': lat, 'lng': lng, 'radius': 150}).json()
+            self.assertEqual(data['count'], len(self.brute_force(lat, lng, 10, radius=150)))
+
+            self.assertEqual(self.client.get(reverse('nearby_buildings_api'), {'lat': lat}).status_code, 400)
+            self.assertEqual(self.client.get(reverse('nearby_buildings_api'), {'lat': lat, 'lng': 200}).status_code, 400)
+        with mock.patch('accounts.views.building_spatial_index.nearest', return_value=None):
+            self.assertEqual(self.client.get(reverse('nearby_buildings_api'), {'lat': lat, 'lng': lng}).status_code, 503)
+
+
+class WalkingRouterTests(TestCase):
+    def setUp(self):
+        active_alert_snapshot.invalidate()
+        self.router = CampusRouter()
+        self.router.set_graph(WalkingGraph.from_lines(grid_lines()))
+
+    def tearDown(self):
+        active_alert_snapshot.invalidate()
+
+    def test_graph_is_undirected_csr(self):
+        graph = self.router.get_graph()
+        self.assertEqual((graph.node_count, graph.edge_count), (9, 24))
+        self.assertEqual(len(graph.indptr), graph.node_count + 1)
+        corner, _ = graph.nearest_node(*grid_point(0, 0))
+        self.assertEqual(graph.indptr[corner + 1] - graph.indptr[corner], 2)
+
+    def test_a_star_matches_dijkstra(self):
+        rng = random.Random(7)
+        lines = [[(33.77 + rng.uniform(0, 0.01), -84.40 + rng.uniform(0, 0.01)) for _ in range(2)] for _ in range(40)]
+        lines += [[a[-1], b[0]] for a, b in zip(lines, lines[1:])]
+        graph = WalkingGraph.from_lines(lines)
+        for _ in range(20):
+            source, target = rng.randrange(graph.node_count), rng.randrange(graph.node_count)
+            path, cost = graph.shortest_path(source, target)
+            self.assertAlmostEqual(cost, graph.distances_from(source)[target], places=6)
+            self.assertEqual((path[0], path[-1]), (source, target))
+            self.assertAlmostEqual(sum(graph.lengths[graph.path_edges(path)]), cost, places=6)
+
+    def test_unreachable_nodes(self):
+        graph = WalkingGraph.from_lines([[(33.77, -84.40), (33.771, -84.40)], [(33.78, -84.40), (33.781, -84.40)]])
+        self.assertEqual(graph.shortest_path(0, 2), (None, math.inf))
+        self.assertTrue(math.isinf(graph.distances_from(0)[2]))
+
+    def test_route_follows_the_grid(self):
+        route = self.router.route(*grid_point(0, 0), *grid_point(2, 2))
+        self.assertTrue(route['found'])
+        self.assertEqual((route['path'][0], route['path'][-1]), (list(grid_point(0, 0)), list(grid_point(2, 2))))
+        self.assertEqual(len(route['path']), 5)
+        self.assertEqual(route['alert_ids'], [])
+
+    def test_route_detours_around_alerts(self):
+        alert = create_alert(*grid_point(1, 1), radius=30)
+        active_alert_snapshot.invalidate()
+        route = self.router.route(*grid_point(0, 1), *grid_point(2, 1))
+        self.assertNotIn(list(grid_point(1, 1)), route['path'])
+        self.assertEqual(route['alert_ids'], [])
+        self.assertEqual(len(route['path']), 5)
+        # No way around an alert at the destination
+        route = self.router.route(*grid_point(0, 0), *grid_point(1, 1))
+        self.assertEqual(route['alert_ids'], [alert.id])
+
+    def test_retries_a_missing_graph_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'graph.geojson')
+            with override_settings(WALKING_GRAPH_PATH=path):
+                router = CampusRouter()
+                with self.assertLogs('accounts.routing', 'WARNING'):
+                    self.assertIsNone(router.get_graph())
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump({'type': 'FeatureCollection', 'features': [{
+                        'type': 'Feature', 'properties': {},
+                        'geometry': {'type': 'LineString', 'coordinates': [[lng, lat] for lat, lng in grid_lines()[0]]},
+                    }]}, f)
+                self.assertEqual(router.get_graph().node_count, 3)
+
+    def test_route_api(self):
+        self.assertEqual(self.client.get('/api/route/').status_code, 400)
+        with mock.patch('accounts.views.campus_router', self.router):
+            response = self.client.get('/api/route/', {
+                'from': '%f,%f' % grid_point(0, 0), 'to': '%f,%f' % grid_point(0, 2),
+            })
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertAlmostEqual(data['distance_m'], 185.3, delta=1)
+        self.assertEqual(data['duration_s'], round(data['distance_m'] / 1.4))
+
+
+class WalkingMatrixTests(TestCase):
+    speed = 1.4
+
+    def setUp(self):
+        # A 4 x 4 street grid plus a separate path nobody can walk to
+        lines = grid_lines(size=4) + [[grid_point(8, 0), grid_point(8, 1)]]
+        self.graph = WalkingGraph.from_lines(lines)
+        self.buildings = [
+            (1, *grid_point(0, 0)), (2, grid_point(0, 3)[0] + 0.0001, grid_point(0, 3)[1]),
+            (3, *grid_point(3, 3)), (4, *grid_point(2, 1)), (5, *grid_point(8, 0)),
+        ]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'walking_times.npy')
+
+    def expected(self, buildings, from_id, to_id):
+        """Snap, A* and snap again, as a route request would."""
+        coordinates = {building_id: (lat, lng) for building_id, lat, lng in buildings}
+        source, source_snap = self.graph.nearest_node(*coordinates[from_id])
+        target, target_snap = self.graph.nearest_node(*coordinates[to_id])
+        _, distance = self.graph.shortest_path(source, target)
+        return (source_snap + distance + target_snap) / self.speed
+
+    def assertMatchesSearches(self, buildings):
+        matrix = WalkingTimeMatrix(self.path)
+        for from_id, _, _ in buildings:
+            for to_id, _, _ in buildings:
+                actual = matrix.walking_time(from_id, to_id)
+                if from_id == to_id:
+                    self.assertEqual(actual, 0.0)
+                elif math.isinf(self.expected(buildings, from_id, to_id)):
+                    self.assertTrue(math.isinf(actual))
+                else:
+                    self.assertAlmostEqual(actual, self.expected(buildings, from_id, to_id), delta=0.01)
+
+    def test_matches_route_searches(self):
+        build_matrix(self.graph, self.buildings, self.path, self.speed)
+        self.assertMatchesSearches(self.buildings)
+        matrix = WalkingTimeMatrix(self.path)
+        self.assertIsNone(matrix.walking_time(1, 99))
+        # The building on the separate path isn't reachable, so it isn't listed
+        self.assertEqual([building_id for building_id, _ in matrix.nearest(1)], [2, 4, 3])
+        self.assertEqual([building_id for building_id, _ in matrix.nearest(1, to_ids=[3, 5, 99], limit=1)], [3])
+
+    def test_moved_building_row_and_column_are_recomputed(self):
+        build_matrix(self.graph, self.buildings, self.path, self.speed)
+        before = WalkingTimeMatrix(self.path)
+        moved = [(4, *grid_point(1, 3)) if building[0] == 4 else building for building in self.buildings]
+        self.assertEqual(update_matrix(self.graph, moved, self.path, self.speed), (1, 0, 0))
+        self.assertMatchesSearches(moved)
+        after = WalkingTimeMatrix(self.path)
+        self.assertEqual(after.walking_time(1, 3), before.walking_time(1, 3))
+        self.assertNotEqual(after.walking_time(1, 4), before.walking_time(1, 4))
+        self.assertEqual(update_matrix(self.graph, moved, self.path, self.speed), (0, 0, 0))
+
+    def test_added_and_removed_buildings(self):
+        build_matrix(self.graph, self.buildings, self.path, self.speed)
+        changed = [building for building in self.buildings if building[0] != 2] + [(6, *grid_point(3, 0))]
+        self.assertEqual(update_matrix(self.graph, changed, self.path, self.speed), (0, 1, 1))
+        self.assertMatchesSearches(changed)
+        self.assertNotIn(2, WalkingTimeMatrix(self.path))
+        # A different graph means a full rebuild
+        graph = WalkingGraph.from_lines(grid_lines(size=4))
+        self.assertIsNone(update_matrix(graph, changed, self.path, self.speed))
+
+    def meta(self):
+        with open(metadata_path(self.path), encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_metadata_names_its_own_generation(self):
+        build_matrix(self.graph, self.buildings, self.path, self.speed)
+        first = self.meta()['generation']
+        update_matrix(self.graph, self.buildings[:-1], self.path, self.speed)
+        second = self.meta()['generation']
+        update_matrix(self.graph, self.buildings[:-2], self.path, self.speed)
+        meta = self.meta()
+        # The generation just replaced stays for readers opening it; older ones go
+        self.assertFalse(generation_path(self.path, first).exists())
+        self.assertTrue(generation_path(self.path, second).exists())
+        self.assertEqual(load_times(self.path, meta).shape, (3, 3))
+        with self.assertRaises(ValueError):
+            load_times(self.path, dict(meta, generation=second))
+
+    @override_settings(WALKING_MATRIX_UPDATE_ASYNC=False)
+    def test_saving_a_moved_building_updates_the_matrix(self):
+        building = Building.objects.create(name='Library', code='LIB', address='', latitude=grid_point(0, 0)[0],
+                                           longitude=grid_point(0, 0)[1])
+        other = Building.objects.create(name='CULC', code='CULC', address='', latitude=grid_point(3, 3)[0],
+                                        longitude=grid_point(3, 3)[1])
+        store = WalkingMatrixStore()
+        rows = list(Building.objects.values_list('id', 'latitude', 'longitude'))
+        build_matrix(self.graph, rows, self.path, self.speed)
+        before = WalkingTimeMatrix(self.path).walking_time(building.pk, other.pk)
+
+        with override_settings(WALKING_MATRIX_PATH=self.path), \
+                mock.patch('accounts.signals.walking_matrix', store), \
+                mock.patch('accounts.routing.campus_router.get_graph', return_value=self.graph):
+            with self.captureOnCommitCallbacks(execute=True):
+                building.name = 'Price Gilbert Library'
+                building.save()
+            self.assertEqual(store.get().walking_time(building.pk, other.pk), before)
+            with self.assertLogs('accounts.walking_matrix', 'INFO'), self.captureOnCommitCallbacks(execute=True):
+                building.latitude, building.longitude = grid_point(3, 2)
+                building.save()
+            self.assertLess(store.get().walking_time(building.pk, other.pk), before)
+
+class IsochroneTests(TestCase):
+    def setUp(self):
+        self.graph = WalkingGraph.from_lines(grid_lines(size=5))
+        self.index = IsochroneIndex(cache_size=2, sectors=8)
+        # One building beside every intersection
+        self.buildings = [
+            (i * 5 + j + 1, grid_point(i, j)[0] + 0.00005, grid_point(i, j)[1]) for i in range(5) for j in range(5)
+        ]
+        self.index.set_buildings(self.graph, self.buildings)
+
+    def expected(self, lat, lng, minutes, speed=1.4):
+        """(building id, seconds) reachable in time, from an unbounded search."""
+        origin, origin_snap = self.graph.nearest_node(lat, lng)
+        distances = self.graph.distances_from(origin)
+        reachable = []
+        for building_id, building_lat, building_lng in self.buildings:
+            node, snap = self.graph.nearest_node(building_lat, building_lng)
+            total = origin_snap + distances[node] + snap
+            if total <= minutes * 60 * speed:
+                reachable.append((building_id, total / speed))
+        return sorted(reachable, key=lambda item: item[1])
+
+    def test_matches_unbounded_search(self):
+        for minutes in (1, 3, 5, 10):
+            with self.subTest(minutes=minutes):
+                result = self.index.query(self.graph, *grid_point(1, 1), minutes, 1.4, max_minutes=10)
+                expected = self.expected(*grid_point(1, 1), minutes)
+                self.assertEqual([pk for pk, _ in result['buildings']], [pk for pk, _ in expected])
+                for (_, seconds), (_, expected_seconds) in zip(result['buildings'], expected):
+                    self.assertAlmostEqual(seconds, expected_seconds, places=6)
+        # The whole grid is under ten minutes away, the nearest building only
+        self.assertEqual(len(result['buildings']), 25)
+        self.assertEqual(result['buildings'][0][0], 7)
+
+    def test_slider_reuses_the_cached_search(self):
+        for minutes in (2, 4, 6):
+            self.index.query(self.graph, *grid_point(0, 0), minutes, 1.4, max_minutes=10)
+        self.assertEqual(self.index.stats(), {'hits': 2, 'misses': 1, 'cached_origins': 1})
+
+        for i in range(1, 4):
+            self.index.query(self.graph, *grid_point(i, i), 5, 1.4, max_minutes=10)
+        self.assertEqual(self.index.stats()['cached_origins'], 2)
+
+        # A new graph drops everything computed on the old one
+        graph = WalkingGraph.from_lines(grid_lines(size=5))
+        self.index.set_buildings(graph, self.buildings)
+        self.assertEqual(self.index.stats()['cached_origins'], 0)
+
+    def test_polygon_outlines_reachable_nodes(self):
+        result = self.index.query(self.graph, *grid_point(2, 2), 3, 1.4, max_minutes=10)
+        self.assertTrue(3 <= len(result['polygon']) <= 8)
+        origin, _ = self.graph.nearest_node(*grid_point(2, 2))
+        distances = self.graph.distances_from(origin)
+        for lat, lng in result['polygon']:
+            node, snap = self.graph.nearest_node(lat, lng)
+            self.assertLess(snap, 1)
+            self.assertLessEqual(distances[node], 3 * 60 * 1.4)
+
+        self.assertEqual(self.index.query(self.graph, *grid_point(2, 2), 0.5, 1.4, max_minutes=10)['polygon'],
+                         [[self.graph.node_lat[origin], self.graph.node_lng[origin]]])
+
+    def test_origin_off_the_network(self):
+        result = self.index.query(self.graph, GRID_ORIGIN[0] + 0.05, GRID_ORIGIN[1], 10, 1.4, 10, max_snap=300)
+        self.assertGreater(result['snap_m'], 300)
+        self.assertEqual((result['buildings'], result['polygon']), ([], []))
+        self.assertEqual(self.index.stats()['misses'], 0)
+
+    def test_building_changes_invalidate_on_commit(self):
+        with mock.patch('accounts.signals.isochrone_index', self.index):
+            with self.captureOnCommitCallbacks(execute=True):
+                building = Building.objects.create(name='New', code='N', address='', latitude=33.77, longitude=-84.39)
+                # A rolled-back save would leave the snapped buildings intact
+                self.assertIsNotNone(self.index._buildings)
+            self.assertIsNone(self.index._buildings)
+
+            self.index.set_buildings(self.graph, self.buildings)
+            with self.captureOnCommitCallbacks(execute=True):
+                building.delete()
+                self.assertIsNotNone(self.index._buildings)
+            self.assertIsNone(self.index._buildings)
+
+    def test_api_filters_busy_buildings(self):
+        quiet = Building.objects.create(name='Quiet', code='Q', address='', latitude=grid_point(0, 1)[0],
+                                        longitude=grid_point(0, 1)[1], current_occupancy_percent=20)
+        Building.objects.create(name='Busy', code='B', address='', latitude=grid_point(1, 0)[0],
+                                longitude=grid_point(1, 0)[1], current_occupancy_percent=95)
+        Building.objects.create(name='Far', code='F', address='', latitude=grid_point(4, 4)[0],
+                                longitude=grid_point(4, 4)[1])
+        lat, lng = grid_point(0, 0)
+        with mock.patch('accounts.views.campus_router.get_graph', return_value=self.graph):
+            data = self.client.get(reverse('isochrone'), {'lat': lat, 'lng': lng, 'minutes': 3}).json()
+            self.assertEqual([building['name'] for building in data['buildings']], ['Quiet', 'Busy'])
+            data = self.client.get(reverse('isochrone'), {'lat': lat, 'lng': lng, 'minutes': 3, 'max_occupancy': 50}).json()
+            self.assertEqual([building['id'] for building in data['buildings']], [quiet.pk])
+            self.assertEqual(self.client.get(reverse('isochrone'), {'lat': lat, 'lng': lng, 'minutes': 90}).status_code, 400)
+            self.assertEqual(self.client.get(reverse('isochrone'), {'lat': lat + 0.05, 'lng': lng, 'minutes': 3}).status_code, 404)
+        with mock.patch('accounts.views.campus_router.get_graph', return_value=None):
+            self.assertEqual(self.client.get(reverse('isochrone'), {'lat': lat, 'lng': lng, 'minutes': 3}).status_code, 503)
+
+
+class RouteCacheTests(TestCase):
+    def setUp(self):
+        active_alert_snapshot.invalidate()
+        self.graph = WalkingGraph.from_lines(grid_lines(size=6))
+        self.router = CampusRouter()
+        self.router.set_graph(self.graph)
+
+    def tearDown(self):
+        active_alert_snapshot.invalidate()
+
+    def uncached(self, *coordinates):
+        router = CampusRouter()
+        router.set_graph(self.graph)
+        return router.route(*coordinates)
+
+    def test_requests_snapping_to_the_same_nodes_share_a_search(self):
+        first = self.router.route(*grid_point(0, 0), *grid_point(3, 3))
+        lat, lng = grid_point(0, 0)
+        second = self.router.route(lat + 0.0001, lng + 0.0001, *grid_point(3, 3))
+        self.assertEqual(dict(first, snap_m=None), dict(second, snap_m=None))
+        self.assertGreater(second['snap_m'][0], first['snap_m'][0])
+        stats = self.router.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_lru_eviction_and_ttl(self):
+        cache = RouteCache(max_size=2, ttl=60)
+        for key in ('a', 'b'):
+            cache.put(key, {'found': True, 'route': key}, None, cache.generation)
+        cache.get('a')
+        cache.put('c', {'found': True, 'route': 'c'}, None, cache.generation)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a')['route'], 'a')
+
+        with mock.patch('accounts.route_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get('a'))
+        stats = cache.stats()
+        self.assertEqual((stats['evicted'], stats['expired'], stats['size']), (1, 1, 1))
+
+        disabled = RouteCache(max_size=0)
+        disabled.put('a', {'found': True}, None, disabled.generation)
+        self.assertIsNone(disabled.get('a'))
+
+    def test_results_computed_before_an_invalidation_are_not_stored(self):
+        cache = RouteCache()
+        generation = cache.generation
+        cache.invalidate_bounds([])
+        cache.put('a', {'found': True}, None, generation)
+        self.assertIsNone(cache.get('a'))
+
+    def test_alert_changes_only_drop_routes_they_may_affect(self):
+        trips = [
+            (grid_point(0, 1), grid_point(2, 1)),
+            (grid_point(0, 0), grid_point(2, 2)),
+            # Runs past the alert, but any path through it would be longer
+            (grid_point(0, 0), grid_point(0, 2)),
+            (grid_point(5, 3), grid_point(5, 5)),
+            (grid_point(4, 4), grid_point(5, 5)),
+        ]
+        for origin, destination in trips:
+            self.router.route(*origin, *destination)
+
+        alert = create_alert(*grid_point(1, 1), radius=30)
+        active_alert_snapshot.invalidate()
+        self.router.route(*trips[0][0], *trips[0][1])
+        # Only the routes near the new alert were dropped
+        self.assertEqual(self.router.cache.stats()['invalidated'], 2)
+        for origin, destination in trips:
+            self.assertEqual(self.router.route(*origin, *destination), self.uncached(*origin, *destination))
+
+        alert.latitude, alert.longitude = grid_point(5, 4)
+        alert.save()
+        active_alert_snapshot.invalidate()
+        for origin, destination in trips:
+            self.assertEqual(self.router.route(*origin, *destination), self.uncached(*origin, *destination))
+
+    def test_cached_routes_match_fresh_searches_as_alerts_change(self):
+        rng = random.Random(11)
+        points = [grid_point(i, j) for i in range(6) for j in range(6)]
+        trips = [(rng.choice(points), rng.choice(points)) for _ in range(30)]
+        alerts = []
+        for step in range(4):
+            if step % 2:
+                alerts.pop(0).delete()
+            else:
+                alerts.append(create_alert(*rng.choice(points), radius=40))
+            active_alert_snapshot.invalidate()
+            for origin, destination in trips:
+                with self.subTest(step=step, origin=origin, destination=destination):
+                    self.assertEqual(self.router.route(*origin, *destination), self.uncached(*origin, *destination))
+        self.assertGreater(self.router.cache.stats()['hits'], 0)
+
+def point_in_polygon(lat, lng, vertices):
+    """Plain even-odd ray cast, one edge at a time."""
+    inside = False
+    for (lat1, lng1), (lat2, lng2) in zip(vertices, vertices[1:] + vertices[:1]):
+        if (lat1 > lat) != (lat2 > lat) and lng < lng1 + (lat - lat1) * (lng2 - lng1) / (lat2 - lat1):
+            inside = not inside
+    return inside
+
+
+class AlertIndexTests(TestCase):
+    def setUp(self):
+        active_alert_snapshot.invalidate()
+
+    def tearDown(self):
+        active_alert_snapshot.invalidate()
+
+    def random_alerts(self, rng, count):
+        """Snapshot-like stand-in holding circle, point and polygon alert entries."""
+        entries = []
+        for alert_id in range(1, count + 1):
+            lat = GRID_ORIGIN[0] + rng.uniform(0, 0.01)
+            lng = GRID_ORIGIN[1] + rng.uniform(0, 0.01)
+            data = {'location_type': rng.choice(['circle', 'point', 'polygon']), 'latitude': lat, 'longitude': lng}
+            if data['location_type'] == 'circle':
+                data['radius'] = rng.uniform(10, 150)
+            elif data['location_type'] == 'polygon':
+                # Star-shaped, so the vertex order never self-intersects
+                angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(rng.randint(3, 8)))
+                data['polygon_coordinates'] = [
+                    [lat + r * math.sin(angle), lng + r * math.cos(angle)]
+                    for angle, r in ((angle, rng.uniform(0.0002, 0.0015)) for angle in angles)
+                ]
+            severity = rng.choice(['critical', 'high', 'medium', 'low'])
+            entries.append(mock.Mock(id=alert_id, severity=severity, data=data))
+        return mock.Mock(entries=entries)
+
+    def brute_force(self, snapshot, lat, lng, point_radius):
+        hits = set()
+        for entry in snapshot.entries:
+            data = entry.data
+            if data['location_type'] == 'polygon':
+                inside = point_in_polygon(lat, lng, [tuple(vertex) for vertex in data['polygon_coordinates']])
+            else:
+                radius = data.get('radius', point_radius)
+                inside = haversine_m(lat, lng, data['latitude'], data['longitude']) <= radius
+            if inside:
+                hits.add(entry.id)
+        return hits
+
+    def test_tree_matches_brute_force_scan(self):
+        rng = random.Random(13)
+        snapshot = self.random_alerts(rng, 400)
+        for capacity in (4, 16):
+            index = AlertGeometryIndex(snapshot, point_radius_m=25.0, capacity=capacity)
+            self.assertGreaterEqual(len(index.levels), 3)
+            overlapping = 0
+            for _ in range(150):
+                lat = GRID_ORIGIN[0] + rng.uniform(-0.001, 0.011)
+                lng = GRID_ORIGIN[1] + rng.uniform(-0.001, 0.011)
+                matches = index.containing(lat, lng)
+                self.assertEqual({entry.id for entry in matches}, self.brute_force(snapshot, lat, lng, 25.0))
+                ranks = [SEVERITY_RANK[entry.severity] for entry in matches]
+                self.assertEqual(ranks, sorted(ranks))
+                overlapping += len(matches) > 1
+            self.assertGreater(overlapping, 20)
+
+        # Every alert contains its own center, except polygons whose center may fall outside
+        for entry in snapshot.entries:
+            if entry.data['location_type'] != 'polygon':
+                self.assertIn(entry, index.containing(entry.data['latitude'], entry.data['longitude']))
+        self.assertEqual(AlertGeometryIndex(mock.Mock(entries=[])).containing(*GRID_ORIGIN), [])
+
+    def test_at_api(self):
+        lat, lng = grid_point(1, 1)
+        circle = create_alert(lat, lng, radius=50)
+        point = create_alert(lat + 0.0001, lng, radius=None, severity='low', location_type='point')
+        square = [grid_point(0, 0), grid_point(0, 2), grid_point(2, 2), grid_point(2, 0)]
+        polygon = create_alert(
+            None, None, None, severity='critical', location_type='polygon', polygon_coordinates=json.dumps(square),
+        )
+
+        data = self.client.get(reverse('alerts_at'), {'lat': lat, 'lng': lng}).json()
+        self.assertEqual((data['inside'], data['count']), (True, 3))
+        self.assertEqual([alert['id'] for alert in data['alerts']], [polygon.pk, circle.pk, point.pk])
+
+        # 80 m east: outside the circle and the point, still inside the square
+        data = self.client.get(reverse('alerts_at'), {'lat': lat, 'lng': lng + 0.0009}).json()
+        self.assertEqual([alert['id'] for alert in data['alerts']], [polygon.pk])
+        data = self.client.get(reverse('alerts_at'), {'lat': lat + 0.01, 'lng': lng}).json()
+        self.assertEqual((data['inside'], data['count'], data['alerts']), (False, 0, []))
+
+        self.assertEqual(self.client.get(reverse('alerts_at'), {'lat': lat}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('alerts_at'), {'lat': 91, 'lng': lng}).status_code, 400)
+
+
+class RouteAlertCheckTests(TestCase):
+    # An east-west route along the grid's bottom street, about 185 m long
+    route = [grid_point(0, 0), grid_point(0, 1), grid_point(0, 2)]
+
+    def setUp(self):
+        active_alert_snapshot.invalidate()
+
+    def tearDown(self):
+        active_alert_snapshot.invalidate()
+
+    def hits(self, points=None):
+        active_alert_snapshot.invalidate()
+        return [(entry.id, distance) for entry, distance in active_alert_index.alerts_on_route(points or self.route)]
+
+    def test_polyline_round_trip(self):
+        points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        self.assertEqual(polyline.encode(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(polyline.decode('_p~iF~ps|U_ulLnnqC_mqNvxq`@'), points)
+        with self.assertRaises(ValueError):
+            polyline.decode('_p~iF~ps|U_')
+
+    def test_circle_entry_distance(self):
+        alert = create_alert(*grid_point(0, 1), radius=20)
+        [(alert_id, distance)] = self.hits()
+        self.assertEqual(alert_id, alert.id)
+        self.assertAlmostEqual(distance, 92.5 - 20, delta=0.5)
+
+    def test_alerts_beside_the_route_are_not_hit(self):
+        lat, lng = grid_point(0, 1)
+        create_alert(lat + 0.0005, lng, radius=50)  # Center 55.6 m north
+        self.assertEqual(self.hits(), [])
+
+    def test_polygon_and_point_alerts(self):
+        lat, lng = grid_point(0, 1)
+        polygon = SafetyAlert.objects.create(
+            title='Polygon', description='', alert_type='hazard', severity='high', location_type='polygon',
+            polygon_coordinates=json.dumps([[lat - 0.0002, lng + 0.0004], [lat + 0.0002, lng + 0.0004],
+                                            [lat + 0.0002, lng + 0.0006], [lat - 0.0002, lng + 0.0006]]),
+            is_active=True,
+        )
+        point = SafetyAlert.objects.create(
+            title='Point', description='', alert_type='hazard', severity='low', location_type='point',
+            latitude=lat, longitude=lng - 0.0005, is_active=True,
+        )
+        hits = self.hits()
+        # Ordered by where the route enters them
+        self.assertEqual([alert_id for alert_id, _ in hits], [point.id, polygon.id])
+        self.assertAlmostEqual(hits[1][1], 92.5 * 1.4, delta=1)
+
+    def test_single_point_route(self):
+        alert = create_alert(*grid_point(0, 0), radius=10)
+        self.assertEqual([alert_id for alert_id, _ in self.hits([grid_point(0, 0)])], [alert.id])
+
+    def test_check_route_api(self):
+        alert = create_alert(*grid_point(0, 2), radius=10)
+        encoded = polyline.encode(self.route)
+        response = self.client.get('/api/routes/check/', {'polyline': encoded})
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['alerts'][0]['alert']['id'], alert.id)
+        response = self.client.post('/api/routes/check/', json.dumps({'polyline': encoded}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(self.client.get('/api/routes/check/', {'polyline': '_p~iF~ps|U_'}).status_code, 400)
+        with override_settings(ROUTE_CHECK_MAX_POINTS=2):
+            self.assertEqual(self.client.get('/api/routes/check/', {'polyline': encoded}).status_code, 400)
+
+
+class PolylineTests(SimpleTestCase):
+    def test_matches_reference_encoding(self):
+        # The worked example from Google's polyline algorithm documentation
+        points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        self.assertEqual(polyline.encode(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(polyline.decode('_p~iF~ps|U_ulLnnqC_mqNvxq`@'), points)
+
+    def test_round_trip_within_precision(self):
+        rng = random.Random(7)
+        points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(200)]
+        for (lat, lng), (decoded_lat, decoded_lng) in zip(points, polyline.decode(polyline.encode(points))):
+            self.assertAlmostEqual(lat, decoded_lat, delta=0.5e-5)
+            self.assertAlmostEqual(lng, decoded_lng, delta=0.5e-5)
+        self.assertEqual(polyline.decode(''), [])
+
+    def test_malformed_input_raises(self):
+        for encoded in ('_p~iF~ps|U_', '_p~iF', 'ab cd'):
+            with self.subTest(encoded=encoded), self.assertRaises(ValueError):
+                polyline.decode(encoded)
+
+    def test_route_geometry_is_stored_canonical(self):
+        path = [grid_point(0, 0), grid_point(0, 1), grid_point(1, 1)]
+        encoded, error = parse_route_geometry(None, [list(point) for point in path])
+        self.assertIsNone(error)
+        self.assertEqual(encoded, polyline.encode(path))
+        self.assertEqual(parse_route_geometry(encoded, None), (encoded, None))
+        self.assertEqual(parse_route_geometry(None, None), ('', None))
+
+    @override_settings(SAVED_ROUTE_MAX_POINTS=3)
+    def test_route_geometry_is_validated(self):
+        self.assertIn('Invalid route geometry', parse_route_geometry('_p~iF', None)[1])
+        self.assertIn('Invalid route geometry', parse_route_geometry(None, [[1, 2, 3]])[1])
+        self.assertIn('between 2 and 3', parse_route_geometry(None, [[33.77, -84.4]])[1])
+        self.assertIn('between 2 and 3', parse_route_geometry(None, [[33.77, -84.4]] * 4)[1])
+        self.assertEqual(
+            parse_route_geometry(None, [[95, -84.4], [33.77, -84.4]])[1], 'Route geometry contains invalid coordinates',
+        )
+
+
+@override_settings(SAVED_ROUTE_CHECK_ASYNC=False)
+class SavedRouteGeometryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='walker', email='walker@gatech.edu')
+
+    def test_bounds_follow_stored_geometry(self):
+        points = [grid_point(0, 0), grid_point(2, 0), grid_point(2, 2), grid_point(0, 2)]
+        points = polyline.decode(polyline.encode(points))
+        route = create_saved_route(self.user, points)
+        self.assertEqual(route.route_points(), points)
+        bounds = route.get_bounds()
+        # The detour reaches further north than either endpoint
+        self.assertGreaterEqual(bounds['north'], points[1][0])
+        self.assertLessEqual(bounds['south'], points[0][0])
+
+        route.route_polyline = ''
+        route.save(update_fields=['route_polyline'])
+        route.refresh_from_db()
+        self.assertEqual(route.route_points(), [points[0], points[-1]])
+        self.assertLess(route.get_bounds()['north'], bounds['north'])
+
+    def test_unreadable_polyline_falls_back_to_endpoints(self):
+        route = create_saved_route(self.user, [grid_point(0, 0), grid_point(0, 2)])
+        route.route_polyline = '_p~iF'
+        self.assertEqual(route.route_points(), [
+            (float(route.origin_lat), float(route.origin_lng)),
+            (float(route.destination_lat), float(route.destination_lng)),
+        ])
+
+    def test_save_and_load_route_api(self):
+        self.client.force_login(self.user)
+        path = [grid_point(0, 0), grid_point(1, 0), grid_point(1, 1)]
+        response = self.client.post(reverse('save_route'), json.dumps({
+            'name': 'To class', 'origin_lat': path[0][0], 'origin_lng': path[0][1],
+            'destination_lat': path[-1][0], 'destination_lng': path[-1][1], 'destination_name': 'Class',
+            'path': path,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        route = SavedRoute.objects.get(pk=response.json()['route_id'])
+        self.assertEqual(route.route_polyline, polyline.encode(path))
+
+        loaded = self.client.post(reverse('load_saved_route'), json.dumps({'route_id': route.pk}),
+                                  content_type='application/json').json()['route']
+        self.assertEqual(polyline.decode(loaded['polyline']), polyline.decode(polyline.encode(path)))
+        self.assertEqual(loaded['bounds'], route.get_bounds())
+
+    def test_save_route_api_rejects_bad_geometry(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('save_route'), json.dumps({
+            'name': 'Broken', 'origin_lat': 33.77, 'origin_lng': -84.4, 'destination_lat': 33.78,
+            'destination_lng': -84.39, 'destination_name': 'Somewhere', 'polyline': '_p~iF',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SavedRoute.objects.exists())
+
+@override_settings(SAVED_ROUTE_CHECK_ASYNC=False)
+class SavedRouteAlertTests(TestCase):
+    def setUp(self):
+        active_alert_snapshot.invalidate()
+        self.checker = SavedRouteAlertChecker()
+        patcher = mock.patch('accounts.signals.saved_route_checker', self.checker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create(username='walker', email='walker@gatech.edu')
+        self.bottom = create_saved_route(user, [grid_point(0, 0), grid_point(0, 1), grid_point(0, 2)])
+        self.top = create_saved_route(user, [grid_point(2, 0), grid_point(2, 1), grid_point(2, 2)])
+        # Same endpoints as bottom, but the stored geometry bends away from the alert
+        self.detour = create_saved_route(user, [grid_point(0, 0), grid_point(1, 0), grid_point(1, 2), grid_point(0, 2)])
+
+    def tearDown(self):
+        active_alert_snapshot.invalidate()
+
+    def flags(self):
+        return {
+            route.pk: (route.has_alert, sorted(route.crossing_alerts.values_list('id', flat=True)))
+            for route in SavedRoute.objects.all()
+        }
+
+    def test_alert_changes_flag_and_clear_routes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            alert = create_alert(*grid_point(0, 1), radius=20)
+        self.assertEqual(self.flags(), {
+            self.bottom.pk: (True, [alert.pk]), self.top.pk: (False, []), self.detour.pk: (False, []),
+        })
+
+        # Moving the alert releases its old routes
+        with self.captureOnCommitCallbacks(execute=True):
+            alert.latitude, alert.longitude = grid_point(2, 1)
+            alert.save()
+        self.assertEqual(self.flags(), {
+            self.bottom.pk: (False, []), self.top.pk: (True, [alert.pk]), self.detour.pk: (False, []),
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alert.is_active = False
+            alert.save()
+        self.assertEqual({flag for flag, _ in self.flags().values()}, {False})
+
+    def test_deleted_alert_clears_its_routes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            alert = create_alert(*grid_point(0, 1), radius=20)
+        with self.captureOnCommitCallbacks(execute=True):
+            alert.delete()
+        self.assertEqual(self.flags()[self.bottom.pk], (False, []))
+
+    def test_only_routes_near_the_alert_are_checked(self):
+        alert = create_alert(*grid_point(0, 1), radius=20)
+        active_alert_snapshot.invalidate()
+        candidates, flagged, cleared = self.checker.check_alerts({alert.pk: None})
+        # bottom and detour have overlapping boxes; top is never loaded
+        self.assertEqual((candidates, flagged, cleared), (2, 1, 0))
+        self.assertEqual(self.checker.stats()['candidates'], 2)
+
+    def test_check_new_route_against_all_alerts(self):
+        first = create_alert(*grid_point(2, 0), radius=20)
+        second = create_alert(*grid_point(2, 2), radius=20)
+        active_alert_snapshot.invalidate()
+        self.assertEqual(self.checker.check_routes([self.top]), (1, 0))
+        self.assertEqual(self.flags()[self.top.pk], (True, [first.pk, second.pk]))
+
+
+class AlertSnapshotTests(TestCase):
+    def setUp(self):
+        active_alert_snapshot.invalidate()
+
+    def tearDown(self):
+        active_alert_snapshot.invalidate()
+
+    def alert_ids(self, **params):
+        response = self.client.get(reverse('get_alerts'), params)
+        return sorted(alert['id'] for alert in response.json()['alerts'])
+
+    @override_settings(ALERT_SNAPSHOT_CHECK_INTERVAL=60)
+    def test_viewport_filter_uses_bbox_columns(self):
+        circle = create_alert(*grid_point(0, 0), radius=50)
+        corners = [grid_point(2, 2), grid_point(2, 3), grid_point(3, 3), grid_point(3, 2)]
+        polygon = SafetyAlert.objects.create(
+            title='Polygon', description='', alert_type='hazard', severity='high', location_type='polygon',
+            polygon_coordinates=json.dumps(corners), is_active=True,
+        )
+        point = create_alert(*grid_point(5, 5), radius=None, severity='low', location_type='point')
+        create_alert(*grid_point(0, 0), radius=50, is_active=False)
+
+        self.alert_ids()
+        # Only the circle's radius reaches into this box, not its center
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.alert_ids(bounds='33.7710,33.7703,-84.3995,-84.4005'), [circle.pk])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('bbox_min_lat', queries[0]['sql'])
+
+        self.assertEqual(self.alert_ids(bounds='33.7726,33.7724,-84.3974,-84.3976'), [polygon.pk])
+        self.assertEqual(self.alert_ids(bounds='33.78,33.76,-84.39,-84.41'), [circle.pk, polygon.pk, point.pk])
+        self.assertEqual(self.alert_ids(bounds='33.78,33.76,-84.39,-84.41', severity='low'), [point.pk])
+        self.assertEqual(self.alert_ids(bounds='33.7690,33.7680,-84.39,-84.41'), [])
+        # Malformed bounds are ignored
+        self.assertEqual(self.alert_ids(bounds='north'), [circle.pk, polygon.pk, point.pk])
+
+    def test_filters_by_type_and_severity(self):
+        hazard = create_alert(*grid_point(0, 0), radius=50)
+        construction = create_alert(*grid_point(1, 1), radius=50, severity='low', alert_type='construction')
+        # Unfiltered polls share one pre-rendered body
+        self.assertIs(active_alert_snapshot.filtered_body(), active_alert_snapshot.get().body)
+        self.assertEqual(self.alert_ids(), [hazard.pk, construction.pk])
+        self.assertEqual(self.alert_ids(alert_type='construction'), [construction.pk])
+        self.assertEqual(self.alert_ids(severity='high'), [hazard.pk])
+        self.assertEqual(self.alert_ids(alert_type='construction', severity='high'), [])
+
+    @override_settings(ALERT_SNAPSHOT_CHECK_INTERVAL=60)
+    def test_rebuilds_when_alerts_change(self):
+        first = active_alert_snapshot.get()
+        self.assertIs(active_alert_snapshot.get(), first)
+        with mock.patch('accounts.signals.saved_route_checker'):
+            with self.captureOnCommitCallbacks(execute=True):
+                alert = create_alert(*grid_point(0, 0), radius=50)
+                self.assertIs(active_alert_snapshot.get(), first)
+            self.assertEqual([entry.id for entry in active_alert_snapshot.get().entries], [alert.pk])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                alert.delete()
+        self.assertEqual(active_alert_snapshot.get().entries, [])
+
+    def test_rebuilds_at_start_and_end_dates(self):
+        now = timezone.now()
+        scheduled = create_alert(
+            *grid_point(0, 0), radius=50, start_date=now + timedelta(hours=1), end_date=now + timedelta(hours=2),
+        )
+        snapshot = active_alert_snapshot.get()
+        self.assertEqual((snapshot.entries, snapshot.expires_at), ([], scheduled.start_date))
+
+        with mock.patch('django.utils.timezone.now', return_value=now + timedelta(minutes=90)):
+            snapshot = active_alert_snapshot.get()
+        self.assertEqual([entry.id for entry in snapshot.entries], [scheduled.pk])
+        self.assertEqual(snapshot.expires_at, scheduled.end_date)
+
+        with mock.patch('django.utils.timezone.now', return_value=now + timedelta(hours=3)):
+            snapshot = active_alert_snapshot.get()
+        self.assertEqual((snapshot.entries, snapshot.expires_at), ([], None))
+
+    @override_settings(ALERT_SNAPSHOT_CHECK_INTERVAL=0)
+    def test_rebuilds_when_another_process_changes_alerts(self):
+        alert = create_alert(*grid_point(0, 0), radius=50)
+        snapshot = active_alert_snapshot.get()
+        self.assertIs(active_alert_snapshot.get(), snapshot)
+
+        # A queryset update sends no signals, as if another process saved it
+        SafetyAlert.objects.filter(pk=alert.pk).update(title='Renamed', updated_at=timezone.now() + timedelta(minutes=1))
+        snapshot = active_alert_snapshot.get()
+        self.assertEqual(snapshot.entries[0].data['title'], 'Renamed')
+
+        # Between checks the snapshot is served as is
+        with override_settings(ALERT_SNAPSHOT_CHECK_INTERVAL=60):
+            SafetyAlert.objects.filter(pk=alert.pk).update(title='Again', updated_at=timezone.now() + timedelta(minutes=2))
+            self.assertIs(active_alert_snapshot.get(), snapshot)
+
+    def test_unlocated_alerts_are_queued_for_geocoding_once(self):
+        def create_unlocated(address):
+            # bulk_create skips save(), like rows saved before server-side geocoding
+            return SafetyAlert.objects.bulk_create([SafetyAlert(
+                title='Unlocated', description='', alert_type='hazard', severity='high', location_type='point',
+                address=address, is_active=True,
+            )])[0]
+
+        first = create_unlocated('North Ave NW')
+        with mock.patch('accounts.geocoding.background_geocoder') as geocoder:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(active_alert_snapshot.get().entries, [])
+                active_alert_snapshot.invalidate()
+                active_alert_snapshot.get()
+            geocoder.enqueue.assert_called_once_with('SafetyAlert', first.pk)
+
+            second = create_unlocated('Ferst Dr NW')
+            active_alert_snapshot.invalidate()
+            with self.captureOnCommitCallbacks(execute=True):
+                active_alert_snapshot.get()
+        self.assertEqual(geocoder.enqueue.call_args_list, [
+            mock.call('SafetyAlert', first.pk), mock.call('SafetyAlert', second.pk),
+        ])
+
+    def test_migration_backfill_matches_model_bounds(self):
+        from importlib import import_module
+        from .geo import alert_bounds, round_bounds
+
+        migration = import_module('accounts.migrations.0013_safetyalert_bbox')
+        corners = [list(grid_point(0, 0)), list(grid_point(1, 2)), list(grid_point(2, 1))]
+        for args in [
+            ('circle', 33.7712345, -84.3987654, 137.5, None),
+            ('polygon', None, None, None, corners),
+            ('point', 33.77, -84.39, None, None),
+            ('circle', None, None, 50, None),
+        ]:
+            expected = alert_bounds(*args)
+            self.assertEqual(migration.alert_bounds(*args), expected)
+            if expected is not None:
+                self.assertEqual(migration.round_bounds(expected), round_bounds(expected))
+
+
+def parse_event(message):
+    """Fields of one SSE message as a dict."""
+    fields = dict(line.split(': ', 1) for line in message.strip().splitlines())
+    if 'data' in fields:
+        fields['data'] = json.loads(fields['data'])
+    return fields
+
+
+@override_settings(ALERT_STREAM_POLL_INTERVAL=0.05)
+class AlertStreamTests(TestCase):
+    def setUp(self):
+        active_alert_snapshot.invalidate()
+        self.broadcaster = AlertBroadcaster()
+        self.addCleanup(active_alert_snapshot._listeners.remove, self.broadcaster._notify)
+        patcher = mock.patch('accounts.views.alert_broadcaster', self.broadcaster)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        active_alert_snapshot.invalidate()
+
+    async def connect(self, **headers):
+        response = await self.async_client.get(reverse('alert_stream'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response.events = aiter(response.streaming_content)
+        self.assertTrue((await anext(response.events)).startswith(b'retry: '))
+        return response
+
+    async def next_event(self, response):
+        return parse_event((await asyncio.wait_for(anext(response.events), timeout=5)).decode())
+
+    async def disconnect(self, response):
+        """Hang up the way the ASGI server does, by cancelling the pending read."""
+        read = asyncio.ensure_future(anext(response.events))
+        await asyncio.sleep(0.01)
+        read.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await read
+
+    async def wait_for_watcher(self):
+        # The watcher stops once the last client has gone
+        if self.broadcaster._watcher is not None:
+            await asyncio.wait_for(self.broadcaster._watcher, timeout=5)
+
+    def change(self, func, *args):
+        """Run a sync alert change and signal it, as the on_commit handler would."""
+        result = func(*args)
+        active_alert_snapshot.invalidate()
+        return result
+
+    async def test_sends_snapshot_then_upsert_and_remove_events(self):
+        existing = await sync_to_async(create_alert)(*grid_point(0, 0), radius=50)
+        response = await self.connect()
+        event = await self.next_event(response)
+        self.assertEqual(event['event'], 'snapshot')
+        self.assertEqual([alert['id'] for alert in event['data']['alerts']], [existing.pk])
+        self.assertEqual(self.broadcaster.connection_count, 1)
+
+        alert = await sync_to_async(self.change)(create_alert, *grid_point(1, 1), 50)
+        event = await self.next_event(response)
+        self.assertEqual((event['event'], event['data']['id']), ('alert_created', alert.pk))
+
+        def rename():
+            alert.title = 'Renamed'
+            alert.save()
+
+        await sync_to_async(self.change)(rename)
+        event = await self.next_event(response)
+        self.assertEqual((event['event'], event['data']['title']), ('alert_updated', 'Renamed'))
+
+        existing_id = existing.pk
+        await sync_to_async(self.change)(existing.delete)
+        event = await self.next_event(response)
+        self.assertEqual(event, {'id': f'{self.broadcaster.boot_id}-3', 'event': 'alert_expired', 'data': {'id': existing_id}})
+
+        await self.disconnect(response)
+        self.assertEqual(self.broadcaster.connection_count, 0)
+        await self.wait_for_watcher()
+
+    async def test_resumes_from_last_event_id(self):
+        def make_history():
+            self.broadcaster._publish_changes(active_alert_snapshot.get())
+            alert = self.change(create_alert, *grid_point(0, 0), 50)
+            self.broadcaster._publish_changes(active_alert_snapshot.get())
+            alert.title = 'Renamed'
+            self.change(alert.save)
+            self.broadcaster._publish_changes(active_alert_snapshot.get())
+
+        await sync_to_async(make_history)()
+        boot_id = self.broadcaster.boot_id
+
+        # Only what came after the client's last event
+        response = await self.connect(last_event_id=f'{boot_id}-1')
+        event = await self.next_event(response)
+        self.assertEqual((event['id'], event['event']), (f'{boot_id}-2', 'alert_updated'))
+        await self.disconnect(response)
+
+        # The snapshot's id from before any change replays all of them
+        response = await self.connect(last_event_id=f'{boot_id}-0')
+        self.assertEqual([(await self.next_event(response))['event'] for _ in range(2)], ['alert_created', 'alert_updated'])
+        await self.disconnect(response)
+
+        # Ids from another process (or rotated out) get a fresh snapshot
+        response = await self.connect(last_event_id='deadbeef-1')
+        event = await self.next_event(response)
+        self.assertEqual((event['id'], event['event']), (f'{boot_id}-2', 'snapshot'))
+        await self.disconnect(response)
+        await self.wait_for_watcher()
+
+    @override_settings(ALERT_STREAM_MAX_CONNECTIONS=1)
+    async def test_connection_cap(self):
+        first = await self.connect()
+        response = await self.async_client.get(reverse('alert_stream'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+        self.assertEqual((await self.next_event(first))['event'], 'snapshot')
+        await self.disconnect(first)
+        second = await self.connect()
+        self.assertEqual((await self.next_event(second))['event'], 'snapshot')
+        await self.disconnect(second)
+        await self.wait_for_watcher()
+
+    def test_requires_asgi(self):
+        response = self.client.get(reverse('alert_stream'))
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(self.broadcaster.connection_count, 0)
+
+
+class GeocodingTests(TestCase):
+    def setUp(self):
+        self.backend = mock.Mock(name='backend')
+        self.backend.name = 'stub'
+        self.backend.geocode.side_effect = lambda address: {'350 Ferst Dr NW': (33.774, -84.398)}.get(address)
+        patcher = mock.patch('accounts.geocoding.get_geocoder', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.hits = CacheHitCounter()
+        patcher = mock.patch('accounts.geocoding.cache_hits', self.hits)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(GEOCODE_HIT_FLUSH_INTERVAL=60)
+    def test_cache_miss_then_hit(self):
+        self.assertEqual(geocode('350 Ferst Dr NW'), (33.774, -84.398))
+        self.assertEqual(GeocodeCache.objects.get().provider, 'stub')
+        # Same address after normalization: served from the cache without a write
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(geocode('350 ferst dr. NW'), (33.774, -84.398))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.backend.geocode.call_count, 1)
+
+        # "No result" answers are cached too; provider errors are not
+        self.assertIsNone(geocode('Nowhere'))
+        self.assertIsNone(geocode('Nowhere'))
+        self.assertEqual(self.backend.geocode.call_count, 2)
+        self.backend.geocode.side_effect = GeocodingError('quota')
+        with self.assertLogs('accounts.geocoding', 'WARNING'):
+            self.assertIsNone(geocode('Somewhere'))
+            self.assertIsNone(geocode('Somewhere'))
+        self.assertEqual(self.backend.geocode.call_count, 4)
+        self.assertEqual(GeocodeCache.objects.count(), 2)
+
+    @override_settings(GEOCODE_HIT_FLUSH_INTERVAL=60)
+    def test_hits_are_written_in_grouped_updates(self):
+        for address in ('350 Ferst Dr NW', 'Nowhere', 'Elsewhere'):
+            geocode(address)
+        for address in ('350 Ferst Dr NW', '350 Ferst Dr NW', 'Nowhere', 'Nowhere', 'Elsewhere'):
+            geocode(address)
+        self.assertEqual(set(GeocodeCache.objects.values_list('hit_count', flat=True)), {0})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.hits.flush(), 2)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(dict(GeocodeCache.objects.values_list('normalized_address', 'hit_count')), {
+            '350 ferst dr nw': 2, 'nowhere': 2, 'elsewhere': 1,
+        })
+        self.assertEqual(self.hits.flush(), 0)
+
+    @override_settings(GEOCODE_HIT_FLUSH_INTERVAL=0)
+    def test_hits_flush_once_the_interval_passes(self):
+        geocode('350 Ferst Dr NW')
+        geocode('350 Ferst Dr NW')
+        entry = GeocodeCache.objects.get()
+        self.assertEqual(entry.hit_count, 1)
+        self.assertIsNotNone(entry.last_used)
+
+    @mock.patch('accounts.signals.saved_route_checker')
+    def test_rows_without_coordinates_are_geocoded_after_commit(self, checker):
+        with mock.patch('accounts.geocoding.background_geocoder') as geocoder:
+            with self.captureOnCommitCallbacks(execute=True):
+                alert = create_alert(None, None, 50, address='350 Ferst Dr NW')
+                concern = SafetyConcern.objects.create(
+                    location_address='350 Ferst Dr NW', category='hazard', description='Broken light',
+                )
+                create_alert(33.77, -84.39, 50, address='North Ave NW')
+                self.assertFalse(geocoder.enqueue.called)
+        self.assertEqual(geocoder.enqueue.call_args_list, [
+            mock.call('SafetyAlert', alert.pk), mock.call('SafetyConcern', concern.pk),
+        ])
+
+        # Inline, the located coordinates are saved back to the rows
+        with override_settings(GEOCODE_ASYNC=False):
+            with self.captureOnCommitCallbacks(execute=True):
+                alert.save()
+                concern.save()
+        alert.refresh_from_db()
+        concern.refresh_from_db()
+        self.assertEqual((float(alert.latitude), float(alert.longitude)), (33.774, -84.398))
+        self.assertEqual((float(concern.latitude), float(concern.longitude)), (33.774, -84.398))
+        self.assertIsNotNone(alert.bbox_min_lat)
+
+
+class SchedulerTests(TestCase):
+    def expire(self):
+        """Let the stored lease run out, as if its holder stopped renewing it."""
+        SchedulerLease.objects.filter(name=LEASE_NAME).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_only_one_identity_holds_the_lease(self):
+        first, second = LeaderLease('host-a:1', ttl=60), LeaderLease('host-b:2', ttl=60)
+        with self.assertLogs('accounts.scheduler', 'INFO'):
+            self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertTrue(first.is_leader())
+        self.assertFalse(second.is_leader())
+
+        # The holder renews
+        renewed_at = SchedulerLease.objects.get().renewed_at
+        self.assertTrue(first.acquire())
+        lease = SchedulerLease.objects.get()
+        self.assertEqual(lease.holder, 'host-a:1')
+        self.assertGreaterEqual(lease.renewed_at, renewed_at)
+        self.assertFalse(second.acquire())
+
+    def test_standby_takes_over_an_expired_lease(self):
+        first, second = LeaderLease('host-a:1', ttl=60), LeaderLease('host-b:2', ttl=60)
+        with self.assertLogs('accounts.scheduler', 'INFO'):
+            first.acquire()
+            self.expire()
+            self.assertTrue(second.acquire())
+        self.assertEqual(SchedulerLease.objects.get().holder, 'host-b:2')
+        # The old leader finds out on its next heartbeat
+        with self.assertLogs('accounts.scheduler', 'WARNING') as logs:
+            heartbeat(first)
+        self.assertIn('lost by host-a:1', logs.output[0])
+        self.assertFalse(first.is_leader())
+
+    def test_release_hands_off_at_once(self):
+        first, second = LeaderLease('host-a:1', ttl=60), LeaderLease('host-b:2', ttl=60)
+        with self.assertLogs('accounts.scheduler', 'INFO'):
+            first.acquire()
+            first.release()
+            self.assertFalse(first.is_leader())
+            self.assertTrue(second.acquire())
+        # Releasing a lease it doesn't hold changes nothing
+        first.release()
+        self.assertEqual(SchedulerLease.objects.get().holder, 'host-b:2')
+        self.assertFalse(first.acquire())
+
+    def test_run_job_only_in_the_leader(self):
+        calls = []
+        leader, standby = LeaderLease('host-a:1'), LeaderLease('host-b:2')
+        with self.assertLogs('accounts.scheduler', 'INFO'):
+            leader.acquire()
+        standby.acquire()
+        run_job('job', lambda: calls.append('standby'), standby)
+        self.assertEqual(calls, [])
+        self.assertFalse(ScheduledJobStatus.objects.exists())
+
+        # A job with nothing to do isn't recorded
+        run_job('job', lambda: False, leader)
+        self.assertFalse(ScheduledJobStatus.objects.exists())
+
+    def test_run_job_records_outcomes(self):
+        lease = LeaderLease('host-a:1')
+        with self.assertLogs('accounts.scheduler', 'INFO'):
+            lease.acquire()
+            run_job('job', lambda: None, lease)
+            run_job('job', lambda: None, lease)
+
+        def fail():
+            raise RuntimeError('feed down')
+
+        with self.assertLogs('accounts.scheduler', 'ERROR'):
+            run_job('job', fail, lease)
+        status = ScheduledJobStatus.objects.get(job_id='job')
+        self.assertEqual((status.runs, status.failures, status.last_holder), (3, 1, 'host-a:1'))
+        self.assertTrue(status.last_error.startswith('feed down\n'))
+        self.assertLess(status.last_success_at, status.last_finished_at)
+        self.assertGreaterEqual(status.max_duration_ms, status.last_duration_ms)
+        self.assertAlmostEqual(status.mean_duration_ms, status.total_duration_ms / 3)
+
+        with self.assertLogs('accounts.scheduler', 'INFO'):
+            run_job('job', lambda: None, lease)
+        status.refresh_from_db()
+        self.assertEqual((status.runs, status.failures, status.last_error), (4, 1, ''))
+
+    def test_status_command(self):
+        out = io.StringIO()
+        call_command('run_scheduler', '--status', stdout=out)
+        self.assertIn('Leader: none', out.getvalue())
+        self.assertIn('rollup_occupancy', out.getvalue())
+        self.assertIn('never run', out.getvalue())
+
+        lease = LeaderLease('host-a:1')
+        with self.assertLogs('accounts.scheduler', 'INFO'):
+            lease.acquire()
+        ScheduledJobStatus.objects.create(job_id='rollup_occupancy', runs=2, failures=1, total_duration_ms=30,
+                                          last_duration_ms=10, max_duration_ms=20, last_error='disk full\ntrace')
+        # A row created before its first run was counted
+        ScheduledJobStatus.objects.create(job_id='check_saved_routes')
+        out = io.StringIO()
+        call_command('run_scheduler', '--status', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Leader: host-a:1', output)
+        self.assertIn('last success never, last 10 ms, mean 15 ms, max 20 ms, 2 runs, 1 failed', output)
+        self.assertIn('last error: disk full', output)
+        self.assertIn('last -, mean -, max 0 ms, 0 runs, 0 failed', output)
+
+
+class AnalyticsBufferTests(TestCase):
+    def buffer(self, **options):
+        """A buffer whose events are only written by flush() and shutdown()."""
+        buffer = AnalyticsBuffer(**options)
+        patcher = mock.patch.object(buffer, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return buffer
+
+    def test_flush_writes_in_batches(self):
+        buffer = self.buffer(batch_size=2)
+        building = Building.objects.create(name='Library', code='LIB', address='', latitude=33.77, longitude=-84.39)
+        for i in range(3):
+            self.assertTrue(buffer.record(PageView, page_path=f'/page/{i}/', session_id='s'))
+        buffer.record(BuildingView, building_id=building.pk, session_id='s')
+        self.assertEqual(buffer.stats()['queued'], 4)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(buffer.flush(), 4)
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT')]
+        # One INSERT per model in each batch of two events
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(PageView.objects.count(), 3)
+        self.assertEqual(BuildingView.objects.get().building_id, building.pk)
+        stats = buffer.stats()
+        self.assertEqual((stats['recorded'], stats['written'], stats['flushes'], stats['queued']), (4, 4, 2, 0))
+
+    def test_full_queue_drops_and_counts(self):
+        buffer = self.buffer(max_size=2)
+        results = [buffer.record(PageView, page_path='/', session_id='s') for _ in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        stats = buffer.stats()
+        self.assertEqual((stats['recorded'], stats['dropped'], stats['queued']), (2, 3, 2))
+
+    def test_timestamp_is_the_time_recorded(self):
+        buffer = self.buffer()
+        recorded_at = timezone.now() - timedelta(minutes=5)
+        with mock.patch('django.utils.timezone.now', return_value=recorded_at):
+            buffer.record(PageView, page_path='/', session_id='s')
+        buffer.flush()
+        self.assertEqual(PageView.objects.get().timestamp, recorded_at)
+
+    def test_failed_writes_are_counted(self):
+        buffer = self.buffer()
+        buffer.record(PageView, page_path='/', session_id='s')
+        with mock.patch.object(PageView.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            with self.assertLogs('accounts.analytics', 'ERROR'):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.stats()['failed'], 1)
+
+    def test_shutdown_flushes_what_is_queued(self):
+        buffer = AnalyticsBuffer(flush_interval=60)
+        with mock.patch('accounts.analytics.threading.Thread') as thread:
+            thread.return_value.is_alive.return_value = True
+            buffer.record(PageView, page_path='/', session_id='s')
+            buffer.shutdown(timeout=1)
+        thread.return_value.start.assert_called_once_with()
+        thread.return_value.join.assert_called_once_with(1)
+        self.assertTrue(buffer._stop.is_set())
+        self.assertEqual(PageView.objects.count(), 1)
+
+    def test_forked_process_starts_afresh(self):
+        buffer = AnalyticsBuffer()
+        with mock.patch('accounts.analytics.threading.Thread') as thread:
+            buffer.record(PageView, page_path='/', session_id='s')
+            # As seen from a child forked after the parent queued an event
+            buffer._pid = -1
+            buffer.record(PageView, page_path='/child/', session_id='s')
+        self.assertEqual(thread.call_count, 2)
+        stats = buffer.stats()
+        self.assertEqual((stats['recorded'], stats['queued']), (1, 1))
+        self.assertEqual(buffer._pid, os.getpid())
+        buffer.flush()
+        self.assertEqual(list(PageView.objects.values_list('page_path', flat=True)), ['/child/'])
+
+    @override_settings(ANALYTICS_BUFFERED=False)
+    def test_unbuffered_events_are_written_at_once(self):
+        self.assertTrue(record_event(PageView, page_path='/', session_id='s'))
+        self.assertEqual(PageView.objects.count(), 1)
\ No newline at end of file
@@ -11,6 +11,9 @@ urlpatterns = [
     path('favorites/', views.favorites_view, name='favorites'),
     path('saved-routes/', views.saved_routes_view, name='saved_routes'),
     path('api/buildings/search/', views.building_search_api, name='building_search_api'),
+    path('api/buildings/batch/', views.building_batch_api, name='building_batch_api'),
+    path('api/buildings/nearby/', views.nearby_buildings_api, name='nearby_buildings_api'),
+    path('api/buildings/walking-times/', views.building_walking_times_api, name='building_walking_times_api'),
     path('api/favorites/toggle/', views.toggle_favorite_api, name='toggle_favorite'),
     path('api/favorites/', views.user_favorites_api, name='user_favorites'),
     path('api/favorites/check/', views.check_favorite_api, name='check_favorite'),
@@ -21,6 +24,11 @@ urlpatterns = [
     path('api/routes/load/', views.load_saved_route_api, name='load_saved_route'),
     path('api/routes/delete/', views.delete_saved_route_api, name='delete_saved_route'),
     path('api/alerts/', views.get_alerts_api, name='get_alerts'),
+    path('api/alerts/stream/', views.alert_stream_api, name='alert_stream'),
+    path('api/alerts/at/', views.alerts_at_api, name='alerts_at'),
+    path('api/route/', views.route_api, name='route'),
+    path('api/isochrone/', views.isochrone_api, name='isochrone'),
+    path('api/routes/check/', views.check_route_api, name='check_route'),
     path('api/alerts/<int:alert_id>/', views.get_alert_detail_api, name='get_alert_detail'),
     path('report-safety-concern/', views.report_safety_concern_view, name='report_safety_concern'),
     path('analytics/', views.analytics_dashboard, name='analytics_dashboard'),
@@ -3,10 +3,28 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse
-from django.db.models import Q
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch, Q
 from .forms import RegistrationForm, LoginForm, ProfileUpdateForm, SafetyConcernForm
-from .models import Building, Favorite, SavedRoute, SafetyAlert, SafetyConcern, BuildingView, PageView, AlertInteraction
+from .models import Building, Favorite, SavedRoute, SafetyAlert, SafetyConcern, BuildingView, PageView, AlertInteraction, User, WaitzFeedState
+from . import polyline
+from .alert_index import active_alert_index
+from .alert_snapshot import active_alert_snapshot
+from .alert_stream import alert_broadcaster
+from .analytics import record_event
+from .isochrone import isochrone_index
+from .outbound import outbound
+from .polling import feed_checked
+from .route_alerts import saved_route_checker
+from .scheduler import scheduler_status
+from .routing import campus_router
+from .search_index import building_index
+from .spatial_index import building_spatial_index
+from .walking_matrix import walking_matrix
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def get_session_id(request):
@@ -17,31 +35,45 @@ def get_session_id(request):
 
 
 def track_building_view(building, user, view_type, session_id):
-    """Helper function to track building views."""
-    try:
-        BuildingView.objects.create(
-            building=building,
-            user=user if user.is_authenticated else None,
-            view_type=view_type,
-            session_id=session_id
-        )
-    except Exception:
-        # Silently fail if tracking fails - don't break the user experience
-        pass
+    """
+    Helper function to track building views.
+    Buffered and written in bulk in the background - never blocks the request.
+    """
+    record_event(
+        BuildingView,
+        building_id=building.pk,
+        user_id=user.pk if user.is_authenticated else None,
+        view_type=view_type,
+        session_id=session_id
+    )
 
 
 def track_alert_interaction(alert, user, interaction_type, session_id):
-    """Helper function to track alert interactions."""
-    try:
-        AlertInteraction.objects.create(
-            alert=alert,
-            user=user if user.is_authenticated else None,
-            interaction_type=interaction_type,
-            session_id=session_id
-        )
-    except Exception:
-        # Silently fail if tracking fails
-        pass
+    """
+    Helper function to track alert interactions.
+    Buffered and written in bulk in the background - never blocks the request.
+    """
+    record_event(
+        AlertInteraction,
+        alert_id=alert.pk,
+        user_id=user.pk if user.is_authenticated else None,
+        interaction_type=interaction_type,
+        session_id=session_id
+    )
+
+
+def track_page_view(request, page_name=''):
+    """
+    Helper function to track page views.
+    Buffered and written in bulk in the background - never blocks the request.
+    """
+    record_event(
+        PageView,
+        user_id=request.user.pk if request.user.is_authenticated else None,
+        page_path=request.path[:255],
+        page_name=page_name,
+        session_id=get_session_id(request)
+    )
 
 
 def register_view(request):
@@ -194,21 +226,71 @@ def map_view(request):
     Map view - displays interactive map with building search and routing.
     """
     from django.conf import settings
+    track_page_view(request, 'Map')
     context = {
         'google_maps_api_key': settings.GOOGLE_MAPS_API_KEY
     }
     return render(request, 'accounts/map.html', context)
 
 
+# Largest number of ids accepted by building_batch_api
+BUILDING_BATCH_MAX_IDS = 500
+
+# Selectable building_batch_api fields -> model columns they read
+BUILDING_BATCH_FIELDS = {
+    'id': ['id'],
+    'name': ['name'],
+    'code': ['code'],
+    'address': ['address'],
+    'latitude': ['latitude'],
+    'longitude': ['longitude'],
+    'description': ['description'],
+    'occupancy': [
+        'current_occupancy_percent', 'occupancy_status', 'next_hour_prediction',
+        'peak_hours', 'best_study_spot', 'operating_hours', 'occupancy_last_updated',
+        'forecast_percent', 'forecast_confidence', 'forecast_for',
+    ],
+}
+
+
+def get_occupancy_data(building, checked=(None, frozenset())):
+    """
+    Occupancy payload for a building, or None if it has no occupancy data.
+    last_updated is when the reading last changed; last_checked is when the
+    feed last confirmed it, from checked (see polling.feed_checked).
+    """
+    if building.current_occupancy_percent is None:
+        return None
+    checked_at, checked_ids = checked
+    return {
+        'percent': building.current_occupancy_percent,
+        'status': building.occupancy_status,
+        'next_hour_prediction': building.next_hour_prediction,
+        'peak_hours': building.peak_hours,
+        'best_study_spot': building.best_study_spot,
+        'operating_hours': building.operating_hours,
+        'last_updated': building.occupancy_last_updated.isoformat() if building.occupancy_last_updated else None,
+        'last_checked': checked_at.isoformat() if building.pk in checked_ids else None,
+        'forecast': {
+            'percent': building.forecast_percent,
+            'confidence': building.forecast_confidence,
+            'for': building.forecast_for.isoformat(),
+        } if building.forecast_for else None,
+    }
+
+
 def building_search_api(request):
     """
     API endpoint for searching buildings by name or code.
-    Supports partial matching (case-insensitive).
+    Supports partial matching (case-insensitive), ranked with exact code
+    matches first, then name prefixes, then other substring matches.
+    With fuzzy=1, misspelled queries are matched and ranked by relevance.
     Also supports fetching a single building by ID using building_id parameter.
     Returns JSON list of matching buildings.
     """
     query = request.GET.get('q', '').strip()
     building_id = request.GET.get('building_id')
+    fuzzy = request.GET.get('fuzzy') == '1'
     session_id = get_session_id(request)
 
     # If building_id is provided, return that specific building
@@ -239,12 +321,21 @@ def building_search_api(request):
         # Return all buildings if no query provided
         buildings = Building.objects.all()[:20]  # Limit to 20 results
     else:
-        # Search by name, code, or address (partial match, case-insensitive)
-        buildings = Building.objects.filter(
-            Q(name__icontains=query) |
-            Q(code__icontains=query) |
-            Q(address__icontains=query)
-        )[:20]
+        # Search by name, code, or address using the in-memory n-gram index
+        if fuzzy:
+            building_ids = building_index.fuzzy_search(query, limit=20)
+        else:
+            building_ids = building_index.search(query, limit=20)
+        if building_ids is not None:
+            found = Building.objects.in_bulk(building_ids)
+            buildings = [found[pk] for pk in building_ids if pk in found]
+        else:
+            # Index unavailable - fall back to a partial match query (case-insensitive)
+            buildings = Building.objects.filter(
+                Q(name__icontains=query) |
+                Q(code__icontains=query) |
+                Q(address__icontains=query)
+            )[:20]
 
     # Track building searches for analytics (only if there's a query)
     if query and buildings:
@@ -252,6 +343,7 @@ def building_search_api(request):
             track_building_view(building, request.user, 'search', session_id)
 
     # Format results as JSON
+    checked = feed_checked()
     results = []
     for building in buildings:
         building_data = {
@@ -265,16 +357,9 @@ def building_search_api(request):
         }
         
         # Add occupancy data if available
-        if building.current_occupancy_percent is not None:
-            building_data['occupancy'] = {
-                'percent': building.current_occupancy_percent,
-                'status': building.occupancy_status,
-                'next_hour_prediction': building.next_hour_prediction,
-                'peak_hours': building.peak_hours,
-                'best_study_spot': building.best_study_spot,
-                'operating_hours': building.operating_hours,
-                'last_updated': building.occupancy_last_updated.isoformat() if building.occupancy_last_updated else None,
-            }
+        occupancy = get_occupancy_data(building, checked)
+        if occupancy is not None:
+            building_data['occupancy'] = occupancy
         
         results.append(building_data)
 
@@ -285,6 +370,201 @@ def building_search_api(request):
     })
 
 
+def building_batch_api(request):
+    """
+    API endpoint for fetching many buildings by ID in one request.
+    Query parameters: ids (comma-separated, up to 500) and fields
+    (optional comma-separated subset of id, name, code, address, latitude,
+    longitude, description, occupancy; defaults to all).
+    Answers with a single id__in query that only reads the requested columns.
+    Buildings are returned in the order requested; unknown ids are listed
+    under "missing".
+    """
+    try:
+        ids = [int(value) for value in request.GET.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'ids must be a comma-separated list of integers'
+        }, status=400)
+
+    if not ids:
+        return JsonResponse({
+            'success': False,
+            'error': 'ids is required'
+        }, status=400)
+
+    if len(ids) > BUILDING_BATCH_MAX_IDS:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {BUILDING_BATCH_MAX_IDS} ids per request'
+        }, status=400)
+
+    fields_param = request.GET.get('fields')
+    if fields_param:
+        fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in BUILDING_BATCH_FIELDS]
+        if unknown:
+            return JsonResponse({
+                'success': False,
+                'error': f'Unknown fields: {", ".join(unknown)}'
+            }, status=400)
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+    else:
+        fields = list(BUILDING_BATCH_FIELDS)
+
+    columns = {column for field in fields for column in BUILDING_BATCH_FIELDS[field]}
+    # Drop duplicate ids while keeping the requested order
+    ids = list(dict.fromkeys(ids))
+    found = Building.objects.only(*columns).in_bulk(ids)
+
+    checked = feed_checked() if 'occupancy' in fields else None
+    results = []
+    missing = []
+    for building_id in ids:
+        building = found.get(building_id)
+        if building is None:
+            missing.append(building_id)
+            continue
+
+        building_data = {}
+        for field in fields:
+            if field == 'occupancy':
+                building_data['occupancy'] = get_occupancy_data(building, checked)
+            elif field in ('latitude', 'longitude'):
+                building_data[field] = float(getattr(building, field))
+            else:
+                building_data[field] = getattr(building, field)
+        results.append(building_data)
+
+    return JsonResponse({
+        'success': True,
+        'count': len(results),
+        'buildings': results,
+        'missing': missing
+    })
+
+
+def nearby_buildings_api(request):
+    """
+    API endpoint for finding the buildings closest to a coordinate.
+    Query parameters: lat, lng, k (max results, default 10, up to 50) and
+    radius (optional, meters).
+    Returns buildings sorted by straight-line (haversine) distance.
+    """
+    try:
+        lat = float(request.GET.get('lat', ''))
+        lng = float(request.GET.get('lng', ''))
+        k = int(request.GET.get('k', 10))
+        radius = request.GET.get('radius')
+        radius = float(radius) if radius else None
+    except (ValueError, TypeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'lat and lng are required; k and radius must be numbers'
+        }, status=400)
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return JsonResponse({
+            'success': False,
+            'error': 'Coordinates out of range'
+        }, status=400)
+
+    k = max(1, min(k, 50))
+
+    nearest = building_spatial_index.nearest(lat, lng, k=k, radius=radius)
+    if nearest is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Spatial index unavailable'
+        }, status=503)
+
+    found = Building.objects.in_bulk([building_id for building_id, _ in nearest])
+
+    results = []
+    for building_id, distance in nearest:
+        building = found.get(building_id)
+        if building is None:
+            continue
+        results.append({
+            'id': building.id,
+            'name': building.name,
+            'code': building.code,
+            'address': building.address,
+            'latitude': float(building.latitude),
+            'longitude': float(building.longitude),
+            'distance_m': round(distance, 1),
+        })
+
+    return JsonResponse({
+        'success': True,
+        'count': len(results),
+        'buildings': results
+    })
+
+
+def building_walking_times_api(request):
+    """
+    API endpoint for precomputed walking times between buildings.
+    Query parameters: from (building id), to (optional comma-separated
+    building ids to choose among) and k (max results, default 10, up to 50).
+    Returns the buildings reachable fastest from `from`, quickest first.
+    """
+    from django.conf import settings
+
+    try:
+        from_id = int(request.GET.get('from', ''))
+        to_ids = request.GET.get('to')
+        to_ids = [int(value) for value in to_ids.split(',') if value.strip()] if to_ids else None
+        k = int(request.GET.get('k', 10))
+    except (ValueError, TypeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'from is required; to must be comma-separated building ids and k a number'
+        }, status=400)
+
+    k = max(1, min(k, 50))
+
+    matrix = walking_matrix.get()
+    if matrix is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Walking times unavailable'
+        }, status=503)
+    if from_id not in matrix:
+        return JsonResponse({
+            'success': False,
+            'error': 'Building not found'
+        }, status=404)
+
+    nearest = matrix.nearest(from_id, to_ids, limit=k)
+    found = Building.objects.in_bulk([building_id for building_id, _ in nearest])
+    speed = getattr(settings, 'WALKING_SPEED_MPS', 1.4)
+
+    results = []
+    for building_id, seconds in nearest:
+        building = found.get(building_id)
+        if building is None:
+            continue
+        results.append({
+            'id': building.id,
+            'name': building.name,
+            'code': building.code,
+            'latitude': float(building.latitude),
+            'longitude': float(building.longitude),
+            'walking_time_s': round(seconds),
+            'walking_distance_m': round(seconds * speed),
+        })
+
+    return JsonResponse({
+        'success': True,
+        'from': from_id,
+        'count': len(results),
+        'buildings': results
+    })
+
+
 @login_required
 @require_http_methods(["POST"])
 def toggle_favorite_api(request):
@@ -519,7 +799,11 @@ def saved_routes_view(request):
     """
     View to display all saved routes for the current user.
     """
-    saved_routes = SavedRoute.objects.filter(user=request.user).select_related('destination_building')
+    saved_routes = (
+        SavedRoute.objects.filter(user=request.user)
+        .select_related('destination_building')
+        .prefetch_related(Prefetch('crossing_alerts', queryset=SafetyAlert.objects.only('id')))
+    )
 
     context = {
         'user': request.user,
@@ -536,6 +820,7 @@ def save_route_api(request):
     API endpoint to save a new route.
     """
     import json
+    from django.conf import settings
     from django.utils import timezone
 
     try:
@@ -562,6 +847,23 @@ def save_route_api(request):
                 'error': 'Missing required fields'
             }, status=400)
 
+        # Optional route geometry: an encoded polyline or a [[lat, lng], ...] path
+        route_polyline, error = parse_route_geometry(data.get('polyline'), data.get('path'))
+        if error:
+            return JsonResponse({
+                'success': False,
+                'error': error
+            }, status=400)
+
+        # Without geometry from the client, take the campus route (usually cached)
+        if not route_polyline:
+            campus_route = campus_route_between(origin_lat, origin_lng, destination_lat, destination_lng)
+            if campus_route is not None:
+                route_polyline = campus_route['polyline']
+                if not distance_value:
+                    distance_value = round(campus_route['distance_m'])
+                    duration_value = round(campus_route['distance_m'] / getattr(settings, 'WALKING_SPEED_MPS', 1.4))
+
         # Get destination building if provided
         destination_building = None
         if destination_building_id:
@@ -585,9 +887,16 @@ def save_route_api(request):
             duration_text=duration_text,
             distance_value=distance_value,
             duration_value=duration_value,
+            route_polyline=route_polyline,
             last_used=timezone.now()
         )
 
+        # Flag it right away if it already crosses an active alert
+        try:
+            saved_route_checker.check_routes([saved_route])
+        except Exception as e:
+            logger.error(f"Alert check for saved route {saved_route.id} failed: {str(e)}")
+
         return JsonResponse({
             'success': True,
             'message': f'Route "{name}" saved successfully',
@@ -606,12 +915,62 @@ def save_route_api(request):
         }, status=500)
 
 
+def campus_route_between(origin_lat, origin_lng, destination_lat, destination_lng):
+    """
+    The campus walking route between two coordinates, or None when there
+    is no graph, an endpoint is off the network or they aren't connected.
+    """
+    from django.conf import settings
+    try:
+        route = campus_router.route(float(origin_lat), float(origin_lng),
+                                    float(destination_lat), float(destination_lng))
+    except (TypeError, ValueError):
+        return None
+    if route is None or not route['found']:
+        return None
+    if max(route['snap_m']) > getattr(settings, 'ROUTE_MAX_SNAP_M', 300):
+        return None
+    return route
+
+
+def parse_route_geometry(encoded, path):
+    """
+    Validate route geometry sent with a saved route and return it as an
+    encoded polyline: (polyline or '', error message or None).
+    """
+    from django.conf import settings
+
+    if not encoded and not path:
+        return '', None
+    try:
+        if encoded:
+            if not isinstance(encoded, str):
+                raise ValueError('polyline must be a string')
+            points = polyline.decode(encoded)
+        else:
+            points = [(float(lat), float(lng)) for lat, lng in path]
+    except (TypeError, ValueError) as e:
+        return '', f'Invalid route geometry: {str(e)}'
+
+    max_points = getattr(settings, 'SAVED_ROUTE_MAX_POINTS', 5000)
+    if not 2 <= len(points) <= max_points:
+        return '', f'Route geometry must contain between 2 and {max_points} points'
+    if any(not (-90 <= lat <= 90 and -180 <= lng <= 180) for lat, lng in points):
+        return '', 'Route geometry contains invalid coordinates'
+    # Re-encode so stored polylines are always canonical precision 5
+    return polyline.encode(points), None
+
+
 @login_required
 def get_saved_routes_api(request):
     """
     API endpoint to get all saved routes for the current user.
     """
-    saved_routes = SavedRoute.objects.filter(user=request.user).select_related('destination_building')
+    saved_routes = (
+        SavedRoute.objects.filter(user=request.user)
+        .select_related('destination_building')
+        .prefetch_related(Prefetch('crossing_alerts', queryset=SafetyAlert.objects.only('id')))
+    )
 
     results = []
     for route in saved_routes:
@@ -632,6 +991,9 @@ def get_saved_routes_api(request):
             'duration_value': route.duration_value,
             'created_at': route.created_at.isoformat(),
             'last_used': route.last_used.isoformat() if route.last_used else None,
+            'has_alert': route.has_alert,
+            'alert_ids': [alert.id for alert in route.crossing_alerts.all()],
+            'alerts_checked_at': route.alerts_checked_at.isoformat() if route.alerts_checked_at else None,
         })
 
     return JsonResponse({
@@ -687,6 +1049,8 @@ def load_saved_route_api(request):
                 'destination_building_id': route.destination_building.id if route.destination_building else None,
                 'distance_text': route.distance_text,
                 'duration_text': route.duration_text,
+                'polyline': route.route_polyline or None,
+                'bounds': route.get_bounds(),
             }
         })
 
@@ -753,90 +1117,274 @@ def get_alerts_api(request):
     """
     API endpoint for fetching active safety alerts.
     Returns all currently active alerts with optional filtering.
+    Served from a pre-serialized snapshot that is rebuilt only when alerts
+    change or a start/end date passes.
     """
     # Get optional query parameters
     alert_type = request.GET.get('alert_type')
     severity = request.GET.get('severity')
     bounds = request.GET.get('bounds')  # Format: "north,south,east,west"
     
-    # Get all alerts that are currently active
-    alerts = SafetyAlert.objects.filter(is_active=True).select_related('created_by')
-    
-    # Filter by alert type if provided
-    if alert_type:
-        alerts = alerts.filter(alert_type=alert_type)
-    
-    # Filter by severity if provided
-    if severity:
-        alerts = alerts.filter(severity=severity)
-    
     # Filter by map bounds if provided (optional optimization)
     if bounds:
         try:
             north, south, east, west = map(float, bounds.split(','))
-            alerts = alerts.filter(
-                latitude__lte=north,
-                latitude__gte=south,
-                longitude__lte=east,
-                longitude__gte=west
-            )
+            bounds = (north, south, east, west)
         except (ValueError, TypeError):
             # Invalid bounds format, ignore it
-            pass
-    
-    # Filter to only currently active alerts (based on dates)
-    active_alerts = [alert for alert in alerts if alert.is_currently_active()]
+            bounds = None
     
-    # Format results as JSON
+    body = active_alert_snapshot.filtered_body(
+        alert_type=alert_type,
+        severity=severity,
+        bounds=bounds
+    )
+    return HttpResponse(body, content_type='application/json')
+
+
+def alerts_at_api(request):
+    """
+    API endpoint answering "is this coordinate inside any active alert zone?".
+    Query parameters: lat and lng.
+    Returns the active alerts whose circle or polygon contains the point
+    (point alerts count within ALERT_POINT_RADIUS_M), most severe first.
+    """
+    try:
+        lat = float(request.GET.get('lat', ''))
+        lng = float(request.GET.get('lng', ''))
+    except (ValueError, TypeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'lat and lng are required numbers'
+        }, status=400)
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return JsonResponse({
+            'success': False,
+            'error': 'Coordinates out of range'
+        }, status=400)
+
+    matches = active_alert_index.alerts_at(lat, lng)
+    body = (
+        '{"success": true, "inside": %s, "count": %d, "alerts": [%s]}'
+        % ('true' if matches else 'false', len(matches), ', '.join(entry.json for entry in matches))
+    )
+    return HttpResponse(body, content_type='application/json')
+
+
+@require_http_methods(["GET", "POST"])
+def check_route_api(request):
+    """
+    API endpoint listing the active alerts a route passes through.
+    Takes an encoded polyline as the `polyline` query parameter or in a
+    JSON body ({"polyline": "..."}). Each alert is returned with
+    entry_distance_m, the distance along the route where it is entered.
+    """
+    import json
+    from django.conf import settings
+
+    if request.method == 'POST':
+        try:
+            encoded = json.loads(request.body).get('polyline', '')
+        except (json.JSONDecodeError, AttributeError):
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid JSON body'
+            }, status=400)
+    else:
+        encoded = request.GET.get('polyline', '')
+
+    try:
+        points = polyline.decode(encoded or '')
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid polyline: {str(e)}'
+        }, status=400)
+
+    max_points = getattr(settings, 'ROUTE_CHECK_MAX_POINTS', 5000)
+    if not points or len(points) > max_points:
+        return JsonResponse({
+            'success': False,
+            'error': f'polyline must contain between 1 and {max_points} points'
+        }, status=400)
+
+    hits = active_alert_index.alerts_on_route(points)
+    body = '{"success": true, "count": %d, "alerts": [%s]}' % (
+        len(hits),
+        ', '.join(
+            '{"entry_distance_m": %s, "alert": %s}' % (round(distance, 1), entry.json)
+            for entry, distance in hits
+        ),
+    )
+    return HttpResponse(body, content_type='application/json')
+
+
+def parse_lat_lng(value):
+    """Parse a "lat,lng" query parameter; raises ValueError if invalid."""
+    lat, lng = (float(part) for part in value.split(','))
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordinates out of range')
+    return lat, lng
+
+
+def isochrone_api(request):
+    """
+    API endpoint for buildings reachable on foot within a time budget.
+    Query parameters: lat, lng, minutes (up to ISOCHRONE_MAX_MINUTES) and
+    max_occupancy (optional percent; busier buildings are left out).
+    Returns the buildings sorted by walking time and an outline polygon of
+    the reachable area.
+    """
+    from django.conf import settings
+    try:
+        lat = float(request.GET.get('lat', ''))
+        lng = float(request.GET.get('lng', ''))
+        minutes = float(request.GET.get('minutes', ''))
+        max_occupancy = request.GET.get('max_occupancy')
+        max_occupancy = int(max_occupancy) if max_occupancy else None
+    except (ValueError, TypeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'lat, lng and minutes are required; max_occupancy must be a number'
+        }, status=400)
+
+    max_minutes = getattr(settings, 'ISOCHRONE_MAX_MINUTES', 30)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or not 0 < minutes <= max_minutes:
+        return JsonResponse({
+            'success': False,
+            'error': f'Coordinates out of range or minutes not between 0 and {max_minutes}'
+        }, status=400)
+
+    graph = campus_router.get_graph()
+    if graph is None or not graph.node_count:
+        return JsonResponse({
+            'success': False,
+            'error': 'Walking graph unavailable'
+        }, status=503)
+
+    speed = getattr(settings, 'WALKING_SPEED_MPS', 1.4)
+    max_snap = getattr(settings, 'ROUTE_MAX_SNAP_M', 300)
+    result = isochrone_index.query(graph, lat, lng, minutes, speed, max_minutes, max_snap=max_snap)
+    if result['snap_m'] > max_snap:
+        return JsonResponse({
+            'success': False,
+            'error': f'Start is more than {max_snap} m from the campus walking network'
+        }, status=404)
+
+    found = Building.objects.only(
+        'id', 'name', 'code', 'latitude', 'longitude', 'current_occupancy_percent', 'occupancy_status',
+    ).in_bulk([building_id for building_id, _ in result['buildings']])
+
     results = []
-    for alert in active_alerts:
-        alert_data = {
-            'id': alert.id,
-            'title': alert.title,
-            'description': alert.description,
-            'alert_type': alert.alert_type,
-            'severity': alert.severity,
-            'location_type': alert.location_type,
-            'is_active': alert.is_active,
-            'created_at': alert.created_at.isoformat(),
-            'updated_at': alert.updated_at.isoformat(),
-            'icon_url': alert.get_icon_url(),
-            'color': alert.get_color(),
-        }
-        
-        # Add address if available
-        if alert.address:
-            alert_data['address'] = alert.address
-        
-        # Add coordinates if available (for backwards compatibility)
-        if alert.latitude is not None and alert.longitude is not None:
-            alert_data['latitude'] = float(alert.latitude)
-            alert_data['longitude'] = float(alert.longitude)
-        
-        # Add location-specific data
-        if alert.location_type == 'circle' and alert.radius:
-            alert_data['radius'] = float(alert.radius)
-        
-        if alert.location_type == 'polygon':
-            polygon_coords = alert.get_polygon_coordinates()
-            if polygon_coords:
-                alert_data['polygon_coordinates'] = polygon_coords
-        
-        # Add date information
-        if alert.start_date:
-            alert_data['start_date'] = alert.start_date.isoformat()
-        if alert.end_date:
-            alert_data['end_date'] = alert.end_date.isoformat()
-        
-        results.append(alert_data)
-    
+    for building_id, seconds in result['buildings']:
+        building = found.get(building_id)
+        if building is None:
+            continue
+        occupancy = building.current_occupancy_percent
+        if max_occupancy is not None and occupancy is not None and occupancy > max_occupancy:
+            continue
+        results.append({
+            'id': building.id,
+            'name': building.name,
+            'code': building.code,
+            'latitude': float(building.latitude),
+            'longitude': float(building.longitude),
+            'walking_time_s': round(seconds),
+            'occupancy_percent': occupancy,
+            'occupancy_status': building.occupancy_status or None,
+        })
+
     return JsonResponse({
         'success': True,
+        'minutes': minutes,
         'count': len(results),
-        'alerts': results
+        'buildings': results,
+        'polygon': result['polygon'],
+    })
+
+
+def route_api(request):
+    """
+    API endpoint for walking directions on the campus graph.
+    Query parameters: from and to, each "lat,lng".
+    Routes avoid active alert zones where a detour exists; alert_ids lists
+    the alerts the returned path still crosses.
+    """
+    from django.conf import settings
+    try:
+        from_lat, from_lng = parse_lat_lng(request.GET.get('from', ''))
+        to_lat, to_lng = parse_lat_lng(request.GET.get('to', ''))
+    except (ValueError, TypeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'from and to are required as "lat,lng"'
+        }, status=400)
+
+    route = campus_router.route(from_lat, from_lng, to_lat, to_lng)
+    if route is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Walking graph unavailable'
+        }, status=503)
+
+    max_snap = getattr(settings, 'ROUTE_MAX_SNAP_M', 300)
+    if max(route['snap_m']) > max_snap:
+        return JsonResponse({
+            'success': False,
+            'error': f'Start or destination is more than {max_snap} m from the campus walking network'
+        }, status=404)
+
+    if not route['found']:
+        return JsonResponse({
+            'success': False,
+            'error': 'No walking route found'
+        }, status=404)
+
+    distance = route['distance_m']
+    return JsonResponse({
+        'success': True,
+        'distance_m': round(distance, 1),
+        'duration_s': round(distance / getattr(settings, 'WALKING_SPEED_MPS', 1.4)),
+        'path': route['path'],
+        'polyline': route['polyline'],
+        'alert_ids': route['alert_ids'],
     })
 
 
+async def alert_stream_api(request):
+    """
+    Server-Sent Events stream of safety alert changes.
+    Sends a snapshot event with all active alerts on connect, then
+    alert_created, alert_updated and alert_expired events as they happen.
+    Reconnecting clients resume from Last-Event-ID when possible.
+    Requires ASGI; under WSGI clients should keep polling /api/alerts/.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'success': False,
+            'error': 'Alert streaming requires an ASGI server'
+        }, status=501)
+
+    subscriber = alert_broadcaster.subscribe()
+    if subscriber is None:
+        response = JsonResponse({
+            'success': False,
+            'error': 'Too many live connections, please poll /api/alerts/ instead'
+        }, status=503)
+        response['Retry-After'] = '30'
+        return response
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(
+        alert_broadcaster.stream(subscriber, last_event_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
 def get_alert_detail_api(request, alert_id):
     """
     API endpoint to get detailed information about a single alert.
@@ -950,6 +1498,7 @@ def analytics_dashboard(request):
     Analytics dashboard view for administrators.
     Displays usage statistics, charts, and trends.
     """
+    from django.conf import settings
     from django.contrib.admin.views.decorators import staff_member_required
     from django.db.models import Count, Q
     from django.utils import timezone
@@ -1037,6 +1586,10 @@ def analytics_dashboard(request):
     # Active Safety Alerts
     active_alerts_count = SafetyAlert.objects.filter(is_active=True).count()
 
+    # Route cache of this server process
+    route_cache_stats = campus_router.cache.stats()
+    route_cache_stats['hit_percent'] = round(route_cache_stats['hit_rate'] * 100, 1)
+
     context = {
         'days': days,
         'start_date': start_date,
@@ -1063,6 +1616,14 @@ def analytics_dashboard(request):
         'total_concerns': total_concerns,
         'concerns_by_status': concerns_by_status,
         'concerns_by_category': concerns_by_category,
+
+        # Routing
+        'route_cache': route_cache_stats,
+        # Outbound integrations (Waitz, geocoding) from this process
+        'outbound_hosts': outbound.stats(),
+        # Scheduler leader and recorded job runs (shared by all processes)
+        'scheduler': scheduler_status(),
+        'waitz_feed': WaitzFeedState.objects.filter(url=getattr(settings, 'WAITZ_FEED_URL', 'https://waitz.io/live/gatech')).first(),
     }
 
     return render(request, 'accounts/analytics_dashboard.html', context)
@@ -0,0 +1,140 @@
+"""
+Matching Waitz live occupancy entries to campus buildings.
+
+A building whose waitz_id is set is matched by id first: a dict lookup
+that survives renames on either side. Other buildings, and buildings whose
+id is no longer in the feed (retired or renumbered), are matched by name,
+which means an exact name (case-insensitive) or one of these partial
+matches:
+- at least two significant words in common (STOP_WORDS don't count), or
+- one name containing the other, where every word of the shorter name is
+  a word of the longer one. This includes common words, so "Library"
+  matches "Price Gilbert Library".
+
+Partial candidates come from an inverted index built once per feed, from
+word to entries. A building is only compared with the entries that share a
+word with its name, so matching stays linear as the feed and the building
+table grow. Containment is therefore checked on whole words: a name hidden
+inside another word ("Art" in "Smart Hall") doesn't match. Only an exact
+name match is confirmed by storing the entry id as the building's waitz_id
+(see fetch_waitz_occupancy), so later runs take the id path. Partial
+matches are found again on every run, so a wrong one doesn't stick.
+
+Change detection: fetch_waitz_occupancy keeps a WaitzFeedState per feed
+URL with fingerprints of the last response, of each entry, and of the
+entry ids and names. Matching depends only on the ids and names and the
+building table, so while those are unchanged the stored matches are reused
+and only entries whose fingerprint changed are ingested.
+"""
+import hashlib
+import json
+from collections import Counter, defaultdict
+
+from django.db.models import Count, Max
+
+# Words too common in building names to identify one
+STOP_WORDS = frozenset({'building', 'hall', 'center', 'tower', 'library', 'commons', 'the', 'and', 'of'})
+
+
+def name_words(name):
+    return set(name.lower().split())
+
+
+def entry_key(entry):
+    """The id of a feed entry, or its name for entries without one."""
+    if entry.get('id') is not None:
+        return str(entry['id'])
+    return 'name:' + (entry.get('name') or '').lower()
+
+
+def entry_fingerprint(entry):
+    return hashlib.sha1(json.dumps(entry, sort_keys=True, separators=(',', ':'), default=str).encode()).hexdigest()
+
+
+def names_fingerprint(entries):
+    """Fingerprint of what matching looks at: each entry's id and name, in feed order."""
+    digest = hashlib.sha1()
+    for entry in entries:
+        digest.update(f'{entry.get("id")}\x1f{entry.get("name") or ""}\x1e'.encode())
+    return digest.hexdigest()
+
+
+def buildings_version():
+    """
+    Changes whenever a building is added, deleted or saved (admin edits,
+    imports, --waitz-id), any of which can change matches.
+    """
+    from .models import Building
+
+    stats = Building.objects.aggregate(count=Count('id'), last_id=Max('id'), last_updated=Max('updated_at'))
+    last_updated = stats['last_updated'].isoformat() if stats['last_updated'] else ''
+    return f'{stats["count"]}:{stats["last_id"]}:{last_updated}'
+
+
+class WaitzMatcher:
+    """
+    Id, name and word indexes over the entries of one Waitz feed.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.by_id = {}
+        self.by_name = {}
+        self.words = defaultdict(list)  # word -> positions of entries using it
+        self._names = []
+        self._word_counts = []
+        for position, entry in enumerate(entries):
+            if entry.get('id') is not None:
+                self.by_id.setdefault(str(entry['id']), entry)
+            name = (entry.get('name') or '').lower()
+            self.by_name.setdefault(name, entry)
+            words = name_words(name)
+            # Common words are indexed too, for containment
+            for word in words:
+                self.words[word].append(position)
+            self._names.append(name)
+            self._word_counts.append(len(words))
+
+    def match(self, building):
+        """
+        The Waitz entry for a building and how it was found ('id', 'name'
+        or 'partial'), or (None, None).
+        """
+        if building.waitz_id:
+            entry = self.by_id.get(str(building.waitz_id))
+            if entry is not None:
+                return entry, 'id'
+
+        name = building.name.lower()
+        entry = self.by_name.get(name)
+        if entry is not None:
+            return entry, 'name'
+
+        words = name_words(name)
+        # Words, and significant words, in common with each entry that shares any
+        shared = Counter()
+        significant = Counter()
+        for word in words:
+            postings = self.words.get(word)
+            if postings:
+                shared.update(postings)
+                if word not in STOP_WORDS:
+                    significant.update(postings)
+
+        # Best candidate: most significant words in common, then feed order
+        best = None
+        best_score = 0
+        for position, count in shared.items():
+            score = significant[position]
+            if score < 2:
+                # Containment needs every word of the shorter name in common
+                if count != self._word_counts[position] and count != len(words):
+                    continue
+                waitz_name = self._names[position]
+                if waitz_name not in name and name not in waitz_name:
+                    continue
+            if score + 1 > best_score or (score + 1 == best_score and position < best):
+                best, best_score = position, score + 1
+        if best is None:
+            return None, None
+        return self.entries[best], 'partial'
@@ -0,0 +1,406 @@
+"""
+Precomputed building-to-building walking times.
+
+build_walking_matrix runs one Dijkstra search over the campus walking graph
+(see routing.py) per building and stores the results as a square float32
+matrix of seconds in a .npy file. A JSON file (WALKING_MATRIX_PATH with a
+.json suffix) maps building ids to rows, records where each building was
+snapped onto the graph, and names the .npy file holding this generation of
+the matrix (walking_times.<generation>.npy). Readers open the matrix with
+np.load(mmap_mode='r'), so all processes share it through the page cache
+instead of each holding a copy, and a lookup is an array index.
+
+A walking time is (snap distance at the origin + graph distance + snap
+distance at the destination) / WALKING_SPEED_MPS, and inf when the two
+buildings are not connected. When a building moves only its row and
+column are recomputed, on a background thread once the save is committed.
+Every write puts the matrix in a new generation file and then atomically
+replaces the JSON file, so a reader always pairs a matrix with its own id
+mapping. Writes happen under a file lock (matrix_lock) shared by all
+processes, so concurrent updates don't overwrite each other. The previous
+generation is kept for readers that are just opening it; older ones are
+deleted.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within a process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_thread_lock = threading.RLock()
+
+
+def metadata_path(path):
+    """The JSON file that goes with a matrix file."""
+    return Path(path).with_suffix('.json')
+
+
+def generation_path(path, generation):
+    """The .npy file holding one generation of the matrix at path."""
+    path = Path(path)
+    return path.with_name(f'{path.stem}.{generation}{path.suffix}')
+
+
+def load_times(path, meta, mmap_mode=None):
+    """
+    The matrix of meta's generation. Raises OSError if it is gone and
+    ValueError if it doesn't fit the metadata.
+    """
+    times = np.load(generation_path(path, meta['generation']), mmap_mode=mmap_mode)
+    size = len(meta['building_ids'])
+    if times.shape != (size, size):
+        raise ValueError(f'Matrix is {times.shape}, metadata has {size} buildings')
+    return times
+
+
+@contextmanager
+def matrix_lock(path):
+    """
+    Hold the exclusive lock for updating the matrix at path, across
+    threads and processes. Not reentrant across processes; take it once
+    around build_matrix/update_matrix.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path.with_name(path.name + '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def graph_signature(graph):
+    """Cheap fingerprint telling whether a matrix was built on this graph."""
+    return [graph.node_count, graph.edge_count, round(float(graph.lengths.sum()), 1)]
+
+
+def snap_buildings(graph, coordinates):
+    """Nearest graph node and snap distance (m) for each (lat, lng)."""
+    nodes = []
+    snaps = []
+    for lat, lng in coordinates:
+        node, snap = graph.nearest_node(lat, lng)
+        nodes.append(node)
+        snaps.append(snap)
+    return nodes, snaps
+
+
+def times_from(graph, node, snap, nodes, snaps, speed):
+    """Walking times in seconds from one snapped building to all of them."""
+    distances = graph.distances_from(node)[nodes]
+    return ((snap + distances + np.asarray(snaps)) / speed).astype(np.float32)
+
+
+def write_matrix(path, times, meta):
+    """
+    Write the matrix as a new generation, then switch the metadata to it.
+    Deletes generations older than the one it replaces.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(metadata_path(path), encoding='utf-8') as f:
+            previous = json.load(f).get('generation')
+    except (OSError, ValueError):
+        previous = None
+    meta['generation'] = uuid.uuid4().hex[:12]
+    temporary = path.with_name(path.name + '.tmp.npy')
+    np.save(temporary, times)
+    os.replace(temporary, generation_path(path, meta['generation']))
+    write_metadata(path, meta)
+
+    keep = {generation_path(path, generation).name for generation in (meta['generation'], previous) if generation}
+    for old in path.parent.glob(f'{path.stem}.*{path.suffix}'):
+        if old.name not in keep and old.name != temporary.name:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def write_metadata(path, meta):
+    meta_path = metadata_path(path)
+    temporary = meta_path.with_name(meta_path.name + '.tmp')
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(temporary, meta_path)
+
+
+def build_matrix(graph, buildings, path, speed):
+    """
+    Compute the full matrix for buildings given as (id, lat, lng) and write
+    it to path. Returns the metadata.
+    """
+    ids = [building_id for building_id, _, _ in buildings]
+    coordinates = [(float(lat), float(lng)) for _, lat, lng in buildings]
+    nodes, snaps = snap_buildings(graph, coordinates)
+
+    times = np.empty((len(ids), len(ids)), dtype=np.float32)
+    # Buildings snapped to the same node share one search
+    by_node = {}
+    for row, node in enumerate(nodes):
+        if node not in by_node:
+            by_node[node] = graph.distances_from(node)[nodes]
+        times[row] = (snaps[row] + by_node[node] + np.asarray(snaps)) / speed
+    np.fill_diagonal(times, 0.0)
+
+    meta = {
+        'building_ids': ids,
+        'coordinates': coordinates,
+        'nodes': nodes,
+        'snap_m': snaps,
+        'speed_mps': speed,
+        'graph': graph_signature(graph),
+        'built_at': timezone.now().isoformat(),
+    }
+    write_matrix(path, times, meta)
+    return meta
+
+
+def update_matrix(graph, buildings, path, speed):
+    """
+    Bring an existing matrix up to date with buildings given as (id, lat,
+    lng): recompute the row and column of every building that moved, add
+    new buildings and drop deleted ones. Falls back to a full build when
+    there is no usable matrix. Returns (moved, added, removed) counts, or
+    None after a full build. Hold matrix_lock(path) around the call.
+    """
+    try:
+        with open(metadata_path(path), encoding='utf-8') as f:
+            meta = json.load(f)
+        # A copy, never the file: readers may have it mapped
+        old = load_times(path, meta)
+    except (OSError, ValueError, KeyError):
+        build_matrix(graph, buildings, path, speed)
+        return None
+    if meta.get('graph') != graph_signature(graph) or meta.get('speed_mps') != speed:
+        build_matrix(graph, buildings, path, speed)
+        return None
+
+    current = {building_id: (float(lat), float(lng)) for building_id, lat, lng in buildings}
+    rows = {building_id: row for row, building_id in enumerate(meta['building_ids'])}
+    moved = [
+        building_id for building_id, row in rows.items()
+        if building_id in current and tuple(meta['coordinates'][row]) != current[building_id]
+    ]
+    added = [building_id for building_id in current if building_id not in rows]
+    removed = [building_id for building_id in rows if building_id not in current]
+
+    if added or removed:
+        # The matrix changes shape: copy the rows we keep, compute the rest
+        kept = [building_id for building_id in meta['building_ids'] if building_id in current]
+        ids = kept + added
+        keep_rows = [rows[building_id] for building_id in kept]
+        times = np.empty((len(ids), len(ids)), dtype=np.float32)
+        times[:len(kept), :len(kept)] = old[np.ix_(keep_rows, keep_rows)]
+        meta['building_ids'] = ids
+        meta['coordinates'] = [list(current[building_id]) for building_id in ids]
+        nodes, snaps = snap_buildings(graph, [current[building_id] for building_id in added])
+        meta['nodes'] = [meta['nodes'][row] for row in keep_rows] + nodes
+        meta['snap_m'] = [meta['snap_m'][row] for row in keep_rows] + snaps
+        recompute = [len(kept) + i for i in range(len(added))] + [ids.index(building_id) for building_id in moved]
+    else:
+        times = old
+        ids = meta['building_ids']
+        recompute = [rows[building_id] for building_id in moved]
+
+    for row in recompute:
+        building_id = ids[row]
+        meta['coordinates'][row] = list(current[building_id])
+        (node,), (snap,) = snap_buildings(graph, [current[building_id]])
+        meta['nodes'][row] = node
+        meta['snap_m'][row] = snap
+    for row in recompute:
+        # Walking is symmetric, so one search fills the row and the column
+        row_times = times_from(graph, meta['nodes'][row], meta['snap_m'][row], meta['nodes'], meta['snap_m'], speed)
+        row_times[row] = 0.0
+        times[row, :] = row_times
+        times[:, row] = row_times
+
+    meta['built_at'] = timezone.now().isoformat()
+    write_matrix(path, times, meta)
+    return len(moved), len(added), len(removed)
+
+
+class WalkingTimeMatrix:
+    """A loaded (memory-mapped, read-only) matrix."""
+
+    def __init__(self, path):
+        with open(metadata_path(path), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.times = load_times(path, self.meta, mmap_mode='r')
+        self.rows = {building_id: row for row, building_id in enumerate(self.meta['building_ids'])}
+
+    def __contains__(self, building_id):
+        return building_id in self.rows
+
+    def walking_time(self, from_id, to_id):
+        """Seconds between two buildings (inf if not connected), or None if unknown."""
+        if from_id not in self.rows or to_id not in self.rows:
+            return None
+        return float(self.times[self.rows[from_id], self.rows[to_id]])
+
+    def nearest(self, from_id, to_ids=None, limit=10):
+        """
+        (building id, seconds) for the buildings reachable fastest from
+        from_id, optionally restricted to to_ids, quickest first.
+        """
+        row = self.times[self.rows[from_id]]
+        if to_ids is None:
+            columns = np.arange(len(row))
+        else:
+            columns = np.array([self.rows[building_id] for building_id in to_ids if building_id in self.rows],
+                               dtype=np.int64)
+        columns = columns[columns != self.rows[from_id]]
+        values = row[columns]
+        reachable = np.isfinite(values)
+        columns, values = columns[reachable], values[reachable]
+        if limit < len(values):
+            top = np.argpartition(values, limit)[:limit]
+            columns, values = columns[top], values[top]
+        order = np.argsort(values, kind='stable')
+        ids = self.meta['building_ids']
+        return [(ids[column], float(value)) for column, value in zip(columns[order].tolist(), values[order].tolist())]
+
+
+class WalkingMatrixStore:
+    """
+    Process-wide access to the matrix file. The mapping is reopened when
+    the metadata file changes, which every write ends with.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._version = None
+        self._reset_worker()
+
+    def _reset_worker(self):
+        self._pending = set()  # ids of buildings that moved
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+
+    @property
+    def path(self):
+        return getattr(settings, 'WALKING_MATRIX_PATH', None)
+
+    def get(self):
+        """The current WalkingTimeMatrix, or None if it has not been built."""
+        path = self.path
+        try:
+            version = os.stat(metadata_path(path)).st_mtime_ns if path else None
+        except OSError:
+            version = None
+        if version is None:
+            return None
+        if version == self._version:
+            return self._matrix
+        with self._lock:
+            if version != self._version:
+                try:
+                    self._matrix = WalkingTimeMatrix(path)
+                except OSError as e:
+                    # Most likely rewritten twice since we read the metadata; retry next time
+                    logger.warning(f"Walking time matrix unavailable ({path}): {str(e)}")
+                    return self._matrix
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Walking time matrix unavailable ({path}): {str(e)}")
+                    self._matrix = None
+                self._version = version
+            return self._matrix
+
+    def building_moved(self, building_id, lat, lng):
+        """
+        Queue a recompute of one building's row and column if it is in the
+        matrix and its coordinates changed. New buildings wait for the next
+        build_walking_matrix run. Call after the save has been committed.
+        Set WALKING_MATRIX_UPDATE_ASYNC = False to update inline instead.
+        """
+        matrix = self.get()
+        if matrix is None or building_id not in matrix:
+            return False
+        if tuple(matrix.meta['coordinates'][matrix.rows[building_id]]) == (float(lat), float(lng)):
+            return False
+
+        if not getattr(settings, 'WALKING_MATRIX_UPDATE_ASYNC', True):
+            return self.update({building_id})
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker process: the parent's thread did not survive
+                self._reset_worker()
+            self._pending.add(building_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='walking-matrix-updater', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return True
+
+    def update(self, building_ids):
+        """Recompute the rows of the matrix's buildings that moved, under matrix_lock."""
+        from .models import Building
+        from .routing import campus_router
+
+        graph = campus_router.get_graph()
+        if graph is None:
+            return False
+        start = time.perf_counter()
+        try:
+            with matrix_lock(self.path):
+                # Read the ids under the lock: another process may just have rewritten the file
+                with open(metadata_path(self.path), encoding='utf-8') as f:
+                    ids = json.load(f)['building_ids']
+                buildings = list(Building.objects.filter(id__in=ids).values_list('id', 'latitude', 'longitude'))
+                # Only moved rows are recomputed as long as the set of buildings is unchanged
+                update_matrix(graph, buildings, self.path, getattr(settings, 'WALKING_SPEED_MPS', 1.4))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Walking time matrix update for buildings {sorted(building_ids)} failed: {str(e)}")
+            return False
+        logger.info(
+            f"Walking time matrix updated for buildings {sorted(building_ids)} in "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                building_ids, self._pending = self._pending, set()
+            if not building_ids:
+                continue
+            # The worker owns its own DB connection; don't keep it open
+            # between updates
+            close_old_connections()
+            try:
+                self.update(building_ids)
+            except Exception as e:
+                logger.error(f"Walking time matrix update for buildings {sorted(building_ids)} failed: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+# Shared per-process store used by the views
+walking_matrix = WalkingMatrixStore()
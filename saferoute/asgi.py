@@ -3,6 +3,9 @@ ASGI config for saferoute project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live alert stream (/api/alerts/stream/) is only served under ASGI, e.g.
+``uvicorn saferoute.asgi:application``. Under WSGI the map polls /api/alerts/.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
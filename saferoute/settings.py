@@ -152,3 +152,113 @@ GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', 'AIzaSyBSynlwsgDX_IhvmpXH
 # Get your API key from: https://makersuite.google.com/app/apikey
 # Store your key in .env file
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+
+# Analytics tracking
+# Building views, alert interactions and page views are buffered in memory
+# and written in bulk by a background thread. Set ANALYTICS_BUFFERED = False
+# to write each event synchronously instead.
+ANALYTICS_BUFFERED = True
+ANALYTICS_BUFFER_SIZE = 10000      # Max queued events; extra events are dropped
+ANALYTICS_FLUSH_BATCH_SIZE = 500   # Flush when this many events are queued
+ANALYTICS_FLUSH_INTERVAL = 2.0     # ... or after this many seconds
+
+# Safety alert snapshot
+# /api/alerts/ is served from an in-memory snapshot. Each process checks at
+# most this often (seconds) whether another process changed any alerts.
+ALERT_SNAPSHOT_CHECK_INTERVAL = 5.0
+
+# Building search and spatial indexes
+# Each process checks at most this often (seconds) whether buildings were
+# changed by another process or a management command, and reloads if so.
+BUILDING_INDEX_CHECK_INTERVAL = 5.0
+
+# Live alert stream (/api/alerts/stream/, requires ASGI)
+ALERT_STREAM_MAX_CONNECTIONS = 1000  # Per process; extra clients get 503 and keep polling
+ALERT_STREAM_HEARTBEAT = 15          # Seconds between keep-alive comments
+ALERT_STREAM_POLL_INTERVAL = 2.0     # Seconds between snapshot checks while clients are connected
+ALERT_STREAM_HISTORY = 500           # Events kept for Last-Event-ID resume
+
+# Server-side geocoding (accounts/geocoding.py). Use
+# 'accounts.geocoding.OfflineGeocoder' for tests and offline development.
+GEOCODER_BACKEND = os.getenv('GEOCODER_BACKEND', 'accounts.geocoding.GoogleGeocoder')
+# Alerts and safety concerns saved without coordinates are geocoded on a
+# background thread after commit. Set GEOCODE_ASYNC = False to geocode them
+# inline after commit instead.
+GEOCODE_ASYNC = True
+# Geocode cache hit counts are buffered and written at most this often (seconds)
+GEOCODE_HIT_FLUSH_INTERVAL = 60
+
+# Point alerts count as a circle of this radius for /api/alerts/at/
+ALERT_POINT_RADIUS_M = 25.0
+
+# Campus walking router (/api/route/). GeoJSON LineStrings or an OSM XML extract.
+WALKING_GRAPH_PATH = os.getenv('WALKING_GRAPH_PATH', str(BASE_DIR / 'data' / 'campus_walking_graph.geojson'))
+WALKING_SPEED_MPS = 1.4   # Average walking speed for durations
+ROUTE_MAX_SNAP_M = 300    # Max distance from an endpoint to the nearest graph node
+WALKING_GRAPH_RETRY_SECONDS = 300  # After a failed load, retry this often (or as soon as the file changes)
+# Edge cost multiplier for walking through an active alert zone, by severity
+ROUTE_ALERT_PENALTIES = {'low': 2.0, 'medium': 5.0, 'high': 20.0, 'critical': 100.0}
+ROUTE_CHECK_MAX_POINTS = 5000  # Longest polyline accepted by /api/routes/check/
+ROUTE_CACHE_SIZE = 1000   # Routes kept per process, keyed by snapped origin/destination nodes (LRU)
+ROUTE_CACHE_TTL = 900     # Seconds before a cached route is recomputed
+
+# Saved route alert flags (accounts/route_alerts.py). Re-checks run on a
+# background thread after an alert change commits; set
+# SAVED_ROUTE_CHECK_ASYNC = False to run them inline.
+SAVED_ROUTE_CHECK_ASYNC = True
+SAVED_ROUTE_CHECK_BATCH_SIZE = 500  # Routes tested and updated per batch
+SAVED_ROUTE_MAX_POINTS = 5000       # Longest route geometry stored with a saved route
+
+# Building-to-building walking times (python manage.py build_walking_matrix).
+# The metadata goes in walking_times.json and each generation of the matrix
+# in walking_times.<generation>.npy next to it.
+WALKING_MATRIX_PATH = os.getenv('WALKING_MATRIX_PATH', str(BASE_DIR / 'data' / 'walking_times.npy'))
+# Rows of buildings that move are recomputed on a background thread after
+# commit. Set WALKING_MATRIX_UPDATE_ASYNC = False to recompute them inline.
+WALKING_MATRIX_UPDATE_ASYNC = True
+
+# Walking isochrones (/api/isochrone/)
+ISOCHRONE_MAX_MINUTES = 30   # Largest time budget; one search per origin covers every smaller one
+ISOCHRONE_CACHE_SIZE = 256   # Origin nodes whose searches are kept (LRU)
+ISOCHRONE_SECTORS = 64       # Vertices (at most) of the reachable-area polygon
+
+# Waitz live occupancy feed (python manage.py fetch_waitz_occupancy --all)
+WAITZ_FEED_URL = os.getenv('WAITZ_FEED_URL', 'https://waitz.io/live/gatech')
+
+# Occupancy history (see accounts/occupancy.py). Each Waitz ingest appends a
+# sample per building; rollup_occupancy merges them into hour-of-week stats.
+OCCUPANCY_TIME_ZONE = 'America/New_York'  # Campus time for hour-of-week buckets
+OCCUPANCY_SAMPLE_RETENTION_DAYS = 28      # Raw samples kept after being rolled up
+OCCUPANCY_MIN_SAMPLES = 3                 # Samples an hour needs before it drives predictions
+
+# Next-hour occupancy forecasts (see accounts/forecast.py), refitted by rollup_occupancy
+OCCUPANCY_FORECAST_PATH = os.getenv('OCCUPANCY_FORECAST_PATH', str(BASE_DIR / 'data' / 'occupancy_forecast.npz'))
+OCCUPANCY_FORECAST_FIT_DAYS = 7    # Days of samples the trend and confidence are fitted on
+OCCUPANCY_FORECAST_TOLERANCE = 10  # Points a forecast may be off and still count as right
+
+# Outbound HTTP (accounts/outbound.py): pooled connections, retries and a
+# circuit breaker per host for Waitz and geocoding calls
+OUTBOUND_POOL_SIZE = 10           # Keep-alive connections per host
+OUTBOUND_RETRIES = 2              # Retries of idempotent requests after errors, 429s and 5xx
+OUTBOUND_BACKOFF_BASE = 0.25      # Seconds; retry n waits up to base * 2**n, randomly
+OUTBOUND_BACKOFF_MAX = 4.0        # Longest wait before a retry, including Retry-After
+OUTBOUND_BREAKER_FAILURES = 5     # Failures in a row that open a host's circuit breaker
+OUTBOUND_BREAKER_COOLDOWN = 30.0  # Seconds an open breaker fails fast before a trial request
+
+# Scheduled jobs (accounts/scheduler.py). Run python manage.py run_scheduler
+# as its own process in production; any number may run, one leads.
+SCHEDULER_LEASE_SECONDS = 60      # Leader lease length; a standby takes over this long after the leader dies
+SCHEDULER_HEARTBEAT_SECONDS = 15  # How often the leader renews and standbys check the lease
+SCHEDULER_IN_RUNSERVER = True     # Also run a scheduler inside runserver (development)
+
+# Adaptive Waitz polling (accounts/polling.py). The scheduler checks every
+# WAITZ_POLL_MIN_SECONDS and fetches the feed once the policy says it's due.
+WAITZ_POLL_ADAPTIVE = True       # False polls every WAITZ_POLL_BASE_SECONDS around the clock
+WAITZ_POLL_BASE_SECONDS = 600    # Fixed interval, and the starting point of the adaptive one
+WAITZ_POLL_MIN_SECONDS = 120     # Shortest interval
+WAITZ_POLL_MAX_SECONDS = 1800    # Longest interval (static data, everything closed)
+WAITZ_POLL_PEAK_SECONDS = 300    # Longest interval during historical peak hours
+WAITZ_POLL_PEAK_FRACTION = 0.75  # Peak hours: campus mean at least this share of the busiest hour of the week
+WAITZ_POLL_DRIFT_BUDGET = 2.5    # Points (RMS) readings may drift between polls at the recent change rate
+WAITZ_POLL_BACKOFF = 1.5         # Most the interval grows per poll (speeding up is immediate)
+WAITZ_POLL_SMOOTHING = 0.5       # Weight of the latest poll in the smoothed change rate